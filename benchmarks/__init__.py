@@ -0,0 +1 @@
+"""Local benchmarks for rag_app_deepseek, runnable without external services."""
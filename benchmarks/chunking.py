@@ -0,0 +1,176 @@
+"""
+Text chunking throughput on a multi megabyte document.
+
+Compares the previous list based sentence splitter with the streaming
+chunker used for ingestion.
+
+Run with:
+    python -m benchmarks.chunking --size-mb 8
+"""
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from typing import Callable, Iterable, List, Tuple
+
+from rag_app_deepseek.services.text_embeddings.service import iter_text_chunks
+
+LIMIT = 200
+# number of words of the generated sentences
+MIN_WORDS = 3
+MAX_WORDS = 40
+MEGABYTE = 1e6
+WORDS = (
+    "milvus ollama kafka embedding vector search chunk sentence token "
+    "retrieval context latency throughput naïve café 東京 データ"
+).split()
+
+
+def legacy_split_text_into_chunks(text: str, limit: int = 200) -> List[str]:
+    """
+    Previous chunker, kept as the baseline.
+
+    :param text: text to split.
+    :param limit: max number of characters of a chunk.
+    :returns: List of chunks.
+    """
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    result = []
+    buffer = ""
+
+    for sentence in sentences:
+        if len(sentence) > limit:
+            result.extend(legacy_slices(sentence, limit))
+        elif len(buffer) + len(sentence) + 1 <= limit:
+            buffer = f"{buffer} {sentence}".strip()
+        else:
+            if buffer:
+                result.append(buffer)
+            buffer = sentence
+
+    if buffer:
+        result.append(buffer)
+
+    return result
+
+
+def legacy_slices(sentence: str, limit: int) -> List[str]:
+    """
+    Slices a sentence over the limit like the previous chunker.
+
+    :param sentence: sentence to slice.
+    :param limit: max number of characters of a slice.
+    :returns: List of slices.
+    """
+    starts = range(0, len(sentence), limit)
+    return [sentence[start : start + limit] for start in starts]
+
+
+def make_document(size: int, seed: int = 0) -> str:
+    """
+    Generates a document of roughly `size` characters.
+
+    :param size: number of characters.
+    :param seed: random seed.
+    :returns: the document.
+    """
+    rnd = random.Random(seed)  # noqa: S311
+    sentences = []
+    total = 0
+    while total < size:
+        words = rnd.choices(WORDS, k=rnd.randint(MIN_WORDS, MAX_WORDS))
+        sentence = " ".join(words).capitalize() + rnd.choice(".!?")
+        sentences.append(sentence)
+        total += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def peak_memory(split: Callable[[str], Iterable[str]], text: str) -> float:
+    """
+    Measures the peak memory allocated while splitting the text.
+
+    :param split: chunker.
+    :param text: document to split.
+    :returns: peak memory in megabytes.
+    """
+    tracemalloc.start()
+    for _ in split(text):  # noqa: WPS328
+        pass  # noqa: WPS420
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / MEGABYTE
+
+
+def time_split(
+    split: Callable[[str], Iterable[str]],
+    text: str,
+) -> Tuple[float, int, int]:
+    """
+    Times a chunker and checks its chunk sizes.
+
+    :param split: chunker.
+    :param text: document to split.
+    :returns: duration, number of chunks and number of chunks over the limit.
+    """
+    started_at = time.perf_counter()
+    chunks = 0
+    oversized = 0
+    for chunk in split(text):
+        chunks += 1
+        oversized += len(chunk.encode()) > LIMIT
+    return time.perf_counter() - started_at, chunks, oversized
+
+
+def run(name: str, split: Callable[[str], Iterable[str]], text: str) -> None:
+    """
+    Times a chunker, checks its chunk sizes and measures its peak memory.
+
+    :param name: name of the run.
+    :param split: chunker.
+    :param text: document to split.
+    """
+    elapsed, chunks, oversized = time_split(split, text)
+    throughput = len(text) / elapsed / MEGABYTE
+    peak = peak_memory(split, text)
+    print(  # noqa: WPS421
+        f"{name:<16}",
+        f"{elapsed:6.2f}s",
+        f"{throughput:6.1f}MB/s",
+        f"chunks={chunks}",
+        f"over_{LIMIT}_bytes={oversized}",
+        f"peak_mem={peak:.1f}MB",
+    )
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    text = make_document(int(args.size_mb * MEGABYTE))
+    run("legacy", legacy_split_text_into_chunks, text)
+    run(
+        "streaming",
+        lambda document: iter_text_chunks(document, overlap=args.overlap),
+        text,
+    )
+    if args.max_tokens:
+        run(
+            "streaming+tokens",
+            lambda document: iter_text_chunks(
+                document,
+                overlap=args.overlap,
+                max_tokens=args.max_tokens,
+            ),
+            text,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--overlap", type=int, default=0)
+    parser.add_argument("--max-tokens", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,472 @@
+"""
+End-to-end load of the search endpoint and of the ingestion pipeline.
+
+Ollama, milvus and kafka are replaced by in-process fakes with a
+configurable latency, milvus searching with a NumPy brute force index,
+so the numbers measure the application code and its concurrency
+rather than the services.
+
+- search: concurrent clients query the search endpoint through its ASGI
+  app, each sending its next request once answered.
+- ingest: messages are produced at a fixed rate to the topic the
+  pipeline consumes, a message is done once its offset is committed.
+
+Throughput, latency percentiles and the peak memory of the process are
+written as json along with the commit and the parameters, `--compare`
+prints the relative change against the results of an earlier run.
+
+Run with:
+    python -m benchmarks.end_to_end search --concurrency 32 --output search.json
+    python -m benchmarks.end_to_end ingest --rate 500 --compare ingest.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess  # noqa: S404
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiokafka import TopicPartition
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient, Response
+
+from benchmarks.search_latency import percentile
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.text_embeddings.consumer import TextEmbeddingsPipeline
+from rag_app_deepseek.services.text_embeddings.dedup import ChunkDeduplicator
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.tests.fakes import (
+    FakeKafkaConsumer,
+    FakeNumpyMilvusClient,
+    FakeOllamaClient,
+    make_record,
+)
+from rag_app_deepseek.web.api.search.views import router
+
+WORDS = (
+    "milvus kafka ollama vector search index chunk embedding query answer "
+    "context model token latency batch stream cache tenant message offset "
+    "partition consumer producer schema collection retrieval rerank prompt"
+).split()
+
+
+def make_text(rng: random.Random, sentences: int) -> str:
+    """
+    Generates a text of random sentences.
+
+    :param rng: random generator, seeded for reproducible runs.
+    :param sentences: number of sentences.
+    :returns: the text.
+    """
+    return " ".join(
+        " ".join(rng.choices(WORDS, k=rng.randint(6, 14))).capitalize() + "."
+        for _ in range(sentences)
+    )
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies in milliseconds.
+
+    :param latencies: measured latencies in seconds.
+    :returns: mean, percentiles and max.
+    """
+    if not latencies:
+        return {}
+    return {
+        "mean": round(statistics.mean(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+        "p99": round(percentile(latencies, 99) * 1000, 3),
+        "max": round(max(latencies) * 1000, 3),
+    }
+
+
+def get_max_rss_mb() -> float:
+    """
+    Returns the peak resident memory of the process.
+
+    :returns: memory in MiB.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB everywhere else
+    scale = 1 if sys.platform == "darwin" else 1024
+    return round(max_rss * scale / 2**20, 1)
+
+
+def get_commit() -> Optional[str]:
+    """
+    Returns the git commit the benchmark runs on.
+
+    :returns: commit hash, suffixed with `-dirty` for uncommitted changes,
+        None outside of a git checkout.
+    """
+    try:
+        commit = subprocess.run(  # noqa: S603 S607
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            cwd=Path(__file__).parent,
+            check=True,
+            text=True,
+        ).stdout.strip()
+        status = subprocess.run(  # noqa: S603 S607
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            cwd=Path(__file__).parent,
+            check=True,
+            text=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if status else commit
+
+
+def parse_server_timing(header_value: str) -> Dict[str, float]:
+    """
+    Parses the stage timings of a Server-Timing header.
+
+    :param header_value: value of the header.
+    :returns: duration in milliseconds of every stage.
+    """
+    timings = {}
+    for metric in header_value.split(","):
+        stage, _, duration = metric.strip().partition(";dur=")
+        if duration:
+            timings[stage] = float(duration)
+    return timings
+
+
+def record_server_timing(
+    response: Response,
+    stage_timings: Dict[str, List[float]],
+) -> None:
+    """
+    Adds the stage timings of a traced response, in seconds.
+
+    :param response: search response.
+    :param stage_timings: timings of every stage so far.
+    """
+    server_timing = response.headers.get("server-timing")
+    if not server_timing:
+        return
+    for stage, duration in parse_server_timing(server_timing).items():
+        stage_timings.setdefault(stage, []).append(duration / 1000)
+
+
+async def run_search(args: argparse.Namespace) -> Dict[str, Any]:  # noqa: WPS210
+    """
+    Loads the search endpoint with concurrent clients.
+
+    :param args: command line arguments.
+    :returns: results of the run.
+    """
+    rng = random.Random(args.seed)  # noqa: S311
+    ollama_client = FakeOllamaClient(
+        dim=args.dim,
+        latency=args.llm_latency,
+        token_latency=args.token_latency,
+        embed_latency=args.embed_latency,
+        embed_text_latency=args.embed_text_latency,
+    )
+    milvus = FakeNumpyMilvusClient(latency=args.milvus_latency)
+    milvus.insert(
+        "",
+        [
+            {"text": text, "embedding": ollama_client.embed_text(text)}
+            for text in (make_text(rng, 3) for _ in range(args.rows))
+        ],
+    )
+    queries = [make_text(rng, 1)[:200] for _ in range(args.queries)]
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/search")
+    app.state.ollama_client = ollama_client
+    app.state.milvus_client = MilvusAsyncClient([milvus] * args.pool_size, timeout=30)
+    app.state.answer_cache = None
+    app.state.vector_codec = VectorCodec()
+    app.state.lexical_index = None
+
+    latencies: List[float] = []
+    stage_timings: Dict[str, List[float]] = {}
+    errors = 0
+    sent = 0
+    params = {"trace": "header"} if args.trace else {}
+
+    async def client_loop(client: AsyncClient) -> None:  # noqa: WPS430
+        nonlocal errors, sent
+        while sent < args.requests:
+            query = queries[sent % len(queries)]
+            sent += 1
+            started_at = time.perf_counter()
+            response = await client.get(
+                "/api/search/",
+                params={"query": query, **params},
+            )
+            latencies.append(time.perf_counter() - started_at)
+            if response.status_code != 200:
+                errors += 1
+            record_server_timing(response, stage_timings)
+
+    # the latency is measured, not bounded
+    async with AsyncClient(  # noqa: S113
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+        timeout=None,
+    ) as client:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started_at
+    app.state.milvus_client.close()
+
+    results = {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2),
+        "latency_ms": summarize(latencies),
+        "max_rss_mb": get_max_rss_mb(),
+    }
+    if stage_timings:
+        results["stages_ms"] = {
+            stage: summarize(durations) for stage, durations in stage_timings.items()
+        }
+    return results
+
+
+class TimedKafkaConsumer(FakeKafkaConsumer):
+    """FakeKafkaConsumer timing every message from its production to its commit."""
+
+    def __init__(self) -> None:
+        super().__init__([])
+        self.produced_at: Dict[TopicPartition, List[float]] = {}
+        self.committed_offsets: Dict[TopicPartition, int] = {}
+        self.latencies: List[float] = []
+
+    def produce(self, value: bytes, partition: int) -> None:
+        """
+        Produces a message to a partition of the topic.
+
+        :param value: message value.
+        :param partition: partition of the message.
+        """
+        topic_partition = TopicPartition("rag-text-bench", partition)
+        produced_at = self.produced_at.setdefault(topic_partition, [])
+        self.append(
+            make_record(
+                value,
+                offset=len(produced_at),
+                partition=partition,
+                topic=topic_partition.topic,
+            ),
+        )
+        produced_at.append(time.perf_counter())
+
+    async def commit(
+        self,
+        offsets: Optional[Dict[TopicPartition, int]] = None,
+    ) -> None:
+        """
+        Commits offsets, the messages they cover are done.
+
+        :param offsets: offsets to commit.
+        """
+        await super().commit(offsets)
+        committed_at = time.perf_counter()
+        for topic_partition, offset in (offsets or {}).items():
+            produced_at = self.produced_at[topic_partition]
+            done = produced_at[self.committed_offsets.get(topic_partition, 0) : offset]
+            self.latencies.extend(committed_at - produced for produced in done)
+            self.committed_offsets[topic_partition] = offset
+
+
+async def run_ingest(args: argparse.Namespace) -> Dict[str, Any]:  # noqa: WPS210
+    """
+    Produces messages at a fixed rate to the ingestion pipeline.
+
+    :param args: command line arguments.
+    :returns: results of the run.
+    """
+    rng = random.Random(args.seed)  # noqa: S311
+    values = [
+        json.dumps(
+            {
+                "text": make_text(rng, args.sentences),
+                "timestamp": "2025-01-29T08:49:13",
+            },
+        ).encode()
+        for _ in range(args.messages)
+    ]
+    ollama_client = FakeOllamaClient(
+        dim=args.dim,
+        embed_latency=args.embed_latency,
+        embed_text_latency=args.embed_text_latency,
+    )
+    milvus = FakeNumpyMilvusClient(latency=args.milvus_latency)
+    milvus_client = MilvusAsyncClient([milvus] * args.pool_size, timeout=30)
+    consumer = TimedKafkaConsumer()
+    pipeline = TextEmbeddingsPipeline(
+        consumer=consumer,  # type: ignore
+        ollama_client=ollama_client,  # type: ignore
+        milvus_client=milvus_client,
+        batch_max_size=args.batch_size,
+        batch_linger_ms=args.linger_ms,
+        embed_concurrency=args.embed_concurrency,
+        insert_concurrency=args.insert_concurrency,
+        queue_size=args.queue_size,
+        deduplicator=(
+            ChunkDeduplicator(
+                milvus_client=milvus_client,
+                max_size=settings.text_embeddings_dedup_local_size,
+            )
+            if args.dedup
+            else None
+        ),
+        vector_codec=VectorCodec(),
+    )
+
+    started_at = time.perf_counter()
+    run_task = asyncio.create_task(pipeline.run())
+    for index, message_value in enumerate(values):
+        if args.rate:
+            await asyncio.sleep(
+                max(0, started_at + index / args.rate - time.perf_counter()),
+            )
+        consumer.produce(message_value, partition=index % args.partitions)
+    while len(consumer.latencies) < args.messages and not run_task.done():
+        await asyncio.sleep(0.001)
+    duration = time.perf_counter() - started_at
+    run_task.cancel()
+    await asyncio.gather(run_task, return_exceptions=True)
+    milvus_client.close()
+
+    return {
+        "messages": len(consumer.latencies),
+        "chunks": len(milvus.rows),
+        "duration_s": round(duration, 3),
+        "throughput_msgs": round(len(consumer.latencies) / duration, 2),
+        "throughput_chunks": round(len(milvus.rows) / duration, 2),
+        "latency_ms": summarize(consumer.latencies),
+        "max_rss_mb": get_max_rss_mb(),
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """
+    Flattens the numeric results.
+
+    :param results: nested results.
+    :param prefix: path of the results.
+    :returns: every number by its dotted path.
+    """
+    flat = {}
+    for name, result in results.items():
+        if isinstance(result, dict):
+            flat.update(flatten(result, f"{prefix}{name}."))
+        elif isinstance(result, (int, float)):
+            flat[f"{prefix}{name}"] = result
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """
+    Prints the relative change of every result against a baseline.
+
+    :param baseline: output of an earlier run.
+    :param current: output of this run.
+    """
+    if baseline.get("params") != current["params"]:
+        print("warning: the runs have different parameters")  # noqa: WPS421
+    print(  # noqa: WPS421
+        f"{'':<28} {str(baseline.get('commit'))[:12]:>12} "
+        f"{str(current['commit'])[:12]:>12}",
+    )
+    before = flatten(baseline["results"])
+    for name, after_value in flatten(current["results"]).items():
+        before_value = before.get(name)
+        if before_value is None:
+            continue
+        change = (
+            f"{(after_value - before_value) / before_value:+8.1%}"
+            if before_value
+            else ""
+        )
+        print(  # noqa: WPS421
+            f"{name:<28} {before_value:>12} {after_value:>12} {change}",
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    params = {
+        name: param_value
+        for name, param_value in vars(args).items()
+        if name not in {"output", "compare"}
+    }
+    output = {
+        "benchmark": f"end_to_end.{args.scenario}",
+        "commit": get_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": await (run_search if args.scenario == "search" else run_ingest)(
+            args,
+        ),
+    }
+    print(json.dumps(output, indent=2))  # noqa: WPS421
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), output)
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    scenarios = parser.add_subparsers(dest="scenario", required=True)
+
+    search = scenarios.add_parser("search", help="load the search endpoint")
+    search.add_argument("--concurrency", type=int, default=32)
+    search.add_argument("--requests", type=int, default=1000)
+    search.add_argument("--queries", type=int, default=100)
+    search.add_argument("--rows", type=int, default=20000)
+    search.add_argument("--llm-latency", type=float, default=0.05)
+    search.add_argument("--token-latency", type=float, default=0)
+    search.add_argument("--trace", action="store_true", help="time every stage")
+
+    ingest = scenarios.add_parser("ingest", help="feed the ingestion pipeline")
+    ingest.add_argument("--messages", type=int, default=2000)
+    ingest.add_argument("--rate", type=float, default=500, help="0 for no limit")
+    ingest.add_argument("--sentences", type=int, default=8)
+    ingest.add_argument("--partitions", type=int, default=4)
+    ingest.add_argument("--batch-size", type=int, default=64)
+    ingest.add_argument("--linger-ms", type=int, default=200)
+    ingest.add_argument("--embed-concurrency", type=int, default=1)
+    ingest.add_argument("--insert-concurrency", type=int, default=2)
+    ingest.add_argument("--queue-size", type=int, default=4)
+    ingest.add_argument("--no-dedup", dest="dedup", action="store_false")
+
+    for scenario in (search, ingest):
+        scenario.add_argument("--dim", type=int, default=256)
+        scenario.add_argument("--embed-latency", type=float, default=0.01)
+        scenario.add_argument("--embed-text-latency", type=float, default=0.0005)
+        scenario.add_argument("--milvus-latency", type=float, default=0.005)
+        scenario.add_argument("--pool-size", type=int, default=4)
+        scenario.add_argument("--seed", type=int, default=0)
+        scenario.add_argument("--output", default="", help="json file of the results")
+        scenario.add_argument("--compare", default="", help="json file of a baseline")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,247 @@
+"""
+Recall vs latency of the ANN index types of the embedding field.
+
+Builds every index type on a synthetic clustered dataset, sweeps the
+search breadth (ef for HNSW and DiskANN, nprobe for IVF) and reports
+recall@k against brute force search along with query latencies.
+
+Runs against Milvus Lite by default, pass --uri to target a real server.
+Milvus Lite accepts every index type but only builds HNSW and IVF_FLAT,
+in the background, and searches flat meanwhile: use a milvus server for
+representative numbers.
+
+Run with:
+    python -m benchmarks.index_recall --rows 20000 --dim 256
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from pymilvus import DataType, MilvusClient
+
+from benchmarks.search_latency import percentile
+from rag_app_deepseek.services.milvus.index import (
+    build_index_params,
+    build_search_params,
+)
+from rag_app_deepseek.settings import MilvusIndexType, MilvusMetricType
+
+COLLECTION = "index_recall_benchmark"
+SWEEPS = {
+    MilvusIndexType.HNSW: [16, 32, 64, 128, 256],
+    MilvusIndexType.DISKANN: [16, 32, 64, 128, 256],
+    MilvusIndexType.IVF_FLAT: [1, 4, 16, 64],
+    MilvusIndexType.IVF_PQ: [1, 4, 16, 64],
+}
+
+
+def make_dataset(
+    rows: int,
+    queries: int,
+    dim: int,
+    seed: int = 0,
+) -> Dict[str, np.ndarray]:
+    """
+    Generates normalized vectors drawn around random centroids.
+
+    :param rows: number of stored vectors.
+    :param queries: number of query vectors.
+    :param dim: vector dimension.
+    :param seed: random seed.
+    :returns: Dict with the `vectors` and the `queries`.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = rng.standard_normal((max(1, rows // 100), dim))
+
+    def sample(count: int) -> np.ndarray:  # noqa: WPS430
+        picked = centroids[rng.integers(0, len(centroids), count)]
+        vectors = picked + 0.5 * rng.standard_normal((count, dim))
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(
+            np.float32,
+        )
+
+    return {"vectors": sample(rows), "queries": sample(queries)}
+
+
+def ground_truth(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Exact top k neighbours by cosine similarity.
+
+    :param vectors: normalized stored vectors.
+    :param queries: normalized query vectors.
+    :param k: number of neighbours.
+    :returns: ids of the top k neighbours of every query.
+    """
+    similarities = queries @ vectors.T
+    top = np.argpartition(-similarities, k, axis=1)[:, :k]
+    return np.take_along_axis(
+        top,
+        np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1),
+        axis=1,
+    )
+
+
+def create_collection(client: MilvusClient, vectors: np.ndarray) -> None:
+    """
+    (Re)creates the benchmark collection and inserts the vectors.
+
+    :param client: milvus client.
+    :param vectors: vectors to insert, their position is their id.
+    """
+    if client.has_collection(COLLECTION):
+        client.drop_collection(COLLECTION)
+    schema = MilvusClient.create_schema(auto_id=False)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    schema.add_field("embedding", DataType.FLOAT_VECTOR, dim=vectors.shape[1])
+    client.create_collection(COLLECTION, schema=schema)
+    batch_size = 1000
+    for start in range(0, len(vectors), batch_size):
+        client.insert(
+            COLLECTION,
+            [
+                {"id": start + offset, "embedding": vector.tolist()}
+                for offset, vector in enumerate(vectors[start : start + batch_size])
+            ],
+        )
+
+
+def build_index(
+    client: MilvusClient,
+    index_type: MilvusIndexType,
+    params: Dict[str, Any],
+) -> float:
+    """
+    Replaces the index of the benchmark collection and loads it.
+
+    :param client: milvus client.
+    :param index_type: type of the index.
+    :param params: build params overriding the defaults.
+    :returns: build time in seconds.
+    """
+    client.release_collection(COLLECTION)
+    for index_name in client.list_indexes(COLLECTION):
+        client.drop_index(COLLECTION, index_name)
+
+    wanted = build_index_params(index_type, MilvusMetricType.COSINE, params)
+    index_params = MilvusClient.prepare_index_params()
+    index_params.add_index(field_name="embedding", index_name="embedding", **wanted)
+    started_at = time.perf_counter()
+    client.create_index(COLLECTION, index_params)
+    client.load_collection(COLLECTION)
+    return time.perf_counter() - started_at
+
+
+def run_sweep(  # noqa: WPS211
+    client: MilvusClient,
+    index_type: MilvusIndexType,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    k: int,
+    breadth: int,
+) -> Dict[str, Any]:
+    """
+    Searches every query with a search breadth and scores the results.
+
+    :param client: milvus client.
+    :param index_type: type of the loaded index.
+    :param queries: query vectors.
+    :param truth: exact top k of every query.
+    :param k: number of results per query.
+    :param breadth: ef or nprobe depending on the index type.
+    :returns: Dict of recall and latency results.
+    """
+    search_params = build_search_params(
+        index_type,
+        MilvusMetricType.COSINE,
+        limit=k,
+        ef=breadth,
+        nprobe=breadth,
+    )
+    latencies: List[float] = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started_at = time.perf_counter()
+        results = client.search(
+            COLLECTION,
+            data=[query.tolist()],
+            anns_field="embedding",
+            limit=k,
+            search_params=search_params,
+        )
+        latencies.append(time.perf_counter() - started_at)
+        hits += len({hit["id"] for hit in results[0]} & set(expected.tolist()))
+
+    return {
+        "index_type": index_type.value,
+        "search_params": search_params["params"],
+        f"recall@{k}": round(hits / (len(queries) * k), 4),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    dataset = make_dataset(args.rows, args.queries, args.dim)
+    truth = ground_truth(dataset["vectors"], dataset["queries"], args.k)
+    uri = args.uri or str(Path(tempfile.mkdtemp()) / "index_recall.db")
+    client = MilvusClient(uri=uri)
+    create_collection(client, dataset["vectors"])
+
+    results: List[Dict[str, Any]] = []
+    for index_type in args.index_types:
+        params = json.loads(args.index_params).get(index_type.value, {})
+        build_s = build_index(client, index_type, params)
+        print(f"{index_type.value}: built in {build_s:.2f}s")  # noqa: WPS421
+        for breadth in SWEEPS[index_type]:
+            result = run_sweep(
+                client,
+                index_type,
+                dataset["queries"],
+                truth,
+                args.k,
+                breadth,
+            )
+            result["build_s"] = round(build_s, 2)
+            results.append(result)
+            print(  # noqa: WPS421
+                f"  {json.dumps(result['search_params']):<24} "
+                f"recall@{args.k}={result[f'recall@{args.k}']:.3f} "
+                f"p50={result['p50_ms']:7.2f}ms p99={result['p99_ms']:7.2f}ms",
+            )
+
+    client.drop_collection(COLLECTION)
+    client.close()
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--uri", default="", help="milvus uri, Milvus Lite if unset")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--index-types",
+        type=MilvusIndexType,
+        nargs="+",
+        default=list(SWEEPS),
+    )
+    parser.add_argument(
+        "--index-params",
+        default="{}",  # noqa: P103
+        help='build params by index type, e.g. {"HNSW": {"M": 32}}',
+    )
+    parser.add_argument("--output", default="", help="json file of the results")
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+"""
+Size, load time and query latency of the BM25 index.
+
+Indexes synthetic chunks drawn from a zipfian vocabulary, like natural
+text, in segments the way the kafka consumer does, then measures the
+size of the index on disk, the time a new worker takes to open it and
+the latency of queries.
+
+Run with:
+    python -m benchmarks.lexical_index --chunks 200000
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from benchmarks.search_latency import percentile
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+
+
+def make_chunks(count: int, vocabulary: int, seed: int = 0) -> List[str]:
+    """
+    Generates chunks of about 30 words drawn from a zipfian vocabulary.
+
+    :param count: number of chunks.
+    :param vocabulary: number of distinct words.
+    :param seed: random seed.
+    :returns: chunk texts.
+    """
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.2, size=count * 30), vocabulary) - 1
+    words = ranks.reshape(count, 30)
+    return [" ".join(f"w{word}" for word in chunk) for chunk in words]
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    chunks = make_chunks(args.chunks, args.vocabulary)
+    path = Path(tempfile.mkdtemp()) / "bm25_index"
+    index = BM25Index(str(path), flush_docs=args.flush_docs, flush_interval_s=1e9)
+
+    started_at = time.perf_counter()
+    for start in range(0, len(chunks), args.batch_size):
+        batch = chunks[start : start + args.batch_size]
+        index.add(list(range(start, start + len(batch))), batch)
+    index.close()
+    index_s = time.perf_counter() - started_at
+
+    size = sum(file.stat().st_size for file in path.rglob("*.npy"))
+    started_at = time.perf_counter()
+    reopened = BM25Index(str(path))
+    load_ms = (time.perf_counter() - started_at) * 1000
+
+    queries = [" ".join(chunk.split()[:3]) for chunk in chunks[:: len(chunks) // 200]]
+    latencies: List[float] = []
+    for query in queries:
+        started_at = time.perf_counter()
+        reopened.search(query, limit=args.limit)
+        latencies.append(time.perf_counter() - started_at)
+
+    results = {
+        "chunks": args.chunks,
+        "segments": len(reopened.segments),
+        "index_s": round(index_s, 2),
+        "size_mb": round(size / 1e6, 2),
+        "bytes_per_chunk": round(size / args.chunks, 1),
+        "load_ms": round(load_ms, 2),
+        "query_p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "query_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+    print(json.dumps(results, indent=2))  # noqa: WPS421
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--flush-docs", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=40)
+    parser.add_argument("--output", default="", help="json file of the results")
+    main(parser.parse_args())
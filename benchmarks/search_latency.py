@@ -0,0 +1,121 @@
+"""
+Search latency under concurrent load with a fake milvus.
+
+Compares calling the blocking MilvusClient.search straight from the
+event loop with going through MilvusAsyncClient.
+
+Run with:
+    python -m benchmarks.search_latency --concurrency 32 --latency 0.02
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient
+
+
+def percentile(latencies: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    :param latencies: measured latencies.
+    :param pct: percentile in between 0 and 100.
+    :returns: the percentile value.
+    """
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def measure(
+    search: Callable[[], Awaitable[object]],
+    concurrency: int,
+    requests: int,
+) -> List[float]:
+    """
+    Fires searches in bursts of `concurrency` concurrent requests.
+
+    Latency is measured from the start of the burst, so time spent
+    waiting on a blocked event loop is accounted for.
+
+    :param search: coroutine function making a single search.
+    :param concurrency: number of requests in every burst.
+    :param requests: total number of searches.
+    :returns: latency of every search in seconds.
+    """
+    latencies: List[float] = []
+
+    async def timed(started_at: float) -> None:  # noqa: WPS430
+        await search()
+        latencies.append(time.perf_counter() - started_at)
+
+    for _ in range(max(1, requests // concurrency)):
+        started_at = time.perf_counter()
+        await asyncio.gather(*(timed(started_at) for _ in range(concurrency)))
+    return latencies
+
+
+def report(name: str, latencies: List[float]) -> None:
+    """
+    Prints latency percentiles.
+
+    :param name: name of the run.
+    :param latencies: measured latencies.
+    """
+    print(  # noqa: WPS421
+        f"{name:<24} p50={statistics.median(latencies) * 1000:8.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.1f}ms",
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    ollama_client = FakeOllamaClient(dim=args.dim)
+    fake = FakeMilvusClient(latency=args.latency)
+    fake.insert(
+        "text_embeddings_schema",
+        [
+            {"text": str(i), "embedding": ollama_client.embed_text(str(i))}
+            for i in range(args.rows)  # noqa: WPS111
+        ],
+    )
+    query = ollama_client.embed_text("query")
+
+    async def blocking_search() -> object:  # noqa: WPS430
+        return fake.search("text_embeddings_schema", [query], output_fields=["text"])
+
+    milvus_client = MilvusAsyncClient([fake] * args.pool_size, timeout=3)
+
+    async def pooled_search() -> object:  # noqa: WPS430
+        return await milvus_client.search(
+            "text_embeddings_schema",
+            [query],
+            output_fields=["text"],
+        )
+
+    report(
+        "blocking MilvusClient",
+        await measure(blocking_search, args.concurrency, args.requests),
+    )
+    report(
+        f"MilvusAsyncClient[{args.pool_size}]",
+        await measure(pooled_search, args.concurrency, args.requests),
+    )
+    milvus_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
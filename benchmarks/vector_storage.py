@@ -0,0 +1,171 @@
+"""
+Memory vs recall of the vector storage modes of the embedding field.
+
+Encodes a synthetic embedding set with every VectorCodec, searches it
+by brute force in the encoded space (cosine, or hamming for binary
+vectors followed by the half precision rerank of the search path) and
+reports recall@k against full precision search, along with the memory
+the embedding field takes once loaded.
+
+Run with:
+    python -m benchmarks.vector_storage --rows 20000 --collection-rows 1000000
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.index_recall import ground_truth
+from rag_app_deepseek.services.milvus.vectors import (
+    EMBEDDING_DIM,
+    BinaryCodec,
+    Float16Codec,
+    ProjectionCodec,
+    VectorCodec,
+)
+
+
+def make_embeddings(rows: int, dim: int, rank: int, seed: int = 0) -> np.ndarray:
+    """
+    Generates normalized embeddings with a low intrinsic dimension.
+
+    Real embeddings concentrate around a much lower dimensional subspace
+    than their size, which is what makes PCA work on them.
+
+    :param rows: number of embeddings.
+    :param dim: embedding dimension.
+    :param rank: intrinsic dimension.
+    :param seed: random seed.
+    :returns: embeddings, one per row.
+    """
+    rng = np.random.default_rng(seed)
+    latent = rng.standard_normal((rows, rank))
+    basis = rng.standard_normal((rank, dim))
+    embeddings = latent @ basis + 0.5 * rng.standard_normal((rows, dim))
+    return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(
+        np.float32,
+    )
+
+
+def search_encoded(
+    codec: VectorCodec,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    rerank_factor: int,
+) -> np.ndarray:
+    """
+    Searches queries over vectors encoded by a codec.
+
+    :param codec: storage codec.
+    :param vectors: full precision stored embeddings.
+    :param queries: full precision query embeddings.
+    :param k: number of results per query.
+    :param rerank_factor: candidates per result reranked for binary vectors.
+    :returns: ids of the top k results of every query.
+    """
+    if codec.rerank:
+        stored = np.unpackbits(
+            np.frombuffer(b"".join(codec.encode(vectors)), dtype=np.uint8).reshape(
+                len(vectors),
+                -1,
+            ),
+            axis=1,
+        ).astype(np.float32)
+        encoded_queries = np.unpackbits(
+            np.frombuffer(b"".join(codec.encode(queries)), dtype=np.uint8).reshape(
+                len(queries),
+                -1,
+            ),
+            axis=1,
+        ).astype(np.float32)
+        # hamming distance through dot products of the bits and their complements
+        distances = stored.shape[1] - (
+            encoded_queries @ stored.T + (1 - encoded_queries) @ (1 - stored).T
+        )
+        candidates = np.argsort(distances, axis=1)[:, : k * rerank_factor]
+        # candidates are reranked with the stored half precision vectors
+        rerank_vectors = codec.rerank_codec.decode(
+            codec.rerank_codec.encode(vectors),
+        )
+        similarities = np.einsum(
+            "qd,qcd->qc",
+            queries,
+            rerank_vectors[candidates],
+        )
+        order = np.argsort(-similarities, axis=1)[:, :k]
+        return np.take_along_axis(candidates, order, axis=1)
+
+    stored = np.asarray(codec.encode(vectors), dtype=np.float32)
+    encoded_queries = np.asarray(codec.encode(queries), dtype=np.float32)
+    stored /= np.linalg.norm(stored, axis=1, keepdims=True)
+    encoded_queries /= np.linalg.norm(encoded_queries, axis=1, keepdims=True)
+    return ground_truth(stored, encoded_queries, k)
+
+
+def main(args: argparse.Namespace) -> None:
+    """
+    Runs the benchmark.
+
+    :param args: command line arguments.
+    """
+    embeddings = make_embeddings(args.rows + args.queries, args.dim, args.rank)
+    vectors, queries = embeddings[: args.rows], embeddings[args.rows :]
+    truth = ground_truth(vectors, queries, args.k)
+
+    codecs: List[VectorCodec] = [
+        VectorCodec(args.dim),
+        Float16Codec(args.dim),
+        ProjectionCodec.fit_pca(vectors[: args.pca_sample], args.reduced_dim),
+        ProjectionCodec.random(args.dim, args.reduced_dim),
+        BinaryCodec(args.dim),
+    ]
+    results: List[Dict[str, Any]] = []
+    for codec in codecs:
+        found = search_encoded(codec, vectors, queries, args.k, args.rerank_factor)
+        hits = sum(
+            len(set(row.tolist()) & set(expected.tolist()))
+            for row, expected in zip(found, truth)
+        )
+        result = {
+            "mode": codec.mode.value,
+            "dim": codec.dim,
+            "bytes_per_vector": codec.bytes_per_vector(),
+            "loaded_gb": round(
+                codec.bytes_per_vector() * args.collection_rows / 1e9,
+                2,
+            ),
+            f"recall@{args.k}": round(hits / (len(queries) * args.k), 4),
+        }
+        results.append(result)
+        print(  # noqa: WPS421
+            f"{result['mode']:<18} dim={result['dim']:<5} "
+            f"{result['bytes_per_vector']:>6} B/vector "
+            f"{result['loaded_gb']:>7.2f} GB per {args.collection_rows} rows "
+            f"recall@{args.k}={result[f'recall@{args.k}']:.3f}",
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    parser.add_argument("--rank", type=int, default=256, help="intrinsic dimension")
+    parser.add_argument("--reduced-dim", type=int, default=512)
+    parser.add_argument("--pca-sample", type=int, default=5000)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--collection-rows",
+        type=int,
+        default=1000000,
+        help="number of chunks to estimate the loaded memory for",
+    )
+    parser.add_argument("--output", default="", help="json file of the results")
+    main(parser.parse_args())
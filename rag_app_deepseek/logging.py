@@ -6,6 +6,15 @@ from loguru import logger
 
 from rag_app_deepseek.settings import settings
 
+# loguru default format, with the trace id of traced requests
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
+    + "<level>{level: <8}</level> | "
+    + "<magenta>{extra[trace_id]}</magenta> | "
+    + "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - "
+    + "<level>{message}</level>"
+)
+
 
 class InterceptHandler(logging.Handler):
     """
@@ -58,7 +67,9 @@ def configure_logging() -> None:  # pragma: no cover
 
     # set logs output, level and format
     logger.remove()
+    logger.configure(extra={"trace_id": "-"})
     logger.add(
         sys.stdout,
         level=settings.log_level.value,
+        format=LOG_FORMAT,
     )
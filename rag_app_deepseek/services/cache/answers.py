@@ -0,0 +1,176 @@
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class AnswerCacheStats:
+    """Counters of the answer cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+@dataclass
+class CachedAnswer:
+    """Answer of the llm together with the context it was generated from."""
+
+    answer: str
+    context_ids: Tuple[int, ...]
+    expires_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache of llm answers looked up by the similarity of the query embedding.
+
+    Query embeddings are kept normalized in a preallocated float32 matrix,
+    so a lookup is a single matrix-vector product over every cached query.
+    A near-duplicate query only reuses an answer when the vector search
+    retrieved the very same context for it, and entries are invalidated
+    once chunks similar to their query are ingested.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        similarity_threshold: float,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.stats = AnswerCacheStats()
+        self.embeddings: Optional[np.ndarray] = None
+        self.entries: List[Optional[CachedAnswer]] = [None] * max_size
+        # slots in use ordered from least to most recently used
+        self.used_slots: "OrderedDict[int, None]" = OrderedDict()
+
+    def _normalize(self, embeddings: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)  # noqa: WPS432
+
+    def _similarities(self, embeddings: np.ndarray) -> np.ndarray:
+        similarities = np.full(
+            (len(embeddings), self.max_size),
+            -np.inf,
+            dtype=np.float32,
+        )
+        if self.embeddings is not None and self.used_slots:
+            slots = np.fromiter(self.used_slots, dtype=np.int64)
+            similarities[:, slots] = embeddings @ self.embeddings[slots].T
+        return similarities
+
+    def _drop(self, slot: int) -> None:
+        self.entries[slot] = None
+        self.used_slots.pop(slot, None)
+
+    def lookup(
+        self,
+        embedding: Sequence[float],
+        context_ids: Sequence[int],
+    ) -> Optional[str]:
+        """
+        Looks up the answer of the most similar cached query.
+
+        :param embedding: embedding of the query.
+        :param context_ids: ids of the context retrieved for the query.
+        :returns: the cached answer or None on a miss.
+        """
+        query = self._normalize(np.asarray([embedding], dtype=np.float32))
+        similarities = self._similarities(query)[0]
+        slot = int(np.argmax(similarities))
+        entry = self.entries[slot]
+        if entry is None or similarities[slot] < self.similarity_threshold:
+            self.stats.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._drop(slot)
+            self.stats.evictions += 1
+            self.stats.misses += 1
+            return None
+
+        if entry.context_ids != tuple(context_ids):
+            # the retrieved context changed since the answer was generated
+            self._drop(slot)
+            self.stats.invalidations += 1
+            self.stats.misses += 1
+            return None
+
+        self.used_slots.move_to_end(slot)
+        self.stats.hits += 1
+        return entry.answer
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        context_ids: Sequence[int],
+        answer: str,
+    ) -> None:
+        """
+        Stores the answer of a query, evicting the least recently used one if full.
+
+        :param embedding: embedding of the query.
+        :param context_ids: ids of the context the answer was generated from.
+        :param answer: answer of the llm.
+        """
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        if self.embeddings is None:
+            self.embeddings = np.zeros((self.max_size, len(query)), dtype=np.float32)
+
+        if len(self.used_slots) < self.max_size:
+            slot = next(
+                free_slot
+                for free_slot, entry in enumerate(self.entries)
+                if entry is None
+            )
+        else:
+            slot, _ = self.used_slots.popitem(last=False)
+            self.stats.evictions += 1
+
+        self.embeddings[slot] = query
+        self.entries[slot] = CachedAnswer(
+            answer=answer,
+            context_ids=tuple(context_ids),
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self.used_slots[slot] = None
+        self.used_slots.move_to_end(slot)
+
+    def invalidate_similar(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        threshold: float,
+    ) -> int:
+        """
+        Drops the answers of cached queries similar to newly ingested chunks.
+
+        :param embeddings: embeddings of the new chunks.
+        :param threshold: min similarity of a chunk to invalidate a query.
+        :returns: number of invalidated answers.
+        """
+        if not self.used_slots or not len(embeddings):
+            return 0
+
+        chunks = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        stale = np.flatnonzero(
+            (self._similarities(chunks) >= threshold).any(axis=0),
+        )
+        for slot in stale:
+            self._drop(int(slot))
+        self.stats.invalidations += len(stale)
+        return len(stale)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        :returns: Dict of counters and the current size.
+        """
+        return {**asdict(self.stats), "size": len(self.used_slots)}
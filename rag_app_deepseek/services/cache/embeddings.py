@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+# size of the cache keys digest, in bytes
+KEY_DIGEST_SIZE = 16
+# keys looked up per sqlite query, under its limit of 999 bound variables
+SQLITE_MAX_KEYS_PER_QUERY = 900
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes the text before using it as a cache key.
+
+    :param text: text to normalize.
+    :returns: NFKC normalized text with collapsed whitespace.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def embeddings_cache_key(model: str, text: str) -> str:
+    """
+    Builds the cache key of a text embedded by a model.
+
+    :param model: name of the embedding model.
+    :param text: embedded text.
+    :returns: hex digest of the model and the normalized text.
+    """
+    digest = hashlib.blake2b(digest_size=KEY_DIGEST_SIZE)
+    digest.update(model.encode())
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class EmbeddingsCacheStats:
+    """Counters of the embeddings cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    shared_hits: int = 0
+
+
+class EmbeddingsCacheBackend(Protocol):
+    """Shared storage behind the in-process LRU, e.g. for multiple workers."""
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, "array[float]"]:
+        """
+        Looks up the embeddings of the keys.
+
+        :param keys: cache keys.
+        """
+
+    def set_many(self, items: Dict[str, "array[float]"], ttl: float) -> None:
+        """
+        Stores the embeddings of the keys.
+
+        :param items: embeddings by cache key.
+        :param ttl: time to live in seconds.
+        """
+
+    def close(self) -> None:
+        """Releases the resources of the backend."""
+
+
+class SqliteEmbeddingsCacheBackend:
+    """
+    Embeddings cache stored in a sqlite file.
+
+    Every uvicorn worker opens the same file, so an embedding computed
+    by one worker is a hit for all the others. Vectors are stored as
+    raw float32 bytes. Expired rows are purged at most once every
+    `purge_interval_s`, through an index on their expiry time.
+    """
+
+    def __init__(self, path: str, purge_interval_s: float = 60) -> None:
+        self.lock = threading.Lock()
+        self.purge_interval_s = purge_interval_s
+        self.purged_at: float = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings "
+            + "(key TEXT PRIMARY KEY, embedding BLOB, expires_at REAL)",
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_expires_at "
+            + "ON embeddings (expires_at)",
+        )
+        self.conn.commit()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, "array[float]"]:
+        """
+        Looks up the non expired embeddings of the keys.
+
+        :param keys: cache keys.
+        :returns: embeddings by cache key.
+        """
+        found: Dict[str, "array[float]"] = {}
+        now = time.time()
+        for start in range(0, len(keys), SQLITE_MAX_KEYS_PER_QUERY):
+            for key, blob in self.select_batch(
+                keys[start : start + SQLITE_MAX_KEYS_PER_QUERY],
+                now,
+            ):
+                found[key] = array("f")
+                found[key].frombytes(blob)
+        return found
+
+    def select_batch(
+        self,
+        keys: Sequence[str],
+        now: float,
+    ) -> List[Tuple[str, bytes]]:
+        """
+        Selects the non expired rows of a batch of keys in one query.
+
+        :param keys: cache keys, at most `SQLITE_MAX_KEYS_PER_QUERY`.
+        :param now: current time.
+        :returns: keys and embedding blobs found.
+        """
+        placeholders = ",".join("?" * len(keys))
+        with self.lock:
+            return self.conn.execute(
+                "SELECT key, embedding FROM embeddings "  # noqa: S608
+                + f"WHERE key IN ({placeholders}) AND expires_at > ?",
+                (*keys, now),
+            ).fetchall()
+
+    def set_many(self, items: Dict[str, "array[float]"], ttl: float) -> None:
+        """
+        Stores the embeddings, and drops the expired ones once in a while.
+
+        :param items: embeddings by cache key.
+        :param ttl: time to live in seconds.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (key, embedding.tobytes(), now + ttl)
+                    for key, embedding in items.items()
+                ],
+            )
+            if now - self.purged_at >= self.purge_interval_s:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE expires_at <= ?",
+                    (now,),
+                )
+                self.purged_at = now
+            self.conn.commit()
+
+    def close(self) -> None:
+        """Closes the sqlite connection."""
+        with self.lock:
+            self.conn.close()
+
+
+class EmbeddingsCache:
+    """
+    LRU cache of text embeddings with a time to live.
+
+    Entries are keyed by the model and the normalized text, and kept
+    as float32 arrays to keep the memory of large vectors in check.
+    An optional shared backend is consulted on local misses.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        backend: Optional[EmbeddingsCacheBackend] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.stats = EmbeddingsCacheStats()
+        self.entries: "OrderedDict[str, Tuple[float, array[float]]]" = (  # noqa: WPS234
+            OrderedDict()
+        )
+
+    async def get_many(  # noqa: WPS234
+        self,
+        model: str,
+        texts: Sequence[str],
+    ) -> List[Optional[List[float]]]:
+        """
+        Looks up the embeddings of the texts.
+
+        :param model: name of the embedding model.
+        :param texts: texts to look up.
+        :returns: embedding of every text, None for misses.
+        """
+        keys = [embeddings_cache_key(model, text) for text in texts]
+        found = await self._get_found(list(dict.fromkeys(keys)))
+
+        results: List[Optional[List[float]]] = []  # noqa: WPS234
+        for key in keys:
+            embedding = found.get(key)
+            if embedding is None:
+                self.stats.misses += 1
+                results.append(None)
+            else:
+                self.stats.hits += 1
+                results.append(embedding.tolist())
+        return results
+
+    async def set_many(
+        self,
+        model: str,
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None:
+        """
+        Stores the embeddings of the texts.
+
+        :param model: name of the embedding model.
+        :param texts: embedded texts.
+        :param embeddings: embedding of every text.
+        """
+        items = {
+            embeddings_cache_key(model, text): array("f", embedding)
+            for text, embedding in zip(texts, embeddings)
+        }
+        for key, embedding in items.items():
+            self._set_local(key, embedding)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set_many, items, self.ttl)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the cache counters.
+
+        :returns: Dict of counters and the current size.
+        """
+        return {**asdict(self.stats), "size": len(self.entries)}
+
+    def close(self) -> None:
+        """Closes the shared backend if any."""
+        if self.backend is not None:
+            self.backend.close()
+
+    async def _get_found(self, keys: Sequence[str]) -> Dict[str, "array[float]"]:
+        found = self._get_found_local(keys)
+        if self.backend is None or len(found) == len(keys):
+            return found
+
+        shared = await asyncio.to_thread(
+            self.backend.get_many,
+            [key for key in keys if key not in found],
+        )
+        for key, embedding in shared.items():
+            self._set_local(key, embedding)
+        self.stats.shared_hits += len(shared)
+        return {**found, **shared}
+
+    def _get_found_local(self, keys: Sequence[str]) -> Dict[str, "array[float]"]:
+        found: Dict[str, "array[float]"] = {}
+        for key in keys:
+            embedding = self._get_local(key)
+            if embedding is not None:
+                found[key] = embedding
+        return found
+
+    def _get_local(self, key: str) -> "Optional[array[float]]":
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, embedding = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]  # noqa: WPS420
+            self.stats.evictions += 1
+            return None
+
+        self.entries.move_to_end(key)
+        return embedding
+
+    def _set_local(self, key: str, embedding: "array[float]") -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
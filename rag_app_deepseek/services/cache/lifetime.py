@@ -0,0 +1,59 @@
+from typing import Optional
+
+from loguru import logger
+
+from rag_app_deepseek.services.cache.answers import SemanticAnswerCache
+from rag_app_deepseek.services.cache.embeddings import (
+    EmbeddingsCache,
+    SqliteEmbeddingsCacheBackend,
+)
+from rag_app_deepseek.settings import settings
+
+
+def init_embeddings_cache() -> Optional[EmbeddingsCache]:
+    """
+    Initialises the embeddings cache if enabled.
+
+    :returns: EmbeddingsCache or None when disabled.
+    """
+    if not settings.embeddings_cache_enabled:
+        return None
+
+    backend = None
+    if settings.embeddings_cache_sqlite_path:
+        backend = SqliteEmbeddingsCacheBackend(settings.embeddings_cache_sqlite_path)
+        logger.info(
+            f"embeddings cache shared via sqlite: {settings.embeddings_cache_sqlite_path}",  # noqa: E501
+        )
+
+    return EmbeddingsCache(
+        max_size=settings.embeddings_cache_max_size,
+        ttl=settings.embeddings_cache_ttl_s,
+        backend=backend,
+    )
+
+
+def init_answer_cache() -> Optional[SemanticAnswerCache]:
+    """
+    Initialises the semantic answer cache if enabled.
+
+    :returns: SemanticAnswerCache or None when disabled.
+    """
+    if not settings.answer_cache_enabled:
+        return None
+
+    return SemanticAnswerCache(
+        max_size=settings.answer_cache_max_size,
+        ttl=settings.answer_cache_ttl_s,
+        similarity_threshold=settings.answer_cache_similarity_threshold,
+    )
+
+
+def shutdown_embeddings_cache(cache: Optional[EmbeddingsCache]) -> None:
+    """
+    Closes the embeddings cache.
+
+    :param cache: embeddings cache to close, if any.
+    """
+    if cache is not None:
+        cache.close()
@@ -0,0 +1,77 @@
+from typing import List, Tuple
+
+from aiokafka import AIOKafkaProducer, ConsumerRecord
+from loguru import logger
+
+from rag_app_deepseek.services.text_embeddings.failures import FailureKind
+
+# longest error message kept in the headers of a dead letter
+MAX_ERROR_CHARS = 1000
+
+
+def get_dead_letter_headers(
+    record: ConsumerRecord,
+    stage: str,
+    kind: FailureKind,
+    error: BaseException,
+) -> List[Tuple[str, bytes]]:
+    """
+    Builds the headers telling where a dead letter comes from and why.
+
+    :param record: message which failed.
+    :param stage: pipeline stage which failed.
+    :param kind: kind of the failure.
+    :param error: raised error.
+    :returns: kafka headers.
+    """
+    return [
+        ("dlq.topic", record.topic.encode()),
+        ("dlq.partition", str(record.partition).encode()),
+        ("dlq.offset", str(record.offset).encode()),
+        ("dlq.stage", stage.encode()),
+        ("dlq.failure", kind.value.encode()),
+        ("dlq.error", repr(error)[:MAX_ERROR_CHARS].encode()),
+    ]
+
+
+class DeadLetterQueue:
+    """
+    Moves the messages the consumer keeps failing on to a dead letter topic.
+
+    Dead letters keep the key and value of the message, so they can be
+    published again to the text topic once the cause is fixed.
+    """
+
+    def __init__(self, producer: AIOKafkaProducer, topic: str) -> None:
+        self.producer = producer
+        self.topic = topic
+        self.count = 0
+
+    async def publish(
+        self,
+        record: ConsumerRecord,
+        stage: str,
+        kind: FailureKind,
+        error: BaseException,
+    ) -> None:
+        """
+        Publishes a failed message and waits for its delivery.
+
+        The offset of the message can be committed once this returns.
+
+        :param record: message which failed.
+        :param stage: pipeline stage which failed.
+        :param kind: kind of the failure.
+        :param error: raised error.
+        """
+        delivery = await self.producer.send(
+            self.topic,
+            record.value,
+            key=record.key,
+            headers=get_dead_letter_headers(record, stage, kind, error),
+        )
+        await delivery
+        self.count += 1
+        logger.warning(
+            f"kafka message {record.topic}:{record.partition}:{record.offset} moved to {self.topic}, {stage} failed: {error!r}",  # noqa: E501
+        )
@@ -0,0 +1,99 @@
+import time
+from typing import Dict, List, Optional
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from aiokafka.admin import AIOKafkaAdminClient
+
+from rag_app_deepseek.services.metrics.instruments import KAFKA_CONSUMER_LAG
+
+
+class ConsumerLagMonitor:
+    """
+    Measures how many messages of a topic a consumer group has yet to process.
+
+    The lag is the sum over the partitions of the end offset minus the
+    offset committed by the group. Partitions the group has not committed
+    to yet are consumed from their earliest offset, so their lag counts
+    from there. It takes a few kafka requests, so it is measured at most
+    once every `interval_s` seconds.
+    """
+
+    def __init__(
+        self,
+        admin_client: AIOKafkaAdminClient,
+        consumer: AIOKafkaConsumer,
+        group_id: str,
+        topic: str,
+        interval_s: float,
+    ) -> None:
+        self.admin_client = admin_client
+        self.consumer = consumer
+        self.group_id = group_id
+        self.topic = topic
+        self.interval_s = interval_s
+        self.lag = 0
+        self.partition_lags: Dict[int, int] = {}
+        self.measured_at: Optional[float] = None
+
+    async def get_partitions(self) -> List[TopicPartition]:
+        """
+        Lists all the partitions of the topic.
+
+        The metadata is fetched again, partitions may have been added.
+
+        :returns: partitions of the topic, none if it does not exist yet.
+        """
+        await self.consumer.topics()
+        partition_ids = self.consumer.partitions_for_topic(self.topic) or set()
+        return [TopicPartition(self.topic, partition) for partition in partition_ids]
+
+    async def get_start_offsets(
+        self,
+        partitions: List[TopicPartition],
+    ) -> Dict[TopicPartition, int]:
+        """
+        Finds where the group resumes consuming every partition.
+
+        :param partitions: partitions of the topic.
+        :returns: committed offset, or earliest offset if never committed.
+        """
+        committed = await self.admin_client.list_consumer_group_offsets(
+            self.group_id,
+            partitions=partitions,
+        )
+        start_offsets = {
+            tp: committed[tp].offset
+            for tp in partitions
+            if tp in committed and committed[tp].offset >= 0
+        }
+        uncommitted = [tp for tp in partitions if tp not in start_offsets]
+        if uncommitted:
+            start_offsets.update(await self.consumer.beginning_offsets(uncommitted))
+        return start_offsets
+
+    async def get_lag(self) -> int:
+        """
+        Returns the lag of the consumer group, measured again when stale.
+
+        The lag of every partition is exported in the metrics.
+
+        :returns: number of messages not yet processed.
+        """
+        now = time.monotonic()
+        if self.measured_at is not None and now - self.measured_at < self.interval_s:
+            return self.lag
+
+        partitions = await self.get_partitions()
+        self.partition_lags = {}
+        if partitions:
+            start_offsets = await self.get_start_offsets(partitions)
+            end_offsets = await self.consumer.end_offsets(partitions)
+            self.partition_lags = {
+                tp.partition: max(end_offsets[tp] - start_offsets[tp], 0)
+                for tp in partitions
+            }
+        for partition, partition_lag in self.partition_lags.items():
+            KAFKA_CONSUMER_LAG.labels(partition=str(partition)).set(partition_lag)
+        self.lag = sum(self.partition_lags.values())
+        self.measured_at = now
+        return self.lag
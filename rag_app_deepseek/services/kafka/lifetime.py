@@ -1,30 +1,24 @@
 import asyncio
 import ssl
+from typing import Any, Dict
 
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka.admin import AIOKafkaAdminClient
 from fastapi import FastAPI
 from loguru import logger
 
+from rag_app_deepseek.services.kafka.lag import ConsumerLagMonitor
 from rag_app_deepseek.services.text_embeddings.consumer import (
     text_embeddings_consumer_handler,
 )
 from rag_app_deepseek.settings import settings
 
 
-async def init_kafka(app: FastAPI) -> None:  # pragma: no cover
+def get_kafka_common_config() -> Dict[str, Any]:  # pragma: no cover
     """
-    Initialise kafka producer needed for test cases and consumer for text embeddings.
-
-    This function creates producer
-    and makes initial connection to
-    the kafka cluster. After that you
-    can use producer stored in state.
-
-    We don't need to use pools here,
-    because aiokafka has implicit pool
-    inside the producer.
+    Builds the connection config shared by all the kafka clients.
 
-    :param app: current application.
+    :returns: kwargs of the aiokafka clients.
     """
     if settings.kafka_ssl and settings.kafka_sasl_mechanism in [  # noqa: WPS337 WPS510
         "SCRAM-SHA-256",
@@ -47,7 +41,7 @@ async def init_kafka(app: FastAPI) -> None:  # pragma: no cover
     context.options &= ssl.OP_NO_TLSv1
     context.options &= ssl.OP_NO_TLSv1_1
 
-    kafka_common_config = {
+    return {
         "bootstrap_servers": settings.kafka_bootstrap_servers_list,
         "security_protocol": security_protocol,
         "sasl_mechanism": settings.kafka_sasl_mechanism if use_sasl else "PLAIN",
@@ -56,20 +50,77 @@ async def init_kafka(app: FastAPI) -> None:  # pragma: no cover
         "sasl_plain_password": settings.kafka_sasl_password,
     }
 
-    app.state.kafka_producer = AIOKafkaProducer(**kafka_common_config)
-    await app.state.kafka_producer.start()
-    logger.info("Kafka producer started")
 
-    app.state.kafka_consumer_text_embeddings = AIOKafkaConsumer(
-        settings.kafka_topic_text,
+def create_text_embeddings_consumer(  # pragma: no cover
+    kafka_common_config: Dict[str, Any],
+) -> AIOKafkaConsumer:
+    """
+    Creates a consumer of the text embeddings consumer group.
+
+    It is subscribed to the text topic once its pipeline runs,
+    see `run_text_embeddings_consumer`.
+
+    :param kafka_common_config: connection config of the kafka clients.
+    :returns: consumer, not started.
+    """
+    return AIOKafkaConsumer(
         **kafka_common_config,
-        client_id=f"rag-app-consumer-{settings.environment}",
-        group_id=f"rag-app-consumer-{settings.environment}",
+        client_id=settings.kafka_consumer_group_id,
+        group_id=settings.kafka_consumer_group_id,
         auto_offset_reset="earliest",
         enable_auto_commit=False,
         max_poll_interval_ms=60000,  # 1 minute # noqa: WPS432
         session_timeout_ms=120000,  # 2 minutes # noqa: WPS432
     )
+
+
+async def init_kafka(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Initialise kafka producer needed for test cases and consumer for text embeddings.
+
+    This function creates producer
+    and makes initial connection to
+    the kafka cluster. After that you
+    can use producer stored in state.
+
+    We don't need to use pools here,
+    because aiokafka has implicit pool
+    inside the producer.
+
+    :param app: current application.
+    """
+    kafka_common_config = get_kafka_common_config()
+
+    app.state.kafka_producer = AIOKafkaProducer(
+        **kafka_common_config,
+        compression_type=settings.kafka_producer_compression_type,
+        max_batch_size=settings.kafka_producer_max_batch_size,
+        linger_ms=settings.kafka_producer_linger_ms,
+    )
+    await app.state.kafka_producer.start()
+    logger.info("Kafka producer started")
+
+    app.state.kafka_admin_client = AIOKafkaAdminClient(**kafka_common_config)
+    await app.state.kafka_admin_client.start()
+    # group-less consumer, only used to read the end offsets of the topic
+    app.state.kafka_offsets_consumer = AIOKafkaConsumer(**kafka_common_config)
+    await app.state.kafka_offsets_consumer.start()
+    app.state.kafka_lag_monitor = ConsumerLagMonitor(
+        admin_client=app.state.kafka_admin_client,
+        consumer=app.state.kafka_offsets_consumer,
+        group_id=settings.kafka_consumer_group_id,
+        topic=settings.kafka_topic_text,
+        interval_s=settings.ingest_lag_check_interval_s,
+    )
+
+    app.state.kafka_consumer_text_embeddings = None
+    if not settings.kafka_consumer_in_web:
+        logger.info("Kafka consumer disabled in the web process")
+        return
+
+    app.state.kafka_consumer_text_embeddings = create_text_embeddings_consumer(
+        kafka_common_config,
+    )
     await app.state.kafka_consumer_text_embeddings.start()
 
     app.state.kafka_consumer_text_embeddings_task = asyncio.create_task(
@@ -88,7 +139,10 @@ async def shutdown_kafka(app: FastAPI) -> None:  # pragma: no cover
 
     :param app: current application.
     """
-    app.state.kafka_consumer_text_embeddings_task.cancel()
-    await app.state.kafka_consumer_text_embeddings.stop()
+    if app.state.kafka_consumer_text_embeddings is not None:
+        app.state.kafka_consumer_text_embeddings_task.cancel()
+        await app.state.kafka_consumer_text_embeddings.stop()
+    await app.state.kafka_offsets_consumer.stop()
+    await app.state.kafka_admin_client.close()
     await app.state.kafka_producer.stop()
     logger.info("kafka consumer disconnected")
@@ -0,0 +1 @@
+"""Lexical search services."""
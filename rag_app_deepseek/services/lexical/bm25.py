@@ -0,0 +1,504 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TERM = re.compile(r"\w+")
+SEGMENT_ARRAYS = (
+    "terms",
+    "offsets",
+    "postings",
+    "frequencies",
+    "doc_ids",
+    "doc_lengths",
+)
+MAX_FREQUENCY = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits a text into case folded word terms.
+
+    :param text: text to split.
+    :returns: terms, repeated as often as they occur.
+    """
+    return TERM.findall(unicodedata.normalize("NFKC", text).casefold())
+
+
+def hash_terms(terms: Iterable[str]) -> np.ndarray:
+    """
+    Hashes terms into stable 64 bits ids.
+
+    Term ids stay the same across processes, so segments written by one
+    worker can be searched by every other one without a shared vocabulary.
+
+    :param terms: terms to hash.
+    :returns: uint64 array of term ids.
+    """
+    return np.asarray(
+        [
+            int.from_bytes(
+                hashlib.blake2b(term.encode(), digest_size=8).digest(),
+                "little",
+            )
+            for term in terms
+        ],
+        dtype=np.uint64,
+    )
+
+
+class Segment:
+    """
+    Immutable postings of a set of chunks, backed by flat arrays.
+
+    Postings of the term `terms[i]` are `postings[offsets[i]:offsets[i + 1]]`,
+    positions in the `doc_ids` and `doc_lengths` of the segment, along
+    with their term `frequencies`. Terms are sorted, so they are looked
+    up by binary search.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        terms: np.ndarray,
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+        doc_ids: np.ndarray,
+        doc_lengths: np.ndarray,
+        replaces: Sequence[str] = (),
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        # segments merged into this one
+        self.replaces = list(replaces)
+
+    @classmethod
+    def from_postings(  # noqa: WPS211
+        cls,
+        posting_terms: np.ndarray,
+        postings: np.ndarray,
+        frequencies: np.ndarray,
+        doc_ids: np.ndarray,
+        doc_lengths: np.ndarray,
+        replaces: Sequence[str] = (),
+    ) -> "Segment":
+        """
+        Builds a segment from unordered (term, doc, frequency) postings.
+
+        :param posting_terms: term id of every posting.
+        :param postings: doc position of every posting.
+        :param frequencies: term frequency of every posting.
+        :param doc_ids: chunk id of every doc position.
+        :param doc_lengths: number of terms of every doc position.
+        :param replaces: names of the segments merged into this one.
+        :returns: Segment
+        """
+        order = np.lexsort((postings, posting_terms))
+        posting_terms = posting_terms[order]
+        terms, starts = np.unique(posting_terms, return_index=True)
+        return cls(
+            terms=terms.astype(np.uint64),
+            offsets=np.append(starts, len(posting_terms)).astype(np.int64),
+            postings=postings[order].astype(np.int32),
+            frequencies=frequencies[order].astype(np.uint16),
+            doc_ids=np.asarray(doc_ids, dtype=np.int64),
+            doc_lengths=np.asarray(doc_lengths, dtype=np.int32),
+            replaces=replaces,
+        )
+
+    @classmethod
+    def from_texts(cls, doc_ids: Sequence[int], texts: Sequence[str]) -> "Segment":
+        """
+        Indexes chunks into a new segment.
+
+        :param doc_ids: milvus ids of the chunks.
+        :param texts: texts of the chunks.
+        :returns: Segment
+        """
+        terms: List[str] = []
+        postings: List[int] = []
+        frequencies: List[int] = []
+        doc_lengths: List[int] = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            terms.extend(counts.keys())
+            postings.extend([position] * len(counts))
+            frequencies.extend(min(count, MAX_FREQUENCY) for count in counts.values())
+            doc_lengths.append(sum(counts.values()))
+        return cls.from_postings(
+            hash_terms(terms),
+            np.asarray(postings, dtype=np.int32),
+            np.asarray(frequencies, dtype=np.uint16),
+            np.asarray(doc_ids, dtype=np.int64),
+            np.asarray(doc_lengths, dtype=np.int32),
+        )
+
+    @classmethod
+    def merge(cls, segments: Dict[str, "Segment"]) -> "Segment":
+        """
+        Merges segments into a single one replacing them.
+
+        :param segments: segments by name.
+        :returns: Segment
+        """
+        posting_terms = []
+        postings = []
+        doc_base = 0
+        for segment in segments.values():
+            posting_terms.append(np.repeat(segment.terms, np.diff(segment.offsets)))
+            postings.append(segment.postings + doc_base)
+            doc_base += len(segment.doc_ids)
+        return cls.from_postings(
+            np.concatenate(posting_terms),
+            np.concatenate(postings),
+            np.concatenate([segment.frequencies for segment in segments.values()]),
+            np.concatenate([segment.doc_ids for segment in segments.values()]),
+            np.concatenate([segment.doc_lengths for segment in segments.values()]),
+            replaces=list(segments),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "Segment":
+        """
+        Opens a segment written with `save`, memory mapping its arrays.
+
+        Only the pages of the postings actually searched are read from disk,
+        so loading takes the same time whatever the size of the segment.
+
+        :param path: directory of the segment.
+        :returns: Segment
+        """
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {
+            array_name: np.load(path / f"{array_name}.npy", mmap_mode="r")
+            for array_name in SEGMENT_ARRAYS
+        }
+        return cls(**arrays, replaces=meta["replaces"])
+
+    def save(self, path: Path) -> None:
+        """
+        Writes the segment to a directory.
+
+        :param path: directory of the segment, must not exist.
+        """
+        path.mkdir(parents=True)
+        for array_name in SEGMENT_ARRAYS:
+            np.save(path / f"{array_name}.npy", getattr(self, array_name))
+        (path / "meta.json").write_text(json.dumps({"replaces": self.replaces}))
+
+    def lookup(self, term: np.uint64) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the postings of a term.
+
+        :param term: term id.
+        :returns: doc positions and term frequencies.
+        """
+        index = int(np.searchsorted(self.terms, term))
+        if index == len(self.terms) or self.terms[index] != term:
+            return self.postings[:0], self.frequencies[:0]
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.postings[start:end], self.frequencies[start:end]
+
+
+class BM25Index:
+    """
+    Incrementally updated BM25 index of the ingested chunks.
+
+    Indexed chunks are buffered in memory and searchable right away.
+    Once enough of them are buffered they are written as an immutable
+    segment to a directory shared by every worker, which loads the
+    segments written by the others on its next refresh. Segments are
+    merged back into one once there are too many of them, a merged
+    segment lists the segments it replaces so they are never counted twice.
+
+    Searches can run in threads while chunks are added, the segments and
+    buffered chunks are only changed under a lock.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        path: str,
+        flush_docs: int = 5000,
+        flush_interval_s: float = 30,
+        max_segments: int = 8,
+        k1: float = 1.2,
+        b: float = 0.75,
+        refresh_interval_s: float = 5,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.flush_docs = flush_docs
+        self.flush_interval_s = flush_interval_s
+        self.max_segments = max_segments
+        self.k1 = k1
+        self.b = b
+        self.refresh_interval_s = refresh_interval_s
+        self.segments: Dict[str, Segment] = {}
+        self.pending_ids: List[int] = []
+        self.pending_texts: List[str] = []
+        self._pending_segment: Optional[Segment] = None
+        self._flushed_at = time.monotonic()
+        self._refreshed_at = 0.0
+        self._mutex = threading.RLock()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return sum(len(segment.doc_ids) for segment in self.segments.values()) + len(
+            self.pending_ids,
+        )
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Holds the lock of the index directory, shared by every worker.
+
+        :yields: once the lock is held.
+        """
+        with open(self.path / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self) -> None:
+        """Loads the segments written by other workers, drops the merged ones."""
+        with self._mutex:
+            self._refresh()
+
+    def add(self, doc_ids: Sequence[int], texts: Sequence[str]) -> None:
+        """
+        Indexes chunks, flushing them to disk once enough are buffered.
+
+        :param doc_ids: milvus ids of the chunks.
+        :param texts: texts of the chunks.
+        """
+        with self._mutex:
+            self.pending_ids.extend(doc_ids)
+            self.pending_texts.extend(texts)
+            self._pending_segment = None
+        if (
+            len(self.pending_ids) >= self.flush_docs
+            or time.monotonic() - self._flushed_at >= self.flush_interval_s
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered chunks as a new segment."""
+        self._flushed_at = time.monotonic()
+        if not self.pending_ids:
+            return
+
+        with self._mutex:
+            segment = Segment.from_texts(self.pending_ids, self.pending_texts)
+            name = self.write_segment(segment)
+            self.segments[name] = Segment.load(self.path / name)
+            self.pending_ids = []
+            self.pending_texts = []
+            self._pending_segment = None
+        if len(self.segments) > self.max_segments:
+            self.compact()
+
+    def write_segment(self, segment: Segment) -> str:
+        """
+        Writes a segment atomically, other workers never see it half written.
+
+        :param segment: segment to write.
+        :returns: name of the segment.
+        """
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp_path = self.path / f".tmp-{name}"
+        segment.save(tmp_path)
+        os.rename(tmp_path, self.path / name)
+        return name
+
+    def compact(self) -> None:
+        """Merges all the segments into one."""
+        with self.lock():
+            with self._mutex:
+                self._refresh()
+                if len(self.segments) < 2:
+                    return
+                merged = Segment.merge(self.segments)
+                name = self.write_segment(merged)
+                self.segments = {name: Segment.load(self.path / name)}
+            for replaced_name in merged.replaces:
+                shutil.rmtree(self.path / replaced_name, ignore_errors=True)
+
+    def searched_segments(self) -> List[Segment]:
+        """
+        Returns the segments a search scans, buffered chunks included.
+
+        :returns: List of Segment
+        """
+        with self._mutex:
+            if time.monotonic() - self._refreshed_at >= self.refresh_interval_s:
+                self._refresh()
+            segments = list(self.segments.values())
+            if self.pending_ids:
+                if self._pending_segment is None:
+                    self._pending_segment = Segment.from_texts(
+                        self.pending_ids,
+                        self.pending_texts,
+                    )
+                segments.append(self._pending_segment)
+        return segments
+
+    def search(self, query: str, limit: int) -> List[Tuple[int, float]]:
+        """
+        Ranks the indexed chunks by BM25 score.
+
+        Scoring is CPU bound, run it in a thread from async code.
+
+        :param query: query text.
+        :param limit: max number of results.
+        :returns: milvus ids and scores of the best chunks, best first.
+        """
+        segments = self.searched_segments()
+        doc_count = sum(len(segment.doc_ids) for segment in segments)
+        terms = hash_terms(set(tokenize(query)))
+        if not doc_count or not len(terms):
+            return []
+
+        avg_length = (
+            sum(int(segment.doc_lengths.sum()) for segment in segments) / doc_count
+        )
+        matches = [[segment.lookup(term) for segment in segments] for term in terms]
+        idfs = []
+        for term_matches in matches:
+            doc_frequency = sum(len(postings) for postings, _ in term_matches)
+            idfs.append(
+                np.log(1 + (doc_count - doc_frequency + 0.5) / (doc_frequency + 0.5)),
+            )
+
+        scored = [
+            self.score_segment(
+                segment,
+                [match[position] for match in matches],
+                np.asarray(idfs),
+                avg_length,
+                limit,
+            )
+            for position, segment in enumerate(segments)
+        ]
+        matched_ids = np.concatenate([ids for ids, _ in scored])
+        matched_scores = np.concatenate([scores for _, scores in scored])
+        best = np.argsort(-matched_scores, kind="stable")[:limit]
+        return [
+            (int(matched_ids[index]), float(matched_scores[index])) for index in best
+        ]
+
+    def score_segment(
+        self,
+        segment: Segment,
+        term_matches: List[Tuple[np.ndarray, np.ndarray]],
+        idfs: np.ndarray,
+        avg_length: float,
+        limit: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores the chunks of a segment which match the query terms.
+
+        :param segment: segment to score.
+        :param term_matches: postings and frequencies of every query term.
+        :param idfs: inverse document frequency of every query term.
+        :param avg_length: average length of the indexed chunks.
+        :param limit: max number of results.
+        :returns: milvus ids and scores of the best chunks of the segment.
+        """
+        postings = np.concatenate([term_postings for term_postings, _ in term_matches])
+        tf = np.concatenate([frequencies for _, frequencies in term_matches]).astype(
+            np.float32,
+        )
+        idf = np.repeat(idfs, [len(term_postings) for term_postings, _ in term_matches])
+        norm = self.k1 * (
+            1 - self.b + self.b * segment.doc_lengths[postings] / avg_length
+        )
+        # dense per segment sums, cheaper than sorting the postings
+        totals = np.bincount(
+            postings,
+            weights=idf * tf * (self.k1 + 1) / (tf + norm),
+            minlength=len(segment.doc_ids),
+        )
+        best = np.flatnonzero(totals)
+        if len(best) > limit:
+            best = best[np.argpartition(-totals[best], limit)[:limit]]
+        return segment.doc_ids[best], totals[best]
+
+    def rebuild(self, chunks: Iterable[Tuple[Sequence[int], Sequence[str]]]) -> int:
+        """
+        Replaces the whole index with the given chunks.
+
+        The new index is built next to the current one and swapped in,
+        workers keep searching the previous segments until their next refresh.
+
+        :param chunks: batches of milvus ids and texts.
+        :returns: number of indexed chunks.
+        """
+        build_path = self.path.with_name(f"{self.path.name}.rebuild")
+        shutil.rmtree(build_path, ignore_errors=True)
+        rebuilt = BM25Index(
+            str(build_path),
+            flush_docs=self.flush_docs,
+            flush_interval_s=float("inf"),
+            max_segments=self.max_segments,
+        )
+        for doc_ids, texts in chunks:
+            rebuilt.add(doc_ids, texts)
+        rebuilt.flush()
+        rebuilt.compact()
+
+        with self.lock():
+            old_path = self.path.with_name(f"{self.path.name}.old")
+            shutil.rmtree(old_path, ignore_errors=True)
+            os.rename(self.path, old_path)
+            os.rename(build_path, self.path)
+            shutil.rmtree(old_path, ignore_errors=True)
+        with self._mutex:
+            self.pending_ids = []
+            self.pending_texts = []
+            self._pending_segment = None
+            self.segments = {}
+            self._refresh()
+        return len(self)
+
+    def close(self) -> None:
+        """Flushes the buffered chunks."""
+        self.flush()
+
+    def _refresh(self) -> None:
+        names = {
+            segment_path.name
+            for segment_path in self.path.iterdir()
+            if segment_path.is_dir() and not segment_path.name.startswith(".")
+        }
+        for name in sorted(names - set(self.segments)):
+            try:
+                self.segments[name] = Segment.load(self.path / name)
+            except FileNotFoundError:
+                # merged and removed by another worker in the meantime
+                names.discard(name)
+        replaced = {
+            replaced_name
+            for segment in self.segments.values()
+            for replaced_name in segment.replaces
+        }
+        for name in set(self.segments) - (names - replaced):
+            del self.segments[name]  # noqa: WPS420
+        self._refreshed_at = time.monotonic()
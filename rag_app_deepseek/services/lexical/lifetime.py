@@ -0,0 +1,39 @@
+from typing import Optional
+
+from loguru import logger
+
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+from rag_app_deepseek.settings import settings
+
+
+def init_lexical_index() -> Optional[BM25Index]:
+    """
+    Opens the BM25 index of the chunks if hybrid search is enabled.
+
+    :returns: BM25Index or None when disabled.
+    """
+    if not settings.search_hybrid_enabled:
+        return None
+
+    index = BM25Index(
+        path=settings.search_bm25_index_path,
+        flush_docs=settings.search_bm25_flush_docs,
+        flush_interval_s=settings.search_bm25_flush_interval_s,
+        max_segments=settings.search_bm25_max_segments,
+        k1=settings.search_bm25_k1,
+        b=settings.search_bm25_b,
+    )
+    logger.info(
+        f"BM25 index opened with {len(index)} chunks: {settings.search_bm25_index_path}",  # noqa: E501
+    )
+    return index
+
+
+def shutdown_lexical_index(index: Optional[BM25Index]) -> None:
+    """
+    Flushes the chunks buffered by the BM25 index.
+
+    :param index: BM25 index to close, if any.
+    """
+    if index is not None:
+        index.close()
@@ -0,0 +1,126 @@
+from typing import Optional
+
+from ollama import ChatResponse
+from prometheus_client import Counter, Gauge, Histogram
+
+from rag_app_deepseek.services.metrics.registry import LATENCY_BUCKETS, SIZE_BUCKETS
+
+# gauges of all the processes are summed, or the max taken, when exported
+# together, see `get_metrics_registry`
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "rag_http_requests_in_flight",
+    "HTTP requests being served.",
+    multiprocess_mode="livesum",
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "rag_http_request_duration_seconds",
+    "Time to serve a HTTP request, streamed responses included.",
+    labelnames=("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+)
+
+EMBED_SECONDS = Histogram(
+    "rag_embed_duration_seconds",
+    "Time to embed texts, embeddings cache lookups included.",
+    labelnames=("priority",),
+    buckets=LATENCY_BUCKETS,
+)
+EMBED_TEXTS = Histogram(
+    "rag_embed_texts",
+    "Texts embedded per call.",
+    labelnames=("priority",),
+    buckets=SIZE_BUCKETS,
+)
+
+MILVUS_SEARCH_SECONDS = Histogram(
+    "rag_milvus_search_duration_seconds",
+    "Time of a milvus vector search, for one or more queries.",
+    buckets=LATENCY_BUCKETS,
+)
+MILVUS_INSERT_SECONDS = Histogram(
+    "rag_milvus_insert_duration_seconds",
+    "Time of a milvus bulk insert.",
+    buckets=LATENCY_BUCKETS,
+)
+MILVUS_INSERT_ROWS = Histogram(
+    "rag_milvus_insert_rows",
+    "Chunks inserted per milvus bulk insert.",
+    buckets=SIZE_BUCKETS,
+)
+
+LLM_SECONDS = Histogram(
+    "rag_llm_duration_seconds",
+    "Time of a llm chat request, scheduler queueing included.",
+    labelnames=("priority",),
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "rag_llm_time_to_first_token_seconds",
+    "Time from the start of a streamed search to its first answer token.",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PREFILL_SECONDS = Histogram(
+    "rag_llm_prefill_duration_seconds",
+    "Time ollama spent evaluating the prompt.",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_GENERATION_SECONDS = Histogram(
+    "rag_llm_generation_duration_seconds",
+    "Time ollama spent generating the answer.",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "rag_llm_prompt_tokens",
+    "Prompt tokens evaluated, the ones found in the prompt cache excluded.",
+    buckets=SIZE_BUCKETS,
+)
+LLM_GENERATED_TOKENS = Histogram(
+    "rag_llm_generated_tokens",
+    "Tokens of the generated answers.",
+    buckets=SIZE_BUCKETS,
+)
+
+INGEST_BATCH_MESSAGES = Histogram(
+    "rag_ingest_batch_messages",
+    "Kafka messages per batch of the ingestion pipeline.",
+    buckets=SIZE_BUCKETS,
+)
+INGEST_BATCH_CHUNKS = Histogram(
+    "rag_ingest_batch_chunks",
+    "Chunks per batch of the ingestion pipeline, before deduplication.",
+    buckets=SIZE_BUCKETS,
+)
+INGEST_CHUNKS = Counter(
+    "rag_ingest_chunks_total",
+    "Chunks processed by the ingestion pipeline.",
+    labelnames=("result",),
+)
+INGEST_DEAD_LETTERS = Counter(
+    "rag_ingest_dead_letters_total",
+    "Kafka messages moved to the dead letter topic.",
+    labelnames=("stage",),
+)
+KAFKA_CONSUMER_LAG = Gauge(
+    "rag_kafka_consumer_lag",
+    "Messages of a partition of the text topic the consumer group has yet to process.",  # noqa: E501
+    labelnames=("partition",),
+    multiprocess_mode="livemax",
+)
+
+
+def observe_llm_response(res: Optional[ChatResponse]) -> None:
+    """
+    Records the prefill and generation stats ollama returns with an answer.
+
+    :param res: the response, or the last chunk of a stream.
+    """
+    if res is None:
+        return
+    if res.prompt_eval_duration:
+        LLM_PREFILL_SECONDS.observe(res.prompt_eval_duration / 1e9)  # noqa: WPS432
+    if res.prompt_eval_count is not None:
+        LLM_PROMPT_TOKENS.observe(res.prompt_eval_count)
+    if res.eval_duration:
+        LLM_GENERATION_SECONDS.observe(res.eval_duration / 1e9)  # noqa: WPS432
+    if res.eval_count is not None:
+        LLM_GENERATED_TOKENS.observe(res.eval_count)
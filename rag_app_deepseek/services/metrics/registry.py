@@ -0,0 +1,52 @@
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# request latencies, from milvus searches to llm generations
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    120,
+)
+# batch sizes and token counts
+SIZE_BUCKETS = tuple(2**exponent for exponent in range(16))
+# directory the processes write their metrics to, to be exported together
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+
+def get_metrics_registry() -> CollectorRegistry:
+    """
+    Returns the registry of the metrics to export.
+
+    When `PROMETHEUS_MULTIPROC_DIR` is set, every process writes its
+    metrics to that directory and the registry collects them all, so any
+    uvicorn or consumer worker serves the metrics of every worker.
+
+    :returns: the registry of the process, or the one of all the processes.
+    """
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> bytes:
+    """
+    Renders the metrics in the prometheus text format.
+
+    :returns: text exposition of the metrics.
+    """
+    return generate_latest(get_metrics_registry())
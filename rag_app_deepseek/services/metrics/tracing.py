@@ -0,0 +1,166 @@
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from loguru import logger
+from ollama import ChatResponse
+
+# trace ids taken from the client, anything else is replaced
+TRACE_ID_PATTERN = re.compile(r"[0-9A-Za-z_-]{1,64}")
+
+current_trace: "ContextVar[Optional[RequestTrace]]" = ContextVar(
+    "current_trace",
+    default=None,
+)
+
+
+class RequestTrace:
+    """
+    Time spent by a request in every stage, with the chunks it retrieved.
+
+    Stages reached several times add up. Tracing is off unless a trace is
+    active, see `activate_trace`, so the spans cost a context variable
+    lookup on untraced requests.
+    """
+
+    def __init__(self, trace_id: str) -> None:
+        self.trace_id = trace_id
+        self.started_at = time.perf_counter()
+        self.timings_ms: Dict[str, float] = {}
+        self.chunks: List[Tuple[int, float]] = []
+
+    def record(self, stage: str, duration_s: float) -> None:
+        """
+        Adds time spent in a stage.
+
+        :param stage: name of the stage.
+        :param duration_s: time spent, in seconds.
+        """
+        self.timings_ms[stage] = round(
+            self.timings_ms.get(stage, 0) + duration_s * 1000,
+            3,
+        )
+
+    def get_total_ms(self) -> float:
+        """
+        Returns the time since the start of the trace.
+
+        :returns: time in milliseconds.
+        """
+        return round((time.perf_counter() - self.started_at) * 1000, 3)
+
+    def get_server_timing(self) -> str:
+        """
+        Formats the stage timings as a Server-Timing header.
+
+        :returns: value of the header, total time included.
+        """
+        timings = {**self.timings_ms, "total": self.get_total_ms()}
+        return ", ".join(
+            f"{stage};dur={duration_ms}" for stage, duration_ms in timings.items()
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the trace as a json serializable dict.
+
+        :returns: trace id, stage timings and retrieved chunks.
+        """
+        return {
+            "trace_id": self.trace_id,
+            "timings_ms": {**self.timings_ms, "total": self.get_total_ms()},
+            "chunks": [
+                {"id": chunk_id, "distance": distance}
+                for chunk_id, distance in self.chunks
+            ],
+        }
+
+
+def start_trace(
+    requested: bool,
+    sample_rate: float,
+    trace_id: Optional[str] = None,
+) -> Optional[RequestTrace]:
+    """
+    Starts the trace of a request asking for it or sampled.
+
+    :param requested: whether the client asked for the trace.
+    :param sample_rate: fraction of the other requests traced.
+    :param trace_id: trace id sent by the client, a new one if unset or invalid.
+    :returns: the trace, None when the request is not traced.
+    """
+    if not requested and random.random() >= sample_rate:  # noqa: S311
+        return None
+    if trace_id is None or not TRACE_ID_PATTERN.fullmatch(trace_id):
+        trace_id = uuid.uuid4().hex
+    return RequestTrace(trace_id)
+
+
+@contextmanager
+def activate_trace(trace: Optional[RequestTrace]) -> Iterator[None]:
+    """
+    Makes a trace the current one, its id is added to the logs.
+
+    :param trace: trace to activate, nothing is done if unset.
+    :yields: nothing, the block runs with the trace active.
+    """
+    if trace is None:
+        yield
+        return
+
+    token = current_trace.set(trace)
+    try:
+        with logger.contextualize(trace_id=trace.trace_id):
+            yield
+    finally:
+        current_trace.reset(token)
+
+
+@contextmanager
+def trace_span(stage: str) -> Iterator[None]:
+    """
+    Records the time spent in a block as a stage of the current trace.
+
+    :param stage: name of the stage.
+    :yields: nothing, the block runs while timed.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(stage, time.perf_counter() - started_at)
+
+
+def trace_chunks(chunks: Iterable[Tuple[int, float]]) -> None:
+    """
+    Records the chunks retrieved for the current trace.
+
+    :param chunks: id and distance of every chunk.
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.chunks.extend(chunks)
+
+
+def trace_llm_response(res: ChatResponse, duration_s: float) -> None:
+    """
+    Splits the time of a llm call into time to first token and generation.
+
+    :param res: the response.
+    :param duration_s: time of the call, scheduler queueing included.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return
+    generation_s = (res.eval_duration or 0) / 1e9  # noqa: WPS432
+    trace.record("llm_ttft", max(duration_s - generation_s, 0))
+    trace.record("llm_generation", generation_s)
@@ -0,0 +1,52 @@
+import json
+from typing import List, NamedTuple, Optional, Sequence
+
+
+class SearchFilters(NamedTuple):
+    """
+    Scalar filters of a search.
+
+    Milvus applies them before the vector search: the tenant filter
+    only searches the partitions of the tenant partition key, the other
+    ones go through the scalar indexes of their fields.
+    """
+
+    # unix seconds, inclusive
+    since: Optional[int] = None
+    # unix seconds, exclusive
+    until: Optional[int] = None
+    sources: Sequence[str] = ()
+    tenant: Optional[str] = None
+
+
+def quote(value: str) -> str:
+    """
+    Quotes a string literal of a milvus filter expression.
+
+    :param value: string to quote.
+    :returns: double quoted and escaped string.
+    """
+    return json.dumps(value, ensure_ascii=False)
+
+
+def build_filter_expr(filters: Optional[SearchFilters]) -> str:
+    """
+    Builds the milvus filter expression of search filters.
+
+    :param filters: search filters, if any.
+    :returns: filter expression, empty without filters.
+    """
+    if filters is None:
+        return ""
+
+    conditions: List[str] = []
+    if filters.tenant is not None:
+        conditions.append(f"tenant == {quote(filters.tenant)}")
+    if filters.since is not None:
+        conditions.append(f"timestamp_unix >= {int(filters.since)}")
+    if filters.until is not None:
+        conditions.append(f"timestamp_unix < {int(filters.until)}")
+    if filters.sources:
+        sources = ", ".join(quote(source) for source in filters.sources)
+        conditions.append(f"source in [{sources}]")
+    return " and ".join(conditions)
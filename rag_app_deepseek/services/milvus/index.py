@@ -0,0 +1,121 @@
+from typing import Any, Dict, Optional
+
+from rag_app_deepseek.settings import (
+    MilvusIndexType,
+    MilvusMetricType,
+    VectorStorageMode,
+    settings,
+)
+
+DEFAULT_INDEX_BUILD_PARAMS: Dict[MilvusIndexType, Dict[str, Any]] = {
+    MilvusIndexType.HNSW: {"M": 16, "efConstruction": 200},
+    MilvusIndexType.IVF_FLAT: {"nlist": 1024},
+    # 5120 dims split into 64 sub-vectors of 80 dims each
+    MilvusIndexType.IVF_PQ: {"nlist": 1024, "m": 64, "nbits": 8},
+    MilvusIndexType.DISKANN: {},
+}
+# binary vectors only support binary indexes and hamming/jaccard metrics
+BINARY_INDEX_PARAMS: Dict[str, Any] = {
+    "index_type": "BIN_IVF_FLAT",
+    "metric_type": "HAMMING",
+    "params": {"nlist": 1024},
+}
+# rerank vectors are never searched, milvus only loads indexed vector fields
+RERANK_INDEX_PARAMS: Dict[str, Any] = {
+    "index_type": "FLAT",
+    "metric_type": "COSINE",
+    "params": {},
+}
+
+
+def build_index_params(
+    index_type: MilvusIndexType,
+    metric_type: MilvusMetricType,
+    params: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Builds the params of an ANN index.
+
+    :param index_type: type of the index.
+    :param metric_type: similarity metric.
+    :param params: build params overriding the defaults of the index type.
+    :returns: index params as expected by milvus create_index.
+    """
+    return {
+        "index_type": index_type.value,
+        "metric_type": metric_type.value,
+        "params": {**DEFAULT_INDEX_BUILD_PARAMS[index_type], **(params or {})},
+    }
+
+
+def build_search_params(  # noqa: WPS211
+    index_type: MilvusIndexType,
+    metric_type: MilvusMetricType,
+    limit: int,
+    ef: int,
+    nprobe: int,
+) -> Dict[str, Any]:
+    """
+    Builds the search params matching an ANN index.
+
+    HNSW and DiskANN can not return more results than they explore,
+    so `ef` is raised to the result limit when lower.
+
+    :param index_type: type of the index searched.
+    :param metric_type: similarity metric of the index.
+    :param limit: number of results of the search.
+    :param ef: search breadth of HNSW, candidate list size of DiskANN.
+    :param nprobe: number of IVF clusters searched.
+    :returns: search params as expected by milvus search.
+    """
+    if index_type == MilvusIndexType.HNSW:
+        params = {"ef": max(ef, limit)}
+    elif index_type == MilvusIndexType.DISKANN:
+        params = {"search_list": max(ef, limit)}
+    else:
+        params = {"nprobe": nprobe}
+    return {"metric_type": metric_type.value, "params": params}
+
+
+def get_index_params() -> Dict[str, Any]:
+    """
+    Returns the params of the embedding index configured in settings.
+
+    :returns: index params.
+    """
+    if settings.milvus_vector_storage == VectorStorageMode.BINARY:
+        return BINARY_INDEX_PARAMS
+
+    return build_index_params(
+        settings.milvus_index_type,
+        settings.milvus_metric_type,
+        settings.milvus_index_params,
+    )
+
+
+def get_search_params(
+    limit: int,
+    ef: Optional[int] = None,
+    nprobe: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Returns the search params of the configured index.
+
+    :param limit: number of results of the search.
+    :param ef: overrides the default HNSW/DiskANN search breadth.
+    :param nprobe: overrides the default number of IVF clusters searched.
+    :returns: search params.
+    """
+    if settings.milvus_vector_storage == VectorStorageMode.BINARY:
+        return {
+            "metric_type": BINARY_INDEX_PARAMS["metric_type"],
+            "params": {"nprobe": nprobe or settings.milvus_search_nprobe},
+        }
+
+    return build_search_params(
+        settings.milvus_index_type,
+        settings.milvus_metric_type,
+        limit=limit,
+        ef=ef or settings.milvus_search_ef,
+        nprobe=nprobe or settings.milvus_search_nprobe,
+    )
@@ -1,31 +1,89 @@
 from loguru import logger
 from pymilvus import MilvusClient
 
-from rag_app_deepseek.settings import settings
+from rag_app_deepseek.services.milvus.index import build_index_params
+from rag_app_deepseek.services.milvus.local import LocalVectorStore
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.settings import (
+    MilvusIndexType,
+    VectorStorageMode,
+    VectorStoreBackend,
+    settings,
+)
 
 
-def init_milvus() -> MilvusClient:
+def init_milvus() -> MilvusAsyncClient:
     """
-    Initialises Milvus (Vector Store DB) connection.
+    Initialises Milvus (Vector Store DB) connection pool.
 
-    :returns: MilvusClient
+    Every pooled client gets its own alias, so each one
+    opens a separate connection to milvus. With the LOCAL
+    backend, the pool shares the local vector store instead.
+
+    :returns: MilvusAsyncClient
+    """
+    if settings.vector_store_backend == VectorStoreBackend.LOCAL:
+        return init_local_vector_store()
+
+    clients = [
+        MilvusClient(
+            uri=f"{settings.milvus_host}:{settings.milvus_port}",
+            user=settings.milvus_username,
+            password=settings.milvus_password,
+            keep_alive=True,
+            db_name=settings.milvus_db_name,
+            alias=f"{settings.milvus_conn_name}-{i}",
+        )
+        for i in range(settings.milvus_pool_size)  # noqa: WPS111
+    ]
+    logger.info(f"milvus db connected, pool size: {settings.milvus_pool_size}")
+    return MilvusAsyncClient(
+        clients=clients,
+        timeout=settings.milvus_timeout_s,
+        insert_timeout=settings.milvus_insert_timeout_s,
+    )
+
+
+def init_local_vector_store() -> MilvusAsyncClient:
     """
-    client = MilvusClient(
-        uri=f"{settings.milvus_host}:{settings.milvus_port}",
-        user=settings.milvus_username,
-        password=settings.milvus_password,
-        keep_alive=True,
-        db_name=settings.milvus_db_name,
+    Opens the local vector store, searched from a pool of threads.
+
+    :returns: MilvusAsyncClient
+    :raises ValueError: with binary vector storage, which it does not support.
+    """
+    if settings.milvus_vector_storage == VectorStorageMode.BINARY:
+        raise ValueError("the local vector store does not support binary vectors")
+
+    store = LocalVectorStore(
+        path=settings.local_vector_store_path,
+        max_segments=settings.local_vector_store_max_segments,
+        hnsw_min_rows=settings.local_vector_store_hnsw_min_rows,
+        hnsw_params=build_index_params(
+            MilvusIndexType.HNSW,
+            settings.milvus_metric_type,
+            (
+                settings.milvus_index_params
+                if settings.milvus_index_type == MilvusIndexType.HNSW
+                else None
+            ),
+        ),
+        hnsw_ef=settings.milvus_search_ef,
+    )
+    logger.info(
+        f"local vector store opened: {settings.local_vector_store_path}, pool size: {settings.milvus_pool_size}",  # noqa: E501
+    )
+    return MilvusAsyncClient(
+        clients=[store] * settings.milvus_pool_size,
+        timeout=settings.milvus_timeout_s,
+        insert_timeout=settings.milvus_insert_timeout_s,
     )
-    logger.info("milvus db connected")
-    return client
 
 
-def disconnect_milvus(client: MilvusClient) -> None:
+def disconnect_milvus(client: MilvusAsyncClient) -> None:
     """
-    Disconnects the db connection.
+    Disconnects the db connections.
 
-    :param client: requires passing the MilvusClient
+    :param client: requires passing the MilvusAsyncClient
     """
     client.close()
     logger.info("milvus db disconnected")
@@ -0,0 +1,987 @@
+import fcntl
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from rag_app_deepseek.services.lexical.bm25 import hash_terms
+
+try:
+    import hnswlib
+except ImportError:  # pragma: no cover
+    # HNSW indexes of the segments are optional
+    hnswlib = None
+
+# rows scored at once by the brute force search, bounds its memory
+SEARCH_BLOCK_ROWS = 16384
+HNSW_SPACES = {"COSINE": "cosine", "IP": "ip", "L2": "l2"}
+FILTER_TOKEN = re.compile(
+    r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<number>-?\d+)'
+    + r"|(?P<name>[A-Za-z_]\w*)|(?P<symbol>==|!=|>=|<=|>|<|\[|\]|\(|\)|,))",
+)
+COMPARISONS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+}
+
+
+class Condition(NamedTuple):
+    """Comparison of a field with a literal, or with a list for `in`."""
+
+    field: str
+    operator: str
+    operand: Any
+
+
+def tokenize_filter(expr: str) -> List[Tuple[str, str]]:
+    """
+    Splits a milvus filter expression into tokens.
+
+    :param expr: filter expression.
+    :returns: kind and text of every token.
+    :raises ValueError: on characters outside of the supported syntax.
+    """
+    tokens = []
+    position = 0
+    expr = expr.rstrip()
+    while position < len(expr):
+        match = FILTER_TOKEN.match(expr, position)
+        if match is None:
+            raise ValueError(f"unsupported filter expression: {expr}")
+        kind = match.lastgroup or ""
+        tokens.append((kind, match.group(kind)))
+        position = match.end()
+    return tokens
+
+
+def parse_literal(kind: str, text: str) -> Any:
+    """
+    Parses a string or number literal of a filter expression.
+
+    :param kind: kind of the token.
+    :param text: text of the token.
+    :returns: the value.
+    :raises ValueError: if the token is not a literal.
+    """
+    if kind == "string":
+        return json.loads(text)
+    if kind == "number":
+        return int(text)
+    raise ValueError(f"expected a literal, got {text}")
+
+
+def parse_condition(
+    tokens: List[Tuple[str, str]],
+    position: int,
+    expr: str,
+) -> Tuple[Condition, int]:
+    """
+    Parses a comparison or an `in` list of a filter expression.
+
+    :param tokens: tokens of the expression, padded with end tokens.
+    :param position: position of the field name of the condition.
+    :param expr: the expression, for the errors.
+    :returns: the condition, position of the token after it.
+    :raises ValueError: on conditions outside of the supported subset.
+    """
+    (field_kind, field), (_, operator) = tokens[position : position + 2]
+    if field_kind != "name" or operator not in {"in", *COMPARISONS}:
+        raise ValueError(f"unsupported filter expression: {expr}")
+    position += 2
+    if operator != "in":
+        return (
+            Condition(field, operator, parse_literal(*tokens[position])),
+            position + 1,
+        )
+
+    if tokens[position] != ("symbol", "[") or ("symbol", "]") not in tokens:
+        raise ValueError(f"expected a list after in: {expr}")
+    end = tokens.index(("symbol", "]"), position)
+    literals = [
+        parse_literal(*token)
+        for token in tokens[position + 1 : end]
+        if token != ("symbol", ",")
+    ]
+    return Condition(field, operator, literals), end + 1
+
+
+def parse_filter(expr: str) -> List[Condition]:
+    """
+    Parses the filter expressions built by the app.
+
+    Only conjunctions of comparisons and `in` lists are supported, which
+    is all `build_filter_expr`, the id lookups and the deduplication use.
+    Parentheses do not change the meaning of a conjunction and are skipped.
+
+    :param expr: milvus filter expression, empty for no filter.
+    :returns: conditions every matching row meets.
+    :raises ValueError: on expressions outside of the supported subset.
+    """
+    tokens = [
+        token
+        for token in tokenize_filter(expr)
+        if token not in {("symbol", "("), ("symbol", ")")}
+    ]
+    # padding instead of bound checks, an incomplete expression ends on it
+    tokens.extend([("end", "")] * 3)
+    conditions: List[Condition] = []
+    position = 0
+    while tokens[position][0] != "end":
+        if conditions:
+            if tokens[position] != ("name", "and"):
+                raise ValueError(f"only conjunctions are supported: {expr}")
+            position += 1
+        condition, position = parse_condition(tokens, position, expr)
+        conditions.append(condition)
+    return conditions
+
+
+class StringColumn(NamedTuple):
+    """Strings of a segment as utf-8 bytes, with their hashes for filtering."""
+
+    hashes: np.ndarray
+    offsets: np.ndarray
+    data: np.ndarray
+
+    @classmethod
+    def from_values(cls, values: Sequence[str]) -> "StringColumn":
+        """
+        Encodes strings.
+
+        :param values: string of every row.
+        :returns: StringColumn
+        """
+        encoded = [value.encode() for value in values]
+        lengths = np.asarray([len(value) for value in encoded], dtype=np.int64)
+        return cls(
+            hashes=hash_terms(values),
+            offsets=np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            data=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        )
+
+    @classmethod
+    def concatenate(cls, columns: Sequence["StringColumn"]) -> "StringColumn":
+        """
+        Concatenates the strings of several segments.
+
+        :param columns: columns to concatenate, in order.
+        :returns: StringColumn
+        """
+        starts = np.cumsum([0] + [len(column.data) for column in columns[:-1]])
+        return cls(
+            hashes=np.concatenate([column.hashes for column in columns]),
+            offsets=np.concatenate(
+                [[0]]
+                + [
+                    column.offsets[1:] + start for column, start in zip(columns, starts)
+                ],
+            ).astype(np.int64),
+            data=np.concatenate([column.data for column in columns]),
+        )
+
+    def get(self, row: int) -> str:
+        """
+        Decodes the string of a row.
+
+        :param row: row of the segment.
+        :returns: the string.
+        """
+        return bytes(self.data[self.offsets[row] : self.offsets[row + 1]]).decode()
+
+
+class VectorSegment:
+    """
+    Immutable rows of a collection, stored in a directory of .npy files.
+
+    Embeddings are kept as a float32 or float16 matrix along with their
+    norms. Scalar fields are stored per column: integers as is, strings
+    as utf-8 bytes plus 64 bits hashes which equality and `in` filters
+    compare, so filtering never decodes a string. A large segment may
+    also have an HNSW index over its embeddings.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        ids: np.ndarray,
+        vectors: np.ndarray,
+        norms: np.ndarray,
+        ints: Dict[str, np.ndarray],
+        strings: Dict[str, StringColumn],
+        replaces: Optional[List[str]] = None,
+        hnsw_index: Any = None,
+        hnsw_metric: Optional[str] = None,
+    ) -> None:
+        self.ids = ids
+        self.vectors = vectors
+        self.norms = norms
+        self.ints = ints
+        self.strings = strings
+        # names of the segments this one was merged from
+        self.replaces = replaces or []
+        self.hnsw_index = hnsw_index
+        self.hnsw_metric = hnsw_metric
+        # the search breadth of the index is set per query
+        self.hnsw_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(
+        cls,
+        ids: Sequence[int],
+        rows: Sequence[Dict[str, Any]],
+    ) -> "VectorSegment":
+        """
+        Builds a segment from inserted rows.
+
+        :param ids: ids of the rows.
+        :param rows: rows with their embedding and scalar fields.
+        :returns: VectorSegment
+        :raises ValueError: on binary vectors or fields of unsupported types.
+        """
+        embeddings = [row["embedding"] for row in rows]
+        if any(isinstance(embedding, bytes) for embedding in embeddings):
+            raise ValueError("the local vector store only keeps float vectors")
+        dtype = (
+            np.float16
+            if all(
+                getattr(embedding, "dtype", None) == np.float16
+                for embedding in embeddings
+            )
+            else np.float32
+        )
+        vectors = np.asarray(embeddings, dtype=dtype)
+
+        ints: Dict[str, np.ndarray] = {}
+        strings: Dict[str, StringColumn] = {}
+        for field in rows[0]:
+            if field in {"id", "embedding"}:
+                continue
+            values = [row[field] for row in rows]
+            if all(isinstance(field_value, str) for field_value in values):
+                strings[field] = StringColumn.from_values(values)
+            elif all(isinstance(field_value, int) for field_value in values):
+                ints[field] = np.asarray(values, dtype=np.int64)
+            else:
+                raise ValueError(f"unsupported type of the {field} field")
+        return cls(
+            ids=np.asarray(ids, dtype=np.int64),
+            vectors=vectors,
+            norms=np.linalg.norm(vectors.astype(np.float32), axis=1),
+            ints=ints,
+            strings=strings,
+        )
+
+    @classmethod
+    def merge(cls, segments: Dict[str, "VectorSegment"]) -> "VectorSegment":
+        """
+        Merges segments into a new one replacing them.
+
+        Fields missing from some segments get their default value, like
+        milvus fills fields added to a collection.
+
+        :param segments: segments by name.
+        :returns: VectorSegment
+        """
+        parts = list(segments.values())
+        dtype = (
+            np.float16
+            if all(part.vectors.dtype == np.float16 for part in parts)
+            else np.float32
+        )
+        int_fields = {field for part in parts for field in part.ints}
+        string_fields = {field for part in parts for field in part.strings}
+        return cls(
+            ids=np.concatenate([part.ids for part in parts]),
+            vectors=np.concatenate([part.vectors for part in parts]).astype(dtype),
+            norms=np.concatenate([part.norms for part in parts]),
+            ints={
+                field: np.concatenate([part.get_ints(field) for part in parts])
+                for field in int_fields
+            },
+            strings={
+                field: StringColumn.concatenate(
+                    [part.get_strings(field) for part in parts],
+                )
+                for field in string_fields
+            },
+            replaces=list(segments),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "VectorSegment":
+        """
+        Opens a segment written with `save`, memory mapping its arrays.
+
+        Embeddings are paged in from disk as they are scored, so opening a
+        segment takes the same time whatever its size.
+
+        :param path: directory of the segment.
+        :returns: VectorSegment
+        """
+        meta = json.loads((path / "meta.json").read_text())
+
+        def load_array(name: str) -> np.ndarray:  # noqa: WPS430
+            return np.load(path / f"{name}.npy", mmap_mode="r")
+
+        vectors = load_array("vectors")
+        hnsw_index = None
+        if meta.get("hnsw_metric") and hnswlib is not None:
+            hnsw_index = hnswlib.Index(
+                space=HNSW_SPACES[meta["hnsw_metric"]],
+                dim=vectors.shape[1],
+            )
+            hnsw_index.load_index(str(path / "hnsw.bin"), max_elements=len(vectors))
+        return cls(
+            ids=load_array("ids"),
+            vectors=vectors,
+            norms=load_array("norms"),
+            ints={field: load_array(f"int.{field}") for field in meta["ints"]},
+            strings={
+                field: StringColumn(
+                    *(
+                        load_array(f"str.{field}.{part}")
+                        for part in StringColumn._fields
+                    ),
+                )
+                for field in meta["strings"]
+            },
+            replaces=meta["replaces"],
+            hnsw_index=hnsw_index,
+            hnsw_metric=meta.get("hnsw_metric") if hnsw_index is not None else None,
+        )
+
+    def save(
+        self,
+        path: Path,
+        hnsw_min_rows: Optional[int] = None,
+        hnsw_params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Writes the segment to a directory.
+
+        :param path: directory of the segment, must not exist.
+        :param hnsw_min_rows: builds an HNSW index when the segment has at
+            least this many rows, never if unset.
+        :param hnsw_params: index params as built by `build_index_params`.
+        """
+        path.mkdir(parents=True)
+        arrays = {"ids": self.ids, "vectors": self.vectors, "norms": self.norms}
+        arrays.update({f"int.{field}": ints for field, ints in self.ints.items()})
+        for field, column in self.strings.items():
+            arrays.update(
+                {
+                    f"str.{field}.{part}": getattr(column, part)
+                    for part in StringColumn._fields
+                },
+            )
+        for name, array in arrays.items():
+            np.save(path / f"{name}.npy", array)
+
+        hnsw_metric = None
+        if hnsw_min_rows is not None and hnsw_params and len(self) >= hnsw_min_rows:
+            hnsw_metric = hnsw_params["metric_type"]
+            index = hnswlib.Index(
+                space=HNSW_SPACES[hnsw_metric],
+                dim=self.vectors.shape[1],
+            )
+            index.init_index(
+                max_elements=len(self),
+                M=hnsw_params["params"]["M"],
+                ef_construction=hnsw_params["params"]["efConstruction"],
+            )
+            index.add_items(
+                np.asarray(self.vectors, dtype=np.float32),
+                np.arange(len(self)),
+            )
+            index.save_index(str(path / "hnsw.bin"))
+        (path / "meta.json").write_text(
+            json.dumps(
+                {
+                    "replaces": self.replaces,
+                    "ints": list(self.ints),
+                    "strings": list(self.strings),
+                    "hnsw_metric": hnsw_metric,
+                },
+            ),
+        )
+
+    def get_ints(self, field: str) -> np.ndarray:
+        """
+        Returns an integer column, ids included.
+
+        :param field: name of the field.
+        :returns: value of every row, 0 if the segment lacks the field.
+        """
+        if field == "id":
+            return self.ids
+        return self.ints.get(field, np.zeros(len(self), dtype=np.int64))
+
+    def get_strings(self, field: str) -> StringColumn:
+        """
+        Returns a string column.
+
+        :param field: name of the field.
+        :returns: value of every row, empty if the segment lacks the field.
+        """
+        column = self.strings.get(field)
+        if column is None:
+            return StringColumn.from_values([""] * len(self))
+        return column
+
+    def match(self, conditions: Sequence[Condition]) -> Optional[np.ndarray]:
+        """
+        Finds the rows meeting filter conditions.
+
+        :param conditions: parsed filter expression.
+        :returns: boolean mask of the rows, None without conditions.
+        :raises ValueError: on ordering comparisons of strings.
+        """
+        mask: Optional[np.ndarray] = None
+        for condition in conditions:
+            operands = (
+                condition.operand if condition.operator == "in" else [condition.operand]
+            )
+            if any(isinstance(operand, str) for operand in operands):
+                hashes = self.get_strings(condition.field).hashes
+                operand = hash_terms(operands)
+                if condition.operator == "in":
+                    matched = np.isin(hashes, operand)
+                elif condition.operator in {"==", "!="}:
+                    matched = COMPARISONS[condition.operator](hashes, operand[0])
+                else:
+                    raise ValueError(f"{condition.field} strings can not be ordered")
+            else:
+                column = self.get_ints(condition.field)
+                if condition.operator == "in":
+                    matched = np.isin(
+                        column,
+                        np.asarray(condition.operand, dtype=np.int64),
+                    )
+                else:
+                    matched = COMPARISONS[condition.operator](column, condition.operand)
+            mask = matched if mask is None else mask & matched
+        return mask
+
+    def get_entity(self, row: int, output_fields: Sequence[str]) -> Dict[str, Any]:
+        """
+        Reads the fields of a row.
+
+        :param row: row of the segment.
+        :param output_fields: fields to read.
+        :returns: value of every field.
+        """
+        entity: Dict[str, Any] = {}
+        for field in output_fields:
+            if field == "embedding":
+                entity[field] = np.array(self.vectors[row])
+            elif field in self.ints or field == "id":
+                entity[field] = int(self.get_ints(field)[row])
+            elif field in self.strings:
+                entity[field] = self.strings[field].get(row)
+            else:
+                # added to the collection after this segment was written
+                entity[field] = None
+        return entity
+
+    def search(
+        self,
+        queries: np.ndarray,
+        metric: str,
+        k: int,
+        mask: Optional[np.ndarray],
+        ef: Optional[int] = None,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Finds the best rows of every query.
+
+        Scores are similarities, the higher the better: the negated
+        squared distance for L2.
+
+        :param queries: float32 queries, one per row.
+        :param metric: COSINE, IP or L2.
+        :param k: number of rows per query.
+        :param mask: rows which may be returned, all of them if unset.
+        :param ef: search breadth of the HNSW index.
+        :returns: rows and scores of every query, best first.
+        """
+        if self.hnsw_index is not None and metric == self.hnsw_metric:
+            found = self.search_hnsw(queries, k, mask, ef)
+            if found is not None:
+                return found
+        return self.search_exhaustive(queries, metric, k, mask)
+
+    def search_exhaustive(  # noqa: WPS210
+        self,
+        queries: np.ndarray,
+        metric: str,
+        k: int,
+        mask: Optional[np.ndarray],
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Finds the best rows of every query by brute force, block by block.
+
+        :param queries: float32 queries, one per row.
+        :param metric: COSINE, IP or L2.
+        :param k: number of rows per query.
+        :param mask: rows which may be returned, all of them if unset.
+        :returns: rows and scores of every query, best first.
+        """
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            scores = self.score_block(queries, metric, start)
+            if mask is not None:
+                scores[:, ~mask[start : start + SEARCH_BLOCK_ROWS]] = -np.inf
+            rows = np.broadcast_to(
+                np.arange(start, start + scores.shape[1]),
+                scores.shape,
+            )
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [
+            (
+                query_rows[np.isfinite(query_scores)],
+                query_scores[np.isfinite(query_scores)],
+            )
+            for query_rows, query_scores in zip(best_rows, best_scores)
+        ]
+
+    def score_block(
+        self,
+        queries: np.ndarray,
+        metric: str,
+        start: int,
+    ) -> np.ndarray:
+        """
+        Scores a block of `SEARCH_BLOCK_ROWS` rows for every query.
+
+        :param queries: float32 queries, one per row.
+        :param metric: COSINE, IP or L2.
+        :param start: first row of the block.
+        :returns: similarity of every query to every row of the block.
+        """
+        block = np.asarray(
+            self.vectors[start : start + SEARCH_BLOCK_ROWS],
+            dtype=np.float32,
+        )
+        norms = self.norms[start : start + SEARCH_BLOCK_ROWS]
+        scores = queries @ block.T
+        query_norms = np.linalg.norm(queries, axis=1)
+        if metric == "COSINE":
+            return scores / np.maximum(
+                np.outer(query_norms, norms),
+                1e-12,  # noqa: WPS432
+            )
+        if metric == "L2":
+            return 2 * scores - query_norms[:, None] ** 2 - norms[None, :] ** 2
+        return scores
+
+    def search_hnsw(
+        self,
+        queries: np.ndarray,
+        k: int,
+        mask: Optional[np.ndarray],
+        ef: Optional[int],
+    ) -> Optional[List[Tuple[np.ndarray, np.ndarray]]]:
+        """
+        Finds the best rows of every query with the HNSW index.
+
+        :param queries: float32 queries, one per row.
+        :param k: number of rows per query.
+        :param mask: rows which may be returned, all of them if unset.
+        :param ef: search breadth, raised to `k` when lower.
+        :returns: rows and scores of every query, best first, None when
+            the filter leaves the index less than `k` rows to return.
+        """
+        k = min(k, len(self) if mask is None else int(mask.sum()))
+        if not k:
+            return [(np.zeros(0, dtype=np.int64), np.zeros(0)) for _ in queries]
+        with self.hnsw_lock:
+            self.hnsw_index.set_ef(max(ef or k, k))
+            try:
+                rows, distances = self.hnsw_index.knn_query(
+                    queries,
+                    k=k,
+                    # the filter is called back from the threads of the index
+                    num_threads=1 if mask is not None else -1,
+                    filter=None if mask is None else lambda row: bool(mask[row]),
+                )
+            except RuntimeError:
+                # fewer matching rows reached than asked for
+                return None
+
+        if self.hnsw_metric == "L2":
+            scores = -distances
+        else:
+            # hnswlib distances of cosine and ip are 1 - similarity
+            scores = 1 - distances
+        return [
+            (query_rows.astype(np.int64), query_scores)
+            for query_rows, query_scores in zip(rows, scores)
+        ]
+
+
+class LocalCollection:
+    """
+    Collection of the local vector store, a directory of append-only segments.
+
+    Every insert is written as a new immutable segment, visible to the
+    other processes sharing the directory on their next refresh. The
+    smallest segments are merged once there are too many of them, a
+    merged segment lists the segments it replaces so they are never
+    counted twice. Ids are allocated under the lock of the directory,
+    after the max id of its segments.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        path: Path,
+        max_segments: int = 16,
+        refresh_interval_s: float = 1,
+        hnsw_min_rows: Optional[int] = None,
+        hnsw_params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_segments = max_segments
+        self.refresh_interval_s = refresh_interval_s
+        self.hnsw_min_rows = hnsw_min_rows
+        self.hnsw_params = hnsw_params
+        self.segments: Dict[str, VectorSegment] = {}
+        self.segments_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self.refresh()
+
+    def __len__(self) -> int:
+        return sum(len(segment) for segment in self.segments.values())
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Holds the lock of the collection directory, shared by every process.
+
+        :yields: once the lock is held.
+        """
+        with self.segments_lock:
+            with open(self.path / ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self) -> None:
+        """Loads the segments written by other processes, drops the merged ones."""
+        names = {
+            segment_path.name
+            for segment_path in self.path.iterdir()
+            if segment_path.is_dir() and not segment_path.name.startswith(".")
+        }
+        segments = dict(self.segments)
+        for name in sorted(names - set(segments)):
+            try:
+                segments[name] = VectorSegment.load(self.path / name)
+            except FileNotFoundError:
+                # merged and removed by another process in the meantime
+                names.discard(name)
+        replaced = {
+            replaced_name
+            for segment in segments.values()
+            for replaced_name in segment.replaces
+        }
+        for name in set(segments) - (names - replaced):
+            del segments[name]  # noqa: WPS420
+        self.segments = segments
+        self._refreshed_at = time.monotonic()
+
+    def get_segments(self, strong: bool = False) -> List[VectorSegment]:
+        """
+        Returns the current segments, refreshed if stale.
+
+        :param strong: refreshes even if recently refreshed, to see every
+            row inserted so far.
+        :returns: segments.
+        """
+        if strong or time.monotonic() - self._refreshed_at >= self.refresh_interval_s:
+            self.refresh()
+        return list(self.segments.values())
+
+    def insert(self, rows: Sequence[Dict[str, Any]]) -> List[int]:
+        """
+        Writes rows as a new segment.
+
+        :param rows: rows to insert.
+        :returns: ids of the rows.
+        """
+        if not rows:
+            return []
+        with self.lock():
+            self.refresh()
+            max_id = max(
+                (
+                    int(segment.ids.max())
+                    for segment in self.segments.values()
+                    if len(segment)
+                ),
+                default=0,
+            )
+            ids = list(range(max_id + 1, max_id + 1 + len(rows)))
+            segment = VectorSegment.from_rows(ids, rows)
+            name = self.write_segment(segment)
+            self.segments = {
+                **self.segments,
+                name: VectorSegment.load(self.path / name),
+            }
+            if len(self.segments) > self.max_segments:
+                self.compact()
+        return ids
+
+    def write_segment(self, segment: VectorSegment) -> str:
+        """
+        Writes a segment atomically, other processes never see it half written.
+
+        :param segment: segment to write.
+        :returns: name of the segment.
+        """
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        tmp_path = self.path / f".tmp-{name}"
+        segment.save(tmp_path, self.hnsw_min_rows, self.hnsw_params)
+        os.rename(tmp_path, self.path / name)
+        return name
+
+    def compact(self) -> None:
+        """
+        Merges the smallest segments, the lock of the directory held.
+
+        Half of the segments are left, large segments are only rewritten
+        once enough small ones add up to their size.
+        """
+        by_size = sorted(self.segments, key=lambda name: len(self.segments[name]))
+        merged_names = by_size[: len(by_size) - self.max_segments // 2]
+        if len(merged_names) < 2:
+            return
+        merged = VectorSegment.merge(
+            {name: self.segments[name] for name in merged_names},
+        )
+        name = self.write_segment(merged)
+        segments = {
+            kept_name: segment
+            for kept_name, segment in self.segments.items()
+            if kept_name not in merged.replaces
+        }
+        segments[name] = VectorSegment.load(self.path / name)
+        self.segments = segments
+        for replaced_name in merged.replaces:
+            shutil.rmtree(self.path / replaced_name, ignore_errors=True)
+
+
+class LocalVectorStore:
+    """
+    Embedded vector store answering the MilvusClient calls of the app.
+
+    Collections live on local disk and are searched in process: by brute
+    force with NumPy, batched across queries and blocks of rows, or with
+    the HNSW index of the large segments if hnswlib is installed. There
+    is no network hop and nothing to start, which suits small corpora and
+    edge deployments. Filters support the subset of the milvus expression
+    language the app builds. The store is thread safe, pool it like a
+    MilvusClient.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        path: str,
+        max_segments: int = 16,
+        refresh_interval_s: float = 1,
+        hnsw_min_rows: Optional[int] = None,
+        hnsw_params: Optional[Dict[str, Any]] = None,
+        hnsw_ef: int = 64,
+    ) -> None:
+        if hnsw_min_rows is not None and hnswlib is None:
+            raise RuntimeError(
+                "HNSW indexes of the local vector store need hnswlib installed",
+            )
+        self.path = Path(path)
+        self.max_segments = max_segments
+        self.refresh_interval_s = refresh_interval_s
+        self.hnsw_min_rows = hnsw_min_rows
+        self.hnsw_params = hnsw_params
+        # HNSW search breadth when the search params do not set it
+        self.hnsw_ef = hnsw_ef
+        self.collections: Dict[str, LocalCollection] = {}
+        self.lock = threading.Lock()
+
+    def get_collection(self, collection_name: str) -> LocalCollection:
+        """
+        Opens a collection, created on first use.
+
+        :param collection_name: name of the collection.
+        :returns: LocalCollection
+        """
+        with self.lock:
+            collection = self.collections.get(collection_name)
+            if collection is None:
+                collection = LocalCollection(
+                    self.path / collection_name,
+                    max_segments=self.max_segments,
+                    refresh_interval_s=self.refresh_interval_s,
+                    hnsw_min_rows=self.hnsw_min_rows,
+                    hnsw_params=self.hnsw_params,
+                )
+                self.collections[collection_name] = collection
+            return collection
+
+    def insert(
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Local MilvusClient.insert, ids are allocated like auto ids.
+
+        :param collection_name: name of the collection.
+        :param data: rows to insert.
+        :param kwargs: ignored.
+        :returns: insert result.
+        """
+        ids = self.get_collection(collection_name).insert(data)
+        return {"insert_count": len(ids), "ids": ids}
+
+    def search(  # noqa: WPS210 WPS211
+        self,
+        collection_name: str,
+        data: List[Sequence[float]],
+        limit: int = 10,
+        output_fields: Optional[List[str]] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        filter: str = "",  # noqa: WPS125
+        offset: int = 0,
+        **kwargs: Any,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Local MilvusClient.search.
+
+        Distances are the ones of milvus: similarities for COSINE and IP,
+        squared distances for L2.
+
+        :param collection_name: name of the collection.
+        :param data: vectors to search for.
+        :param limit: number of results per vector.
+        :param output_fields: row fields to return in the entity.
+        :param search_params: metric type and HNSW `ef` of the search.
+        :param filter: scalar filter expression.
+        :param offset: number of best results skipped.
+        :param kwargs: ignored.
+        :returns: results for every vector.
+        """
+        search_params = search_params or {}
+        metric = search_params.get("metric_type", "COSINE")
+        ef = search_params.get("params", {}).get("ef", self.hnsw_ef)
+        conditions = parse_filter(filter)
+        queries = np.asarray(data, dtype=np.float32)
+        k = offset + limit
+
+        candidates: List[List[Tuple[float, int, int]]] = [[] for _ in data]
+        segments = self.get_collection(collection_name).get_segments(
+            strong=kwargs.get("consistency_level") == "Strong",
+        )
+        for position, segment in enumerate(segments):
+            found = segment.search(queries, metric, k, segment.match(conditions), ef)
+            for query_candidates, (rows, scores) in zip(candidates, found):
+                query_candidates.extend(
+                    (float(score), position, int(row))
+                    for row, score in zip(rows, scores)
+                )
+
+        results = []
+        for query_candidates in candidates:
+            query_candidates.sort(key=lambda candidate: -candidate[0])
+            results.append(
+                [
+                    {
+                        "id": int(segments[position].ids[row]),
+                        "distance": max(-score, 0) if metric == "L2" else score,
+                        "entity": segments[position].get_entity(
+                            row,
+                            output_fields or [],
+                        ),
+                    }
+                    for score, position, row in query_candidates[offset:k]
+                ],
+            )
+        return results
+
+    def query(
+        self,
+        collection_name: str,
+        filter: str = "",  # noqa: WPS125
+        output_fields: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Local MilvusClient.query.
+
+        :param collection_name: name of the collection.
+        :param filter: scalar filter expression.
+        :param output_fields: row fields to return, the id is always returned.
+        :param limit: max number of rows.
+        :param kwargs: `consistency_level`, other arguments are ignored.
+        :returns: matching rows.
+        """
+        conditions = parse_filter(filter)
+        fields = ["id", *(field for field in output_fields or [] if field != "id")]
+        rows: List[Dict[str, Any]] = []
+        segments = self.get_collection(collection_name).get_segments(
+            strong=kwargs.get("consistency_level") == "Strong",
+        )
+        for segment in segments:
+            mask = segment.match(conditions)
+            matched = np.arange(len(segment)) if mask is None else np.flatnonzero(mask)
+            rows.extend(segment.get_entity(int(row), fields) for row in matched)
+            if limit is not None and len(rows) >= limit:
+                return rows[:limit]
+        return rows
+
+    def load_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Local MilvusClient.load_collection, opens the collection.
+
+        :param collection_name: name of the collection.
+        :param kwargs: ignored.
+        """
+        self.get_collection(collection_name)
+
+    def release_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Local MilvusClient.release_collection, segments stay memory mapped.
+
+        :param collection_name: name of the collection.
+        :param kwargs: ignored.
+        """
+
+    def close(self) -> None:
+        """Local MilvusClient.close, every write is already on disk."""
@@ -1,7 +1,32 @@
-from pymilvus import Collection, CollectionSchema, connections, db, utility
+import argparse
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
 
-from rag_app_deepseek.services.milvus.schema import text_embeddings_schema
-from rag_app_deepseek.settings import settings
+import numpy as np
+from pymilvus import (
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    connections,
+    db,
+    utility,
+)
+
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+from rag_app_deepseek.services.milvus.index import RERANK_INDEX_PARAMS, get_index_params
+from rag_app_deepseek.services.milvus.schema import (
+    RERANK_EMBEDDING_FIELD,
+    build_text_embeddings_schema,
+)
+from rag_app_deepseek.services.milvus.vectors import (
+    EMBEDDING_DIM,
+    ProjectionCodec,
+    VectorCodec,
+    get_vector_field_spec,
+    load_vector_codec,
+)
+from rag_app_deepseek.services.text_embeddings.dedup import chunk_content_hash
+from rag_app_deepseek.settings import VectorStorageMode, settings
 
 
 def has_db(name: str) -> bool:
@@ -42,13 +67,495 @@ def create_collection(name: str, schema: CollectionSchema) -> Collection:
     :param schema: schema of the collection to create
     :returns: the newly created collection.
     """
-    collection = Collection(name=name, data=None, schema=schema)
+    collection = Collection(
+        name=name,
+        data=None,
+        schema=schema,
+        num_partitions=settings.milvus_num_partitions,
+    )
     print("\ncollection created:", name)  # noqa: WPS421
     return collection
 
 
-def ensure_db_and_collections():  # type: ignore
-    """Ensures if the db and collections exists."""
+def get_field_names(collection: Collection) -> Set[str]:
+    """
+    Returns the names of the fields of a collection.
+
+    :param collection: milvus collection.
+    :returns: Set of field names.
+    """
+    return {field.name for field in collection.schema.fields}
+
+
+def get_missing_fields(collection: Collection) -> List[str]:
+    """
+    Returns the fields of the configured schema missing from a collection.
+
+    Collections created before a field was added to the schema, or for
+    another storage mode, lack it.
+
+    :param collection: text embeddings collection.
+    :returns: names of the missing fields.
+    """
+    fields = get_field_names(collection)
+    schema = build_text_embeddings_schema(*get_vector_field_spec())
+    return [field.name for field in schema.fields if field.name not in fields]
+
+
+def ensure_scalar_indexes(collection: Collection) -> None:
+    """
+    Indexes the scalar fields searches and deduplication filter on.
+
+    Tenants are not indexed, filtering on the partition key already
+    restricts searches to the partitions of the tenant.
+
+    :param collection: text embeddings collection.
+    """
+    fields = get_field_names(collection)
+    scalar_indexes = {
+        "text_hash": settings.milvus_scalar_index_type,
+        "source": settings.milvus_scalar_index_type,
+        "timestamp_unix": settings.milvus_numeric_index_type,
+    }
+    indexed = {index.index_name for index in collection.indexes}
+    for field_name, index_type in scalar_indexes.items():
+        if field_name in fields and field_name not in indexed:
+            collection.create_index(
+                field_name=field_name,
+                index_params={"index_type": index_type},
+                index_name=field_name,
+            )
+            print(f"\n{field_name} index built:", index_type)  # noqa: WPS421
+
+
+def ensure_rerank_index(collection: Collection) -> None:
+    """
+    Indexes the rerank vectors stored along with binary vectors.
+
+    :param collection: text embeddings collection.
+    """
+    indexed = {index.index_name for index in collection.indexes}
+    if RERANK_EMBEDDING_FIELD in get_field_names(collection) - indexed:
+        collection.create_index(
+            field_name=RERANK_EMBEDDING_FIELD,
+            index_params=RERANK_INDEX_PARAMS,
+            index_name=RERANK_EMBEDDING_FIELD,
+        )
+        print("\nrerank index built:", RERANK_INDEX_PARAMS)  # noqa: WPS421
+
+
+def get_vector_index(collection: Collection) -> Optional[Dict[str, Any]]:
+    """
+    Returns the params of the current embedding index.
+
+    :param collection: text embeddings collection.
+    :returns: index params or None if the field is not indexed.
+    """
+    for index in collection.indexes:
+        if index.field_name == "embedding":
+            return index.params
+    return None
+
+
+def is_same_index(current: Dict[str, Any], wanted: Dict[str, Any]) -> bool:
+    """
+    Compares index params, milvus returns build params as strings.
+
+    :param current: params of the existing index.
+    :param wanted: declared params.
+    :returns: if both describe the same index.
+    """
+    current_params = {
+        key: str(value) for key, value in (current.get("params") or {}).items()
+    }
+    wanted_params = {key: str(value) for key, value in wanted["params"].items()}
+    return (
+        current.get("index_type") == wanted["index_type"]
+        and current.get("metric_type") == wanted["metric_type"]
+        and current_params == wanted_params
+    )
+
+
+def ensure_vector_index(collection: Collection, rebuild: bool = False) -> None:
+    """
+    Makes the embedding index match the one declared in settings.
+
+    A missing index is built right away. Replacing an existing index
+    makes the collection unsearchable until the new one is built and
+    loaded, so it only happens when a rebuild is requested.
+
+    :param collection: text embeddings collection.
+    :param rebuild: drop and rebuild the index if it differs from the settings.
+    """
+    wanted = get_index_params()
+    current = get_vector_index(collection)
+    if current is not None:
+        if is_same_index(current, wanted):
+            return
+        if not rebuild:
+            print(  # noqa: WPS421
+                "\nembedding index differs from settings, run with --rebuild-index:",
+                current,
+                "->",
+                wanted,
+            )
+            return
+
+        collection.release()
+        collection.drop_index(index_name="embedding")
+        print("\nembedding index dropped:", current)  # noqa: WPS421
+
+    collection.create_index(
+        field_name="embedding",
+        index_params=wanted,
+        index_name="embedding",
+    )
+    utility.wait_for_index_building_complete(collection.name, index_name="embedding")
+    print("\nembedding index built:", wanted)  # noqa: WPS421
+    if rebuild:
+        collection.load()
+
+
+def get_embedding_field(collection: Collection) -> FieldSchema:
+    """
+    Returns the embedding field of the text embeddings collection.
+
+    :param collection: text embeddings collection.
+    :returns: FieldSchema
+    """
+    return next(
+        field for field in collection.schema.fields if field.name == "embedding"
+    )
+
+
+def fit_pca_projection(collection: Collection, sample_size: int) -> None:
+    """
+    Fits the PCA projection on a sample of the stored embeddings and saves it.
+
+    :param collection: loaded collection of full precision embeddings.
+    :param sample_size: number of embeddings to fit on.
+    :raises ValueError: if there are fewer embeddings than reduced dimensions.
+    """
+    rows = collection.query(
+        expr="",
+        output_fields=["embedding"],
+        limit=sample_size,
+    )
+    if len(rows) < settings.milvus_vector_reduced_dim:
+        raise ValueError(
+            f"PCA needs at least {settings.milvus_vector_reduced_dim} stored "
+            + f"embeddings, found {len(rows)}",
+        )
+
+    codec = ProjectionCodec.fit_pca(
+        np.asarray([row["embedding"] for row in rows], dtype=np.float32),
+        settings.milvus_vector_reduced_dim,
+    )
+    codec.save(settings.milvus_vector_projection_path)
+    print(  # noqa: WPS421
+        f"\nPCA projection fitted on {len(rows)} embeddings:",
+        settings.milvus_vector_projection_path,
+    )
+
+
+def get_insertable_vector(vector: Any) -> Any:
+    """
+    Turns a vector read from milvus back into an insertable one.
+
+    :param vector: vector as returned by a query.
+    :returns: vector to insert.
+    """
+    # binary and float16 vectors are read as bytes wrapped in a list
+    if isinstance(vector, list) and vector and isinstance(vector[0], bytes):
+        return vector[0]
+    return vector
+
+
+def get_migrated_rows(
+    rows: List[Dict[str, Any]],
+    codec: Optional[VectorCodec],
+) -> List[Dict[str, Any]]:
+    """
+    Builds the rows inserted into the migrated collection.
+
+    :param rows: rows of the source collection, with their text hash.
+    :param codec: encodes full precision embeddings, None to copy the vectors.
+    :returns: rows to insert.
+    """
+    if codec is None:
+        vector_fields = {
+            field_name: [get_insertable_vector(row[field_name]) for row in rows]
+            for field_name in ("embedding", RERANK_EMBEDDING_FIELD)
+            if field_name in rows[0]
+        }
+    else:
+        vector_fields = codec.encode_fields([row["embedding"] for row in rows])
+    return [
+        {
+            "text": row["text"],
+            "timestamp_unix": row["timestamp_unix"],
+            "text_hash": row["text_hash"],
+            "source": row.get("source", ""),
+            "tenant": row.get("tenant", ""),
+            # chunks of older collections are never merged
+            "document_id": row.get("document_id", ""),
+            **{name: vectors[index] for name, vectors in vector_fields.items()},
+        }
+        for index, row in enumerate(rows)
+    ]
+
+
+def has_stale_hashes(collection: Collection) -> bool:
+    """
+    Checks whether the stored text hashes were computed by an older scheme.
+
+    :param collection: loaded text embeddings collection with all the fields.
+    :returns: if a sampled chunk has a text hash which differs from its own.
+    """
+    rows = collection.query(
+        expr="",
+        output_fields=["text", "text_hash", "source", "tenant"],
+        limit=1,
+    )
+    return any(
+        row["text_hash"]
+        != chunk_content_hash(row["text"], row["source"], row["tenant"])
+        for row in rows
+    )
+
+
+def create_migration_target(name: str) -> Collection:
+    """
+    Creates the collection a migration copies rows into.
+
+    A target left by an interrupted migration is dropped first.
+
+    :param name: name of the collection to migrate.
+    :returns: empty collection with the configured storage mode and schema.
+    """
+    target_name = f"{name}_migrating"
+    if has_collection(target_name):
+        utility.drop_collection(target_name)
+    return create_collection(
+        target_name,
+        build_text_embeddings_schema(*get_vector_field_spec()),
+    )
+
+
+def get_unseen_rows(
+    rows: List[Dict[str, Any]],
+    seen: Set[str],
+) -> List[Dict[str, Any]]:
+    """
+    Hashes the rows and keeps the chunks not seen yet.
+
+    :param rows: rows of the source collection.
+    :param seen: text hashes of the chunks copied so far, updated.
+    :returns: new rows, with their text hash.
+    """
+    new_rows = []
+    for row in rows:
+        text_hash = chunk_content_hash(
+            row["text"],
+            row.get("source", ""),
+            row.get("tenant", ""),
+        )
+        if text_hash not in seen:
+            seen.add(text_hash)
+            new_rows.append({**row, "text_hash": text_hash})
+    return new_rows
+
+
+def copy_unseen_rows(
+    source: Collection,
+    target: Collection,
+    codec: Optional[VectorCodec],
+    batch_size: int,
+) -> int:
+    """
+    Copies the rows of a collection into another, dropping duplicate chunks.
+
+    :param source: loaded collection to copy.
+    :param target: collection to copy into.
+    :param codec: encodes full precision embeddings, None to copy the vectors.
+    :param batch_size: number of rows copied at once.
+    :returns: number of rows copied.
+    """
+    copied_fields = [
+        field_name
+        for field_name in ("source", "tenant", "document_id", RERANK_EMBEDDING_FIELD)
+        if field_name in get_field_names(source)
+    ]
+    iterator = source.query_iterator(
+        batch_size=batch_size,
+        output_fields=["text", "timestamp_unix", "embedding", *copied_fields],
+    )
+    seen: Set[str] = set()
+    copied = 0
+    while True:  # noqa: WPS457
+        rows: List[Dict[str, Any]] = iterator.next()
+        if not rows:
+            iterator.close()
+            return copied
+
+        new_rows = get_unseen_rows(rows, seen)
+        if new_rows:
+            target.insert(get_migrated_rows(new_rows, codec))
+            copied += len(new_rows)
+
+
+def migrate_vectors(  # noqa: WPS210
+    name: str,
+    batch_size: int,
+    pca_sample_size: int,
+) -> None:
+    """
+    Copies a collection to the configured storage mode and schema.
+
+    Rows are copied into a new collection, which then takes the name of
+    the source collection. The source collection is kept under a
+    `_backup` name for rollbacks, drop it once the new one is verified.
+    Full precision embeddings are re-encoded for the storage mode,
+    duplicate chunks are dropped, text hashes recomputed and missing
+    metadata fields filled on the way. Collections created before the
+    text hashes, or hashed by an older scheme, are migrated this way.
+
+    :param name: name of the collection to migrate.
+    :param batch_size: number of rows copied at once.
+    :param pca_sample_size: number of embeddings to fit the PCA projection on.
+    """
+    source = Collection(name=name)
+    embedding_field = get_embedding_field(source)
+    stored_spec = (embedding_field.dtype, embedding_field.params["dim"])
+    reencode = stored_spec != get_vector_field_spec()
+    missing_fields = get_missing_fields(source)
+    # rerank vectors can only be computed from full precision embeddings
+    encoded = reencode or RERANK_EMBEDDING_FIELD in missing_fields
+    if encoded and stored_spec != (DataType.FLOAT_VECTOR, EMBEDDING_DIM):
+        print(  # noqa: WPS421
+            "\nonly full precision embeddings can be migrated, re-ingest instead:",
+            name,
+        )
+        return
+
+    source.load()
+    if not reencode and not missing_fields and not has_stale_hashes(source):
+        print("\ncollection already stored as configured:", name)  # noqa: WPS421
+        return
+
+    codec = None
+    if encoded:
+        if settings.milvus_vector_storage == VectorStorageMode.PCA:
+            fit_pca_projection(source, pca_sample_size)
+        codec = load_vector_codec()
+
+    target = create_migration_target(name)
+    migrated = copy_unseen_rows(source, target, codec, batch_size)
+
+    target.flush()
+    ensure_scalar_indexes(target)
+    ensure_rerank_index(target)
+    ensure_vector_index(target)
+    source.release()
+    utility.rename_collection(name, f"{name}_backup")
+    utility.rename_collection(target.name, name)
+    print(  # noqa: WPS421
+        f"\nmigrated {migrated} rows of {name} to "
+        + f"{settings.milvus_vector_storage.value} storage, previous rows kept "
+        + f"in {name}_backup",
+    )
+
+
+def iter_chunks(
+    collection: Collection,
+    batch_size: int,
+) -> Iterator[Tuple[Sequence[int], Sequence[str]]]:
+    """
+    Iterates over all the chunks of a collection.
+
+    :param collection: collection to read.
+    :param batch_size: number of rows read at once.
+    :yields: batches of ids and texts.
+    """
+    iterator = collection.query_iterator(batch_size=batch_size, output_fields=["text"])
+    while True:  # noqa: WPS457
+        rows: List[Dict[str, Any]] = iterator.next()
+        if not rows:
+            iterator.close()
+            return
+        yield [row["id"] for row in rows], [row["text"] for row in rows]
+
+
+def rebuild_lexical_index(collection: Collection, batch_size: int) -> None:
+    """
+    Rebuilds the BM25 index from the chunks stored in a collection.
+
+    :param collection: collection of the chunks.
+    :param batch_size: number of rows read at once.
+    """
+    collection.load()
+    index = BM25Index(
+        path=settings.search_bm25_index_path,
+        flush_docs=settings.search_bm25_flush_docs,
+        max_segments=settings.search_bm25_max_segments,
+    )
+    indexed = index.rebuild(iter_chunks(collection, batch_size))
+    print(  # noqa: WPS421
+        f"\nBM25 index rebuilt with {indexed} chunks:",
+        settings.search_bm25_index_path,
+    )
+
+
+def is_stored_as_configured(collection: Collection) -> bool:
+    """
+    Checks the collection matches the storage mode and schema of the settings.
+
+    Prints how to migrate the collection when it does not.
+
+    :param collection: text embeddings collection.
+    :returns: if the collection can be indexed and ingested into.
+    """
+    embedding_field = get_embedding_field(collection)
+    if get_vector_field_spec() != (
+        embedding_field.dtype,
+        embedding_field.params["dim"],
+    ):
+        print(  # noqa: WPS421
+            "\nembedding field differs from the storage mode, run with "
+            + "--migrate-vectors:",
+            settings.milvus_vector_storage.value,
+        )
+        return False
+    missing_fields = get_missing_fields(collection)
+    if missing_fields:
+        print(  # noqa: WPS421
+            "\ncollection lacks fields, ingestion fails until it is "
+            + "migrated with --migrate-vectors:",
+            missing_fields,
+        )
+        return False
+    return True
+
+
+def ensure_db_and_collections(  # type: ignore
+    rebuild_index: bool = False,
+    migrate: bool = False,
+    batch_size: int = 1000,
+    pca_sample_size: int = 20000,
+    rebuild_lexical: bool = False,
+):
+    """
+    Ensures if the db, collections and indexes exists.
+
+    Migrating vectors changes the ids of the chunks, so the BM25 index
+    is rebuilt too when hybrid search is enabled.
+
+    :param rebuild_index: rebuild the embedding index if it differs from settings.
+    :param migrate: migrate stored embeddings to the configured storage mode.
+    :param batch_size: number of rows copied at once by the migration.
+    :param pca_sample_size: number of embeddings to fit the PCA projection on.
+    :param rebuild_lexical: rebuild the BM25 index from the stored chunks.
+    """
     connections.connect(
         host=settings.milvus_host,
         port=settings.milvus_port,
@@ -66,10 +573,54 @@ def ensure_db_and_collections():  # type: ignore
 
     does_text_embeddings_coll_exists = has_collection("text_embeddings_schema")
     if does_text_embeddings_coll_exists is False:
-        create_collection(name="text_embeddings_schema", schema=text_embeddings_schema)
+        create_collection(
+            name="text_embeddings_schema",
+            schema=build_text_embeddings_schema(*get_vector_field_spec()),
+        )
+    elif migrate:
+        migrate_vectors("text_embeddings_schema", batch_size, pca_sample_size)
+
+    text_embeddings_coll = Collection(name="text_embeddings_schema")
+    if is_stored_as_configured(text_embeddings_coll):
+        ensure_scalar_indexes(text_embeddings_coll)
+        ensure_rerank_index(text_embeddings_coll)
+        ensure_vector_index(text_embeddings_coll, rebuild=rebuild_index)
+        if rebuild_lexical or (migrate and settings.search_hybrid_enabled):
+            rebuild_lexical_index(text_embeddings_coll, batch_size)
 
     connections.disconnect(settings.milvus_conn_name)
     print("milvus disconnected")  # noqa: WPS421
 
 
-ensure_db_and_collections()
+def main() -> None:
+    """Entrypoint of the milvus migration."""
+    parser = argparse.ArgumentParser(description="Creates the milvus collections.")
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="drop and rebuild the embedding index if it differs from settings",
+    )
+    parser.add_argument(
+        "--migrate-vectors",
+        action="store_true",
+        help="copy stored chunks to the storage mode, schema and hashes configured",
+    )
+    parser.add_argument(
+        "--rebuild-lexical-index",
+        action="store_true",
+        help="rebuild the BM25 index of hybrid search from the stored chunks",
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pca-sample-size", type=int, default=20000)
+    args = parser.parse_args()
+    ensure_db_and_collections(
+        rebuild_index=args.rebuild_index,
+        migrate=args.migrate_vectors,
+        batch_size=args.batch_size,
+        pca_sample_size=args.pca_sample_size,
+        rebuild_lexical=args.rebuild_lexical_index,
+    )
+
+
+if __name__ == "__main__":
+    main()
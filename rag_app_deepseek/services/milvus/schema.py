@@ -1,5 +1,8 @@
 from pymilvus import CollectionSchema, DataType, FieldSchema
 
+# half precision embeddings binary vectors are reranked with
+RERANK_EMBEDDING_FIELD = "rerank_embedding"
+
 text_embeddings_field_primary_key = FieldSchema(
     name="id",
     dtype=DataType.INT64,
@@ -26,17 +29,114 @@ text_embeddings_field_timestamp_unix = FieldSchema(
     description="stores timestamp of text in unix",
 )
 
+text_embeddings_field_text_hash = FieldSchema(
+    name="text_hash",
+    dtype=DataType.VARCHAR,
+    max_length=32,  # noqa: WPS432
+    description="blake2b hash of the normalized text, to deduplicate chunks",
+)
+
+text_embeddings_field_source = FieldSchema(
+    name="source",
+    dtype=DataType.VARCHAR,
+    max_length=128,  # noqa: WPS432
+    description="where the text comes from, to filter searches on",
+)
+
+text_embeddings_field_tenant = FieldSchema(
+    name="tenant",
+    dtype=DataType.VARCHAR,
+    max_length=64,  # noqa: WPS432
+    is_partition_key=True,
+    description="owner of the text, searches of a tenant only scan its partitions",
+)
+
+text_embeddings_field_document_id = FieldSchema(
+    name="document_id",
+    dtype=DataType.VARCHAR,
+    max_length=64,  # noqa: WPS432
+    description="document the chunk was split from, its chunks are merged in prompts",
+)
+
+text_embeddings_metadata_fields = (
+    text_embeddings_field_timestamp_unix,
+    text_embeddings_field_text_hash,
+    text_embeddings_field_source,
+    text_embeddings_field_tenant,
+    text_embeddings_field_document_id,
+)
+
+# max utf-8 bytes of the VARCHAR metadata fields, milvus rejects longer values
+text_embeddings_metadata_max_bytes = {
+    metadata_field.name: metadata_field.params["max_length"]
+    for metadata_field in text_embeddings_metadata_fields
+    if metadata_field.dtype == DataType.VARCHAR
+}
+
+
+def check_metadata_bytes(field_name: str, field_value: str) -> str:
+    """
+    Checks a metadata value fits in its VARCHAR field.
+
+    :param field_name: name of the metadata field.
+    :param field_value: value of the field.
+    :returns: the value.
+    :raises ValueError: when the value has too many utf-8 bytes.
+    """
+    max_bytes = text_embeddings_metadata_max_bytes[field_name]
+    if len(field_value.encode()) > max_bytes:
+        raise ValueError(f"{field_name} is longer than {max_bytes} utf-8 bytes")
+    return field_value
+
+
 text_embeddings_schema = CollectionSchema(
     fields=[
         text_embeddings_field_primary_key,
         text_embeddings_field_embedding,
         text_embeddings_field_text,
-        text_embeddings_field_timestamp_unix,
+        *text_embeddings_metadata_fields,
     ],
     description="text_embeddings_schema",
 )
 
 
+def build_text_embeddings_schema(
+    embedding_dtype: DataType,
+    embedding_dim: int,
+) -> CollectionSchema:
+    """
+    Builds the text embeddings schema for a vector storage mode.
+
+    :param embedding_dtype: data type of the embedding field.
+    :param embedding_dim: dimension of the embedding field.
+    :returns: CollectionSchema
+    """
+    if (
+        embedding_dtype == text_embeddings_field_embedding.dtype
+        and embedding_dim == text_embeddings_field_embedding.params["dim"]
+    ):
+        return text_embeddings_schema
+
+    fields = [
+        text_embeddings_field_primary_key,
+        FieldSchema(name="embedding", dtype=embedding_dtype, dim=embedding_dim),
+        text_embeddings_field_text,
+        *text_embeddings_metadata_fields,
+    ]
+    if embedding_dtype == DataType.BINARY_VECTOR:
+        fields.append(
+            FieldSchema(
+                name=RERANK_EMBEDDING_FIELD,
+                dtype=DataType.FLOAT16_VECTOR,
+                dim=embedding_dim,
+                # only read for the candidates of a search
+                mmap_enabled=True,
+                description="half precision embedding to rerank binary candidates",
+            ),
+        )
+    return CollectionSchema(fields=fields, description="text_embeddings_schema")
+
+
 class MilvusCollections:
     """Enum of milvus collections."""
 
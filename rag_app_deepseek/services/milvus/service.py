@@ -0,0 +1,202 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Protocol, Sequence
+
+
+class VectorStoreClient(Protocol):
+    """
+    Blocking vector store client, the MilvusClient calls the app makes.
+
+    Implemented by MilvusClient and by the embedded LocalVectorStore.
+    """
+
+    def search(self, collection_name: str, data: Any, **kwargs: Any) -> Any:
+        """
+        Searches the nearest rows of vectors.
+
+        :param collection_name: name of the collection.
+        :param data: vectors to search for.
+        :param kwargs: limit, offset, filter, output fields and search params.
+        """
+
+    def insert(self, collection_name: str, data: Any, **kwargs: Any) -> Any:
+        """
+        Inserts rows.
+
+        :param collection_name: name of the collection.
+        :param data: rows to insert.
+        :param kwargs: other arguments of the insert.
+        """
+
+    def query(self, collection_name: str, **kwargs: Any) -> Any:
+        """
+        Finds the rows matching a filter.
+
+        :param collection_name: name of the collection.
+        :param kwargs: filter, output fields and consistency level.
+        """
+
+    def load_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Makes a collection searchable.
+
+        :param collection_name: name of the collection.
+        :param kwargs: other arguments of the call.
+        """
+
+    def release_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Releases the resources of a loaded collection.
+
+        :param collection_name: name of the collection.
+        :param kwargs: other arguments of the call.
+        """
+
+    def close(self) -> None:
+        """Closes the connection."""
+
+
+class MilvusAsyncClient:
+    """
+    Async access layer over a pool of vector store clients.
+
+    MilvusClient is blocking, so every call is made from a dedicated
+    thread pool with one worker per pooled connection. The event loop
+    never waits on milvus, and once every connection is busy further
+    calls queue up here instead of piling up threads. The embedded
+    LocalVectorStore is pooled the same way, its searches then run in
+    parallel. Inserts of whole consumer batches take far longer than
+    searches, so they get their own timeout.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[VectorStoreClient],
+        timeout: float,
+        insert_timeout: Optional[float] = None,
+    ) -> None:
+        self.clients = list(clients)
+        self.timeout = timeout
+        self.insert_timeout = insert_timeout or timeout
+        self.idle_clients: "asyncio.Queue[VectorStoreClient]" = asyncio.Queue()
+        for client in self.clients:
+            self.idle_clients.put_nowait(client)
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(self.clients),
+            thread_name_prefix="milvus",
+        )
+
+    async def run(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs a MilvusClient method on an idle pooled connection.
+
+        :param method: name of the MilvusClient method to call.
+        :param args: positional arguments of the method.
+        :param kwargs: keyword arguments of the method.
+        :returns: the result of the method.
+        """
+        client = await self.idle_clients.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor,
+                partial(getattr(client, method), *args, **kwargs),
+            )
+        finally:
+            self.idle_clients.put_nowait(client)
+
+    async def search(  # noqa: WPS211
+        self,
+        collection_name: str,
+        data: List[Sequence[float]],
+        limit: int = 10,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Async MilvusClient.search.
+
+        :param collection_name: name of the collection to search.
+        :param data: vectors to search for.
+        :param limit: number of results per vector.
+        :param timeout: timeout of the call in seconds, defaults to settings.
+        :param kwargs: other MilvusClient.search arguments.
+        :returns: results for every vector.
+        """
+        return await self.run(
+            "search",
+            collection_name=collection_name,
+            data=data,
+            limit=limit,
+            timeout=timeout or self.timeout,
+            **kwargs,
+        )
+
+    async def insert(
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Async MilvusClient.insert.
+
+        :param collection_name: name of the collection to insert into.
+        :param data: rows to insert.
+        :param timeout: timeout of the call in seconds, defaults to the
+            insert timeout.
+        :param kwargs: other MilvusClient.insert arguments.
+        :returns: insert result.
+        """
+        return await self.run(
+            "insert",
+            collection_name=collection_name,
+            data=data,
+            timeout=timeout or self.insert_timeout,
+            **kwargs,
+        )
+
+    async def query(
+        self,
+        collection_name: str,
+        timeout: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Async MilvusClient.query.
+
+        :param collection_name: name of the collection to query.
+        :param timeout: timeout of the call in seconds, defaults to settings.
+        :param kwargs: other MilvusClient.query arguments.
+        :returns: matching rows.
+        """
+        return await self.run(
+            "query",
+            collection_name=collection_name,
+            timeout=timeout or self.timeout,
+            **kwargs,
+        )
+
+    async def load_collection(self, collection_name: str) -> None:
+        """
+        Async MilvusClient.load_collection.
+
+        :param collection_name: name of the collection to load.
+        """
+        await self.run("load_collection", collection_name=collection_name)
+
+    async def release_collection(self, collection_name: str) -> None:
+        """
+        Async MilvusClient.release_collection.
+
+        :param collection_name: name of the collection to release.
+        """
+        await self.run("release_collection", collection_name=collection_name)
+
+    def close(self) -> None:
+        """Waits for in flight calls and closes every pooled connection."""
+        self.executor.shutdown(wait=True)
+        for client in self.clients:
+            client.close()
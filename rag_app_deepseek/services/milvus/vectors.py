@@ -0,0 +1,319 @@
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+from pymilvus import DataType
+
+from rag_app_deepseek.services.milvus.schema import RERANK_EMBEDDING_FIELD
+from rag_app_deepseek.settings import VectorStorageMode, settings
+
+EMBEDDING_DIM = 5120
+RANDOM_PROJECTION_SEED = 5120
+
+# full precision embeddings, one per row
+Embeddings = Union[Sequence[Sequence[float]], np.ndarray]
+
+
+def _stored_array(vector: Any, dtype: Any) -> np.ndarray:
+    # milvus returns float16 and binary vectors as bytes, some pymilvus
+    # versions wrap them in a single item list
+    if isinstance(vector, list) and vector and isinstance(vector[0], bytes):
+        vector = b"".join(vector)
+    if isinstance(vector, bytes):
+        return np.frombuffer(vector, dtype=dtype)
+    return np.asarray(vector, dtype=dtype)
+
+
+class VectorCodec:
+    """
+    Turns full precision embeddings into the vectors stored in milvus.
+
+    The same codec encodes ingested chunks and search queries. This base
+    codec stores embeddings as they are, as FLOAT_VECTOR.
+    """
+
+    mode = VectorStorageMode.FLOAT
+    data_type = DataType.FLOAT_VECTOR
+    # whether searches over-fetch candidates to rerank them
+    rerank = False
+    # entity field of the vectors search results are reranked with
+    rerank_field = "embedding"
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+        # codec of the vectors stored in `rerank_field`
+        self.rerank_codec: VectorCodec = self
+
+    def encode(self, embeddings: Embeddings) -> List[Any]:
+        """
+        Encodes embeddings for storage and search.
+
+        :param embeddings: full precision embeddings.
+        :returns: encoded vectors.
+        """
+        return list(embeddings)
+
+    def encode_fields(self, embeddings: Embeddings) -> Dict[str, List[Any]]:
+        """
+        Encodes embeddings for every vector field of the storage mode.
+
+        :param embeddings: full precision embeddings.
+        :returns: encoded vectors by field name.
+        """
+        return {"embedding": self.encode(embeddings)}
+
+    def decode(self, vectors: Sequence[Any]) -> np.ndarray:
+        """
+        Turns stored vectors back into float arrays comparable by cosine.
+
+        :param vectors: vectors as returned by milvus.
+        :returns: float32 array, one vector per row.
+        """
+        return np.asarray(vectors, dtype=np.float32)
+
+    def bytes_per_vector(self) -> int:
+        """
+        Size of a stored vector.
+
+        :returns: number of bytes.
+        """
+        return self.dim * 4
+
+
+class Float16Codec(VectorCodec):
+    """Stores embeddings as FLOAT16_VECTOR, halving their size."""
+
+    mode = VectorStorageMode.FLOAT16
+    data_type = DataType.FLOAT16_VECTOR
+
+    def encode(self, embeddings: Embeddings) -> List[Any]:
+        """
+        Encodes embeddings as half precision arrays.
+
+        :param embeddings: full precision embeddings.
+        :returns: float16 arrays.
+        """
+        return list(np.asarray(embeddings, dtype=np.float16))
+
+    def decode(self, vectors: Sequence[Any]) -> np.ndarray:
+        """
+        Turns stored half precision vectors back into float arrays.
+
+        :param vectors: vectors as returned by milvus.
+        :returns: float32 array, one vector per row.
+        """
+        return np.stack(
+            [_stored_array(vector, np.float16) for vector in vectors],
+        ).astype(np.float32)
+
+    def bytes_per_vector(self) -> int:
+        """
+        Size of a stored vector.
+
+        :returns: number of bytes.
+        """
+        return self.dim * 2
+
+
+class ProjectionCodec(VectorCodec):
+    """
+    Stores embeddings projected on fewer dimensions, as FLOAT_VECTOR.
+
+    Projected vectors are normalized again, so cosine similarity keeps
+    working on them.
+    """
+
+    def __init__(
+        self,
+        components: np.ndarray,
+        mean: np.ndarray,
+        mode: VectorStorageMode,
+    ) -> None:
+        super().__init__(dim=components.shape[0])
+        self.components = components.astype(np.float32)
+        self.mean = mean.astype(np.float32)
+        self.mode = mode
+
+    @classmethod
+    def fit_pca(cls, sample: np.ndarray, dim: int) -> "ProjectionCodec":
+        """
+        Fits a PCA projection on a sample of embeddings.
+
+        :param sample: embeddings, one per row, at least `dim` of them.
+        :param dim: number of dimensions to keep.
+        :returns: ProjectionCodec
+        """
+        sample = np.asarray(sample, dtype=np.float32)
+        mean = sample.mean(axis=0)
+        _, _, components = np.linalg.svd(sample - mean, full_matrices=False)
+        return cls(components[:dim], mean, VectorStorageMode.PCA)
+
+    @classmethod
+    def random(cls, input_dim: int, dim: int) -> "ProjectionCodec":
+        """
+        Builds a gaussian random projection, which needs no training data.
+
+        The projection is seeded, so every process builds the same one.
+
+        :param input_dim: dimension of the embeddings.
+        :param dim: number of dimensions to project on.
+        :returns: ProjectionCodec
+        """
+        rng = np.random.default_rng(RANDOM_PROJECTION_SEED)
+        components = rng.standard_normal((dim, input_dim)) / np.sqrt(dim)
+        return cls(
+            components,
+            np.zeros(input_dim),
+            VectorStorageMode.RANDOM_PROJECTION,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ProjectionCodec":
+        """
+        Loads a projection saved with `save`.
+
+        :param path: path of the .npz file.
+        :returns: ProjectionCodec
+        """
+        with np.load(path) as saved:
+            return cls(
+                saved["components"],
+                saved["mean"],
+                VectorStorageMode(str(saved["mode"])),
+            )
+
+    def save(self, path: str) -> None:
+        """
+        Saves the projection.
+
+        :param path: path of the .npz file.
+        """
+        with open(path, "wb") as projection_file:
+            np.savez(
+                projection_file,
+                components=self.components,
+                mean=self.mean,
+                mode=self.mode.value,
+            )
+
+    def encode(self, embeddings: Embeddings) -> List[Any]:
+        """
+        Projects and normalizes embeddings.
+
+        :param embeddings: full precision embeddings.
+        :returns: projected vectors.
+        """
+        projected = (
+            np.asarray(embeddings, dtype=np.float32) - self.mean
+        ) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return (projected / np.maximum(norms, 1e-12)).tolist()  # noqa: WPS432
+
+
+class BinaryCodec(VectorCodec):
+    """
+    Stores the sign bit of every dimension as BINARY_VECTOR, 32x smaller.
+
+    Hamming distance on sign bits only roughly orders the results, so
+    searches over-fetch candidates and rerank them with the half
+    precision embeddings stored alongside, memory mapped by milvus.
+    """
+
+    mode = VectorStorageMode.BINARY
+    data_type = DataType.BINARY_VECTOR
+    rerank = True
+    rerank_field = RERANK_EMBEDDING_FIELD
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        super().__init__(dim)
+        self.rerank_codec = Float16Codec(dim)
+
+    def encode(self, embeddings: Embeddings) -> List[Any]:
+        """
+        Packs the sign bits of the embeddings.
+
+        :param embeddings: full precision embeddings.
+        :returns: packed bits, dim / 8 bytes per vector.
+        """
+        bits = np.packbits(np.asarray(embeddings, dtype=np.float32) > 0, axis=1)
+        return [row.tobytes() for row in bits]
+
+    def encode_fields(self, embeddings: Embeddings) -> Dict[str, List[Any]]:
+        """
+        Encodes embeddings as sign bits and as half precision rerank vectors.
+
+        :param embeddings: full precision embeddings.
+        :returns: encoded vectors by field name.
+        """
+        return {
+            "embedding": self.encode(embeddings),
+            self.rerank_field: self.rerank_codec.encode(embeddings),
+        }
+
+    def decode(self, vectors: Sequence[Any]) -> np.ndarray:
+        """
+        Turns stored sign bits into +1/-1 arrays.
+
+        Cosine similarity of sign vectors follows their hamming distance.
+
+        :param vectors: vectors as returned by milvus.
+        :returns: float32 array, one vector per row.
+        """
+        bits = np.unpackbits(
+            np.stack([_stored_array(vector, np.uint8) for vector in vectors]),
+            axis=1,
+        )
+        return bits.astype(np.float32) * 2 - 1
+
+    def bytes_per_vector(self) -> int:
+        """
+        Size of a stored vector in memory.
+
+        The rerank vectors are memory mapped, only the candidates of a
+        search are read from disk.
+
+        :returns: number of bytes.
+        """
+        return self.dim // 8
+
+
+def load_vector_codec() -> VectorCodec:
+    """
+    Builds the codec of the storage mode configured in settings.
+
+    :returns: VectorCodec
+    :raises FileNotFoundError: if the PCA projection has not been fitted yet.
+    """
+    mode = settings.milvus_vector_storage
+    if mode == VectorStorageMode.FLOAT16:
+        return Float16Codec()
+    if mode == VectorStorageMode.BINARY:
+        return BinaryCodec()
+    if mode == VectorStorageMode.RANDOM_PROJECTION:
+        return ProjectionCodec.random(EMBEDDING_DIM, settings.milvus_vector_reduced_dim)
+    if mode == VectorStorageMode.PCA:
+        if not Path(settings.milvus_vector_projection_path).exists():
+            raise FileNotFoundError(
+                "PCA projection not found, fit it with the milvus migration: "
+                + settings.milvus_vector_projection_path,
+            )
+        return ProjectionCodec.load(settings.milvus_vector_projection_path)
+    return VectorCodec()
+
+
+def get_vector_field_spec() -> Tuple[DataType, int]:
+    """
+    Returns the embedding field type of the storage mode configured in settings.
+
+    Unlike `load_vector_codec` it does not need a fitted PCA projection.
+
+    :returns: data type and dimension of the embedding field.
+    """
+    mode = settings.milvus_vector_storage
+    if mode in {VectorStorageMode.PCA, VectorStorageMode.RANDOM_PROJECTION}:
+        return DataType.FLOAT_VECTOR, settings.milvus_vector_reduced_dim
+    if mode == VectorStorageMode.FLOAT16:
+        return DataType.FLOAT16_VECTOR, EMBEDDING_DIM
+    if mode == VectorStorageMode.BINARY:
+        return DataType.BINARY_VECTOR, EMBEDDING_DIM
+    return DataType.FLOAT_VECTOR, EMBEDDING_DIM
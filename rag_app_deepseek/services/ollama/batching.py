@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Sequence
+
+import httpx
+from ollama import ResponseError
+
+
+def split_into_batches(text: Sequence[str], budget: int) -> List[List[int]]:
+    """
+    Groups texts into batches of at most `budget` characters.
+
+    Consecutive texts are packed together, a text longer than the
+    budget gets a batch of its own.
+
+    :param text: texts to group.
+    :param budget: max number of characters in a batch.
+    :returns: List of batches holding the indexes of their texts.
+    """
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    batch_chars = 0
+    for i, txt in enumerate(text):  # noqa: WPS111
+        if batch and batch_chars + len(txt) > budget:
+            batches.append(batch)
+            batch = []
+            batch_chars = 0
+        batch.append(i)
+        batch_chars += len(txt)
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Tells if a failed ollama request is worth retrying.
+
+    :param error: raised error.
+    :returns: True for connection errors, timeouts, 429 and 5xx responses.
+    """
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, ResponseError):
+        return error.status_code == 429 or error.status_code >= 500  # noqa: WPS432
+    return False
+
+
+class AdaptiveBatchSizer:  # noqa: WPS230
+    """
+    Learns online the embed batch size giving the best throughput.
+
+    Batch sizes (in characters) move on a power of two ladder. Throughput
+    of every size is tracked as an exponentially weighted moving average
+    of characters/sec, every `explore_every` batches a neighbouring size is
+    tried, and the sizer settles on whichever neighbour did best.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        initial: int,
+        min_size: int,
+        max_size: int,
+        explore_every: int = 10,
+        smoothing: float = 0.3,
+    ) -> None:
+        self.ladder = [min_size]
+        while self.ladder[-1] * 2 <= max_size:
+            self.ladder.append(self.ladder[-1] * 2)
+        self.index = min(
+            range(len(self.ladder)),
+            key=lambda i: abs(self.ladder[i] - initial),  # noqa: WPS111
+        )
+        self.explore_every = explore_every
+        self.smoothing = smoothing
+        self.throughput: Dict[int, float] = {}
+        self.batches = 0
+        self.explore_up = True
+
+    def next_budget(self) -> int:
+        """
+        Picks the batch size of the next request.
+
+        :returns: max number of characters per batch.
+        """
+        self.batches += 1
+        if self.batches % self.explore_every:
+            return self.ladder[self.index]
+
+        step = 1 if self.explore_up else -1
+        self.explore_up = not self.explore_up
+        explored = max(self.index + step, 0)
+        return self.ladder[min(explored, len(self.ladder) - 1)]
+
+    def observe(self, budget: int, chars: int, seconds: float) -> None:
+        """
+        Records the latency of a batch.
+
+        Batches filled with less than half of their budget say little
+        about that batch size and are ignored.
+
+        :param budget: batch size the batch was built with.
+        :param chars: number of characters in the batch.
+        :param seconds: latency of the request.
+        """
+        if budget not in self.ladder or chars * 2 < budget or seconds <= 0:
+            return
+
+        index = self.ladder.index(budget)
+        rate = chars / seconds
+        previous = self.throughput.get(index)
+        if previous is None:
+            self.throughput[index] = rate
+        else:
+            self.throughput[index] = previous + self.smoothing * (rate - previous)
+
+        neighbours = [
+            neighbour
+            for neighbour in (self.index - 1, self.index, self.index + 1)
+            if neighbour in self.throughput
+        ]
+        if neighbours:
+            self.index = max(
+                neighbours,
+                key=lambda neighbour: self.throughput[neighbour],
+            )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Returns the current batch size and the throughput of the sizes tried.
+
+        :returns: Dict of stats.
+        """
+        return {
+            "budget": self.ladder[self.index],
+            "chars_per_s": {
+                self.ladder[index]: round(rate, 1)
+                for index, rate in sorted(self.throughput.items())
+            },
+        }
@@ -0,0 +1,32 @@
+from typing import Optional
+
+from rag_app_deepseek.services.cache.embeddings import EmbeddingsCache
+from rag_app_deepseek.services.ollama.batching import AdaptiveBatchSizer
+from rag_app_deepseek.services.ollama.scheduler import OllamaScheduler
+from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.settings import settings
+
+
+def init_ollama_client(embeddings_cache: Optional[EmbeddingsCache]) -> OllamaClient:
+    """
+    Creates the ollama client with its scheduler and batch sizer.
+
+    :param embeddings_cache: cache of the embeddings, if enabled.
+    :returns: OllamaClient
+    """
+    return OllamaClient(
+        embeddings_cache=embeddings_cache,
+        scheduler=OllamaScheduler(
+            embed_concurrency=settings.ollama_embed_concurrency,
+            chat_concurrency=settings.ollama_chat_concurrency,
+        ),
+        batch_sizer=(
+            AdaptiveBatchSizer(
+                initial=settings.ollama_embed_batch_chars,
+                min_size=settings.ollama_embed_batch_min_chars,
+                max_size=settings.ollama_embed_batch_max_chars,
+            )
+            if settings.ollama_embed_batch_adaptive
+            else None
+        ),
+    )
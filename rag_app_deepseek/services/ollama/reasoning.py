@@ -0,0 +1,68 @@
+from typing import List, Tuple
+
+THINK_OPEN_TAG = "<think>"
+THINK_CLOSE_TAG = "</think>"
+
+
+class ReasoningSplitter:
+    """
+    Splits streamed DeepSeek-R1 output into reasoning and answer parts.
+
+    The model wraps its reasoning in <think>...</think> tags. Since a tag
+    may arrive split over several streamed chunks, the tail of a chunk
+    which could be the start of a tag is held back until the next one.
+    """
+
+    def __init__(self) -> None:
+        self.in_think = False
+        self.pending = ""
+
+    def feed(self, content: str) -> List[Tuple[str, str]]:
+        """
+        Splits the next streamed chunk.
+
+        :param content: content of the streamed chunk.
+        :returns: List of (kind, text) parts, kind is "think" or "answer".
+        """
+        parts: List[Tuple[str, str]] = []
+        text = self.pending + content
+        self.pending = ""
+
+        while text:
+            tag = THINK_CLOSE_TAG if self.in_think else THINK_OPEN_TAG
+            kind = "think" if self.in_think else "answer"
+            index = text.find(tag)
+            if index >= 0:
+                if index:
+                    parts.append((kind, text[:index]))
+                text = text[index + len(tag) :]
+                self.in_think = not self.in_think
+                continue
+
+            held = _partial_tag_suffix(text, tag)
+            if len(text) > held:
+                parts.append((kind, text[: len(text) - held]))
+            self.pending = text[len(text) - held :]
+            break
+
+        return parts
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """
+        Returns whatever text is still held back at the end of the stream.
+
+        :returns: List of (kind, text) parts.
+        """
+        if not self.pending:
+            return []
+
+        kind = "think" if self.in_think else "answer"
+        pending, self.pending = self.pending, ""
+        return [(kind, pending)]
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
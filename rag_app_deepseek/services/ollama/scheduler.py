@@ -0,0 +1,193 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import (  # noqa: WPS235
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")  # noqa: WPS111
+
+
+class Priority(enum.IntEnum):
+    """Priority of a request to ollama, lower goes first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclass
+class LaneStats:
+    """Counters of a scheduler lane."""
+
+    requests: int = 0
+    coalesced: int = 0
+    queued: int = 0
+    max_queued: int = 0
+    in_flight: int = 0
+    wait_time_total_s: float = 0
+    wait_time_max_s: float = 0
+
+
+class PriorityLimiter:
+    """
+    Semaphore handing free slots to waiters by priority, then in arrival order.
+
+    Keeps queue depth and time spent waiting for a slot in `stats`.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.stats = LaneStats()
+        self.counter = itertools.count()
+        self.waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []  # noqa: WPS234
+
+    async def acquire(self, priority: Priority) -> None:
+        """
+        Waits for a free slot.
+
+        :param priority: priority of the request.
+        :raises BaseException: if cancelled while waiting.
+        """
+        self.stats.requests += 1
+        if self.stats.in_flight < self.limit and not self.waiters:
+            self.stats.in_flight += 1
+            return
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), waiter))
+        self.stats.queued += 1
+        self.stats.max_queued = max(self.stats.max_queued, self.stats.queued)
+        started_at = time.perf_counter()
+        try:
+            await waiter
+        except BaseException:  # noqa: WPS424
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over right before the cancellation
+                self.release()
+            else:
+                self.stats.queued -= 1
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            self.stats.wait_time_total_s += waited
+            self.stats.wait_time_max_s = max(self.stats.wait_time_max_s, waited)
+
+    def release(self) -> None:
+        """Hands the slot over to the next waiter or frees it."""
+        while self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                self.stats.queued -= 1
+                waiter.set_result(None)
+                return
+        self.stats.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority) -> AsyncIterator[None]:
+        """
+        Holds a slot for the duration of the context.
+
+        :param priority: priority of the request.
+        :yields: once the slot is acquired.
+        """
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class OllamaScheduler:
+    """
+    Limits and orders the requests sent to the single ollama backend.
+
+    Embed and chat requests have separate concurrency limits, interactive
+    requests overtake queued background ones, and identical embed requests
+    already in flight are coalesced into a single call.
+    """
+
+    def __init__(self, embed_concurrency: int, chat_concurrency: int) -> None:
+        self.embed_limiter = PriorityLimiter(embed_concurrency)
+        self.chat_limiter = PriorityLimiter(chat_concurrency)
+        self.inflight_embeds: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    async def embed(
+        self,
+        key: Hashable,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority,
+    ) -> T:
+        """
+        Runs an embed call, sharing the result of an identical one in flight.
+
+        :param key: identity of the call, e.g. model and texts.
+        :param call: makes the actual request.
+        :param priority: priority of the request.
+        :returns: the result of the call.
+        """
+        inflight = self.inflight_embeds.get(key)
+        if inflight is not None:
+            self.embed_limiter.stats.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(self._run(self.embed_limiter, call, priority))
+        self.inflight_embeds[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def chat(self, call: Callable[[], Awaitable[T]], priority: Priority) -> T:
+        """
+        Runs a chat call within the chat concurrency limit.
+
+        :param call: makes the actual request.
+        :param priority: priority of the request.
+        :returns: the result of the call.
+        """
+        return await self._run(self.chat_limiter, call, priority)
+
+    def chat_slot(self, priority: Priority) -> Any:
+        """
+        Holds a chat slot, e.g. for the whole lifetime of a streamed answer.
+
+        :param priority: priority of the request.
+        :returns: async context manager.
+        """
+        return self.chat_limiter.slot(priority)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns queue depth and wait time counters of every lane.
+
+        :returns: Dict of counters by lane.
+        """
+        return {
+            "embed": asdict(self.embed_limiter.stats),
+            "chat": asdict(self.chat_limiter.stats),
+        }
+
+    async def _run(
+        self,
+        limiter: PriorityLimiter,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority,
+    ) -> T:
+        async with limiter.slot(priority):
+            return await call()
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        self.inflight_embeds.pop(key, None)
+        if not task.cancelled():
+            # retrieved here so a failure nobody waits for anymore is not logged
+            task.exception()
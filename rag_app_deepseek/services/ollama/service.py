@@ -1,7 +1,18 @@
-from typing import Sequence
+import asyncio
+import time
+from typing import AsyncIterator, Dict, List, Optional, Sequence
 
-from ollama import AsyncClient, ChatResponse
+from loguru import logger
+from ollama import AsyncClient, ChatResponse, EmbedResponse
 
+from rag_app_deepseek.services.cache.embeddings import EmbeddingsCache
+from rag_app_deepseek.services.metrics.instruments import EMBED_SECONDS, EMBED_TEXTS
+from rag_app_deepseek.services.ollama.batching import (
+    AdaptiveBatchSizer,
+    is_transient_error,
+    split_into_batches,
+)
+from rag_app_deepseek.services.ollama.scheduler import OllamaScheduler, Priority
 from rag_app_deepseek.settings import settings
 
 
@@ -15,32 +26,245 @@ class OllamaClient:
     client = AsyncClient(host=settings.ollama_host)
     model = settings.ollama_model
 
-    async def generate_embeddings_from_text(self, text: Sequence[str]):  # type: ignore
+    def __init__(
+        self,
+        embeddings_cache: Optional[EmbeddingsCache] = None,
+        scheduler: Optional[OllamaScheduler] = None,
+        batch_sizer: Optional[AdaptiveBatchSizer] = None,
+    ) -> None:
+        self.embeddings_cache = embeddings_cache
+        self.scheduler = scheduler
+        self.batch_sizer = batch_sizer
+
+    async def generate_embeddings_from_text(
+        self,
+        text: Sequence[str],
+        use_cache: bool = True,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> EmbedResponse:
         """
         Generates embeddings from the text provided.
 
+        When the client has an embeddings cache, only the texts
+        missing from it are sent to the model. Texts are sent in
+        batches of bounded size, see `_embed`.
+
         :param text: string to generate embeddings for
+        :param use_cache: whether to go through the embeddings cache
+        :param priority: priority of the request in the ollama scheduler
         :returns: text embeddings result
         """
-        return await self.client.embed(model=self.model, input=text)
+        labels = {"priority": priority.name.lower()}
+        EMBED_TEXTS.labels(**labels).observe(len(text))
+        with EMBED_SECONDS.labels(**labels).time():
+            if self.embeddings_cache is None or not use_cache:
+                embeddings = await self._embed(text, priority)
+            else:
+                embeddings = await self._embed_with_cache(
+                    self.embeddings_cache,
+                    text,
+                    priority,
+                )
+        return EmbedResponse(model=self.model, embeddings=embeddings)
 
-    async def chat(self, user_prompt: str, system_prompt: str = "") -> ChatResponse:
+    async def chat(
+        self,
+        user_prompt: str,
+        system_prompt: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> ChatResponse:
         """
         Chat api.
 
         :param user_prompt: query prompt provided by end user
         :param system_prompt: admin prompt to keep llm guided
+        :param priority: priority of the request in the ollama scheduler
 
         :returns: ChatResponse
         """
+        msgs = self._build_messages(user_prompt, system_prompt)
+        if self.scheduler is None:
+            return await self.client.chat(model=self.model, messages=msgs)
+
+        return await self.scheduler.chat(
+            call=lambda: self.client.chat(model=self.model, messages=msgs),
+            priority=priority,
+        )
+
+    async def chat_stream(
+        self,
+        user_prompt: str,
+        system_prompt: str = "",
+    ) -> AsyncIterator[ChatResponse]:
+        """
+        Streaming chat api.
+
+        Closing the returned iterator closes the http stream,
+        which makes ollama stop the generation. With a scheduler the
+        chat slot is held until the stream is over.
+
+        :param user_prompt: query prompt provided by end user
+        :param system_prompt: admin prompt to keep llm guided
+
+        :returns: AsyncIterator of ChatResponse chunks
+        """
+        msgs = self._build_messages(user_prompt, system_prompt)
+        if self.scheduler is None:
+            return await self.client.chat(model=self.model, messages=msgs, stream=True)
+
+        return self._scheduled_chat_stream(msgs)
+
+    async def _embed_batch(
+        self,
+        text: Sequence[str],
+        priority: Priority,
+        budget: int,
+    ) -> EmbedResponse:
+        if self.scheduler is None:
+            return await self._timed_embed(text, budget)
+
+        return await self.scheduler.embed(
+            key=(self.model, tuple(text)),
+            call=lambda: self._timed_embed(text, budget),
+            priority=priority,
+        )
+
+    async def _timed_embed(self, text: Sequence[str], budget: int) -> EmbedResponse:
+        """
+        Calls the embed api, feeding its latency to the batch sizer.
+
+        Only the request itself is timed, time spent queued in the
+        scheduler or in between retries says nothing about the batch size.
+
+        :param text: texts to embed.
+        :param budget: batch size the batch was built with.
+        :returns: text embeddings result.
+        """
+        started_at = time.perf_counter()
+        embed_res = await self.client.embed(model=self.model, input=text)
+        if self.batch_sizer is not None:
+            self.batch_sizer.observe(
+                budget,
+                sum(len(txt) for txt in text),
+                time.perf_counter() - started_at,
+            )
+        return embed_res
+
+    async def _embed_batch_with_retries(
+        self,
+        text: Sequence[str],
+        priority: Priority,
+        budget: int,
+    ) -> EmbedResponse:
+        for attempt in range(1, settings.ollama_embed_retries + 1):
+            try:
+                return await self._embed_batch(text, priority, budget)
+            except Exception as error:
+                if not is_transient_error(error):
+                    raise
+                await self._wait_before_retry(len(text), error, attempt)
+        return await self._embed_batch(text, priority, budget)
+
+    async def _wait_before_retry(
+        self,
+        batch_size: int,
+        error: Exception,
+        attempt: int,
+    ) -> None:
+        delay = settings.ollama_embed_retry_backoff_s * 2 ** (attempt - 1)
+        logger.warning(
+            f"embed batch of {batch_size} texts failed ({error!r}), retry {attempt} in {delay}s",  # noqa: E501
+        )
+        await asyncio.sleep(delay)
+
+    async def _embed(  # noqa: WPS210
+        self,
+        text: Sequence[str],
+        priority: Priority,
+    ) -> List[Sequence[float]]:
+        """
+        Embeds the texts in batches of bounded size, in parallel.
+
+        :param text: texts to embed.
+        :param priority: priority of the requests in the ollama scheduler.
+        :returns: embedding of every text, in order.
+        """
+        if self.batch_sizer is None:
+            budget = settings.ollama_embed_batch_chars
+        else:
+            budget = self.batch_sizer.next_budget()
+
+        embeddings: List[Sequence[float]] = [[] for _ in text]
+        parallelism = asyncio.Semaphore(settings.ollama_embed_batch_parallelism)
+
+        async def embed_batch(indexes: List[int]) -> None:  # noqa: WPS430
+            async with parallelism:
+                embed_res = await self._embed_batch_with_retries(
+                    [text[index] for index in indexes],
+                    priority,
+                    budget,
+                )
+            for index, embedding in zip(indexes, embed_res.embeddings):
+                embeddings[index] = embedding
+
+        await asyncio.gather(
+            *(embed_batch(indexes) for indexes in split_into_batches(text, budget)),
+        )
+        return embeddings
+
+    async def _embed_with_cache(  # noqa: WPS210
+        self,
+        embeddings_cache: EmbeddingsCache,
+        text: Sequence[str],
+        priority: Priority,
+    ) -> List[Sequence[float]]:
+        cached = await embeddings_cache.get_many(self.model, text)
+        embeddings: Dict[str, Sequence[float]] = {
+            cached_text: hit
+            for cached_text, hit in zip(text, cached)
+            if hit is not None
+        }
+
+        # a text missing several times is embedded once
+        missing_text = [
+            unique for unique in dict.fromkeys(text) if unique not in embeddings
+        ]
+        if missing_text:
+            missing_embeddings = await self._embed(missing_text, priority)
+            await embeddings_cache.set_many(
+                self.model,
+                missing_text,
+                missing_embeddings,
+            )
+            embeddings.update(zip(missing_text, missing_embeddings))
+        return [embeddings[txt] for txt in text]
+
+    def _build_messages(
+        self,
+        user_prompt: str,
+        system_prompt: str,
+    ) -> List[Dict[str, str]]:
         msgs = []
 
         if system_prompt:
-            msgs.append({"role": "system", "content": user_prompt})
+            msgs.append({"role": "system", "content": system_prompt})
 
         msgs.append({"role": "user", "content": user_prompt})
 
-        return await self.client.chat(
-            model=self.model,
-            messages=msgs,
-        )
+        return msgs
+
+    async def _scheduled_chat_stream(
+        self,
+        msgs: List[Dict[str, str]],
+    ) -> AsyncIterator[ChatResponse]:
+        async with self.scheduler.chat_slot(Priority.INTERACTIVE):  # type: ignore
+            stream = await self.client.chat(
+                model=self.model,
+                messages=msgs,
+                stream=True,
+            )
+            try:  # noqa: WPS501
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()  # type: ignore
@@ -0,0 +1,355 @@
+import operator
+import re
+from collections import deque
+from typing import (
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+# end of a sentence in utf-8 text, its punctuation is captured to be kept
+SENTENCE_END = re.compile(rb"([.!?])\s+")
+# same boundary as SENTENCE_END, found in the text before encoding it
+TEXT_SENTENCE_END = re.compile(r"[.!?][ \t\n\r\f\v]+")
+TOKEN = re.compile(r"\w+|[^\w\s]")
+# number of characters encoded and split into sentences at once
+SENTENCE_BLOCK_SIZE = 65536
+# bytes matching the mask are utf-8 continuation bytes
+UTF8_CONTINUATION_MASK = 0xC0
+UTF8_CONTINUATION = 0x80
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in the text.
+
+    Counts words and punctuation marks, which is close to what
+    subword tokenizers produce for plain english text.
+
+    :param text: text to count the tokens of.
+    :returns: estimated number of tokens.
+    """
+    return len(TOKEN.findall(text))
+
+
+class ChunkUnit(NamedTuple):
+    """Piece of text the chunker packs: a sentence or a cut of a long one."""
+
+    data: bytes
+    tokens: int
+
+
+def iter_sentences(text: str, block_size: int = SENTENCE_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Lazily splits the text into utf-8 encoded sentences.
+
+    The text is encoded a block at a time, every block ending on a
+    sentence boundary, so the regex engine does the splitting while the
+    sentences in memory stay bounded. Only ascii whitespace ends a
+    sentence, e.g. a no-break space does not.
+
+    :param text: text to split.
+    :param block_size: min number of characters of a block.
+    :yields: stripped, non empty sentences.
+    """
+    start = 0
+    while start < len(text):
+        boundary = TEXT_SENTENCE_END.search(text, start + block_size)
+        end = len(text) if boundary is None else boundary.start() + 1
+        # bodies of the sentences alternate with their final punctuation
+        parts = SENTENCE_END.split(text[start:end].encode().strip())
+        ends = [*parts[1::2], b""]
+        yield from filter(None, map(operator.add, parts[::2], ends))
+        start = len(text) if boundary is None else boundary.end()
+
+
+def is_continuation(byte: int) -> bool:
+    """
+    Checks whether a byte continues a multi-byte utf-8 character.
+
+    :param byte: byte of utf-8 text.
+    :returns: if the byte does not start a character.
+    """
+    return byte & UTF8_CONTINUATION_MASK == UTF8_CONTINUATION
+
+
+def char_start(data: bytes, index: int) -> int:
+    """
+    Moves an index back to the start of the character it is in.
+
+    :param data: utf-8 encoded text.
+    :param index: index in the text.
+    :returns: index of a character boundary, at most `index`.
+    """
+    while 0 < index < len(data) and is_continuation(data[index]):
+        index -= 1
+    return index
+
+
+def next_char(data: bytes, index: int) -> int:
+    """
+    Returns the index of the character following the one at `index`.
+
+    :param data: utf-8 encoded text.
+    :param index: index of a character boundary.
+    :returns: index of the next character boundary.
+    """
+    index += 1
+    while index < len(data) and is_continuation(data[index]):
+        index += 1
+    return index
+
+
+def drop_last_word(head: bytes) -> bytes:
+    """
+    Drops the partial last word of a piece cut in the middle of a word.
+
+    :param head: utf-8 encoded piece of text.
+    :returns: the piece up to its last whitespace, as is without any.
+    """
+    if head[-1:].isspace():
+        return head
+    words = head.rsplit(None, 1)
+    return words[0] if len(words) == 2 else head
+
+
+def join_units(units: Iterable[ChunkUnit]) -> str:
+    """
+    Joins units into a chunk.
+
+    :param units: units of the chunk.
+    :returns: decoded chunk.
+    """
+    return b" ".join([unit.data for unit in units]).decode()
+
+
+class TextChunker:
+    """
+    Packs text into chunks bounded in utf-8 bytes and optionally in tokens.
+
+    Sentences are packed greedily, a sentence that does not fit in a
+    chunk on its own is cut on whitespace. Consecutive chunks can share
+    up to `overlap` bytes of trailing sentences. Sentences are encoded
+    once and handled as bytes, every chunk is decoded once.
+    """
+
+    def __init__(
+        self,
+        limit: int = 200,
+        overlap: int = 0,
+        max_tokens: Optional[int] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        self.limit = limit
+        self.overlap = overlap
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+
+    def make_unit(self, data: bytes) -> ChunkUnit:
+        """
+        Measures a piece of text.
+
+        :param data: utf-8 encoded piece of text.
+        :returns: ChunkUnit
+        """
+        if self.max_tokens is None:
+            return ChunkUnit(data, 0)
+        return ChunkUnit(data, self.count_tokens(data.decode()))
+
+    def fits(self, unit: ChunkUnit, size: int = -1, tokens: int = 0) -> bool:
+        """
+        Checks whether a unit fits after the units of a chunk.
+
+        :param unit: unit to add.
+        :param size: joined size of the chunk, -1 when empty.
+        :param tokens: number of tokens of the chunk.
+        :returns: if the chunk with the unit is within the limits.
+        """
+        return size + 1 + len(unit.data) <= self.limit and (
+            self.max_tokens is None or tokens + unit.tokens <= self.max_tokens
+        )
+
+    def split_sentence(self, sentence: bytes) -> List[ChunkUnit]:
+        """
+        Splits a sentence into units which fit in a chunk on their own.
+
+        A sentence over the limits is cut at the last whitespace within
+        the limits, or right at the limits for a single overlong word.
+
+        :param sentence: utf-8 encoded sentence to split.
+        :returns: List of ChunkUnit
+        """
+        units = []
+        start = 0
+        while start < len(sentence):
+            if len(sentence) - start <= self.limit:
+                unit = self.make_unit(sentence[start:])
+                if self.fits(unit):
+                    units.append(unit)
+                    break
+
+            end = self.cut(sentence, start)
+            units.append(self.make_unit(sentence[start:end]))
+            start = len(sentence) - len(sentence[end:].lstrip())
+        return units
+
+    def cut(self, data: bytes, start: int = 0) -> int:
+        """
+        Cuts the longest piece of the text within the limits.
+
+        :param data: utf-8 encoded text over the limits.
+        :param start: index the piece starts at, not a whitespace.
+        :returns: index the piece ends at, trailing whitespace excluded.
+        """
+        end = char_start(data, start + self.limit)
+        if self.max_tokens is not None:
+            end = self.cut_tokens(data, start, end)
+
+        head = data[start:end]
+        next_byte = data[end : end + 1]
+        if next_byte and not next_byte.isspace():
+            head = drop_last_word(head)
+        head = head.rstrip()
+        # a character over the limit on its own is kept whole
+        return start + len(head) if head else next_char(data, start)
+
+    def cut_tokens(self, data: bytes, start: int, end: int) -> int:
+        """
+        Cuts a piece of the text to the max number of tokens.
+
+        :param data: utf-8 encoded text.
+        :param start: index the piece starts at.
+        :param end: index the piece ends at.
+        :returns: index the piece ends at once cut.
+        """
+        head = data[start:end].decode()
+        for index, match in enumerate(TOKEN.finditer(head)):
+            if index == self.max_tokens:
+                return start + len(head[: match.start()].encode())
+        return end
+
+    def iter_pieces(self, text: str) -> Iterator[bytes]:
+        """
+        Lazily splits the text into pieces of at most `limit` bytes.
+
+        :param text: text to split.
+        :yields: the sentences of the text, cut when over the limit.
+        """
+        for sentence in iter_sentences(text):
+            start = 0
+            while len(sentence) - start > self.limit:
+                end = self.cut(sentence, start)
+                yield sentence[start:end]
+                start = len(sentence) - len(sentence[end:].lstrip())
+            if start < len(sentence):
+                yield sentence[start:]
+
+    def iter_units(self, text: str) -> Iterator[ChunkUnit]:
+        """
+        Lazily splits the text into units which fit in a chunk on their own.
+
+        :param text: text to split.
+        :yields: the sentences of the text, cut when over the limits.
+        """
+        if self.max_tokens is None:
+            yield from (ChunkUnit(piece, 0) for piece in self.iter_pieces(text))
+            return
+
+        for sentence in iter_sentences(text):
+            yield from self.split_sentence(sentence)
+
+    def iter_chunks(self, text: str) -> Iterator[str]:
+        """
+        Lazily splits the text into chunks.
+
+        :param text: text to split.
+        :returns: Iterator of chunks of text.
+        """
+        if self.max_tokens is None and not self.overlap:
+            return self.iter_packed_chunks(text)
+        return self.iter_window_chunks(text)
+
+    def iter_packed_chunks(self, text: str) -> Iterator[str]:
+        """
+        Lazily splits the text into chunks bounded in bytes, without overlap.
+
+        The default settings, which only need the sizes of the pieces.
+
+        :param text: text to split.
+        :yields: chunks of text.
+        """
+        packed: List[bytes] = []
+        size = -1  # joined size, counting a separator in between pieces
+        for piece in self.iter_pieces(text):
+            size += len(piece) + 1
+            if packed and size > self.limit:
+                yield b" ".join(packed).decode()
+                packed = []
+                size = len(piece)
+            packed.append(piece)
+
+        if packed:
+            yield b" ".join(packed).decode()
+
+    def iter_window_chunks(self, text: str) -> Iterator[str]:
+        """
+        Lazily splits the text into chunks bounded in tokens or overlapping.
+
+        :param text: text to split.
+        :yields: chunks of text.
+        """
+        window: Deque[ChunkUnit] = deque()
+        size = -1  # joined size, counting a separator in between units
+        tokens = 0
+        fresh = False  # whether the window holds units not emitted yet
+
+        for unit in self.iter_units(text):
+            if window and not self.fits(unit, size, tokens):
+                if fresh:
+                    yield join_units(window)
+                    fresh = False
+                size, tokens = self.drop_overlapped(window, size, tokens, unit)
+
+            window.append(unit)
+            size += len(unit.data) + 1
+            tokens += unit.tokens
+            fresh = True
+
+        if fresh:
+            yield join_units(window)
+
+    def drop_overlapped(
+        self,
+        window: Deque[ChunkUnit],
+        size: int,
+        tokens: int,
+        unit: ChunkUnit,
+    ) -> Tuple[int, int]:
+        """
+        Drops the units of an emitted chunk that the next one does not repeat.
+
+        Trailing units within the overlap are kept, as long as the next
+        unit still fits with them.
+
+        :param window: units of the emitted chunk, shrunk in place.
+        :param size: joined size of the window.
+        :param tokens: number of tokens of the window.
+        :param unit: next unit to add to the window.
+        :returns: joined size and number of tokens of the remaining units.
+        """
+        if not self.overlap:
+            window.clear()
+            return -1, 0
+
+        while window:
+            if size <= self.overlap and self.fits(unit, size, tokens):
+                break
+            dropped = window.popleft()
+            size -= len(dropped.data) + 1
+            tokens -= dropped.tokens
+        return size, tokens
@@ -1,20 +1,74 @@
-import traceback
-from dataclasses import dataclass
+import asyncio
+from contextlib import suppress
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from typing import List
+from functools import partial
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from aiokafka import AIOKafkaConsumer
+from aiokafka import (
+    AIOKafkaConsumer,
+    AIOKafkaProducer,
+    ConsumerRebalanceListener,
+    ConsumerRecord,
+    TopicPartition,
+)
 from fastapi import FastAPI
 from loguru import logger
-from pydantic import BaseModel
-from pymilvus import MilvusClient
+from pydantic import BaseModel, ValidationError, ValidationInfo, field_validator
 
+from rag_app_deepseek.services.cache.answers import SemanticAnswerCache
+from rag_app_deepseek.services.kafka.dlq import DeadLetterQueue
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+from rag_app_deepseek.services.metrics.instruments import (
+    INGEST_BATCH_CHUNKS,
+    INGEST_BATCH_MESSAGES,
+    INGEST_CHUNKS,
+    INGEST_DEAD_LETTERS,
+)
+from rag_app_deepseek.services.milvus.schema import check_metadata_bytes
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.ollama.scheduler import Priority
 from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.services.text_embeddings.dedup import (
+    ChunkDeduplicator,
+    chunk_content_hash,
+)
+from rag_app_deepseek.services.text_embeddings.failures import (
+    FailureKind,
+    classify_failure,
+    retry_transient,
+    supervise,
+)
 from rag_app_deepseek.services.text_embeddings.service import (
     InsertTextWithEmbeddingsIntoMilvusInput,
     insert_text_with_embeddings_into_milvus,
     split_text_into_chunks,
 )
+from rag_app_deepseek.settings import settings
+
+# fields of TextEmbeddingsBatch holding a value per chunk
+CHUNK_FIELDS = (
+    "chunks",
+    "timestamps",
+    "hashes",
+    "sources",
+    "tenants",
+    "documents",
+    "chunk_records",
+    "embeddings",
+    "ids",
+)
 
 
 @dataclass
@@ -23,53 +77,861 @@ class KafkaMsgText(BaseModel):
 
     text: str
     timestamp: datetime
+    # where the text comes from and who owns it, searches filter on them
+    source: str = ""
+    tenant: str = ""
+    # groups the chunks of a document published as several messages,
+    # the partition and offset of the message if unset
+    document_id: str = ""
+
+    @field_validator("source", "tenant", "document_id")
+    @classmethod
+    def check_byte_length(cls, field_value: str, info: ValidationInfo) -> str:
+        """
+        Refuses metadata longer than its VARCHAR field, milvus would reject it.
+
+        :param field_value: value of the field.
+        :param info: name of the field.
+        :returns: the value.
+        """
+        return check_metadata_bytes(str(info.field_name), field_value)
 
 
-async def text_embeddings_consumer_handler(app: FastAPI) -> None:  # noqa: WPS210 WPS231
+async def collect_kafka_batch(
+    consumer: AIOKafkaConsumer,
+    max_size: int,
+    linger_ms: int,
+) -> List[ConsumerRecord]:
     """
-    Handle kafka consumer messages.
+    Collects a micro batch of kafka messages.
 
-    :param app: FastAPI object.
-    :raises Exception: In case we fail generate embeddings or insert into milvus.
-    :raises RuntimeError: If the data list is empty.
+    Blocks until at least one message is available, then keeps polling
+    until either the batch is full or the linger time has passed.
+    Messages keep their order within each partition.
+
+    :param consumer: kafka consumer to poll.
+    :param max_size: max number of messages in the batch.
+    :param linger_ms: max time to wait for the batch to fill up.
+    :returns: List of consumer records.
+    """
+    loop = asyncio.get_running_loop()
+    records: List[ConsumerRecord] = []
+    deadline = None
+
+    while len(records) < max_size:
+        if deadline is None:
+            timeout_ms = linger_ms
+        else:
+            timeout_ms = int((deadline - loop.time()) * 1000)
+            if timeout_ms <= 0:
+                break
+
+        polled = await consumer.getmany(
+            timeout_ms=timeout_ms,
+            max_records=max_size - len(records),
+        )
+        for partition_records in polled.values():
+            records.extend(partition_records)
+
+        if records and deadline is None:
+            deadline = loop.time() + linger_ms / 1000
+
+    return records
+
+
+def get_batch_commit_offsets(
+    records: Sequence[ConsumerRecord],
+) -> Dict[TopicPartition, int]:
+    """
+    Computes the offsets to commit once a batch has been processed.
+
+    :param records: processed consumer records.
+    :returns: Dict of partition to the next offset to consume.
+    """
+    offsets: Dict[TopicPartition, int] = {}
+    for record in records:
+        topic_partition = TopicPartition(record.topic, record.partition)
+        offsets[topic_partition] = max(
+            offsets.get(topic_partition, 0),
+            record.offset + 1,
+        )
+    return offsets
+
+
+@dataclass
+class TextEmbeddingsBatch:
+    """A micro batch of kafka messages flowing through the pipeline stages."""
+
+    seq: int
+    records: Sequence[ConsumerRecord]
+    chunks: List[str] = field(default_factory=list)
+    timestamps: List[int] = field(default_factory=list)
+    hashes: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    tenants: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    # index in records of the message of every chunk
+    chunk_records: List[int] = field(default_factory=list)
+    embeddings: Sequence[Sequence[float]] = field(default_factory=list)
+    ids: List[int] = field(default_factory=list)
+    insert_count: int = 0
+    skipped_count: int = 0
+    dead_letter_count: int = 0
+
+    def keep_chunks(self, indexes: Sequence[int]) -> None:
+        """
+        Drops all the chunks of the batch but some.
+
+        :param indexes: indexes of the chunks to keep, in order.
+        """
+        for name in CHUNK_FIELDS:
+            values = getattr(self, name)
+            if values:
+                setattr(self, name, [values[index] for index in indexes])
+
+    def select(self, indexes: Sequence[int]) -> "TextEmbeddingsBatch":
+        """
+        Copies some of the chunks of the batch into a batch of their own.
+
+        :param indexes: indexes of the chunks to copy, in order.
+        :returns: batch of the chunks.
+        """
+        part = replace(self)
+        part.keep_chunks(indexes)
+        return part
+
+    def combine(self, parts: Sequence["TextEmbeddingsBatch"]) -> None:
+        """
+        Replaces the chunks of the batch with the chunks of processed parts of it.
+
+        :param parts: parts made with `select`, in order.
+        """
+        for name in CHUNK_FIELDS:
+            values = [value for part in parts for value in getattr(part, name)]
+            setattr(self, name, values)
+        self.insert_count = sum(part.insert_count for part in parts)
+
+    def group_chunks_by_record(self) -> Dict[int, List[int]]:
+        """
+        Groups the chunks of the batch by message.
+
+        :returns: Dict of index of a message to the indexes of its chunks.
+        """
+        groups: Dict[int, List[int]] = {}
+        for index, record_index in enumerate(self.chunk_records):
+            groups.setdefault(record_index, []).append(index)
+        return groups
+
+
+class RecordFailure(NamedTuple):
+    """A message of a batch which could not be ingested."""
+
+    record_index: int
+    error: Exception
+    # chunks of the message claimed by the deduplicator
+    hashes: Sequence[str] = ()
+
+
+def parse_text_embeddings_batch(batch: TextEmbeddingsBatch) -> List[RecordFailure]:
+    """
+    Parses the messages of the batch and splits them into chunks.
+
+    :param batch: batch to parse, chunks are stored on it.
+    :returns: the messages which are not valid text messages.
+    """
+    failures: List[RecordFailure] = []
+    for record_index, record in enumerate(batch.records):
+        try:
+            msg_json = KafkaMsgText.model_validate_json(record.value)
+        except ValidationError as error:
+            failures.append(RecordFailure(record_index, error))
+            continue
+        msg_chunks = split_text_into_chunks(
+            msg_json.text,
+            limit=settings.text_embeddings_chunk_max_bytes,
+            overlap=settings.text_embeddings_chunk_overlap_bytes,
+            max_tokens=settings.text_embeddings_chunk_max_tokens,
+        )
+        batch.chunks.extend(msg_chunks)
+        batch.timestamps.extend(
+            [int(msg_json.timestamp.timestamp())] * len(msg_chunks),
+        )
+        batch.hashes.extend(
+            chunk_content_hash(chunk, msg_json.source, msg_json.tenant)
+            for chunk in msg_chunks
+        )
+        batch.sources.extend([msg_json.source] * len(msg_chunks))
+        batch.tenants.extend([msg_json.tenant] * len(msg_chunks))
+        document_id = msg_json.document_id or f"{record.partition}:{record.offset}"
+        batch.documents.extend([document_id] * len(msg_chunks))
+        batch.chunk_records.extend([record_index] * len(msg_chunks))
+    return failures
+
+
+async def dedup_text_embeddings_batch(
+    deduplicator: ChunkDeduplicator,
+    batch: TextEmbeddingsBatch,
+) -> None:
+    """
+    Drops the chunks of the batch which are already stored or in flight.
+
+    Makes redelivered messages idempotent and saves embedding repeated text.
+
+    :param deduplicator: deduplicator of ingested chunks.
+    :param batch: batch to deduplicate, chunks are filtered in place.
+    """
+    if not batch.chunks:
+        return
+
+    new = await deduplicator.filter_new(batch.hashes)
+    batch.skipped_count = len(batch.chunks) - len(new)
+    batch.keep_chunks(new)
+
+
+async def embed_text_embeddings_batch(
+    ollama_client: OllamaClient,
+    batch: TextEmbeddingsBatch,
+) -> None:
+    """
+    Generates the embeddings of all the chunks of the batch in one call.
+
+    :param ollama_client: client to generate the embeddings.
+    :param batch: batch to embed, embeddings are stored on it.
+    """
+    if not batch.chunks:
+        return
+
+    embeddings_res = await ollama_client.generate_embeddings_from_text(
+        text=batch.chunks,
+        use_cache=settings.embeddings_cache_ingestion,
+        priority=Priority.BACKGROUND,
+    )
+    batch.embeddings = embeddings_res.embeddings
+
+
+async def insert_text_embeddings_batch(
+    milvus_client: MilvusAsyncClient,
+    batch: TextEmbeddingsBatch,
+    vector_codec: Optional[VectorCodec] = None,
+) -> None:
+    """
+    Inserts all the chunks of the batch into milvus with a single bulk insert.
+
+    :param milvus_client: client to make queries to milvus.
+    :param batch: batch to insert.
+    :param vector_codec: encodes the embeddings for the storage mode.
+    :raises RuntimeError: If the insert count does not match the input size.
+    """
+    if not batch.chunks:
+        return
+
+    vector_fields = {"embedding": list(batch.embeddings)}
+    if vector_codec is not None:
+        vector_fields = vector_codec.encode_fields(batch.embeddings)
+    text_with_embeddings: List[InsertTextWithEmbeddingsIntoMilvusInput] = []
+    for i, chunk in enumerate(batch.chunks):  # noqa: WPS111
+        text_with_embeddings.append(
+            InsertTextWithEmbeddingsIntoMilvusInput(
+                text=chunk,
+                **{name: vectors[i] for name, vectors in vector_fields.items()},
+                timestamp_unix=batch.timestamps[i],
+                text_hash=batch.hashes[i],
+                source=batch.sources[i],
+                tenant=batch.tenants[i],
+                document_id=batch.documents[i],
+            ),
+        )
+    insert_res = await insert_text_with_embeddings_into_milvus(
+        milvus_client=milvus_client,
+        text_with_embeddings=text_with_embeddings,
+    )
+    if insert_res["insert_count"] != len(text_with_embeddings):
+        raise RuntimeError(
+            "Database insertion failed: insert count does not match the input size.",  # noqa: E501
+        )
+    batch.insert_count = insert_res["insert_count"]
+    batch.ids = list(insert_res["ids"])
+
+
+async def index_text_embeddings_batch(
+    lexical_index: BM25Index,
+    batch: TextEmbeddingsBatch,
+) -> None:
+    """
+    Adds the inserted chunks of the batch to the BM25 index.
+
+    Adding builds segments and may flush and compact them on disk, so it
+    runs in a worker thread, searches are not held up meanwhile. The chunks
+    are in milvus already, a failure is only logged: the message must not
+    be consumed again, and the index is rebuilt with --rebuild-lexical-index.
+
+    :param lexical_index: BM25 index of the chunks.
+    :param batch: inserted batch.
+    """
+    if not batch.ids:
+        return
+    try:
+        await asyncio.to_thread(lexical_index.add, batch.ids, batch.chunks)
+    except Exception as error:
+        logger.error(
+            f"BM25 indexing of batch {batch.seq} failed, {len(batch.ids)} chunks missing from the lexical index: {error!r}",  # noqa: E501
+        )
+
+
+async def process_text_embeddings_batch(
+    ollama_client: OllamaClient,
+    milvus_client: MilvusAsyncClient,
+    records: Sequence[ConsumerRecord],
+    deduplicator: Optional[ChunkDeduplicator] = None,
+    vector_codec: Optional[VectorCodec] = None,
+    lexical_index: Optional[BM25Index] = None,
+) -> int:
+    """
+    Chunks, embeds and inserts a batch of kafka messages sequentially.
+
+    :param ollama_client: client to generate the embeddings.
+    :param milvus_client: client to make queries to milvus.
+    :param records: consumer records to process.
+    :param deduplicator: skips the chunks already ingested if set.
+    :param vector_codec: encodes the embeddings for the storage mode.
+    :param lexical_index: BM25 index fed with the inserted chunks if set.
+    :returns: number of chunks inserted.
+    :raises ValidationError: if a message is not a valid text message.
     """
-    ollama_client: OllamaClient = app.state.ollama_client
-    milvus_client: MilvusClient = app.state.milvus_client
-    consumer: AIOKafkaConsumer = app.state.kafka_consumer_text_embeddings
+    batch = TextEmbeddingsBatch(seq=0, records=records)
+    failures = parse_text_embeddings_batch(batch)
+    if failures:
+        raise failures[0].error
+    if deduplicator is not None:
+        await dedup_text_embeddings_batch(deduplicator, batch)
+    await embed_text_embeddings_batch(ollama_client, batch)
+    await insert_text_embeddings_batch(milvus_client, batch, vector_codec)
+    if lexical_index is not None:
+        await index_text_embeddings_batch(lexical_index, batch)
+    return batch.insert_count
 
-    async for msg in consumer:
+
+class TextEmbeddingsPipeline:
+    """
+    Staged ingestion pipeline: poll + parse -> embed -> insert -> commit.
+
+    Every stage runs as its own set of asyncio tasks connected with bounded
+    queues, so ollama keeps embedding the next batch while milvus is still
+    inserting the previous one, and a slow stage applies backpressure on the
+    stages before it. Batches may finish out of order, but offsets are only
+    committed once every earlier batch is done too, which keeps at-least-once
+    delivery for every partition.
+
+    Messages a stage keeps failing on are moved to the dead letter queue,
+    so a bad message does not stop the partition, see `run_isolating`.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        consumer: AIOKafkaConsumer,
+        ollama_client: OllamaClient,
+        milvus_client: MilvusAsyncClient,
+        batch_max_size: int,
+        batch_linger_ms: int,
+        embed_concurrency: int,
+        insert_concurrency: int,
+        queue_size: int,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        deduplicator: Optional[ChunkDeduplicator] = None,
+        vector_codec: Optional[VectorCodec] = None,
+        lexical_index: Optional[BM25Index] = None,
+        dead_letter_queue: Optional[DeadLetterQueue] = None,
+    ) -> None:
+        self.consumer = consumer
+        self.dead_letter_queue = dead_letter_queue
+        self.answer_cache = answer_cache
+        self.deduplicator = deduplicator
+        self.vector_codec = vector_codec
+        self.lexical_index = lexical_index
+        self.ollama_client = ollama_client
+        self.milvus_client = milvus_client
+        self.batch_max_size = batch_max_size
+        self.batch_linger_ms = batch_linger_ms
+        self.embed_concurrency = embed_concurrency
+        self.insert_concurrency = insert_concurrency
+        self.embed_queue: "asyncio.Queue[TextEmbeddingsBatch]" = asyncio.Queue(
+            queue_size,
+        )
+        self.insert_queue: "asyncio.Queue[TextEmbeddingsBatch]" = asyncio.Queue(
+            queue_size,
+        )
+        self.commit_queue: "asyncio.Queue[TextEmbeddingsBatch]" = asyncio.Queue(
+            queue_size,
+        )
+        # batches polled so far and batches whose offsets are committed
+        self.polled_count = 0
+        self.committed_count = 0
+        self.committed_event = asyncio.Event()
+        self.running = False
+
+    async def run(self) -> None:
+        """
+        Runs all the stages until one of them fails or the task is cancelled.
+
+        :raises Exception: the first error raised by any of the stages.
+        """
+        tasks = [asyncio.create_task(self.poll_stage())]
+        tasks += [
+            asyncio.create_task(self.embed_stage())
+            for _ in range(self.embed_concurrency)
+        ]
+        tasks += [
+            asyncio.create_task(self.insert_stage())
+            for _ in range(self.insert_concurrency)
+        ]
+        tasks.append(asyncio.create_task(self.commit_stage()))
+
+        self.running = True
         try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            self.running = False
+            self.committed_event.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def poll_stage(self) -> None:
+        """Polls micro batches from kafka and parses them."""
+        while True:  # noqa: WPS457
+            records = await collect_kafka_batch(
+                consumer=self.consumer,
+                max_size=self.batch_max_size,
+                linger_ms=self.batch_linger_ms,
+            )
+            if not records:
+                continue
+
+            batch = TextEmbeddingsBatch(seq=self.polled_count, records=records)
+            self.polled_count += 1
+            failures = parse_text_embeddings_batch(batch)
+            INGEST_BATCH_MESSAGES.observe(len(records))
+            INGEST_BATCH_CHUNKS.observe(len(batch.chunks))
             logger.info(
-                f"processing kafka consumer msg for topic: {msg.topic}, partition: {msg.partition}, offset: {msg.offset}",  # noqa: E501
+                f"processing kafka consumer batch {batch.seq} of {len(records)} msgs, {len(batch.chunks)} chunks",  # noqa: E501
             )
-            msg_json = KafkaMsgText.model_validate_json(msg.value)
-            chunks = split_text_into_chunks(msg_json.text)
-            embeddings_res = await ollama_client.generate_embeddings_from_text(
-                text=chunks,
+            for failure in failures:
+                await self.dead_letter(batch, "parse", failure)
+            await self.embed_queue.put(batch)
+
+    async def embed_stage(self) -> None:
+        """Drops known chunks of parsed batches and embeds the new ones."""
+        while True:  # noqa: WPS457
+            batch = await self.embed_queue.get()
+            if self.deduplicator is not None:
+                await self.retry(
+                    partial(dedup_text_embeddings_batch, self.deduplicator, batch),
+                )
+            await self.run_isolating(
+                "embed",
+                batch,
+                partial(embed_text_embeddings_batch, self.ollama_client),
             )
+            await self.insert_queue.put(batch)
 
-            text_with_embeddings: List[InsertTextWithEmbeddingsIntoMilvusInput] = []
-            for i, chunk in enumerate(chunks):  # noqa: WPS111
-                text_with_embeddings.append(
-                    InsertTextWithEmbeddingsIntoMilvusInput(
-                        text=chunk,
-                        embedding=embeddings_res.embeddings[i],
-                        timestamp_unix=int(msg_json.timestamp.timestamp()),
+    async def insert_stage(self) -> None:
+        """Inserts embedded batches into milvus and drops the answers they make stale."""
+        while True:  # noqa: WPS457
+            batch = await self.insert_queue.get()
+            await self.run_isolating(
+                "insert",
+                batch,
+                partial(
+                    self.retry_step,
+                    partial(
+                        insert_text_embeddings_batch,
+                        self.milvus_client,
+                        vector_codec=self.vector_codec,
                     ),
-                )
-            insert_res = insert_text_with_embeddings_into_milvus(
-                milvus_client=milvus_client,
-                text_with_embeddings=text_with_embeddings,
+                ),
             )
-            if insert_res["insert_count"] != len(text_with_embeddings):
-                raise RuntimeError(
-                    "Database insertion failed: insert count does not match the input size.",  # noqa: E501
+            if self.lexical_index is not None:
+                await index_text_embeddings_batch(self.lexical_index, batch)
+            if self.answer_cache is not None:
+                self.answer_cache.invalidate_similar(
+                    batch.embeddings,
+                    settings.answer_cache_invalidation_threshold,
                 )
+            INGEST_CHUNKS.labels(result="duplicate").inc(batch.skipped_count)
+            INGEST_CHUNKS.labels(result="inserted").inc(batch.insert_count)
+            await self.commit_queue.put(batch)
+
+    async def commit_stage(self) -> None:
+        """
+        Commits offsets of inserted batches in the order they were polled.
+
+        Offsets of partitions no longer assigned to this consumer are not
+        committed, their new owner processes the batches again.
+        """
+        done: Dict[int, TextEmbeddingsBatch] = {}
+        while True:  # noqa: WPS457
+            batch = await self.commit_queue.get()
+            done[batch.seq] = batch
+
+            ready: List[TextEmbeddingsBatch] = []
+            while self.committed_count in done:
+                ready.append(done.pop(self.committed_count))
+                self.committed_count += 1
+            if not ready:
+                continue
 
-            await consumer.commit()
+            offsets = get_batch_commit_offsets(
+                [record for ready_batch in ready for record in ready_batch.records],
+            )
+            assignment = self.consumer.assignment()
+            offsets = {
+                topic_partition: offset
+                for topic_partition, offset in offsets.items()
+                if topic_partition in assignment
+            }
+            if offsets:
+                await self.consumer.commit(offsets)
+            self.committed_event.set()
             logger.info(
-                f"processed kafka consumer msg for topic: {msg.topic}, partition: {msg.partition}, offset: {msg.offset}",  # noqa: E501
+                f"processed kafka consumer batches {ready[0].seq}..{ready[-1].seq}, {sum(ready_batch.insert_count for ready_batch in ready)} chunks, {sum(ready_batch.skipped_count for ready_batch in ready)} duplicates skipped, {sum(ready_batch.dead_letter_count for ready_batch in ready)} msgs dead lettered, offsets: {offsets}",  # noqa: E501
+            )
+
+    async def retry(self, call: Callable[[], Awaitable[None]]) -> None:
+        """
+        Calls a step of the pipeline again while it fails with transient errors.
+
+        :param call: coroutine function of the step.
+        """
+        await retry_transient(
+            call,
+            retries=settings.text_embeddings_retries,
+            backoff_s=settings.text_embeddings_retry_backoff_s,
+            backoff_max_s=settings.text_embeddings_retry_backoff_max_s,
+        )
+
+    async def retry_step(
+        self,
+        step: Callable[[TextEmbeddingsBatch], Awaitable[None]],
+        batch: TextEmbeddingsBatch,
+    ) -> None:
+        """
+        Runs a step on a batch, again while it fails with transient errors.
+
+        Only for steps whose client does not retry on its own, the embed
+        calls are already retried by the ollama client.
+
+        :param step: coroutine function processing a batch in place.
+        :param batch: batch to process.
+        """
+        await self.retry(partial(step, batch))
+
+    async def run_isolating(
+        self,
+        stage: str,
+        batch: TextEmbeddingsBatch,
+        step: Callable[[TextEmbeddingsBatch], Awaitable[None]],
+    ) -> None:
+        """
+        Runs a step on a batch, dead lettering the messages it fails on.
+
+        When the batch fails, the step runs once on the chunks of every
+        message on their own and the messages failing again are dead
+        lettered, the others go on. Transient errors mean ollama or milvus
+        is down rather than messages being bad: they are raised, never
+        dead lettered, and the batch is processed again once the consumer
+        restarts.
+
+        :param stage: name of the stage, for the dead letters.
+        :param batch: batch to process.
+        :param step: coroutine function processing a batch in place.
+        :raises Exception: the transient error of the batch or of a message.
+        """
+        try:
+            await step(batch)
+        except Exception as batch_error:
+            if classify_failure(batch_error) == FailureKind.TRANSIENT:
+                raise
+            logger.warning(
+                f"{stage} of kafka consumer batch {batch.seq} failed ({batch_error!r}), isolating its msgs",  # noqa: E501
+            )
+        else:
+            return
+
+        parts, failures = await self.isolate(batch, step)
+        batch.combine(parts)
+        for failure in failures:
+            await self.dead_letter(batch, stage, failure)
+
+    async def isolate(
+        self,
+        batch: TextEmbeddingsBatch,
+        step: Callable[[TextEmbeddingsBatch], Awaitable[None]],
+    ) -> Tuple[List[TextEmbeddingsBatch], List[RecordFailure]]:
+        """
+        Runs a step on the chunks of every message of a batch on their own.
+
+        :param batch: batch the step failed on.
+        :param step: coroutine function processing a batch in place.
+        :returns: parts of the messages which went through, failed messages.
+        :raises Exception: the first transient error, without going on.
+        """
+        parts: List[TextEmbeddingsBatch] = []
+        failures: List[RecordFailure] = []
+        for record_index, indexes in batch.group_chunks_by_record().items():
+            part = batch.select(indexes)
+            try:
+                await step(part)
+            except Exception as error:
+                if classify_failure(error) == FailureKind.TRANSIENT:
+                    raise
+                failures.append(RecordFailure(record_index, error, part.hashes))
+            else:
+                parts.append(part)
+        return parts, failures
+
+    async def dead_letter(
+        self,
+        batch: TextEmbeddingsBatch,
+        stage: str,
+        failure: RecordFailure,
+    ) -> None:
+        """
+        Moves a failed message of a batch to the dead letter queue.
+
+        Its offset is committed with the batch. Without a dead letter
+        queue, the message is only logged.
+
+        :param batch: batch of the message.
+        :param stage: stage which failed.
+        :param failure: failed message.
+        """
+        batch.dead_letter_count += 1
+        INGEST_DEAD_LETTERS.labels(stage=stage).inc()
+        if self.deduplicator is not None:
+            # its chunks can be ingested again if the dead letter is replayed
+            self.deduplicator.forget(failure.hashes)
+        record = batch.records[failure.record_index]
+        if self.dead_letter_queue is None:
+            logger.error(
+                f"kafka message {record.topic}:{record.partition}:{record.offset} dropped, {stage} failed: {failure.error!r}",  # noqa: E501
             )
-        except Exception:
-            logger.error(traceback.format_exc())
-            raise  # to avoid losing the stack trace!
+            return
+        await self.retry(
+            partial(
+                self.dead_letter_queue.publish,
+                record,
+                stage,
+                classify_failure(failure.error),
+                failure.error,
+            ),
+        )
+
+    async def drain(self, timeout_s: float) -> bool:
+        """
+        Waits until the batches polled so far are processed and committed.
+
+        :param timeout_s: max time to wait.
+        :returns: whether all of them were committed in time.
+        """
+        polled_count = self.polled_count
+        if self.running:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wait_committed(polled_count), timeout_s)
+        return self.committed_count >= polled_count
+
+    async def stop(self, timeout_s: float) -> bool:
+        """
+        Stops fetching new messages and drains the batches in flight.
+
+        :param timeout_s: max time to wait for the batches in flight.
+        :returns: whether all of them were committed in time.
+        """
+        self.consumer.pause(*self.consumer.assignment())
+        return await self.drain(timeout_s)
+
+    async def _wait_committed(self, count: int) -> None:
+        while self.running and self.committed_count < count:
+            self.committed_event.clear()
+            await self.committed_event.wait()
+
+
+class TextEmbeddingsRebalanceListener(ConsumerRebalanceListener):
+    """
+    Commits the processed offsets of a pipeline before its partitions move.
+
+    Without it, the batches in flight when a consumer joins or leaves the
+    group would be processed again by the new owner of their partitions.
+    Messages still lingering in the batch being collected are, like any
+    uncommitted message, delivered again to the new owner.
+    """
+
+    def __init__(self, pipeline: TextEmbeddingsPipeline, timeout_s: float) -> None:
+        self.pipeline = pipeline
+        self.timeout_s = timeout_s
+
+    async def on_partitions_revoked(self, revoked: List[TopicPartition]) -> None:
+        """
+        Drains the pipeline so its offsets are committed while still owned.
+
+        :param revoked: partitions taken away from the consumer.
+        """
+        if not revoked:
+            return
+        drained = await self.pipeline.drain(self.timeout_s)
+        if drained:
+            logger.info(f"kafka partitions revoked after draining: {revoked}")
+        else:
+            logger.warning(
+                f"kafka partitions revoked before draining, batches in flight will be processed again: {revoked}",  # noqa: E501
+            )
+
+    async def on_partitions_assigned(self, assigned: List[TopicPartition]) -> None:
+        """
+        Logs the partitions assigned to the consumer.
+
+        :param assigned: partitions given to the consumer.
+        """
+        logger.info(f"kafka partitions assigned: {assigned}")
+
+
+async def run_text_embeddings_consumer(  # noqa: WPS210 WPS211
+    consumer: AIOKafkaConsumer,
+    ollama_client: OllamaClient,
+    milvus_client: MilvusAsyncClient,
+    answer_cache: Optional[SemanticAnswerCache] = None,
+    vector_codec: Optional[VectorCodec] = None,
+    lexical_index: Optional[BM25Index] = None,
+    stopping: Optional[asyncio.Event] = None,
+    producer: Optional[AIOKafkaProducer] = None,
+) -> None:
+    """
+    Subscribes a started consumer to the text topic and runs its pipeline.
+
+    Once `stopping` is set, the consumer stops fetching and the batches in
+    flight are committed before returning, so the consumer can leave the
+    group without its partitions being processed again.
+
+    Subscribing resets the assignment of the consumer, so when this runs
+    again after a failure, messages are fetched from the committed offsets.
+
+    :param consumer: started kafka consumer of the consumer group.
+    :param ollama_client: client to generate the embeddings.
+    :param milvus_client: client to insert the chunks.
+    :param answer_cache: cache of the answers made stale by new chunks.
+    :param vector_codec: encodes the stored vectors.
+    :param lexical_index: BM25 index fed with the chunks.
+    :param stopping: event to stop the consumer gracefully, runs until
+        cancelled if unset.
+    :param producer: publishes the messages the pipeline keeps failing on
+        to the dead letter topic, they are only logged if unset.
+    :raises Exception: In case we fail generate embeddings or insert into milvus.
+    """
+    deduplicator = None
+    if settings.text_embeddings_dedup_enabled:
+        deduplicator = ChunkDeduplicator(
+            milvus_client=milvus_client,
+            max_size=settings.text_embeddings_dedup_local_size,
+        )
+    pipeline = TextEmbeddingsPipeline(
+        consumer=consumer,
+        ollama_client=ollama_client,
+        milvus_client=milvus_client,
+        batch_max_size=settings.kafka_consumer_batch_max_size,
+        batch_linger_ms=settings.kafka_consumer_batch_linger_ms,
+        embed_concurrency=settings.text_embeddings_embed_concurrency,
+        insert_concurrency=settings.text_embeddings_insert_concurrency,
+        queue_size=settings.text_embeddings_pipeline_queue_size,
+        answer_cache=answer_cache,
+        deduplicator=deduplicator,
+        vector_codec=vector_codec,
+        lexical_index=lexical_index,
+        dead_letter_queue=(
+            DeadLetterQueue(producer, settings.kafka_topic_text_dlq)
+            if producer is not None
+            else None
+        ),
+    )
+    consumer.subscribe(
+        [settings.kafka_topic_text],
+        listener=TextEmbeddingsRebalanceListener(
+            pipeline,
+            settings.kafka_consumer_rebalance_timeout_s,
+        ),
+    )
+    run_task = asyncio.create_task(pipeline.run())
+    waited: List["asyncio.Future[Any]"] = [run_task]
+    if stopping is not None:
+        waited.append(asyncio.create_task(stopping.wait()))
+    try:
+        await asyncio.wait(waited, return_when=asyncio.FIRST_COMPLETED)
+        if not run_task.done():
+            drained = await pipeline.stop(settings.kafka_consumer_rebalance_timeout_s)
+            logger.info(f"kafka consumer stopped, drained: {drained}")
+            return
+        run_task.result()
+    finally:
+        for task in waited:
+            task.cancel()
+        await asyncio.gather(*waited, return_exceptions=True)
+
+
+async def supervise_text_embeddings_consumer(  # noqa: WPS211
+    consumer: AIOKafkaConsumer,
+    ollama_client: OllamaClient,
+    milvus_client: MilvusAsyncClient,
+    answer_cache: Optional[SemanticAnswerCache] = None,
+    vector_codec: Optional[VectorCodec] = None,
+    lexical_index: Optional[BM25Index] = None,
+    stopping: Optional[asyncio.Event] = None,
+    producer: Optional[AIOKafkaProducer] = None,
+) -> None:
+    """
+    Runs a text embeddings consumer, restarting it with backoff when it fails.
+
+    :param consumer: started kafka consumer of the consumer group.
+    :param ollama_client: client to generate the embeddings.
+    :param milvus_client: client to insert the chunks.
+    :param answer_cache: cache of the answers made stale by new chunks.
+    :param vector_codec: encodes the stored vectors.
+    :param lexical_index: BM25 index fed with the chunks.
+    :param stopping: event to stop the consumer gracefully.
+    :param producer: publishes the dead letters.
+    """
+    await supervise(
+        partial(
+            run_text_embeddings_consumer,
+            consumer=consumer,
+            ollama_client=ollama_client,
+            milvus_client=milvus_client,
+            answer_cache=answer_cache,
+            vector_codec=vector_codec,
+            lexical_index=lexical_index,
+            stopping=stopping,
+            producer=producer,
+        ),
+        name="kafka consumer",
+        backoff_s=settings.kafka_consumer_restart_backoff_s,
+        backoff_max_s=settings.kafka_consumer_restart_backoff_max_s,
+        stopping=stopping,
+    )
+
+
+async def text_embeddings_consumer_handler(app: FastAPI) -> None:
+    """
+    Handle kafka consumer messages with the staged ingestion pipeline.
+
+    The consumer is restarted whenever it fails.
+
+    :param app: FastAPI object.
+    """
+    await supervise_text_embeddings_consumer(
+        consumer=app.state.kafka_consumer_text_embeddings,
+        ollama_client=app.state.ollama_client,
+        milvus_client=app.state.milvus_client,
+        answer_cache=app.state.answer_cache,
+        vector_codec=app.state.vector_codec,
+        lexical_index=app.state.lexical_index,
+        producer=app.state.kafka_producer,
+    )
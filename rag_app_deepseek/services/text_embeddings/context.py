@@ -0,0 +1,103 @@
+import re
+from typing import Dict, Hashable, List, NamedTuple, Sequence
+
+from rag_app_deepseek.services.text_embeddings.chunking import estimate_tokens
+
+WHITESPACE = re.compile(r"\s+")
+
+
+class ContextChunk(NamedTuple):
+    """Chunk picked for the context of a prompt."""
+
+    id: int
+    text: str
+    # document the chunk was split from, empty if unknown
+    document_id: str = ""
+
+
+def normalize_for_comparison(text: str) -> str:
+    """
+    Normalizes the case and whitespace of a text for comparisons.
+
+    :param text: text to normalize.
+    :returns: normalized text.
+    """
+    return WHITESPACE.sub(" ", text).strip().lower()
+
+
+def merge_texts(first: str, second: str) -> str:
+    """
+    Joins consecutive chunks of a document, dropping the text they overlap on.
+
+    The chunker repeats whole sentences of a chunk at the start of the
+    next one, so only overlaps starting at a word boundary are merged.
+    An overlap is never longer than the later chunk, so only the end of
+    the earlier one is scanned: merging a whole document chunk by chunk
+    stays linear in its length.
+
+    :param first: earlier chunk.
+    :param second: later chunk.
+    :returns: merged text.
+    """
+    for start in range(max(0, len(first) - len(second)), len(first)):
+        if start and not first[start - 1].isspace():
+            continue
+        if second.startswith(first[start:]):
+            return first[:start] + second
+    return f"{first} {second}"
+
+
+def group_chunks(chunks: Sequence[ContextChunk]) -> List[List[ContextChunk]]:
+    """
+    Groups the chunks of the same document, ordered by id.
+
+    Chunks of an unknown document are never grouped. Groups are ordered
+    by their best chunk, chunks being best first.
+
+    :param chunks: chunks, best first.
+    :returns: groups of chunks.
+    """
+    groups: Dict[Hashable, List[ContextChunk]] = {}
+    for position, chunk in enumerate(chunks):
+        key: Hashable = chunk.document_id or position
+        groups.setdefault(key, []).append(chunk)
+    return [sorted(group, key=lambda chunk: chunk.id) for group in groups.values()]
+
+
+def build_context(chunks: Sequence[ContextChunk], token_budget: int) -> List[str]:
+    """
+    Packs the chunks into context blocks under a token budget.
+
+    Chunks of the same document are merged into one block, without the
+    text they overlap on. Chunks whose text is already in the context
+    are dropped. Blocks are packed best first while they fit in the
+    budget.
+
+    :param chunks: chunks picked for the context, best first.
+    :param token_budget: max estimated tokens of the context.
+    :returns: context blocks.
+    """
+    blocks: List[str] = []
+    packed: List[str] = []
+    remaining_tokens = token_budget
+    for group in group_chunks(chunks):
+        block = ""
+        block_texts: List[str] = []
+        for chunk in group:
+            normalized = normalize_for_comparison(chunk.text)
+            if not normalized or any(
+                normalized in text for text in packed + block_texts
+            ):
+                continue
+            block = merge_texts(block, chunk.text) if block else chunk.text
+            block_texts.append(normalized)
+        if not block:
+            continue
+
+        tokens = estimate_tokens(block)
+        if tokens > remaining_tokens:
+            continue
+        blocks.append(block)
+        packed += block_texts
+        remaining_tokens -= tokens
+    return blocks
@@ -0,0 +1,129 @@
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Sequence, Set
+
+from rag_app_deepseek.services.cache.embeddings import normalize_text
+from rag_app_deepseek.services.milvus.schema import MilvusCollections
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+
+# size of the content hashes digest, in bytes, the text_hash field stores its hex
+CONTENT_HASH_SIZE = 16
+
+
+def chunk_content_hash(text: str, source: str = "", tenant: str = "") -> str:
+    """
+    Hashes the content of a chunk.
+
+    The same text ingested from two sources, or by two tenants, is
+    stored for each of them, so that searches filtered on a source
+    still find it.
+
+    :param text: text of the chunk.
+    :param source: where the chunk comes from.
+    :param tenant: owner of the chunk.
+    :returns: hex digest of the tenant, the source and the normalized text.
+    """
+    digest = hashlib.blake2b(digest_size=CONTENT_HASH_SIZE)
+    for part in (tenant, source):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(normalize_text(text).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class ChunkDedupStats:
+    """Counters of the chunk deduplicator."""
+
+    new: int = 0
+    skipped_seen: int = 0
+    skipped_stored: int = 0
+
+
+class ChunkDeduplicator:
+    """
+    Filters out chunks which are already stored in milvus.
+
+    Chunks are identified by the hash of their content, which milvus
+    stores in the `text_hash` field. Hashes of recently ingested chunks
+    are remembered in a bounded LRU, so repeated chunks do not even
+    reach milvus and a chunk claimed by a batch still in flight is not
+    ingested a second time by a concurrent one.
+    """
+
+    def __init__(self, milvus_client: MilvusAsyncClient, max_size: int) -> None:
+        self.milvus_client = milvus_client
+        self.max_size = max_size
+        self.seen: "OrderedDict[str, None]" = OrderedDict()
+        self.stats = ChunkDedupStats()
+
+    async def filter_new(self, hashes: Sequence[str]) -> List[int]:
+        """
+        Finds the chunks which still have to be embedded and inserted.
+
+        The returned chunks are claimed right away: later calls skip them.
+
+        :param hashes: content hashes of the chunks.
+        :returns: indexes of the new chunks, in order.
+        :raises BaseException: if milvus can not be queried, claims are released.
+        """
+        candidates = self._claim(hashes)
+        if not candidates:
+            return []
+
+        try:
+            stored = await self._get_stored(list(candidates))
+        except BaseException:  # noqa: WPS424
+            self.forget(candidates)
+            raise
+
+        self.stats.skipped_stored += len(stored)
+        self.stats.new += len(candidates) - len(stored)
+        return [
+            index for text_hash, index in candidates.items() if text_hash not in stored
+        ]
+
+    def forget(self, hashes: Iterable[str]) -> None:
+        """
+        Releases the claim on chunks which could not be ingested.
+
+        :param hashes: content hashes of the chunks.
+        """
+        for text_hash in hashes:
+            self.seen.pop(text_hash, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns the dedup counters.
+
+        :returns: Dict of counters.
+        """
+        return {**asdict(self.stats), "size": len(self.seen)}
+
+    def _claim(self, hashes: Sequence[str]) -> Dict[str, int]:
+        candidates: Dict[str, int] = {}
+        for index, text_hash in enumerate(hashes):
+            if text_hash in self.seen:
+                self.seen.move_to_end(text_hash)
+            elif text_hash not in candidates:
+                candidates[text_hash] = index
+        self.stats.skipped_seen += len(hashes) - len(candidates)
+
+        for claimed in candidates:
+            self.seen[claimed] = None
+        while len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+        return candidates
+
+    async def _get_stored(self, hashes: List[str]) -> Set[str]:
+        hashes_list = json.dumps(hashes)
+        rows = await self.milvus_client.query(
+            collection_name=MilvusCollections.TEXT_EMBEDDINGS,
+            filter=f"text_hash in {hashes_list}",
+            output_fields=["text_hash"],
+            # rows inserted right before a crash must be visible to the redelivery
+            consistency_level="Strong",
+        )
+        return {row["text_hash"] for row in rows}
@@ -0,0 +1,192 @@
+import asyncio
+import enum
+import traceback
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import grpc
+from aiokafka.errors import KafkaConnectionError, KafkaTimeoutError
+from loguru import logger
+from pydantic import ValidationError
+from pymilvus.exceptions import (
+    ConnectError,
+    MilvusException,
+    MilvusUnavailableException,
+)
+from pymilvus.grpc_gen import common_pb2
+
+from rag_app_deepseek.services.ollama.batching import is_transient_error
+
+ResultT = TypeVar("ResultT")
+# timeouts and connection errors, ollama errors are told apart by status
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    KafkaConnectionError,
+    KafkaTimeoutError,
+    ConnectError,
+    MilvusUnavailableException,
+)
+# codes of the milvus server errors worth retrying: service unavailable, too
+# many requests, rate limit and resource insufficient, the others are raised
+# again for the same input, like a value over the VARCHAR max length
+MILVUS_TRANSIENT_CODES = frozenset((2, 4, 8, 12))
+# legacy codes of the same errors, set along with the codes above
+MILVUS_TRANSIENT_LEGACY_CODES = frozenset(
+    (
+        common_pb2.RateLimit,
+        common_pb2.NotReadyServe,
+        common_pb2.NotReadyCoordActivating,
+    ),
+)
+GRPC_TRANSIENT_CODES = frozenset(
+    (
+        grpc.StatusCode.UNAVAILABLE,
+        grpc.StatusCode.DEADLINE_EXCEEDED,
+        grpc.StatusCode.RESOURCE_EXHAUSTED,
+    ),
+)
+
+
+class FailureKind(str, enum.Enum):  # noqa: WPS600
+    """Why the ingestion of a message failed."""
+
+    # the message is not a valid text message, retrying will not help
+    INVALID = "invalid"
+    # ollama, milvus or kafka are unavailable or overloaded, worth retrying
+    TRANSIENT = "transient"
+    # ollama or milvus refused the message
+    PERMANENT = "permanent"
+
+
+def classify_failure(error: BaseException) -> FailureKind:
+    """
+    Classifies an error raised while ingesting messages.
+
+    :param error: raised error.
+    :returns: kind of the failure.
+    """
+    if isinstance(error, ValidationError):
+        return FailureKind.INVALID
+    if is_transient_error(error) or isinstance(error, TRANSIENT_ERRORS):
+        return FailureKind.TRANSIENT
+    if is_transient_milvus_error(error):
+        return FailureKind.TRANSIENT
+    return FailureKind.PERMANENT
+
+
+def is_transient_milvus_error(error: BaseException) -> bool:
+    """
+    Tells if a milvus call failed because milvus is unavailable or overloaded.
+
+    Server errors are told apart by code. Once pymilvus runs out of
+    retries, it raises the last error as the cause of its own.
+
+    :param error: raised error.
+    :returns: True for timeouts, unavailability and rate limiting.
+    """
+    if isinstance(error, grpc.RpcError):
+        return error.code() in GRPC_TRANSIENT_CODES
+    if not isinstance(error, MilvusException):
+        return False
+    if error.code in MILVUS_TRANSIENT_CODES:
+        return True
+    if error.compatible_code in MILVUS_TRANSIENT_LEGACY_CODES:
+        return True
+    cause = error.__cause__
+    return cause is not None and is_transient_milvus_error(cause)
+
+
+def get_backoff_delay(attempt: int, backoff_s: float, backoff_max_s: float) -> float:
+    """
+    Computes the exponential backoff delay before an attempt.
+
+    :param attempt: number of failures so far, from 1.
+    :param backoff_s: delay after the first failure.
+    :param backoff_max_s: max delay.
+    :returns: delay in seconds.
+    """
+    return min(backoff_s * 2 ** (attempt - 1), backoff_max_s)
+
+
+async def retry_transient(
+    call: Callable[[], Awaitable[ResultT]],
+    retries: int,
+    backoff_s: float,
+    backoff_max_s: float,
+) -> ResultT:
+    """
+    Calls again a coroutine function failing with transient errors.
+
+    :param call: coroutine function to call.
+    :param retries: max number of retries.
+    :param backoff_s: delay before the first retry, doubled on every retry.
+    :param backoff_max_s: max delay before a retry.
+    :returns: the result of the call.
+    :raises Exception: the last error, or the first one which is not transient.
+    """
+    attempt = 0
+    while True:  # noqa: WPS457
+        try:
+            return await call()
+        except Exception as error:
+            attempt += 1
+            if attempt > retries or classify_failure(error) != FailureKind.TRANSIENT:
+                raise
+            delay = get_backoff_delay(attempt, backoff_s, backoff_max_s)
+            logger.warning(f"{error!r}, retry {attempt} in {delay}s")
+            await asyncio.sleep(delay)
+
+
+async def supervise(
+    run: Callable[[], Awaitable[None]],
+    name: str,
+    backoff_s: float,
+    backoff_max_s: float,
+    stopping: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Runs a long running coroutine function again whenever it fails.
+
+    The delay before a restart doubles on every failure in a row, it is
+    reset once a run lasts longer than the max delay.
+
+    :param run: coroutine function to supervise.
+    :param name: name of the supervised task, for the logs.
+    :param backoff_s: delay before the first restart.
+    :param backoff_max_s: max delay before a restart.
+    :param stopping: stops restarting once set.
+    """
+    loop = asyncio.get_running_loop()
+    failures = 0
+    while True:  # noqa: WPS457
+        started_at = loop.time()
+        try:
+            await run()
+            return
+        except Exception:
+            logger.error(f"{name} failed:\n{traceback.format_exc()}")
+
+        if loop.time() - started_at > backoff_max_s:
+            failures = 0
+        failures += 1
+        delay = get_backoff_delay(failures, backoff_s, backoff_max_s)
+        logger.warning(f"restarting {name} in {delay}s, failure {failures} in a row")
+        if await wait_stopping(delay, stopping):
+            return
+
+
+async def wait_stopping(delay: float, stopping: Optional[asyncio.Event]) -> bool:
+    """
+    Waits before a restart, unless stopping.
+
+    :param delay: delay before the restart.
+    :param stopping: stops restarting once set.
+    :returns: whether stopping was set.
+    """
+    if stopping is None:
+        await asyncio.sleep(delay)
+        return False
+    with suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(stopping.wait(), delay)
+    return stopping.is_set()
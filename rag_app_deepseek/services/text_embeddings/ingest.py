@@ -0,0 +1,224 @@
+import asyncio
+import codecs
+import json
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Iterator, List, Optional
+
+from aiokafka import AIOKafkaProducer
+from pydantic import BaseModel, ValidationError, ValidationInfo, field_validator
+
+from rag_app_deepseek.services.milvus.schema import check_metadata_bytes
+from rag_app_deepseek.services.text_embeddings.service import iter_text_chunks
+from rag_app_deepseek.settings import settings
+
+# raw text documents are chunked in pieces of about this many characters
+TEXT_PIECE_CHARS = 65536
+PARAGRAPH_BOUNDARY = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"[.!?]\s")
+
+
+class IngestDocument(BaseModel):
+    """Document of a bulk ingestion."""
+
+    text: str
+    # ingestion time if unset
+    timestamp: Optional[datetime] = None
+    source: str = ""
+    tenant: str = ""
+    # chunks of a document are merged in prompts, a new id if unset
+    document_id: str = ""
+
+    @field_validator("source", "tenant", "document_id")
+    @classmethod
+    def check_byte_length(cls, field_value: str, info: ValidationInfo) -> str:
+        """
+        Refuses metadata longer than its VARCHAR field, milvus would reject it.
+
+        :param field_value: value of the field.
+        :param info: name of the field.
+        :returns: the value.
+        """
+        return check_metadata_bytes(str(info.field_name), field_value)
+
+
+class IngestError(ValueError):
+    """Invalid document in a bulk ingestion."""
+
+
+async def iter_lines(
+    stream: AsyncIterator[bytes],
+    max_line_bytes: int,
+) -> AsyncIterator[bytes]:
+    """
+    Splits a stream into lines as it is received.
+
+    :param stream: body of the request.
+    :param max_line_bytes: max bytes of a line.
+    :yields: lines, without their line feed.
+    :raises IngestError: on a line too long, once the lines before it are read.
+    """
+    buffer = bytearray()
+    line_count = 0
+    async for data in stream:
+        searched = len(buffer)
+        buffer += data
+        end = buffer.rfind(b"\n", searched)
+        if end >= 0:
+            lines = bytes(buffer[:end]).split(b"\n")
+            del buffer[: end + 1]  # noqa: WPS420
+            line_count += len(lines)
+            for line in lines:
+                yield line
+        if len(buffer) > max_line_bytes:
+            raise IngestError(f"line {line_count + 1} is too long")
+    yield bytes(buffer)
+
+
+async def iter_ndjson_documents(
+    stream: AsyncIterator[bytes],
+    max_document_bytes: int,
+) -> AsyncIterator[IngestDocument]:
+    """
+    Parses a NDJSON stream as it is received, one document per line.
+
+    :param stream: body of the request.
+    :param max_document_bytes: max bytes of a line.
+    :yields: documents, blank lines are skipped.
+    :raises IngestError: on a line too long or not a valid document.
+    """
+    line_number = 0
+    async for line in iter_lines(stream, max_document_bytes):
+        line_number += 1
+        if line.strip():
+            yield parse_ndjson_line(line, line_number)
+
+
+def parse_ndjson_line(line: bytes, line_number: int) -> IngestDocument:
+    """
+    Parses a line of a NDJSON stream.
+
+    :param line: json of the document.
+    :param line_number: position of the line, for errors.
+    :returns: the document.
+    :raises IngestError: when not a valid document.
+    """
+    try:
+        return IngestDocument.model_validate_json(line)
+    except ValidationError as error:
+        raise IngestError(
+            f"line {line_number} is not a valid document: {error}",
+        ) from error
+
+
+def cut_text_piece(text: str) -> int:
+    """
+    Finds where to cut a piece of a long text, at a paragraph or sentence end.
+
+    :param text: text to cut.
+    :returns: length of the piece.
+    """
+    for boundary in (PARAGRAPH_BOUNDARY, SENTENCE_END):
+        ends = [match.end() for match in boundary.finditer(text)]
+        if ends:
+            return ends[-1]
+    return len(text)
+
+
+async def iter_text_pieces(
+    stream: AsyncIterator[bytes],
+    piece_chars: int = TEXT_PIECE_CHARS,
+) -> AsyncIterator[str]:
+    """
+    Cuts a raw text stream into pieces as it is received.
+
+    Pieces end at a paragraph or sentence boundary when there is one,
+    so they can be chunked one at a time.
+
+    :param stream: utf-8 body of the request.
+    :param piece_chars: characters buffered before a piece is cut.
+    :yields: pieces of the text.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = ""
+    async for data in stream:
+        buffer += decoder.decode(data)
+        while len(buffer) >= piece_chars:
+            cut = cut_text_piece(buffer[:piece_chars])
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield buffer
+
+
+def iter_document_messages(document: IngestDocument) -> Iterator[bytes]:
+    """
+    Chunks a document into text embeddings kafka messages.
+
+    Chunks are cut like the consumer does, so it stores them as they are.
+    They share a document id, so searches merge them back together.
+
+    :param document: document to chunk.
+    :yields: json of the `KafkaMsgText` of every chunk.
+    """
+    timestamp = document.timestamp or datetime.now(timezone.utc)
+    document_id = document.document_id or uuid.uuid4().hex
+    for chunk in iter_text_chunks(
+        document.text,
+        limit=settings.text_embeddings_chunk_max_bytes,
+        overlap=settings.text_embeddings_chunk_overlap_bytes,
+        max_tokens=settings.text_embeddings_chunk_max_tokens,
+    ):
+        yield json.dumps(
+            {
+                "text": chunk,
+                "timestamp": timestamp.isoformat(),
+                "source": document.source,
+                "tenant": document.tenant,
+                "document_id": document_id,
+            },
+        ).encode()
+
+
+class BulkPublisher:
+    """
+    Publishes messages to a kafka topic without waiting for every one.
+
+    The producer batches and compresses the messages sent in a row,
+    delivery is awaited once `max_pending` messages are in flight.
+    """
+
+    def __init__(
+        self,
+        producer: AIOKafkaProducer,
+        topic: str,
+        max_pending: int,
+    ) -> None:
+        self.producer = producer
+        self.topic = topic
+        self.max_pending = max_pending
+        self.pending: List["asyncio.Future[object]"] = []
+        self.published = 0
+
+    async def publish(self, value: bytes) -> None:
+        """
+        Queues a message in the producer.
+
+        :param value: message to publish.
+        """
+        self.pending.append(await self.producer.send(self.topic, value))
+        if len(self.pending) >= self.max_pending:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Waits for the delivery of the queued messages.
+
+        :returns: number of messages delivered so far.
+        """
+        pending, self.pending = self.pending, []
+        await asyncio.gather(*pending)
+        self.published += len(pending)
+        return self.published
@@ -0,0 +1,200 @@
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, cast
+
+import numpy as np
+
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.text_embeddings.chunking import estimate_tokens
+from rag_app_deepseek.services.text_embeddings.service import (
+    GetTextsMatchingVectorRes,
+    GetTextsMatchingVectorResEntity,
+)
+from rag_app_deepseek.settings import settings
+
+# candidates this similar to a picked chunk are duplicates, MMR alone
+# would still pick them over less relevant chunks when lambda > 0.5
+DUPLICATE_SIMILARITY = 0.98
+
+
+class RetrievalParams(NamedTuple):
+    """Parameters of the context retrieval of a query."""
+
+    # candidates fetched from milvus and reranked locally
+    candidates: int
+    # max number of context chunks
+    top_k: int
+    # min cosine similarity of a context chunk to the query
+    min_score: float
+    # MMR tradeoff in between relevance (1) and diversity (0)
+    mmr_lambda: float
+    # max estimated tokens of the context
+    token_budget: int
+    # fuse BM25 lexical search results with the vector search ones
+    hybrid: bool = False
+
+
+def get_default_retrieval_params() -> RetrievalParams:
+    """
+    Returns the retrieval params configured in settings.
+
+    :returns: RetrievalParams
+    """
+    return RetrievalParams(
+        candidates=settings.search_candidates,
+        top_k=settings.search_top_k,
+        min_score=settings.search_min_score,
+        mmr_lambda=settings.search_mmr_lambda,
+        token_budget=settings.search_context_token_budget,
+        hybrid=settings.search_hybrid_enabled,
+    )
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales every row to unit length.
+
+    :param vectors: vectors, one per row.
+    :returns: normalized vectors.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)  # noqa: WPS432
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    k: int = 60,
+) -> Dict[int, float]:
+    """
+    Fuses rankings by summing `1 / (k + rank)` of every id in every ranking.
+
+    Only ranks are used, so rankings with incomparable scores, such as
+    cosine similarities and BM25 scores, can be fused.
+
+    :param rankings: ids of every ranking, best first.
+    :param k: rank constant, higher values flatten the rank differences.
+    :returns: fused score of every id.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0) + 1 / (k + rank)
+    return fused
+
+
+def select_context(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    token_counts: np.ndarray,
+    params: RetrievalParams,
+    eligible: Optional[np.ndarray] = None,
+) -> List[int]:
+    """
+    Picks context chunks by maximal marginal relevance under a token budget.
+
+    Every step picks the candidate maximizing
+    `lambda * relevance - (1 - lambda) * max similarity to the picked ones`
+    among the candidates above the min score which still fit in the
+    budget. Near duplicates of a picked chunk are skipped. Similarities
+    in between candidates are computed once, as a single matrix product.
+
+    :param relevance: cosine similarity of every candidate to the query.
+    :param vectors: candidate vectors, one per row.
+    :param token_counts: estimated tokens of every candidate.
+    :param params: retrieval params.
+    :param eligible: candidates which may be picked, those above the min score
+        if unset.
+    :returns: positions of the picked candidates, in picking order.
+    """
+    normalized = normalize_rows(vectors)
+    similarities = normalized @ normalized.T
+    pickable = relevance >= params.min_score if eligible is None else eligible.copy()
+    redundancy = np.zeros(len(relevance), dtype=np.float32)
+    remaining_tokens = params.token_budget
+    picked: List[int] = []
+    while len(picked) < params.top_k:
+        fitting = pickable & (token_counts <= remaining_tokens)
+        if not fitting.any():
+            break
+        scores = params.mmr_lambda * relevance - (1 - params.mmr_lambda) * redundancy
+        chosen = int(np.argmax(np.where(fitting, scores, -np.inf)))
+        redundancy = (
+            np.maximum(redundancy, similarities[chosen])
+            if picked
+            else similarities[chosen]
+        )
+        picked.append(chosen)
+        pickable &= similarities[chosen] < DUPLICATE_SIMILARITY
+        pickable[chosen] = False
+        remaining_tokens -= int(token_counts[chosen])
+    return picked
+
+
+def rerank_candidates(
+    vector_codec: VectorCodec,
+    embedding_to_match: Sequence[float],
+    candidates: List[GetTextsMatchingVectorRes],
+    params: RetrievalParams,
+    lexical_ids: Optional[Sequence[int]] = None,
+) -> List[GetTextsMatchingVectorRes]:
+    """
+    Reranks the candidates of a vector search into the context of a query.
+
+    Candidates are compared with the vectors milvus returned along with
+    them, in the rerank field of the codec: the half precision embeddings
+    stored next to lossy binary vectors, else the searched vectors.
+
+    With lexical results, relevance is the reciprocal rank fusion of the
+    vector and lexical rankings, and lexical matches are kept even below
+    the min score.
+
+    :param vector_codec: codec of the stored vectors.
+    :param embedding_to_match: full precision query embedding.
+    :param candidates: search results, with the rerank entity field of the codec.
+    :param params: retrieval params.
+    :param lexical_ids: ids of the BM25 results, best first, all in candidates.
+    :returns: picked context, with the cosine similarity as distance and
+        the entity fields of the candidates but the rerank vectors.
+    """
+    if not candidates:
+        return []
+
+    texts = [candidate["entity"]["text"] for candidate in candidates]
+    entities = [
+        cast(Mapping[str, Any], candidate["entity"]) for candidate in candidates
+    ]
+    rerank_codec = vector_codec.rerank_codec
+    vectors = rerank_codec.decode(
+        [entity[vector_codec.rerank_field] for entity in entities],
+    )
+    query = rerank_codec.decode(rerank_codec.encode([embedding_to_match]))
+
+    similarity = normalize_rows(vectors) @ normalize_rows(query)[0]
+    token_counts = np.asarray([estimate_tokens(text) for text in texts])
+    relevance = similarity
+    eligible = similarity >= params.min_score
+    if lexical_ids:
+        ids = [candidate["id"] for candidate in candidates]
+        dense_ranking = [ids[index] for index in np.argsort(-similarity)]
+        fused = reciprocal_rank_fusion(
+            [dense_ranking, lexical_ids],
+            k=settings.search_rrf_k,
+        )
+        relevance = np.asarray([fused[doc_id] for doc_id in ids])
+        relevance /= relevance.max()
+        eligible |= np.isin(ids, lexical_ids)
+
+    picked = select_context(relevance, vectors, token_counts, params, eligible)
+    return [
+        GetTextsMatchingVectorRes(
+            id=candidates[index]["id"],
+            distance=float(similarity[index]),
+            entity=cast(
+                GetTextsMatchingVectorResEntity,
+                {
+                    field: field_value
+                    for field, field_value in entities[index].items()
+                    if field != vector_codec.rerank_field
+                },
+            ),
+        )
+        for index in picked
+    ]
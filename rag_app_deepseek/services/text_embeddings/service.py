@@ -1,46 +1,86 @@
-import re
+import time
 from dataclasses import asdict, dataclass
-from typing import List, Sequence, TypedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypedDict,
+    cast,
+)
 
 from ollama import ChatResponse
-from pymilvus import MilvusClient
 
+from rag_app_deepseek.services.metrics.instruments import (
+    LLM_SECONDS,
+    MILVUS_INSERT_ROWS,
+    MILVUS_INSERT_SECONDS,
+    MILVUS_SEARCH_SECONDS,
+    observe_llm_response,
+)
+from rag_app_deepseek.services.metrics.tracing import trace_llm_response, trace_span
+from rag_app_deepseek.services.milvus.index import get_search_params
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.ollama.scheduler import Priority
 from rag_app_deepseek.services.ollama.service import OllamaClient
-
-
-def split_text_into_chunks(  # noqa: C901 WPS231
+from rag_app_deepseek.services.text_embeddings.chunking import TextChunker
+
+# static prompt prefix, identical for every request so that ollama reuses
+# its cached KV state instead of evaluating it again
+SYSTEM_PROMPT = (
+    "You are an AI assistant. You are able to find answers to the questions "
+    + "from the contextual passage snippets provided. Use the pieces of "
+    + "information enclosed in <context> tags to provide an answer to the "
+    + "question enclosed in <question> tags."
+)
+USER_PROMPT_TEMPLATE = (
+    "<context>\n{context_data}\n</context>\n<question>\n{query}\n</question>"
+)
+
+
+def split_text_into_chunks(
     text: str,
     limit: int = 200,
+    overlap: int = 0,
+    max_tokens: Optional[int] = None,
 ) -> Sequence[str]:
     """
     Splits the text into the chunks.
 
+    Chunks are at most `limit` bytes once utf-8 encoded, so they always
+    fit in the milvus VARCHAR text field. Use `iter_text_chunks` to split
+    large texts lazily.
+
     :param text: text to ensure it's within the limit
-    :param limit: max size of the text chunk
+    :param limit: max size of the text chunk in utf-8 bytes
+    :param overlap: max number of bytes of trailing text repeated in the next chunk
+    :param max_tokens: max number of tokens of the text chunk
     :returns: Sequence/List of strings
     """
-    sentences = re.split(r"(?<=[.!?])\s+", text)  # Split by sentence delimiters
-    result = []
-    buffer = ""
+    return list(iter_text_chunks(text, limit, overlap, max_tokens))
 
-    for sentence in sentences:
-        if len(sentence) > limit:
-            # Case 3: If a single sentence is bigger than the limit, split it further
-            for i in range(0, len(sentence), limit):  # noqa: WPS111
-                result.append(sentence[i : i + limit])
-        elif len(buffer) + len(sentence) + 1 <= limit:
-            # Case 1: If adding this sentence keeps the buffer under the limit, add it
-            buffer = f"{buffer} {sentence}".strip()
-        else:
-            # Case 2: Store the buffer and start a new one with the current sentence
-            if buffer:
-                result.append(buffer)
-            buffer = sentence
 
-    if buffer:
-        result.append(buffer)  # Add the last buffer if any
+def iter_text_chunks(
+    text: str,
+    limit: int = 200,
+    overlap: int = 0,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Lazily splits the text into the chunks.
 
-    return result
+    :param text: text to ensure it's within the limit
+    :param limit: max size of the text chunk in utf-8 bytes
+    :param overlap: max number of bytes of trailing text repeated in the next chunk
+    :param max_tokens: max number of tokens of the text chunk
+    :returns: Iterator of strings
+    """
+    return TextChunker(limit, overlap, max_tokens).iter_chunks(text)
 
 
 @dataclass
@@ -48,8 +88,15 @@ class InsertTextWithEmbeddingsIntoMilvusInput:
     """Dataclass for the input of inserting text with embeddings."""
 
     text: str
-    embedding: Sequence[float]
+    # encoded by the VectorCodec of the storage mode
+    embedding: Any
     timestamp_unix: int
+    text_hash: str
+    source: str = ""
+    tenant: str = ""
+    document_id: str = ""
+    # stored only by the storage modes which rerank, see VectorCodec.encode_fields
+    rerank_embedding: Optional[Any] = None
 
 
 class InsertTextWithEmbeddingsIntoMilvusInputRes(TypedDict):
@@ -59,8 +106,8 @@ class InsertTextWithEmbeddingsIntoMilvusInputRes(TypedDict):
     ids: List[int]
 
 
-def insert_text_with_embeddings_into_milvus(  # noqa: WPS234
-    milvus_client: MilvusClient,
+async def insert_text_with_embeddings_into_milvus(  # noqa: WPS234
+    milvus_client: MilvusAsyncClient,
     text_with_embeddings: Sequence[InsertTextWithEmbeddingsIntoMilvusInput],
 ) -> InsertTextWithEmbeddingsIntoMilvusInputRes:
     """
@@ -72,17 +119,37 @@ def insert_text_with_embeddings_into_milvus(  # noqa: WPS234
     """
     data = []
     for txt_emb in text_with_embeddings:
-        data.append(asdict(txt_emb))
+        data.append(
+            {key: value for key, value in asdict(txt_emb).items() if value is not None},
+        )
 
-    return milvus_client.insert(collection_name="text_embeddings_schema", data=data)
+    MILVUS_INSERT_ROWS.observe(len(data))
+    with MILVUS_INSERT_SECONDS.time():
+        res = await milvus_client.insert(
+            collection_name="text_embeddings_schema",
+            data=data,
+        )
+    return cast(InsertTextWithEmbeddingsIntoMilvusInputRes, res)
 
 
-class GetTextsMatchingVectorResEntity(TypedDict):
-    """Get texts matching vector res entity."""
+class _GetTextsMatchingVectorResText(TypedDict):
+    """Entity field every search returns."""
 
     text: str
 
 
+class GetTextsMatchingVectorResEntity(_GetTextsMatchingVectorResText, total=False):
+    """Get texts matching vector res entity, with the requested output fields."""
+
+    embedding: Any
+    rerank_embedding: Any
+    source: str
+    tenant: str
+    timestamp_unix: int
+    text_hash: str
+    document_id: str
+
+
 class GetTextsMatchingVectorRes(TypedDict):
     """TypedDict for the response of inserting text with embeddings."""
 
@@ -91,33 +158,143 @@ class GetTextsMatchingVectorRes(TypedDict):
     entity: GetTextsMatchingVectorResEntity
 
 
-def get_texts_matching_vector_search(
-    milvus_client: MilvusClient,
+async def get_texts_matching_vector_search(  # noqa: WPS211
+    milvus_client: MilvusAsyncClient,
     embedding_to_match: Sequence[float],
+    search_params: Optional[Dict[str, Any]] = None,
+    vector_codec: Optional[VectorCodec] = None,
+    limit: int = 10,
+    output_fields: Optional[List[str]] = None,
+    filter_expr: str = "",
+    offset: int = 0,
 ) -> List[GetTextsMatchingVectorRes]:
     """
-    Retrieves top 10 results matching the embeddings.
+    Retrieves the top `limit` results matching the embeddings.
 
     :param milvus_client: client to make queries to milvus
     :param embedding_to_match: embeddings to match search against with
+    :param search_params: index search params, defaults to the settings
+    :param vector_codec: encodes the query like the stored vectors
+    :param limit: number of results
+    :param output_fields: entity fields of the results, only the text if unset
+    :param filter_expr: scalar filter applied by milvus before the vector search
+    :param offset: number of best results skipped
     :returns: List of TypedDict
     """
-    results = milvus_client.search(
+    results = await get_texts_matching_vectors_search(
+        milvus_client=milvus_client,
+        embeddings_to_match=[embedding_to_match],
+        search_params=search_params,
+        vector_codec=vector_codec,
+        limit=limit,
+        output_fields=output_fields,
+        filter_expr=filter_expr,
+        offset=offset,
+    )
+    return results[0]
+
+
+async def get_texts_matching_vectors_search(  # noqa: WPS211
+    milvus_client: MilvusAsyncClient,
+    embeddings_to_match: Sequence[Sequence[float]],
+    search_params: Optional[Dict[str, Any]] = None,
+    vector_codec: Optional[VectorCodec] = None,
+    limit: int = 10,
+    output_fields: Optional[List[str]] = None,
+    filter_expr: str = "",
+    offset: int = 0,
+) -> List[List[GetTextsMatchingVectorRes]]:
+    """
+    Retrieves the top `limit` results of every embedding in a single search.
+
+    :param milvus_client: client to make queries to milvus
+    :param embeddings_to_match: embeddings to match search against with
+    :param search_params: index search params, defaults to the settings
+    :param vector_codec: encodes the queries like the stored vectors
+    :param limit: number of results per embedding
+    :param output_fields: entity fields of the results, only the text if unset
+    :param filter_expr: scalar filter applied by milvus before the vector search
+    :param offset: number of best results of every embedding skipped
+    :returns: List of TypedDict for every embedding, in order
+    """
+    if vector_codec is not None:
+        embeddings_to_match = vector_codec.encode(embeddings_to_match)
+
+    with MILVUS_SEARCH_SECONDS.time():
+        results = await milvus_client.search(
+            collection_name="text_embeddings_schema",
+            data=list(embeddings_to_match),
+            anns_field="embedding",
+            output_fields=output_fields or ["text"],
+            limit=limit,
+            search_params=search_params or get_search_params(limit=offset + limit),
+            filter=filter_expr,
+            offset=offset,
+        )
+    return cast(List[List[GetTextsMatchingVectorRes]], results)
+
+
+async def get_texts_by_ids(
+    milvus_client: MilvusAsyncClient,
+    ids: Sequence[int],
+    output_fields: Optional[List[str]] = None,
+    filter_expr: str = "",
+) -> List[GetTextsMatchingVectorRes]:
+    """
+    Retrieves chunks by id, shaped like vector search results.
+
+    :param milvus_client: client to make queries to milvus
+    :param ids: ids of the chunks
+    :param output_fields: entity fields of the results, only the text if unset
+    :param filter_expr: scalar filter the chunks must also match
+    :returns: List of TypedDict, without distance
+    """
+    if not ids:
+        return []
+
+    ids_expr = f"id in {list(ids)}"
+    rows = await milvus_client.query(
         collection_name="text_embeddings_schema",
-        data=[embedding_to_match],
-        anns_field="embedding",
-        output_fields=["text"],
-        limit=10,
-        timeout=3000,  # noqa: WPS432
+        filter=f"{ids_expr} and ({filter_expr})" if filter_expr else ids_expr,
+        output_fields=output_fields or ["text"],
     )
+    return [
+        GetTextsMatchingVectorRes(
+            id=row["id"],
+            distance=0.0,
+            entity=cast(
+                GetTextsMatchingVectorResEntity,
+                {field: row[field] for field in output_fields or ["text"]},
+            ),
+        )
+        for row in rows
+    ]
+
+
+def build_llm_prompts(context: List[str], user_query: str) -> Tuple[str, str]:
+    """
+    Builds the system and user prompts to answer user's query from the context.
 
-    return results[0]
+    The instructions are in the system prompt, which never changes,
+    the user prompt only holds the context and the query.
+
+    :param context: List of context blocks, see `build_context`
+    :param user_query: user's query prompt which needs to be answered via llm
+
+    :returns: Tuple of the system prompt and the user prompt
+    """
+    user_prompt = USER_PROMPT_TEMPLATE.format(
+        context_data="\n\n".join(context),
+        query=user_query,
+    )
+    return SYSTEM_PROMPT, user_prompt
 
 
 async def prompt_llm_with_context_and_query(
     ollama_client: OllamaClient,
     context: List[str],
     user_query: str,
+    priority: Priority = Priority.INTERACTIVE,
 ) -> ChatResponse:
     """
     Prompt llm to answer user's query from the context fetched from the database.
@@ -125,27 +302,43 @@ async def prompt_llm_with_context_and_query(
     :param ollama_client: llm client to make api requests to the model
     :param context: List of texts fetched from db to provide context to llm
     :param user_query: user's query prompt which needs to be answered via llm
+    :param priority: priority of the request in the ollama scheduler
 
     :returns: ChatResponse
     """
-    system_prompt = """
-    Human: You are an AI assistant. You are able to find answers to the questions from the contextual passage snippets provided.
-    """
+    with trace_span("prompt"):
+        system_prompt, user_prompt = build_llm_prompts(context, user_query)
 
-    user_prompt = """
-    Use the following pieces of information enclosed in <context> tags to provide an answer to the question enclosed in <question> tags.
-    <context>
-    {context_data}
-    </context>
-    <question>
-    {query}
-    </question>
-    """.format(
-        context_data="\n".join(context),
-        query=user_query,
+    started_at = time.perf_counter()
+    res = await ollama_client.chat(
+        user_prompt=user_prompt,
+        system_prompt=system_prompt,
+        priority=priority,
     )
+    duration_s = time.perf_counter() - started_at
+    LLM_SECONDS.labels(priority=priority.name.lower()).observe(duration_s)
+    observe_llm_response(res)
+    trace_llm_response(res, duration_s)
+    return res
+
+
+async def stream_llm_with_context_and_query(
+    ollama_client: OllamaClient,
+    context: List[str],
+    user_query: str,
+) -> AsyncIterator[ChatResponse]:
+    """
+    Prompt llm to answer user's query from the context, streaming the answer.
+
+    :param ollama_client: llm client to make api requests to the model
+    :param context: List of texts fetched from db to provide context to llm
+    :param user_query: user's query prompt which needs to be answered via llm
+
+    :returns: AsyncIterator of ChatResponse chunks
+    """
+    system_prompt, user_prompt = build_llm_prompts(context, user_query)
 
-    return await ollama_client.chat(
+    return await ollama_client.chat_stream(
         user_prompt=user_prompt,
         system_prompt=system_prompt,
     )
@@ -1,7 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Optional
+from typing import Any, Dict, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -19,6 +19,47 @@ class LogLevel(str, enum.Enum):  # noqa: WPS600
     FATAL = "FATAL"
 
 
+class MilvusIndexType(str, enum.Enum):  # noqa: WPS600
+    """ANN index types of the embedding field."""
+
+    HNSW = "HNSW"
+    IVF_FLAT = "IVF_FLAT"
+    IVF_PQ = "IVF_PQ"
+    DISKANN = "DISKANN"
+
+
+class MilvusMetricType(str, enum.Enum):  # noqa: WPS600
+    """Similarity metrics of the embedding field."""
+
+    COSINE = "COSINE"
+    IP = "IP"
+    L2 = "L2"
+
+
+class VectorStoreBackend(str, enum.Enum):  # noqa: WPS600
+    """Where the chunks and their embeddings are stored."""
+
+    # milvus server, see deploy/docker-compose.yml
+    MILVUS = "MILVUS"
+    # memory mapped files on local disk, searched in process
+    LOCAL = "LOCAL"
+
+
+class VectorStorageMode(str, enum.Enum):  # noqa: WPS600
+    """How embeddings are stored in milvus."""
+
+    # full precision float32
+    FLOAT = "FLOAT"
+    # half precision, 2x smaller
+    FLOAT16 = "FLOAT16"
+    # projected on the principal components of the stored embeddings
+    PCA = "PCA"
+    # projected on a seeded gaussian random matrix
+    RANDOM_PROJECTION = "RANDOM_PROJECTION"
+    # sign bits, 32x smaller, reranked in full precision at search time
+    BINARY = "BINARY"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -45,9 +86,128 @@ class Settings(BaseSettings):
     kafka_sasl_password: Optional[str] = None
     kafka_sasl_mechanism: str = "PLAIN"
     kafka_topic_text: str = "rag-text-local"
+    # messages the consumer keeps failing on are moved to this topic
+    kafka_topic_text_dlq: str = "rag-text-local-dlq"
+    # producer compression, lz4 and zstd need the compression libraries of aiokafka
+    kafka_producer_compression_type: Optional[str] = "gzip"
+    # max bytes of a producer batch per partition and time to wait to fill it
+    kafka_producer_max_batch_size: int = 262144
+    kafka_producer_linger_ms: int = 20
+    # max number of kafka messages pooled into one embeddings batch
+    kafka_consumer_batch_max_size: int = 64
+    # max time to wait for a batch to fill up before processing it
+    kafka_consumer_batch_linger_ms: int = 200
+    # max time to finish the batches in flight when partitions are revoked
+    kafka_consumer_rebalance_timeout_s: float = 20
+    # run a consumer in every web process, disable when running the consumer runner
+    kafka_consumer_in_web: bool = True
+    # consumer runner: processes and consumers per process, all in the same group
+    kafka_consumer_processes: int = 1
+    kafka_consumer_tasks: int = 1
+    # consumer runner: port of the prometheus metrics of its processes, 0 disables it
+    kafka_consumer_metrics_port: int = 8001
+    # delay before restarting a failed consumer, doubled on every failure in a row
+    kafka_consumer_restart_backoff_s: float = 1
+    kafka_consumer_restart_backoff_max_s: float = 60
+
+    # bulk ingestion: chunks published but not yet acknowledged by kafka
+    ingest_max_pending_chunks: int = 10000
+    # bulk ingestion: max bytes of a NDJSON document, 16 MiB
+    ingest_max_document_bytes: int = 16777216
+    # bulk ingestion is refused with a 429 above this consumer lag, in messages
+    ingest_max_consumer_lag: int = 100000
+    ingest_lag_check_interval_s: float = 5
+    ingest_retry_after_s: int = 30
+
+    # concurrent workers for the embed and insert stages of the ingestion pipeline
+    text_embeddings_embed_concurrency: int = 1
+    text_embeddings_insert_concurrency: int = 2
+    # max batches waiting in between two stages of the ingestion pipeline
+    text_embeddings_pipeline_queue_size: int = 4
+    # retries of a milvus or kafka call of the ingestion pipeline failing with a
+    # transient error, with backoff, ollama calls are retried by the ollama client
+    text_embeddings_retries: int = 3
+    text_embeddings_retry_backoff_s: float = 1
+    text_embeddings_retry_backoff_max_s: float = 30
+    # max utf-8 bytes of a text chunk, must not exceed the milvus text field max_length
+    text_embeddings_chunk_max_bytes: int = 200
+    # max bytes of trailing text repeated at the start of the next chunk
+    text_embeddings_chunk_overlap_bytes: int = 0
+    # max estimated tokens of a text chunk, no token limit if unset
+    text_embeddings_chunk_max_tokens: Optional[int] = None
+    # skip embedding and inserting chunks whose content is already stored
+    text_embeddings_dedup_enabled: bool = True
+    # number of recently ingested chunk hashes remembered in memory
+    text_embeddings_dedup_local_size: int = 100000
 
     ollama_host: str = "localhost:11434"
     ollama_model: str = "deepseek-r1:32b"
+    # max concurrent embed and chat requests sent to ollama
+    ollama_embed_concurrency: int = 2
+    ollama_chat_concurrency: int = 1
+    # max characters of text sent in a single embed request
+    ollama_embed_batch_chars: int = 4000
+    # learn the embed batch size online, in between the min and max bounds
+    ollama_embed_batch_adaptive: bool = True
+    ollama_embed_batch_min_chars: int = 500
+    ollama_embed_batch_max_chars: int = 32000
+    # max concurrent embed requests of a single generate_embeddings_from_text call
+    ollama_embed_batch_parallelism: int = 2
+    ollama_embed_retries: int = 3
+    ollama_embed_retry_backoff_s: float = 0.5
+
+    embeddings_cache_enabled: bool = True
+    # max number of embeddings kept in memory by every worker
+    embeddings_cache_max_size: int = 1000
+    embeddings_cache_ttl_s: float = 3600
+    # sqlite file to share cached embeddings in between workers, memory only if unset
+    embeddings_cache_sqlite_path: Optional[str] = None
+    # whether the kafka consumer also goes through the embeddings cache, off by
+    # default so that ingested chunks don't evict the cached queries
+    embeddings_cache_ingestion: bool = False
+
+    answer_cache_enabled: bool = True
+    answer_cache_max_size: int = 1000
+    answer_cache_ttl_s: float = 3600
+    # min cosine similarity of two queries to share a cached answer
+    answer_cache_similarity_threshold: float = 0.95
+    # min cosine similarity of an ingested chunk to a cached query to drop its answer
+    answer_cache_invalidation_threshold: float = 0.47
+
+    # candidates fetched from milvus per query and reranked locally
+    search_candidates: int = 40
+    # max number of context chunks passed to the llm
+    search_top_k: int = 10
+    # min cosine similarity of a context chunk to the query
+    search_min_score: float = 0.47
+    # MMR tradeoff in between relevance (1) and diversity (0) of the context
+    search_mmr_lambda: float = 0.7
+    # max estimated tokens of the context passed to the llm
+    search_context_token_budget: int = 2000
+    # fuse BM25 lexical search with vector search by reciprocal rank fusion,
+    # per request overridable, the consumer only feeds the BM25 index if enabled
+    search_hybrid_enabled: bool = False
+    # directory of the BM25 index segments, shared by the workers
+    search_bm25_index_path: str = "bm25_index"
+    # chunks buffered in memory before being written as a new segment
+    search_bm25_flush_docs: int = 5000
+    search_bm25_flush_interval_s: float = 30
+    # segments merged back into one once there are more
+    search_bm25_max_segments: int = 8
+    # BM25 term frequency saturation and document length normalization
+    search_bm25_k1: float = 1.2
+    search_bm25_b: float = 0.75
+    # BM25 ranks chunks of every tenant, filtered searches fetch this many
+    # times more BM25 results so enough of them pass the filters
+    search_bm25_filtered_overfetch: int = 10
+    # rank constant of reciprocal rank fusion
+    search_rrf_k: int = 60
+    # max queries of a batch search request and its max concurrent llm calls
+    search_batch_max_queries: int = 100
+    search_batch_llm_concurrency: int = 4
+    # fraction of the searches traced without asking, their timings are logged
+    # and returned in the Server-Timing header
+    search_trace_sample_rate: float = 0
 
     milvus_conn_name: str = "rag_app_deepseek"
     milvus_host: str = "http://localhost"
@@ -55,6 +215,44 @@ class Settings(BaseSettings):
     milvus_username: str = ""
     milvus_password: str = ""
     milvus_db_name: str = "default"
+    # number of pooled milvus connections, also the max concurrent milvus calls
+    milvus_pool_size: int = 4
+    # timeout of a single milvus search or query in seconds
+    milvus_timeout_s: float = 3
+    # timeout of a milvus insert in seconds, a consumer batch of full embeddings
+    milvus_insert_timeout_s: float = 60
+    # ANN index of the embedding field, applied by the milvus migration
+    milvus_index_type: MilvusIndexType = MilvusIndexType.HNSW
+    milvus_metric_type: MilvusMetricType = MilvusMetricType.COSINE
+    # build params overriding the defaults of the index type, e.g. {"M": 32}
+    milvus_index_params: Dict[str, Any] = {}
+    # search breadth of HNSW (ef) and DiskANN (search_list), per request overridable
+    milvus_search_ef: int = 64
+    # number of IVF clusters searched, per request overridable
+    milvus_search_nprobe: int = 16
+    # index of scalar fields, INVERTED needs milvus 2.4+, use Trie on 2.3
+    milvus_scalar_index_type: str = "INVERTED"
+    # index of numeric scalar fields, INVERTED needs milvus 2.4+, use STL_SORT on 2.3
+    milvus_numeric_index_type: str = "INVERTED"
+    # partitions the tenant partition key is hashed into, set at collection creation
+    milvus_num_partitions: int = 64
+    # storage of the embedding field, changing it requires the vector migration
+    milvus_vector_storage: VectorStorageMode = VectorStorageMode.FLOAT
+    # number of dimensions kept by PCA and random projection
+    milvus_vector_reduced_dim: int = 512
+    # PCA projection fitted by the vector migration
+    milvus_vector_projection_path: str = "vector_projection.npz"
+    # binary storage: candidates fetched per result to rerank in full precision
+    milvus_binary_rerank_factor: int = 4
+    # store of the chunks, LOCAL needs no milvus but is not shared across hosts
+    vector_store_backend: VectorStoreBackend = VectorStoreBackend.MILVUS
+    # directory of the LOCAL vector store, shared by the processes of the host
+    local_vector_store_path: str = "vector_store"
+    # LOCAL segments, one per insert, merged once there are more
+    local_vector_store_max_segments: int = 16
+    # LOCAL segments of at least this many rows get an HNSW index, needs
+    # hnswlib; searched by brute force only if unset
+    local_vector_store_hnsw_min_rows: Optional[int] = None
 
     @property
     def kafka_bootstrap_servers_list(self) -> list[str]:
@@ -65,6 +263,15 @@ class Settings(BaseSettings):
         """
         return self.kafka_bootstrap_servers.split(",")
 
+    @property
+    def kafka_consumer_group_id(self) -> str:
+        """
+        Kafka consumer group of the text embeddings consumers.
+
+        :return: group id.
+        """
+        return f"rag-app-consumer-{self.environment}"
+
     class Config:
         env_file = ".env"
         env_prefix = ""
@@ -0,0 +1,557 @@
+"""In-process fakes for the external services used in tests."""
+import asyncio
+import json
+import math
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
+
+import httpx
+import numpy as np
+from aiokafka import ConsumerRecord, TopicPartition
+from ollama import ChatResponse, EmbedResponse, Message
+
+from rag_app_deepseek.services.ollama.scheduler import Priority
+from rag_app_deepseek.services.text_embeddings.retrieval import normalize_rows
+
+
+class FakeOllamaClient:
+    """
+    Fake of OllamaClient returning deterministic embeddings.
+
+    Embed calls take `latency` unless `embed_latency` is set, plus
+    `embed_text_latency` for every text.
+    """
+
+    def __init__(  # noqa: WPS211
+        self,
+        dim: int = 8,
+        latency: float = 0,
+        answer: str = "<think>thinking</think>answer",
+        token_latency: float = 0,
+        embed_latency: Optional[float] = None,
+        embed_text_latency: float = 0,
+    ) -> None:
+        self.dim = dim
+        self.latency = latency
+        self.answer = answer
+        self.token_latency = token_latency
+        self.embed_latency = latency if embed_latency is None else embed_latency
+        self.embed_text_latency = embed_text_latency
+        self.embed_calls: List[Sequence[str]] = []
+        self.chat_prompts: List[str] = []
+        self.closed_streams = 0
+
+    def embed_text(self, text: str) -> List[float]:
+        """
+        Deterministic embedding of a single text.
+
+        :param text: text to embed.
+        :returns: embedding vector.
+        """
+        seed = sum(text.encode())
+        return [float((seed * (i + 1)) % 97) / 97 for i in range(self.dim)]
+
+    async def generate_embeddings_from_text(
+        self,
+        text: Sequence[str],
+        use_cache: bool = True,
+        priority: int = 0,
+    ) -> EmbedResponse:
+        """
+        Fake of OllamaClient.generate_embeddings_from_text.
+
+        :param text: texts to embed.
+        :param use_cache: ignored.
+        :param priority: ignored.
+        :returns: embed response.
+        """
+        self.embed_calls.append(list(text))
+        await asyncio.sleep(self.embed_latency + self.embed_text_latency * len(text))
+        return EmbedResponse(embeddings=[self.embed_text(txt) for txt in text])
+
+    def _tokens(self) -> List[str]:
+        return [self.answer[i : i + 4] for i in range(0, len(self.answer), 4)]
+
+    async def chat(
+        self,
+        user_prompt: str,
+        system_prompt: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> ChatResponse:
+        """
+        Fake of OllamaClient.chat answering with the configured answer.
+
+        :param user_prompt: recorded prompt.
+        :param system_prompt: ignored.
+        :param priority: ignored.
+        :returns: ChatResponse
+        """
+        self.chat_prompts.append(user_prompt)
+        generation_s = self.token_latency * len(self._tokens())
+        await asyncio.sleep(self.latency + generation_s)
+        return ChatResponse(
+            message=Message(role="assistant", content=self.answer),
+            done=True,
+            done_reason="stop",
+            eval_count=len(self._tokens()),
+            eval_duration=int(generation_s * 1e9),  # noqa: WPS432
+            prompt_eval_count=len(user_prompt.split()),
+            prompt_eval_duration=int(self.latency * 1e9),  # noqa: WPS432
+        )
+
+    async def chat_stream(
+        self,
+        user_prompt: str,
+        system_prompt: str = "",
+    ) -> AsyncIterator[ChatResponse]:
+        """
+        Fake of OllamaClient.chat_stream streaming the configured answer.
+
+        :param user_prompt: recorded prompt.
+        :param system_prompt: ignored.
+        :returns: AsyncIterator of ChatResponse chunks
+        """
+        self.chat_prompts.append(user_prompt)
+        return self._stream(len(user_prompt.split()))
+
+    async def _stream(self, prompt_tokens: int) -> AsyncIterator[ChatResponse]:
+        try:
+            await asyncio.sleep(self.latency)
+            for token in self._tokens():
+                await asyncio.sleep(self.token_latency)
+                yield ChatResponse(
+                    message=Message(role="assistant", content=token),
+                    done=False,
+                )
+            yield ChatResponse(
+                message=Message(role="assistant", content=""),
+                done=True,
+                done_reason="stop",
+                eval_count=len(self._tokens()),
+                eval_duration=1_000_000,
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=1_000_000,
+            )
+        finally:
+            self.closed_streams += 1
+
+
+class FakeOllamaServer:
+    """Fake ollama http api served through an httpx mock transport."""
+
+    def __init__(self, latency: float = 0.05) -> None:
+        self.latency = latency
+        self.embed_inputs: List[Any] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # texts whose embed request fails once with a 503
+        self.fail_once: Set[str] = set()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        """
+        Answers /api/embed requests.
+
+        :param request: incoming request.
+        :returns: embed response.
+        """
+        payload = json.loads(request.content)
+        self.embed_inputs.append(payload["input"])
+        failing = self.fail_once.intersection(payload["input"])
+        if failing:
+            self.fail_once -= failing
+            return httpx.Response(503, json={"error": "overloaded"})
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return httpx.Response(
+            200,
+            json={
+                "model": payload["model"],
+                "embeddings": [[float(len(txt))] for txt in payload["input"]],
+            },
+        )
+
+
+class FakeKafkaProducer:
+    """Fake of AIOKafkaProducer keeping the sent messages."""
+
+    def __init__(self) -> None:
+        self.messages: List[Tuple[str, bytes]] = []
+        self.headers: List[Dict[str, bytes]] = []
+
+    async def send(
+        self,
+        topic: str,
+        value: bytes,
+        key: Optional[bytes] = None,
+        headers: Optional[List[Tuple[str, bytes]]] = None,
+    ) -> "asyncio.Future[None]":
+        """
+        Fake of AIOKafkaProducer.send, delivering the message at once.
+
+        :param topic: topic of the message.
+        :param value: message.
+        :param key: ignored.
+        :param headers: headers of the message.
+        :returns: future of the delivery.
+        """
+        self.messages.append((topic, value))
+        self.headers.append(dict(headers or []))
+        delivery: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        delivery.set_result(None)
+        return delivery
+
+
+class FakeMilvusClient:
+    """
+    Fake of MilvusClient keeping inserted rows in memory.
+
+    Like the real client, calls block the calling thread:
+    search sleeps for `latency` seconds.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        self.latency = latency
+        self.rows: List[Dict[str, Any]] = []
+        self.insert_calls = 0
+        self.search_calls = 0
+
+    def insert(
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Fake of MilvusClient.insert.
+
+        :param collection_name: ignored.
+        :param data: rows to insert.
+        :param kwargs: ignored.
+        :returns: insert result.
+        """
+        self.insert_calls += 1
+        ids = list(range(len(self.rows), len(self.rows) + len(data)))
+        for row_id, row in zip(ids, data):
+            self.rows.append({"id": row_id, **row})
+        return {"insert_count": len(data), "ids": ids}
+
+    def search(
+        self,
+        collection_name: str,
+        data: List[Sequence[float]],
+        limit: int = 10,
+        output_fields: Optional[List[str]] = None,
+        offset: int = 0,
+        **kwargs: Any,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Fake of MilvusClient.search with brute force cosine similarity.
+
+        :param collection_name: ignored.
+        :param data: vectors to search for.
+        :param limit: number of results per vector.
+        :param output_fields: row fields to return in the entity.
+        :param offset: number of best results skipped.
+        :param kwargs: ignored.
+        :returns: results for every vector.
+        """
+        time.sleep(self.latency)
+        self.search_calls += 1
+        results = []
+        for vector in data:
+            hits = [
+                {
+                    "id": row["id"],
+                    "distance": _cosine(vector, row["embedding"]),
+                    "entity": {field: row.get(field) for field in output_fields or []},
+                }
+                for row in self.rows
+            ]
+            hits.sort(key=lambda hit: hit["distance"], reverse=True)
+            results.append(hits[offset : offset + limit])
+        return results
+
+    def query(
+        self,
+        collection_name: str,
+        filter: str = "",  # noqa: WPS125
+        output_fields: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        Fake of MilvusClient.query supporting `field in [...]` filters only.
+
+        :param collection_name: ignored.
+        :param filter: filter expression.
+        :param output_fields: row fields to return.
+        :param kwargs: ignored.
+        :returns: matching rows.
+        """
+        field_name, values = filter.split(" in ", 1)
+        wanted = set(json.loads(values))
+        return [
+            {
+                "id": row["id"],
+                **{field: row.get(field) for field in output_fields or []},
+            }
+            for row in self.rows
+            if row.get(field_name) in wanted
+        ]
+
+    def load_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Fake of MilvusClient.load_collection.
+
+        :param collection_name: ignored.
+        :param kwargs: ignored.
+        """
+
+    def release_collection(self, collection_name: str, **kwargs: Any) -> None:
+        """
+        Fake of MilvusClient.release_collection.
+
+        :param collection_name: ignored.
+        :param kwargs: ignored.
+        """
+
+    def close(self) -> None:
+        """Fake of MilvusClient.close."""
+
+
+class FakeNumpyMilvusClient(FakeMilvusClient):
+    """
+    FakeMilvusClient searching with a NumPy brute force index.
+
+    Scales to the collection sizes of the benchmarks. Like the pure
+    python fake, filters are ignored.
+    """
+
+    def __init__(self, latency: float = 0) -> None:
+        super().__init__(latency)
+        # normalized embeddings of the rows, the last inserted ones pending
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.pending: List[Sequence[float]] = []
+        # calls run in the threads of MilvusAsyncClient
+        self.lock = threading.Lock()
+
+    def insert(
+        self,
+        collection_name: str,
+        data: List[Dict[str, Any]],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Fake of MilvusClient.insert.
+
+        :param collection_name: ignored.
+        :param data: rows to insert.
+        :param kwargs: ignored.
+        :returns: insert result.
+        """
+        with self.lock:
+            self.pending.extend(row["embedding"] for row in data)
+            return super().insert(collection_name, data, **kwargs)
+
+    def search(
+        self,
+        collection_name: str,
+        data: List[Sequence[float]],
+        limit: int = 10,
+        output_fields: Optional[List[str]] = None,
+        offset: int = 0,
+        **kwargs: Any,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Fake of MilvusClient.search with a cosine similarity matrix product.
+
+        :param collection_name: ignored.
+        :param data: vectors to search for.
+        :param limit: number of results per vector.
+        :param output_fields: row fields to return in the entity.
+        :param offset: number of best results skipped.
+        :param kwargs: ignored.
+        :returns: results for every vector.
+        """
+        time.sleep(self.latency)
+        self.search_calls += 1
+        with self.lock:
+            if self.pending:
+                added = normalize_rows(np.asarray(self.pending, dtype=np.float32))
+                self.vectors = (
+                    np.vstack([self.vectors, added]) if self.vectors.size else added
+                )
+                self.pending = []
+            vectors, rows = self.vectors, self.rows[: len(self.vectors)]
+        if not vectors.size:
+            return [[] for _ in data]
+
+        scores = normalize_rows(np.asarray(data, dtype=np.float32)) @ vectors.T
+        top_k = min(offset + limit, len(rows))
+        results = []
+        for row_scores in scores:
+            top = np.argpartition(-row_scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-row_scores[top], kind="stable")]
+            results.append(
+                [
+                    {
+                        "id": rows[index]["id"],
+                        "distance": float(row_scores[index]),
+                        "entity": {
+                            field: rows[index].get(field)
+                            for field in output_fields or []
+                        },
+                    }
+                    for index in top[offset:]
+                ],
+            )
+        return results
+
+
+def _cosine(left: Sequence[float], right: Sequence[float]) -> float:
+    dot = sum(lval * rval for lval, rval in zip(left, right))
+    norm = math.sqrt(sum(lval * lval for lval in left)) * math.sqrt(
+        sum(rval * rval for rval in right),
+    )
+    return dot / norm if norm else 0
+
+
+class FakeKafkaConsumer:
+    """Fake of AIOKafkaConsumer serving a fixed list of messages."""
+
+    def __init__(self, records: Sequence[ConsumerRecord]) -> None:
+        self.records = list(records)
+        self.topic_records = list(records)
+        self.committed: List[Optional[Dict[TopicPartition, int]]] = []
+        self.assigned = {
+            TopicPartition(record.topic, record.partition) for record in records
+        }
+        self.paused: Set[TopicPartition] = set()
+        self.listener: Any = None
+
+    def subscribe(self, topics: List[str], listener: Any = None) -> None:
+        """
+        Fake of AIOKafkaConsumer.subscribe.
+
+        Like a new assignment, messages are fetched again from the
+        committed offsets.
+
+        :param topics: ignored.
+        :param listener: rebalance listener, kept to simulate rebalances.
+        """
+        self.listener = listener
+        committed: Dict[TopicPartition, int] = {}
+        for offsets in self.committed:
+            committed.update(offsets or {})
+        self.records = [
+            record
+            for record in self.topic_records
+            if record.offset
+            >= committed.get(TopicPartition(record.topic, record.partition), 0)
+        ]
+        self.paused.clear()
+
+    def append(self, record: ConsumerRecord) -> None:
+        """
+        Simulates a message produced to the topic while consuming.
+
+        :param record: the new message, its partition gets assigned.
+        """
+        self.records.append(record)
+        self.topic_records.append(record)
+        self.assigned.add(TopicPartition(record.topic, record.partition))
+
+    def assignment(self) -> Set[TopicPartition]:
+        """
+        Fake of AIOKafkaConsumer.assignment.
+
+        :returns: assigned partitions.
+        """
+        return set(self.assigned)
+
+    def pause(self, *partitions: TopicPartition) -> None:
+        """
+        Fake of AIOKafkaConsumer.pause.
+
+        :param partitions: partitions not fetched anymore.
+        """
+        self.paused.update(partitions)
+
+    async def getmany(
+        self,
+        timeout_ms: int = 0,
+        max_records: Optional[int] = None,
+    ) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        """
+        Fake of AIOKafkaConsumer.getmany.
+
+        :param timeout_ms: time to wait when there are no messages.
+        :param max_records: max number of records to return.
+        :returns: records grouped by partition.
+        """
+        if not self.records or self.paused:
+            await asyncio.sleep(timeout_ms / 1000)
+            return {}
+
+        count = max_records or len(self.records)
+        polled, self.records = self.records[:count], self.records[count:]
+        grouped: Dict[TopicPartition, List[ConsumerRecord]] = {}
+        for record in polled:
+            topic_partition = TopicPartition(record.topic, record.partition)
+            grouped.setdefault(topic_partition, []).append(record)
+        return grouped
+
+    async def commit(
+        self,
+        offsets: Optional[Dict[TopicPartition, int]] = None,
+    ) -> None:
+        """
+        Fake of AIOKafkaConsumer.commit.
+
+        :param offsets: offsets to commit.
+        """
+        self.committed.append(offsets)
+
+
+def make_record(
+    value: bytes,
+    offset: int,
+    partition: int = 0,
+    topic: str = "rag-text-test",
+) -> ConsumerRecord:
+    """
+    Builds a kafka consumer record.
+
+    :param value: message value.
+    :param offset: message offset.
+    :param partition: message partition.
+    :param topic: message topic.
+    :returns: ConsumerRecord
+    """
+    return ConsumerRecord(
+        topic=topic,
+        partition=partition,
+        offset=offset,
+        timestamp=0,
+        timestamp_type=0,
+        key=None,
+        value=value,
+        checksum=None,
+        serialized_key_size=0,
+        serialized_value_size=len(value),
+        headers=(),
+    )
+
+
+def make_app(**state: Any) -> Any:
+    """
+    Builds a stand-in of the FastAPI app carrying only the given state.
+
+    :param state: attributes of app.state.
+    :returns: object with a `state` namespace.
+    """
+    return SimpleNamespace(state=SimpleNamespace(**state))
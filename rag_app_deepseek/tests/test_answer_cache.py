@@ -0,0 +1,51 @@
+from rag_app_deepseek.services.cache.answers import SemanticAnswerCache
+
+
+def test_near_duplicate_query_hits() -> None:
+    """A query similar enough to a cached one with the same context is a hit."""
+    cache = SemanticAnswerCache(max_size=4, ttl=60, similarity_threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], [1, 2], "answer")
+
+    assert cache.lookup([0.99, 0.05, 0.0], [1, 2]) == "answer"
+    assert cache.lookup([0.0, 1.0, 0.0], [1, 2]) is None
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_changed_context_invalidates_answer() -> None:
+    """An answer is not reused once the retrieved context changed."""
+    cache = SemanticAnswerCache(max_size=4, ttl=60, similarity_threshold=0.95)
+    cache.store([1.0, 0.0], [1, 2], "answer")
+
+    assert cache.lookup([1.0, 0.0], [1, 3]) is None
+    assert cache.lookup([1.0, 0.0], [1, 2]) is None
+    assert cache.get_stats()["invalidations"] == 1
+
+
+def test_least_recently_used_answer_is_evicted() -> None:
+    """The cache never grows past its max size."""
+    cache = SemanticAnswerCache(max_size=2, ttl=60, similarity_threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], [1], "first")
+    cache.store([0.0, 1.0, 0.0], [2], "second")
+    cache.lookup([1.0, 0.0, 0.0], [1])
+    cache.store([0.0, 0.0, 1.0], [3], "third")
+
+    assert cache.lookup([1.0, 0.0, 0.0], [1]) == "first"
+    assert cache.lookup([0.0, 1.0, 0.0], [2]) is None
+    assert cache.get_stats() == {
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+        "invalidations": 0,
+        "size": 2,
+    }
+
+
+def test_new_similar_chunks_invalidate_answers() -> None:
+    """Ingesting chunks close to a cached query drops its answer."""
+    cache = SemanticAnswerCache(max_size=4, ttl=60, similarity_threshold=0.95)
+    cache.store([1.0, 0.0], [1], "first")
+    cache.store([0.0, 1.0], [2], "second")
+
+    assert cache.invalidate_similar([[0.9, 0.1]], threshold=0.5) == 1
+    assert cache.lookup([1.0, 0.0], [1]) is None
+    assert cache.lookup([0.0, 1.0], [2]) == "second"
@@ -0,0 +1,133 @@
+from array import array
+from pathlib import Path
+from typing import Any, List, Sequence
+
+import pytest
+from ollama import EmbedResponse
+
+from rag_app_deepseek.services.cache.embeddings import (
+    EmbeddingsCache,
+    SqliteEmbeddingsCacheBackend,
+)
+from rag_app_deepseek.services.ollama.service import OllamaClient
+
+
+class FakeAsyncClient:
+    """Fake of ollama's AsyncClient recording embed inputs."""
+
+    def __init__(self) -> None:
+        self.inputs: List[Sequence[str]] = []
+
+    async def embed(
+        self,
+        model: str,
+        input: Sequence[str],  # noqa: WPS125
+    ) -> EmbedResponse:
+        """
+        Fake of AsyncClient.embed.
+
+        :param model: ignored.
+        :param input: texts to embed.
+        :returns: embed response.
+        """
+        self.inputs.append(list(input))
+        return EmbedResponse(embeddings=[[float(len(txt)), 1.0] for txt in input])
+
+
+@pytest.mark.anyio
+async def test_lru_evicts_least_recently_used() -> None:
+    """The least recently used entry is evicted once the cache is full."""
+    cache = EmbeddingsCache(max_size=2, ttl=60)
+    await cache.set_many("model", ["a", "b"], [[1.0], [2.0]])
+    await cache.get_many("model", ["a"])
+    await cache.set_many("model", ["c"], [[3.0]])
+
+    cached = await cache.get_many("model", ["a", "b", "c"])
+
+    assert cached == [[1.0], None, [3.0]]
+    assert cache.get_stats()["evictions"] == 1
+
+
+@pytest.mark.anyio
+async def test_expired_entries_are_misses() -> None:
+    """Entries past their time to live are not returned."""
+    cache = EmbeddingsCache(max_size=2, ttl=0)
+    await cache.set_many("model", ["a"], [[1.0]])
+
+    assert await cache.get_many("model", ["a"]) == [None]
+
+
+@pytest.mark.anyio
+async def test_keys_are_normalized_and_per_model() -> None:
+    """Whitespace differences hit the same entry, other models do not."""
+    cache = EmbeddingsCache(max_size=2, ttl=60)
+    await cache.set_many("model", ["hello  world "], [[1.0]])
+
+    assert await cache.get_many("model", ["hello world"]) == [[1.0]]
+    assert await cache.get_many("other", ["hello world"]) == [None]
+
+
+@pytest.mark.anyio
+async def test_sqlite_backend_is_shared(tmp_path: Path) -> None:
+    """
+    An embedding cached by one worker is a hit for another one.
+
+    :param tmp_path: temporary directory.
+    """
+    path = str(tmp_path / "embeddings.sqlite")
+    first = EmbeddingsCache(1, 60, SqliteEmbeddingsCacheBackend(path))
+    second = EmbeddingsCache(1, 60, SqliteEmbeddingsCacheBackend(path))
+
+    await first.set_many("model", ["a"], [[0.5, 0.25]])
+
+    assert await second.get_many("model", ["a"]) == [[0.5, 0.25]]
+    assert second.get_stats()["shared_hits"] == 1
+    first.close()
+    second.close()
+
+
+def test_sqlite_backend_looks_up_many_keys(tmp_path: Path, monkeypatch: Any) -> None:
+    """
+    Lookups of more keys than sqlite binds in one query are split up.
+
+    :param tmp_path: temporary directory.
+    :param monkeypatch: records the size of every query.
+    """
+    backend = SqliteEmbeddingsCacheBackend(str(tmp_path / "embeddings.sqlite"))
+    keys = [str(index) for index in range(2000)]
+    backend.set_many({key: array("f", [1.0]) for key in keys[::2]}, ttl=60)
+    query_sizes: List[int] = []
+    select_batch = backend.select_batch
+
+    def recording_select_batch(batch: Sequence[str], now: float) -> Any:
+        query_sizes.append(len(batch))
+        return select_batch(batch, now)
+
+    monkeypatch.setattr(backend, "select_batch", recording_select_batch)
+    found = backend.get_many(keys)
+    backend.close()
+
+    assert query_sizes == [900, 900, 200]
+    assert len(found) == 1000
+    assert found["0"] == array("f", [1.0])
+    assert "1" not in found
+
+
+@pytest.mark.anyio
+async def test_client_only_embeds_misses(monkeypatch: Any) -> None:
+    """
+    Cached texts are not sent to the model again.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    fake = FakeAsyncClient()
+    monkeypatch.setattr(OllamaClient, "client", fake)
+    ollama_client = OllamaClient(embeddings_cache=EmbeddingsCache(10, 60))
+
+    await ollama_client.generate_embeddings_from_text(["a", "bb"])
+    embed_res = await ollama_client.generate_embeddings_from_text(
+        ["bb", "ccc", "ccc"],
+    )
+
+    assert fake.inputs == [["a", "bb"], ["ccc"]]
+    assert embed_res.embeddings == [[2.0, 1.0], [3.0, 1.0], [3.0, 1.0]]
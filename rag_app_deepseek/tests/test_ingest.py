@@ -0,0 +1,223 @@
+import json
+from types import SimpleNamespace
+from typing import AsyncIterator, Dict, List, Set
+
+import pytest
+from aiokafka import TopicPartition
+from aiokafka.structs import OffsetAndMetadata
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from rag_app_deepseek.services.kafka.dependencies import get_kafka_producer
+from rag_app_deepseek.services.kafka.lag import ConsumerLagMonitor
+from rag_app_deepseek.services.text_embeddings.consumer import KafkaMsgText
+from rag_app_deepseek.services.text_embeddings.ingest import iter_ndjson_documents
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.tests.fakes import FakeKafkaProducer
+from rag_app_deepseek.web.api.ingest.views import router
+
+
+async def _stream(parts: List[bytes]) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+
+
+def _make_app(producer: FakeKafkaProducer, *lags: int) -> FastAPI:
+    """Builds the ingest app, its consumers lagging as given on each check."""
+    checks = iter(lags)
+
+    async def get_lag() -> int:  # noqa: WPS430
+        return next(checks, lags[-1])
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/ingest")
+    app.dependency_overrides[get_kafka_producer] = lambda: producer
+    app.state.kafka_lag_monitor = SimpleNamespace(get_lag=get_lag) if lags else None
+    return app
+
+
+@pytest.mark.anyio
+async def test_ndjson_documents_are_parsed_across_reads() -> None:
+    """Lines split over several reads of the body are parsed once complete."""
+    body = b'{"text": "first"}\n\n{"text": "second", "tenant": "acme"}'
+
+    documents = [
+        document
+        async for document in iter_ndjson_documents(
+            _stream([body[:5], body[5:25], body[25:]]),
+            max_document_bytes=100,
+        )
+    ]
+
+    assert [(doc.text, doc.tenant) for doc in documents] == [
+        ("first", ""),
+        ("second", "acme"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_bulk_ingest_publishes_chunks() -> None:
+    """Documents are chunked into text messages the consumer can parse."""
+    producer = FakeKafkaProducer()
+    text = "A sentence. " * 40
+    lines = [
+        json.dumps({"text": text, "source": "wiki", "tenant": "acme"}),
+        json.dumps({"text": "Short.", "timestamp": "2025-01-29T08:49:13"}),
+    ]
+    transport = ASGITransport(app=_make_app(producer))
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(
+            "/api/ingest/",
+            content="\n".join(lines),
+            headers={"content-type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["documents"] == 2
+    assert response.json()["chunks"] == len(producer.messages) > 2
+    messages = [
+        KafkaMsgText.model_validate_json(message) for _, message in producer.messages
+    ]
+    assert {topic for topic, _ in producer.messages} == {settings.kafka_topic_text}
+    assert all(len(msg.text.encode()) <= 200 for msg in messages)  # noqa: WPS432
+    assert (messages[0].source, messages[0].tenant) == ("wiki", "acme")
+    assert messages[-1].text == "Short."
+    document_ids = [msg.document_id for msg in messages]
+    assert len(set(document_ids[:-1])) == 1
+    assert document_ids[-1] not in document_ids[:-1]
+
+
+@pytest.mark.anyio
+async def test_bulk_ingest_backs_off_when_consumers_lag() -> None:
+    """Ingestion is refused with a Retry-After while the consumers lag behind."""
+    producer = FakeKafkaProducer()
+    transport = ASGITransport(
+        app=_make_app(producer, settings.ingest_max_consumer_lag + 1),
+    )
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(
+            "/api/ingest/",
+            content="Some text.",
+            headers={"content-type": "text/plain"},
+        )
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == str(settings.ingest_retry_after_s)
+    assert producer.messages == []
+
+
+@pytest.mark.anyio
+async def test_bulk_ingest_stops_on_consumer_lag() -> None:
+    """A long upload stops once the consumers lag, telling what was ingested."""
+    producer = FakeKafkaProducer()
+    limit = settings.ingest_max_consumer_lag
+    lines = [json.dumps({"text": f"Document {index}."}) for index in range(4)]
+    transport = ASGITransport(app=_make_app(producer, 0, 0, 0, limit + 1))
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post(
+            "/api/ingest/",
+            content="\n".join(lines),
+            headers={"content-type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == str(settings.ingest_retry_after_s)
+    assert "2 chunks were ingested" in response.json()["detail"]
+    assert len(producer.messages) == 2
+
+
+@pytest.mark.anyio
+async def test_bulk_ingest_refuses_oversize_metadata() -> None:
+    """Metadata milvus would reject is refused in utf-8 bytes, not characters."""
+    producer = FakeKafkaProducer()
+    transport = ASGITransport(app=_make_app(producer))
+
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        ndjson = await client.post(
+            "/api/ingest/",
+            content=json.dumps({"text": "Some text.", "tenant": "é" * 33}),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        text = await client.post(
+            "/api/ingest/",
+            content="Some text.",
+            params={"source": "s" * 129},
+            headers={"content-type": "text/plain"},
+        )
+
+    assert ndjson.status_code == 400
+    assert "tenant is longer than 64 utf-8 bytes" in ndjson.json()["detail"]
+    assert text.status_code == 400
+    assert text.json()["detail"] == "source is longer than 128 utf-8 bytes"
+    assert producer.messages == []
+
+
+class FakeOffsetsKafka:
+    """Fake admin client and consumer of a topic, answering its offsets."""
+
+    def __init__(
+        self,
+        committed: Dict[int, int],
+        beginning: Dict[int, int],
+        end: Dict[int, int],
+    ) -> None:
+        self.committed = committed
+        self.beginning = beginning
+        self.end = end
+
+    async def topics(self) -> Set[str]:
+        """Fake of AIOKafkaConsumer.topics."""
+        return {settings.kafka_topic_text}
+
+    def partitions_for_topic(self, topic: str) -> Set[int]:
+        """Fake of AIOKafkaConsumer.partitions_for_topic."""
+        return set(self.end)
+
+    async def list_consumer_group_offsets(
+        self,
+        group_id: str,
+        partitions: List[TopicPartition],
+    ) -> Dict[TopicPartition, OffsetAndMetadata]:
+        """Fake of AIOKafkaAdminClient.list_consumer_group_offsets."""
+        return {
+            tp: OffsetAndMetadata(self.committed[tp.partition], "")
+            for tp in partitions
+            if tp.partition in self.committed
+        }
+
+    async def beginning_offsets(
+        self,
+        partitions: List[TopicPartition],
+    ) -> Dict[TopicPartition, int]:
+        """Fake of AIOKafkaConsumer.beginning_offsets."""
+        return {tp: self.beginning[tp.partition] for tp in partitions}
+
+    async def end_offsets(
+        self,
+        partitions: List[TopicPartition],
+    ) -> Dict[TopicPartition, int]:
+        """Fake of AIOKafkaConsumer.end_offsets."""
+        return {tp: self.end[tp.partition] for tp in partitions}
+
+
+@pytest.mark.anyio
+async def test_lag_counts_uncommitted_partitions_from_their_beginning() -> None:
+    """Partitions the group never committed to lag from their earliest offset."""
+    kafka = FakeOffsetsKafka(
+        committed={0: 90, 1: -1},
+        beginning={0: 0, 1: 10, 2: 5},
+        end={0: 100, 1: 50, 2: 30},
+    )
+    lag_monitor = ConsumerLagMonitor(
+        admin_client=kafka,  # type: ignore
+        consumer=kafka,  # type: ignore
+        group_id=settings.kafka_consumer_group_id,
+        topic=settings.kafka_topic_text,
+        interval_s=0,
+    )
+
+    assert await lag_monitor.get_lag() == 75
+    assert lag_monitor.partition_lags == {0: 10, 1: 40, 2: 25}
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.text_embeddings.retrieval import RetrievalParams
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient, make_app
+from rag_app_deepseek.web.api.search.views import retrieve_context
+
+TEXTS = [
+    "The deployment failed with error ERR_4821 on the staging cluster.",
+    "Staging cluster deployments are scheduled every night.",
+    "The cluster was upgraded to the new kernel last week.",
+    "Nightly builds publish their artifacts to the registry.",
+]
+
+
+def test_rare_terms_rank_first(tmp_path: Path) -> None:
+    """A chunk holding a rare identifier outranks chunks of common terms."""
+    index = BM25Index(str(tmp_path), flush_docs=2)
+    index.add([10, 11], TEXTS[:2])
+    index.add([12, 13], TEXTS[2:])
+
+    results = index.search("what is err_4821 on the cluster", limit=3)
+
+    assert results[0][0] == 10
+    assert {doc_id for doc_id, _ in results} <= {10, 11, 12}
+    assert index.search("unknown words", limit=3) == []
+
+
+def test_segments_are_shared_and_compacted(tmp_path: Path) -> None:
+    """Flushed segments are searched by other workers, merged ones only once."""
+    writer = BM25Index(str(tmp_path), flush_docs=1, max_segments=2)
+    reader = BM25Index(str(tmp_path), refresh_interval_s=0)
+    for doc_id, text in enumerate(TEXTS):
+        writer.add([doc_id], [text])
+        reader.search("cluster", limit=10)
+
+    # three segments merged into one, then the last one
+    assert len(writer.segments) == 2
+    assert len([path for path in tmp_path.iterdir() if path.is_dir()]) == 2
+    assert len(reader.search("cluster", limit=10)) == 3
+    assert len(reader) == len(TEXTS)
+    assert len(BM25Index(str(tmp_path))) == len(TEXTS)
+
+
+@pytest.mark.anyio
+async def test_hybrid_retrieval_adds_lexical_matches(tmp_path: Path) -> None:
+    """An exact identifier match missed by vector search makes it into the context."""
+    ollama_client = FakeOllamaClient()
+    milvus = FakeMilvusClient()
+    query_embedding = ollama_client.embed_text("ERR_4821")
+    vectors = [-np.asarray(query_embedding)] + [
+        np.asarray(query_embedding) + np.eye(ollama_client.dim)[index]
+        for index in range(len(TEXTS) - 1)
+    ]
+    insert_res = milvus.insert(
+        "",
+        [
+            {"text": text, "embedding": vector.tolist()}
+            for text, vector in zip(TEXTS, vectors)
+        ],
+    )
+    lexical_index = BM25Index(str(tmp_path))
+    lexical_index.add(insert_res["ids"], TEXTS)
+    app = make_app(
+        ollama_client=ollama_client,
+        milvus_client=MilvusAsyncClient([milvus], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=lexical_index,
+    )
+    params = RetrievalParams(
+        candidates=2,
+        top_k=2,
+        min_score=0.5,
+        mmr_lambda=1,
+        token_budget=1000,
+    )
+
+    _, dense_ids, _ = await retrieve_context(app, "ERR_4821", retrieval_params=params)
+    _, hybrid_ids, _ = await retrieve_context(
+        app,
+        "ERR_4821",
+        retrieval_params=params._replace(hybrid=True),
+    )
+
+    assert insert_res["ids"][0] not in dense_ids
+    assert hybrid_ids[0] == insert_res["ids"][0]
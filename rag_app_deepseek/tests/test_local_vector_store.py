@@ -0,0 +1,142 @@
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from rag_app_deepseek.services.milvus.filters import SearchFilters, build_filter_expr
+from rag_app_deepseek.services.milvus.index import build_index_params
+from rag_app_deepseek.services.milvus.local import LocalVectorStore
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import Float16Codec
+from rag_app_deepseek.services.text_embeddings.service import (
+    InsertTextWithEmbeddingsIntoMilvusInput,
+    get_texts_by_ids,
+    get_texts_matching_vector_search,
+    insert_text_with_embeddings_into_milvus,
+)
+from rag_app_deepseek.settings import MilvusIndexType, MilvusMetricType
+
+EMBEDDINGS = np.random.default_rng(0).normal(size=(40, 16)).astype(np.float32)
+
+
+def _rows(start: int, stop: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "text": f"chunk {index}",
+            "embedding": EMBEDDINGS[index].tolist(),
+            "timestamp_unix": index,
+            "text_hash": f"hash {index}",
+            "tenant": "even" if index % 2 == 0 else "odd",
+        }
+        for index in range(start, stop)
+    ]
+
+
+@pytest.mark.anyio
+async def test_local_store_serves_the_milvus_calls(tmp_path: Path) -> None:
+    """Chunks inserted and searched like with milvus are persisted on disk."""
+    codec = Float16Codec(dim=16)
+    milvus_client = MilvusAsyncClient([LocalVectorStore(str(tmp_path))] * 2, timeout=1)
+    res = await insert_text_with_embeddings_into_milvus(
+        milvus_client,
+        [
+            InsertTextWithEmbeddingsIntoMilvusInput(
+                text=f"chunk {index}",
+                embedding=codec.encode([EMBEDDINGS[index]])[0],
+                timestamp_unix=index,
+                text_hash=f"hash {index}",
+                tenant="even" if index % 2 == 0 else "odd",
+            )
+            for index in range(10)
+        ],
+    )
+
+    hits = await get_texts_matching_vector_search(
+        milvus_client,
+        EMBEDDINGS[4],
+        search_params={"metric_type": "COSINE", "params": {}},
+        vector_codec=codec,
+        limit=3,
+        output_fields=["text", "embedding"],
+        filter_expr=build_filter_expr(SearchFilters(tenant="even", since=2)),
+    )
+    reopened = MilvusAsyncClient([LocalVectorStore(str(tmp_path))], timeout=1)
+    by_ids = await get_texts_by_ids(reopened, [res["ids"][3], res["ids"][4]])
+
+    assert res["ids"] == list(range(1, 11))
+    assert hits[0]["id"] == 5
+    assert hits[0]["distance"] == pytest.approx(1, abs=1e-3)
+    assert hits[0]["entity"]["text"] == "chunk 4"
+    assert codec.decode([hits[0]["entity"]["embedding"]]).shape == (1, 16)
+    assert {hit["entity"]["text"] for hit in hits} <= {
+        "chunk 2",
+        "chunk 4",
+        "chunk 6",
+        "chunk 8",
+    }
+    assert sorted(hit["entity"]["text"] for hit in by_ids) == ["chunk 3", "chunk 4"]
+    milvus_client.close()
+    reopened.close()
+
+
+def test_segments_are_shared_and_merged(tmp_path: Path) -> None:
+    """Segments of another store are searched, merged ones only once."""
+    writer = LocalVectorStore(str(tmp_path), max_segments=2)
+    reader = LocalVectorStore(str(tmp_path), refresh_interval_s=0)
+    ids = []
+    for start in range(0, 40, 8):
+        ids.extend(writer.insert("chunks", _rows(start, start + 8))["ids"])
+        reader.search("chunks", [EMBEDDINGS[0].tolist()], limit=1)
+
+    stored = reader.query(
+        "chunks",
+        filter='text_hash in ["hash 3", "hash 39", "unknown"]',
+        output_fields=["text_hash"],
+    )
+    hits = reader.search(
+        "chunks",
+        EMBEDDINGS[[12, 31]].tolist(),
+        limit=2,
+        search_params={"metric_type": "L2"},
+        filter="timestamp_unix < 30",
+    )
+
+    assert ids == list(range(1, 41))
+    assert len(writer.get_collection("chunks").segments) <= 2
+    assert len(reader.get_collection("chunks")) == 40
+    assert sorted(stored, key=lambda row: row["id"]) == [
+        {"id": 4, "text_hash": "hash 3"},
+        {"id": 40, "text_hash": "hash 39"},
+    ]
+    assert hits[0][0] == {
+        "id": 13,
+        "distance": pytest.approx(0, abs=1e-4),
+        "entity": {},
+    }
+    assert all(hit["id"] <= 30 for hit in hits[1])
+
+
+def test_large_segments_are_searched_with_hnsw(tmp_path: Path) -> None:
+    """Segments above the size threshold get an HNSW index, filters included."""
+    pytest.importorskip("hnswlib")
+    store = LocalVectorStore(
+        str(tmp_path),
+        hnsw_min_rows=20,
+        hnsw_params=build_index_params(MilvusIndexType.HNSW, MilvusMetricType.COSINE),
+    )
+    store.insert("chunks", _rows(0, 30))
+    store.insert("chunks", _rows(30, 40))
+
+    hits = store.search(
+        "chunks",
+        EMBEDDINGS[[3, 6]].tolist(),
+        limit=1,
+        output_fields=["text"],
+        filter='tenant == "odd"',
+    )
+
+    segments = list(store.get_collection("chunks").segments.values())
+    assert [segment.hnsw_index is not None for segment in segments] == [True, False]
+    assert hits[0][0]["entity"] == {"text": "chunk 3"}
+    assert hits[1][0]["entity"]["text"] != "chunk 6"
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import Counter, values
+
+from rag_app_deepseek.services.metrics.registry import MULTIPROC_DIR_ENV, render_metrics
+from rag_app_deepseek.web.api.monitoring.views import router
+from rag_app_deepseek.web.middleware import MetricsMiddleware
+
+
+def test_metrics_of_every_process_are_exported(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    With a multiprocess directory, the metrics of all the workers add up.
+
+    :param tmp_path: multiprocess directory.
+    :param monkeypatch: fixture to set the directory and the process ids.
+    """
+    monkeypatch.setenv(MULTIPROC_DIR_ENV, str(tmp_path))
+    monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda: 1))
+    Counter("test_events", "Test.", registry=None).inc()
+    monkeypatch.setattr(values, "ValueClass", values.MultiProcessValue(lambda: 2))
+    Counter("test_events", "Test.", registry=None).inc()
+    values.close_all_multiprocess_files()
+
+    assert "test_events_total 2.0" in render_metrics().decode().splitlines()
+
+
+@pytest.mark.anyio
+async def test_requests_are_exported_by_route() -> None:
+    """Requests are labelled with their route template, not their path."""
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int) -> int:  # noqa: WPS430
+        return item_id
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+    ) as client:
+        await client.get("/items/1")
+        await client.get("/items/2")
+        response = await client.get("/api/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert (
+        'rag_http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 2.0'  # noqa: E501
+        in response.text
+    )
+    assert "rag_http_requests_in_flight 1.0" in response.text
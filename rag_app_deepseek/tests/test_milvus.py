@@ -0,0 +1,157 @@
+import asyncio
+from typing import Any, Dict
+
+import numpy as np
+import pytest
+
+from rag_app_deepseek.services.milvus.filters import SearchFilters, build_filter_expr
+from rag_app_deepseek.services.milvus.index import (
+    build_index_params,
+    build_search_params,
+)
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import BinaryCodec, ProjectionCodec
+from rag_app_deepseek.settings import MilvusIndexType, MilvusMetricType
+from rag_app_deepseek.tests.fakes import FakeMilvusClient
+
+
+@pytest.mark.anyio
+async def test_search_does_not_block_event_loop() -> None:
+    """Other coroutines keep running while a milvus search is in flight."""
+    milvus_client = MilvusAsyncClient([FakeMilvusClient(latency=0.1)], timeout=1)
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    await milvus_client.search("text_embeddings_schema", [[1.0, 0.0]])
+    ticker_task.cancel()
+    milvus_client.close()
+
+    assert ticks >= 5
+
+
+@pytest.mark.anyio
+async def test_pool_size_bounds_concurrent_calls() -> None:
+    """Calls beyond the pool size wait for a free connection."""
+    fakes = [FakeMilvusClient(), FakeMilvusClient()]
+    milvus_client = MilvusAsyncClient(fakes, timeout=1)
+
+    await asyncio.gather(
+        *(
+            milvus_client.insert("text_embeddings_schema", [{"text": str(i)}])
+            for i in range(6)  # noqa: WPS111
+        ),
+    )
+    milvus_client.close()
+
+    assert milvus_client.idle_clients.qsize() == 2
+    assert sum(fake.insert_calls for fake in fakes) == 6
+
+
+class TimedMilvusClient:
+    """Fake milvus client recording the timeout of every call."""
+
+    def __init__(self) -> None:
+        self.timeouts: Dict[str, float] = {}
+
+    def search(self, collection_name: str, data: Any, **kwargs: Any) -> Any:
+        """Records the timeout of the search."""
+        self.timeouts["search"] = kwargs["timeout"]
+        return [[]]
+
+    def insert(self, collection_name: str, data: Any, **kwargs: Any) -> Any:
+        """Records the timeout of the insert."""
+        self.timeouts["insert"] = kwargs["timeout"]
+        return {"insert_count": len(data), "ids": []}
+
+    def close(self) -> None:
+        """Nothing to close."""
+
+
+@pytest.mark.anyio
+async def test_inserts_have_their_own_timeout() -> None:
+    """Bulk inserts get the longer insert timeout, searches the short one."""
+    fake = TimedMilvusClient()
+    milvus_client = MilvusAsyncClient(
+        [fake],  # type: ignore
+        timeout=3,
+        insert_timeout=60,
+    )
+
+    await milvus_client.insert("text_embeddings_schema", [{"text": "chunk"}])
+    await milvus_client.search("text_embeddings_schema", [[1.0, 0.0]])
+    milvus_client.close()
+
+    assert fake.timeouts == {"insert": 60, "search": 3}
+
+
+def test_index_and_search_params_match_index_type() -> None:
+    """Build params override the defaults and search params fit the index."""
+    hnsw = build_index_params(
+        MilvusIndexType.HNSW,
+        MilvusMetricType.COSINE,
+        {"M": 32},
+    )
+    ivf_search = build_search_params(
+        MilvusIndexType.IVF_FLAT,
+        MilvusMetricType.COSINE,
+        limit=10,
+        ef=64,
+        nprobe=8,
+    )
+    hnsw_search = build_search_params(
+        MilvusIndexType.HNSW,
+        MilvusMetricType.COSINE,
+        limit=10,
+        ef=4,
+        nprobe=8,
+    )
+
+    assert hnsw["params"] == {"M": 32, "efConstruction": 200}
+    assert ivf_search == {"metric_type": "COSINE", "params": {"nprobe": 8}}
+    # HNSW can not return more results than ef
+    assert hnsw_search["params"] == {"ef": 10}
+
+
+def test_vector_codecs_shrink_embeddings() -> None:
+    """Projections keep normalized vectors, binary packs one bit per dimension."""
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((40, 64))
+
+    for codec in (
+        ProjectionCodec.fit_pca(embeddings, 8),
+        ProjectionCodec.random(64, 8),
+    ):
+        encoded = np.asarray(codec.encode(embeddings))
+        assert encoded.shape == (40, 8)
+        assert np.allclose(np.linalg.norm(encoded, axis=1), 1, atol=1e-5)
+
+    binary = BinaryCodec(dim=64)
+    packed = binary.encode(embeddings)
+    assert {len(vector) for vector in packed} == {binary.bytes_per_vector()} == {8}
+    assert np.array_equal(
+        np.unpackbits(np.frombuffer(packed[0], dtype=np.uint8)),
+        (embeddings[0] > 0).astype(np.uint8),
+    )
+
+
+def test_search_filters_build_milvus_expression() -> None:
+    """Filters are combined into one expression with quoted string literals."""
+    filters = SearchFilters(
+        since=100,
+        until=200,
+        sources=["wiki", 'say "hi"'],
+        tenant="acme",
+    )
+
+    assert build_filter_expr(None) == ""
+    assert build_filter_expr(SearchFilters()) == ""
+    assert build_filter_expr(filters) == (
+        'tenant == "acme" and timestamp_unix >= 100 and timestamp_unix < 200 '
+        + 'and source in ["wiki", "say \\"hi\\""]'
+    )
@@ -0,0 +1,99 @@
+from typing import Any, List
+
+import httpx
+import pytest
+from ollama import AsyncClient
+
+from rag_app_deepseek.services.ollama.batching import (
+    AdaptiveBatchSizer,
+    split_into_batches,
+)
+from rag_app_deepseek.services.ollama.scheduler import OllamaScheduler
+from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.tests.fakes import FakeOllamaServer
+
+
+def test_split_into_batches_respects_budget() -> None:
+    """Texts are packed in order without exceeding the budget."""
+    assert split_into_batches(["aa", "bb", "cccc", "d", "eeeeeeee"], 4) == [
+        [0, 1],
+        [2],
+        [3],
+        [4],
+    ]
+
+
+def test_sizer_settles_on_fastest_batch_size() -> None:
+    """The sizer climbs towards the batch size with the best throughput."""
+    sizer = AdaptiveBatchSizer(initial=1000, min_size=500, max_size=16000)
+
+    for _ in range(300):
+        budget = sizer.next_budget()
+        # fixed overhead per request, throughput degrades past 4000 chars
+        seconds = 0.05 + budget / 100000 + max(0, budget - 4000) / 20000  # noqa: WPS221
+        sizer.observe(budget, budget, seconds)
+
+    assert sizer.get_stats()["budget"] == 4000
+
+
+@pytest.mark.anyio
+async def test_failed_sub_batch_is_retried_alone(monkeypatch: Any) -> None:
+    """
+    Only the failing sub-batch is sent again, results keep the input order.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    server = FakeOllamaServer(latency=0)
+    server.fail_once = {"ccc"}
+    monkeypatch.setattr(
+        OllamaClient,
+        "client",
+        AsyncClient(host="http://ollama", transport=httpx.MockTransport(server.handle)),
+    )
+    monkeypatch.setattr(settings, "ollama_embed_batch_chars", 3)
+    monkeypatch.setattr(settings, "ollama_embed_retry_backoff_s", 0)
+
+    embed_res = await OllamaClient().generate_embeddings_from_text(
+        ["a", "bb", "ccc", "dddd"],
+    )
+
+    assert embed_res.embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert sorted(server.embed_inputs) == [
+        ["a", "bb"],
+        ["ccc"],
+        ["ccc"],
+        ["dddd"],
+    ]
+
+
+@pytest.mark.anyio
+async def test_sizer_ignores_scheduler_queueing(monkeypatch: Any) -> None:
+    """
+    Batches waiting for a scheduler slot report the latency of ollama only.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    server = FakeOllamaServer(latency=0.02)
+    monkeypatch.setattr(
+        OllamaClient,
+        "client",
+        AsyncClient(host="http://ollama", transport=httpx.MockTransport(server.handle)),
+    )
+    monkeypatch.setattr(settings, "ollama_embed_batch_parallelism", 4)
+    sizer = AdaptiveBatchSizer(initial=2, min_size=2, max_size=2)
+    latencies: List[float] = []
+    monkeypatch.setattr(
+        sizer,
+        "observe",
+        lambda budget, chars, seconds: latencies.append(seconds),
+    )
+    ollama_client = OllamaClient(
+        scheduler=OllamaScheduler(embed_concurrency=1, chat_concurrency=1),
+        batch_sizer=sizer,
+    )
+
+    await ollama_client.generate_embeddings_from_text(["aa", "bb", "cc", "dd"])
+
+    assert len(latencies) == 4
+    assert max(latencies) < 0.04  # noqa: WPS459
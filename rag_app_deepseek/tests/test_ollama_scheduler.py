@@ -0,0 +1,101 @@
+import asyncio
+from typing import Any, List
+
+import httpx
+import pytest
+from ollama import AsyncClient
+
+from rag_app_deepseek.services.ollama.scheduler import (
+    OllamaScheduler,
+    Priority,
+    PriorityLimiter,
+)
+from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.tests.fakes import FakeOllamaServer
+
+
+def _client(server: FakeOllamaServer, monkeypatch: Any, **limits: int) -> OllamaClient:
+    monkeypatch.setattr(
+        OllamaClient,
+        "client",
+        AsyncClient(host="http://ollama", transport=httpx.MockTransport(server.handle)),
+    )
+    return OllamaClient(scheduler=OllamaScheduler(**limits))
+
+
+@pytest.mark.anyio
+async def test_identical_embeds_are_coalesced(monkeypatch: Any) -> None:
+    """
+    Concurrent identical embed requests reach ollama once.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    server = FakeOllamaServer()
+    ollama_client = _client(
+        server,
+        monkeypatch,
+        embed_concurrency=4,
+        chat_concurrency=1,
+    )
+
+    results = await asyncio.gather(
+        *(
+            ollama_client.generate_embeddings_from_text(["same query"])
+            for _ in range(5)
+        ),
+    )
+
+    assert server.embed_inputs == [["same query"]]
+    assert all(res.embeddings == [[10.0]] for res in results)
+    assert ollama_client.scheduler.get_stats()["embed"]["coalesced"] == 4  # type: ignore
+
+
+@pytest.mark.anyio
+async def test_embed_concurrency_is_limited(monkeypatch: Any) -> None:
+    """
+    No more embed requests than the limit are in flight at once.
+
+    :param monkeypatch: pytest monkeypatch fixture.
+    """
+    server = FakeOllamaServer(latency=0.01)
+    ollama_client = _client(
+        server,
+        monkeypatch,
+        embed_concurrency=2,
+        chat_concurrency=1,
+    )
+
+    await asyncio.gather(
+        *(
+            ollama_client.generate_embeddings_from_text([str(index)])
+            for index in range(6)
+        ),
+    )
+
+    stats = ollama_client.scheduler.get_stats()["embed"]  # type: ignore
+    assert server.max_in_flight == 2
+    assert stats["max_queued"] == 4
+    assert stats["queued"] == 0
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.anyio
+async def test_interactive_requests_go_first() -> None:
+    """Queued interactive requests overtake queued background ones."""
+    limiter = PriorityLimiter(1)
+    order: List[str] = []
+
+    async def request(name: str, priority: Priority) -> None:  # noqa: WPS430
+        async with limiter.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    first = asyncio.create_task(request("first", Priority.BACKGROUND))
+    await asyncio.sleep(0)
+    await asyncio.gather(
+        first,
+        request("background", Priority.BACKGROUND),
+        request("interactive", Priority.INTERACTIVE),
+    )
+
+    assert order == ["first", "interactive", "background"]
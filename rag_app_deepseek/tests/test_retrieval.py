@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import BinaryCodec, VectorCodec
+from rag_app_deepseek.services.text_embeddings.context import (
+    ContextChunk,
+    build_context,
+    merge_texts,
+)
+from rag_app_deepseek.services.text_embeddings.retrieval import (
+    RetrievalParams,
+    rerank_candidates,
+    select_context,
+)
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient, make_app
+from rag_app_deepseek.web.api.search.views import retrieve_context
+
+
+def _params(**overrides: float) -> RetrievalParams:
+    defaults = {
+        "candidates": 10,
+        "top_k": 3,
+        "min_score": 0.0,
+        "mmr_lambda": 0.5,
+        "token_budget": 100,  # noqa: S105
+    }
+    return RetrievalParams(**{**defaults, **overrides})  # type: ignore
+
+
+def test_select_context_prefers_diverse_chunks() -> None:
+    """A chunk similar to a picked one loses to a less relevant new one."""
+    vectors = np.asarray([[1, 0], [1, 0.4], [0, 1]], dtype=np.float32)
+    relevance = np.asarray([0.9, 0.85, 0.7], dtype=np.float32)
+    token_counts = np.asarray([10, 10, 10])
+
+    assert select_context(relevance, vectors, token_counts, _params(top_k=2)) == [
+        0,
+        2,
+    ]
+    assert select_context(
+        relevance,
+        vectors,
+        token_counts,
+        _params(top_k=2, mmr_lambda=1),
+    ) == [0, 1]
+
+
+def test_select_context_respects_min_score_and_budget() -> None:
+    """Chunks below the min score or over the remaining budget are skipped."""
+    vectors = np.eye(4, dtype=np.float32)
+    relevance = np.asarray([0.9, 0.8, 0.7, 0.2], dtype=np.float32)
+    token_counts = np.asarray([60, 50, 30, 1])
+
+    picked = select_context(
+        relevance,
+        vectors,
+        token_counts,
+        _params(top_k=4, min_score=0.5),
+    )
+
+    assert picked == [0, 2]
+
+
+def test_rerank_uses_stored_half_vectors() -> None:
+    """Binary candidates are reranked with their stored half precision vectors."""
+    codec = BinaryCodec(dim=8)
+    embeddings = np.asarray(
+        [[1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1], [1, 0, 0, 0, 0, 0, 0, 0.9]],
+        dtype=np.float32,
+    )
+    rerank_vectors = codec.encode_fields(embeddings)[codec.rerank_field]
+    candidates = [
+        {
+            "id": index,
+            "distance": 0,
+            "entity": {"text": text, codec.rerank_field: vector},
+        }
+        for index, (text, vector) in enumerate(zip(["near", "far"], rerank_vectors))
+    ]
+
+    picked = rerank_candidates(
+        codec,
+        [0.9, 0, 0, 0, 0, 0, 0, 1],
+        candidates,  # type: ignore
+        _params(top_k=1, min_score=-1, mmr_lambda=1),
+    )
+
+    assert [hit["entity"] for hit in picked] == [{"text": "far"}]
+    assert picked[0]["distance"] == pytest.approx(0.99, abs=0.01)
+
+
+@pytest.mark.anyio
+async def test_retrieve_context_skips_duplicate_chunks() -> None:
+    """Duplicated chunks are fetched as candidates but passed to the llm once."""
+    ollama_client = FakeOllamaClient()
+    milvus = FakeMilvusClient()
+    query_embedding = ollama_client.embed_text("same text")
+    rows = [
+        ("same text", query_embedding),
+        ("same text", query_embedding),
+        ("other text", np.eye(ollama_client.dim)[0].tolist()),
+        ("third text", np.eye(ollama_client.dim)[1].tolist()),
+    ]
+    milvus.insert("", [{"text": text, "embedding": vector} for text, vector in rows])
+    app = make_app(
+        ollama_client=ollama_client,
+        milvus_client=MilvusAsyncClient([milvus], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=None,
+    )
+
+    _, ctx_ids, ctx_texts = await retrieve_context(
+        app,
+        "same text",
+        retrieval_params=_params(top_k=3, min_score=-1, mmr_lambda=0.7),
+    )
+
+    assert len(ctx_ids) == 3
+    assert sorted(ctx_texts) == ["other text", "same text", "third text"]
+
+
+def test_context_merges_documents_drops_repeats() -> None:
+    """Chunks of a document are merged without their overlap, repeats are dropped."""
+    chunks = [
+        ContextChunk(id=2, text="Second one. Third one.", document_id="a"),
+        ContextChunk(id=7, text="Another message.", document_id="b"),
+        ContextChunk(id=1, text="First one. Second one.", document_id="a"),
+        ContextChunk(id=9, text="another   MESSAGE."),
+        ContextChunk(id=3, text="Unknown document."),
+        ContextChunk(id=8, text="Out of budget, far too many tokens here."),
+    ]
+
+    assert build_context(chunks, token_budget=15) == [
+        "First one. Second one. Third one.",
+        "Another message.",
+        "Unknown document.",
+    ]
+
+
+def test_merge_texts_scans_only_the_possible_overlap() -> None:
+    """Overlaps are found at the end of a long block, up to the whole chunk."""
+    block = " ".join(f"Sentence {index}." for index in range(2000))
+
+    assert merge_texts(block, "Sentence 1999. Next one.") == f"{block} Next one."
+    assert merge_texts(block, "Sentence 1999.") == block
+    assert merge_texts("One. Two.", "Three.") == "One. Two. Three."
+    assert merge_texts("One. Two.", "wo. Three.") == "One. Two. wo. Three."
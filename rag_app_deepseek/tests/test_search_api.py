@@ -0,0 +1,49 @@
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient
+from rag_app_deepseek.web.api.search.views import router
+
+TEXTS = ["First chunk.", "Second chunk.", "Third chunk."]
+
+
+@pytest.mark.anyio
+async def test_traced_search_returns_stage_timings() -> None:
+    """A traced search returns its timings in the header and the json body."""
+    ollama_client = FakeOllamaClient()
+    milvus = FakeMilvusClient()
+    milvus.insert(
+        "",
+        [{"text": text, "embedding": ollama_client.embed_text(text)} for text in TEXTS],
+    )
+    app = FastAPI()
+    app.include_router(router, prefix="/api/search")
+    app.state.ollama_client = ollama_client
+    app.state.milvus_client = MilvusAsyncClient([milvus], timeout=1)
+    app.state.answer_cache = None
+    app.state.vector_codec = VectorCodec()
+    app.state.lexical_index = None
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+    ) as client:
+        untraced = await client.get("/api/search/", params={"query": TEXTS[0]})
+        traced = await client.get(
+            "/api/search/",
+            params={"query": TEXTS[0], "trace": "json"},
+            headers={"X-Trace-Id": "abc-123"},
+        )
+
+    assert untraced.json() == ollama_client.answer
+    assert "server-timing" not in untraced.headers
+    body = traced.json()
+    assert body["answer"] == ollama_client.answer
+    assert body["trace"]["trace_id"] == traced.headers["x-trace-id"] == "abc-123"
+    stages = ["embed", "search", "rerank", "context", "prompt", "llm_ttft"]
+    assert set(stages) < set(body["trace"]["timings_ms"])
+    assert traced.headers["server-timing"].startswith("embed;dur=")
+    assert [chunk["id"] for chunk in body["trace"]["chunks"]]
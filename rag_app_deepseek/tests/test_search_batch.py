@@ -0,0 +1,73 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient, make_app
+from rag_app_deepseek.web.api.search.schema import BatchSearchResult
+from rag_app_deepseek.web.api.search.views import iter_batch_answers
+
+TEXTS = ["First chunk.", "Second chunk.", "Third chunk."]
+
+
+@pytest.mark.anyio
+async def test_batch_search_embeds_and_searches_once() -> None:
+    """All queries of a batch share one embed call and one milvus search."""
+    ollama_client = FakeOllamaClient()
+    milvus = FakeMilvusClient()
+    milvus.insert(
+        "",
+        [{"text": text, "embedding": ollama_client.embed_text(text)} for text in TEXTS],
+    )
+    app = make_app(
+        ollama_client=ollama_client,
+        milvus_client=MilvusAsyncClient([milvus], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=None,
+    )
+
+    results: List[BatchSearchResult] = [
+        result async for result in iter_batch_answers(app, TEXTS)
+    ]
+
+    assert ollama_client.embed_calls == [TEXTS]
+    assert milvus.search_calls == 1
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    for result in results:
+        assert result.query == TEXTS[result.index]
+        assert result.answer == ollama_client.answer
+        assert result.error is None
+        assert result.context_ids
+    assert len(ollama_client.chat_prompts) == len(TEXTS)
+
+
+@pytest.mark.anyio
+async def test_closed_batch_leaves_no_pending_tasks() -> None:
+    """Closing the answers early cancels the llm calls and waits for them."""
+    ollama_client = FakeOllamaClient(latency=0.05)
+    milvus = FakeMilvusClient()
+    milvus.insert(
+        "",
+        [{"text": text, "embedding": ollama_client.embed_text(text)} for text in TEXTS],
+    )
+    app = make_app(
+        ollama_client=ollama_client,
+        milvus_client=MilvusAsyncClient([milvus], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=None,
+    )
+
+    answers = iter_batch_answers(app, TEXTS * 4)
+    await answers.__anext__()
+    await answers.aclose()  # type: ignore
+
+    pending = [
+        task
+        for task in asyncio.all_tasks()
+        if task.get_coro().__name__ == "answer_batch_query"  # type: ignore
+    ]
+    assert not pending
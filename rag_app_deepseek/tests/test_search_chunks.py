@@ -0,0 +1,111 @@
+from typing import Any, AsyncGenerator, Dict, Union
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient
+from rag_app_deepseek.web.api.search.views import MAX_SEARCH_WINDOW, router
+
+TEXTS = ["First chunk.", "Second chunk.", "Third chunk."]
+
+
+@pytest.fixture
+def ollama_client() -> FakeOllamaClient:
+    """
+    Fake ollama client.
+
+    :returns: FakeOllamaClient
+    """
+    return FakeOllamaClient()
+
+
+@pytest.fixture
+async def search_client(
+    ollama_client: FakeOllamaClient,
+    anyio_backend: Any,
+) -> AsyncGenerator[AsyncClient, None]:
+    """
+    Client of the search api, over the chunks of TEXTS.
+
+    :param ollama_client: fake ollama client.
+    :param anyio_backend: backend of the anyio plugin.
+    :yield: client for the app.
+    """
+    milvus = FakeMilvusClient()
+    milvus.insert(
+        "",
+        [
+            {
+                "text": text,
+                "embedding": ollama_client.embed_text(text),
+                "timestamp_unix": index,
+                "source": "mail",
+            }
+            for index, text in enumerate(TEXTS)
+        ],
+    )
+    app = FastAPI()
+    app.include_router(router, prefix="/api/search")
+    app.state.ollama_client = ollama_client
+    app.state.milvus_client = MilvusAsyncClient([milvus], timeout=1)
+    app.state.vector_codec = VectorCodec()
+    async with AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://test",
+    ) as api_client:
+        yield api_client
+
+
+@pytest.mark.anyio
+async def test_chunks_are_paged_without_llm(
+    search_client: AsyncClient,
+    ollama_client: FakeOllamaClient,
+) -> None:
+    """Chunks are paged through the vector search and never reach the llm."""
+    params: Dict[str, Union[str, int]] = {"query": TEXTS[0], "limit": 2}
+
+    first = await search_client.get("/api/search/chunks", params=params)
+    last = await search_client.get("/api/search/chunks", params={**params, "offset": 2})
+
+    assert first.status_code == last.status_code == 200
+    chunks = first.json()["chunks"] + last.json()["chunks"]
+    assert [chunk["id"] for chunk in chunks] == [0, 1, 2]
+    assert chunks[0]["text"] == TEXTS[0]
+    assert chunks[0]["timestamp_unix"] == 0
+    assert first.json()["next_offset"] == 2
+    assert "next_offset" not in last.json()
+    assert ollama_client.chat_prompts == []
+
+
+@pytest.mark.anyio
+async def test_chunks_return_the_requested_fields(search_client: AsyncClient) -> None:
+    """Only the requested fields are returned, unset ones are left out."""
+    response = await search_client.get(
+        "/api/search/chunks",
+        params=[("query", TEXTS[0]), ("fields", "source"), ("fields", "tenant")],
+    )
+
+    assert response.status_code == 200
+    chunk = response.json()["chunks"][0]
+    assert set(chunk) == {"id", "distance", "source"}
+    assert chunk["source"] == "mail"
+
+
+@pytest.mark.anyio
+async def test_chunks_reject_invalid_pages(search_client: AsyncClient) -> None:
+    """Pages past the search window and unknown fields are rejected."""
+    past_window = await search_client.get(
+        "/api/search/chunks",
+        params={"query": TEXTS[0], "limit": 10, "offset": MAX_SEARCH_WINDOW - 5},
+    )
+    unknown_field = await search_client.get(
+        "/api/search/chunks",
+        params={"query": TEXTS[0], "fields": "embedding"},
+    )
+
+    assert past_window.status_code == 422
+    assert str(MAX_SEARCH_WINDOW) in past_window.json()["detail"]
+    assert unknown_field.status_code == 422
@@ -0,0 +1,96 @@
+import time
+from typing import List
+
+import pytest
+import ujson
+
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.ollama.reasoning import ReasoningSplitter
+from rag_app_deepseek.tests.fakes import FakeMilvusClient, FakeOllamaClient, make_app
+from rag_app_deepseek.web.api.search.schema import ReasoningMode
+from rag_app_deepseek.web.api.search.views import stream_answer
+
+
+def test_splitter_handles_tags_split_across_chunks() -> None:
+    """Reasoning tags are recognised even when streamed in pieces."""
+    splitter = ReasoningSplitter()
+    parts = []
+    for chunk in ["<thi", "nk>hmm</th", "ink>", "yes <", "b>"]:
+        parts += splitter.feed(chunk)
+    parts += splitter.flush()
+
+    assert "".join(text for kind, text in parts if kind == "think") == "hmm"
+    assert "".join(text for kind, text in parts if kind == "answer") == "yes <b>"
+
+
+def _events(raw: List[str]) -> List[str]:
+    return [event.split("\n")[0].removeprefix("event: ") for event in raw]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(
+    "reasoning,expected",
+    [
+        (ReasoningMode.TAG, "thinking|answer"),
+        (ReasoningMode.DROP, "answer"),
+        (ReasoningMode.INCLUDE, "<think>thinking</think>answer"),
+    ],
+)
+async def test_stream_answer_events(reasoning: ReasoningMode, expected: str) -> None:
+    """
+    The answer is streamed as events ending with the generation stats.
+
+    :param reasoning: reasoning mode of the stream.
+    :param expected: streamed text, think and answer parts separated by `|`.
+    """
+    app = make_app(
+        ollama_client=FakeOllamaClient(),
+        milvus_client=MilvusAsyncClient([FakeMilvusClient()], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=None,
+    )
+
+    raw = [
+        event
+        async for event in stream_answer(app, "query", reasoning, time.perf_counter())
+    ]
+
+    kinds = _events(raw)
+    assert kinds[0] == "context"
+    assert kinds[-1] == "done"
+    think = "".join(
+        ujson.loads(event.split("data: ")[1])["text"]
+        for event in raw
+        if event.startswith("event: think")
+    )
+    answer = "".join(
+        ujson.loads(event.split("data: ")[1])["text"]
+        for event in raw
+        if event.startswith("event: answer")
+    )
+    assert "|".join(filter(None, [think, answer])) == expected
+    stats = ujson.loads(raw[-1].split("data: ")[1])
+    assert stats["tokens"] > 0
+    assert stats["prompt_tokens"] > 0
+
+
+@pytest.mark.anyio
+async def test_closing_stream_cancels_generation() -> None:
+    """Closing the response stream closes the llm stream."""
+    ollama_client = FakeOllamaClient()
+    app = make_app(
+        ollama_client=ollama_client,
+        milvus_client=MilvusAsyncClient([FakeMilvusClient()], timeout=1),
+        answer_cache=None,
+        vector_codec=VectorCodec(),
+        lexical_index=None,
+    )
+
+    stream = stream_answer(app, "query", ReasoningMode.TAG, time.perf_counter())
+    await stream.__anext__()
+    await stream.__anext__()
+    await stream.aclose()  # type: ignore
+
+    assert ollama_client.closed_streams == 1
@@ -0,0 +1,47 @@
+from rag_app_deepseek.services.text_embeddings.chunking import estimate_tokens
+from rag_app_deepseek.services.text_embeddings.service import (
+    iter_text_chunks,
+    split_text_into_chunks,
+)
+
+
+def test_sentences_are_packed_within_limit() -> None:
+    """Whole sentences are packed greedily into chunks."""
+    text = "One two. Three four! Five six? Seven."
+
+    assert split_text_into_chunks(text, limit=20) == [
+        "One two. Three four!",
+        "Five six? Seven.",
+    ]
+
+
+def test_chunks_fit_limit_in_utf8_bytes() -> None:
+    """Multi-byte text is cut by its encoded size, on character boundaries."""
+    text = " ".join(["東京データ"] * 40) + ". " + "é" * 500
+
+    chunks = list(iter_text_chunks(text, limit=50))
+
+    assert all(len(chunk.encode()) <= 50 for chunk in chunks)
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
+    # long sentences are cut at word boundaries
+    assert chunks[0] == " ".join(["東京データ"] * 3)
+
+
+def test_overlap_repeats_trailing_sentences() -> None:
+    """The next chunk starts with the trailing sentences within the overlap."""
+    text = "Aaaa. Bbbb. Cccc. Dddd. Eeee."
+
+    assert split_text_into_chunks(text, limit=17, overlap=5) == [
+        "Aaaa. Bbbb. Cccc.",
+        "Cccc. Dddd. Eeee.",
+    ]
+
+
+def test_token_limit() -> None:
+    """Chunks are bounded in tokens as well as in bytes."""
+    text = "a b c d e f g. h i. j k l m n o p q r s t u v w x y z."
+
+    chunks = split_text_into_chunks(text, limit=200, max_tokens=6)
+
+    assert all(estimate_tokens(chunk) <= 6 for chunk in chunks)
+    assert chunks[:2] == ["a b c d e f", "g. h i."]
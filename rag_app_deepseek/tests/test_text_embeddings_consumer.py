@@ -0,0 +1,481 @@
+import asyncio
+import json
+import threading
+from typing import List, Sequence
+
+import httpx
+import pytest
+from aiokafka import TopicPartition
+from ollama import EmbedResponse, ResponseError
+from pymilvus.exceptions import MilvusException
+
+from rag_app_deepseek.services.kafka.dlq import DeadLetterQueue
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.text_embeddings.consumer import (
+    TextEmbeddingsBatch,
+    TextEmbeddingsPipeline,
+    collect_kafka_batch,
+    get_batch_commit_offsets,
+    parse_text_embeddings_batch,
+    process_text_embeddings_batch,
+    run_text_embeddings_consumer,
+    supervise_text_embeddings_consumer,
+)
+from rag_app_deepseek.services.text_embeddings.dedup import ChunkDeduplicator
+from rag_app_deepseek.services.text_embeddings.failures import (
+    FailureKind,
+    classify_failure,
+)
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.tests.fakes import (
+    FakeKafkaConsumer,
+    FakeKafkaProducer,
+    FakeMilvusClient,
+    FakeOllamaClient,
+    make_record,
+)
+
+
+def _msg(text: str, **metadata: str) -> bytes:
+    return json.dumps(
+        {"text": text, "timestamp": "2025-01-29T08:49:13", **metadata},
+    ).encode()
+
+
+@pytest.mark.anyio
+async def test_batch_is_embedded_and_inserted_once() -> None:
+    """Chunks of all messages in a batch share one embed and one insert call."""
+    ollama_client = FakeOllamaClient()
+    milvus_client = FakeMilvusClient()
+    records = [
+        make_record(_msg("First message. It has two sentences."), offset=0),
+        make_record(_msg("Second message."), offset=1),
+        make_record(_msg("Third message."), offset=0, partition=1),
+    ]
+
+    insert_count = await process_text_embeddings_batch(
+        ollama_client=ollama_client,  # type: ignore
+        milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+        records=records,
+    )
+
+    assert insert_count == 3
+    assert len(ollama_client.embed_calls) == 1
+    assert milvus_client.insert_calls == 1
+    assert [row["text"] for row in milvus_client.rows] == [
+        "First message. It has two sentences.",
+        "Second message.",
+        "Third message.",
+    ]
+    assert [row["document_id"] for row in milvus_client.rows] == ["0:0", "0:1", "1:0"]
+
+
+@pytest.mark.anyio
+async def test_collect_batch_respects_max_size() -> None:
+    """Batches never exceed the configured max size."""
+    consumer = FakeKafkaConsumer(
+        [make_record(_msg(f"msg {i}"), offset=i) for i in range(5)],
+    )
+
+    first = await collect_kafka_batch(consumer, max_size=3, linger_ms=10)  # type: ignore
+    second = await collect_kafka_batch(consumer, max_size=3, linger_ms=10)  # type: ignore
+
+    assert [record.offset for record in first] == [0, 1, 2]
+    assert [record.offset for record in second] == [3, 4]
+
+
+def test_commit_offsets_per_partition() -> None:
+    """The next offset to consume is committed for every partition."""
+    records = [
+        make_record(b"", offset=4),
+        make_record(b"", offset=5),
+        make_record(b"", offset=9, partition=1),
+    ]
+
+    assert get_batch_commit_offsets(records) == {
+        TopicPartition("rag-text-test", 0): 6,
+        TopicPartition("rag-text-test", 1): 10,
+    }
+
+
+class SlowFirstOllamaClient(FakeOllamaClient):
+    """Embeds the first message slower than the rest."""
+
+    async def generate_embeddings_from_text(
+        self,
+        text: Sequence[str],
+        use_cache: bool = True,
+        priority: int = 0,
+    ) -> EmbedResponse:
+        """
+        Delays the embeddings of the very first message.
+
+        :param text: texts to embed.
+        :param use_cache: ignored.
+        :param priority: ignored.
+        :returns: embed response.
+        """
+        if "msg 0" in text:
+            await asyncio.sleep(0.05)
+        return await super().generate_embeddings_from_text(text)
+
+
+@pytest.mark.anyio
+async def test_pipeline_commits_in_order() -> None:
+    """Offsets are never committed past a batch that is still in flight."""
+    consumer = FakeKafkaConsumer(
+        [make_record(_msg(f"msg {i}"), offset=i) for i in range(4)],
+    )
+    milvus_client = FakeMilvusClient()
+    pipeline = TextEmbeddingsPipeline(
+        consumer=consumer,  # type: ignore
+        ollama_client=SlowFirstOllamaClient(),  # type: ignore
+        milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+        batch_max_size=1,
+        batch_linger_ms=1,
+        embed_concurrency=4,
+        insert_concurrency=2,
+        queue_size=4,
+    )
+
+    task = asyncio.create_task(pipeline.run())
+    while len(milvus_client.rows) < 4 or not consumer.committed:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert [row["text"] for row in milvus_client.rows][-1] == "msg 0"
+    assert consumer.committed == [{TopicPartition("rag-text-test", 0): 4}]
+
+
+@pytest.mark.anyio
+async def test_redelivered_batch_is_not_reinserted() -> None:
+    """Known chunks skip both the embed and the insert calls."""
+    ollama_client = FakeOllamaClient()
+    fake_milvus = FakeMilvusClient()
+    milvus_client = MilvusAsyncClient([fake_milvus], timeout=1)
+    records = [
+        make_record(_msg("Same text.  Other text."), offset=0),
+        make_record(_msg("Same   text. Other\ntext."), offset=1),
+    ]
+
+    first = await process_text_embeddings_batch(
+        ollama_client=ollama_client,  # type: ignore
+        milvus_client=milvus_client,  # type: ignore
+        records=records,
+        deduplicator=ChunkDeduplicator(milvus_client, max_size=10),  # type: ignore
+    )
+    # a new deduplicator only knows what milvus stores, like after a restart
+    redelivered = await process_text_embeddings_batch(
+        ollama_client=ollama_client,  # type: ignore
+        milvus_client=milvus_client,  # type: ignore
+        records=records,
+        deduplicator=ChunkDeduplicator(milvus_client, max_size=10),  # type: ignore
+    )
+
+    assert first == 1
+    assert redelivered == 0
+    assert len(ollama_client.embed_calls) == 1
+    assert [row["text"] for row in fake_milvus.rows] == ["Same text. Other text."]
+
+
+@pytest.mark.anyio
+async def test_same_text_is_kept_per_source() -> None:
+    """Chunks keep the source and tenant of their message, dedup is per both."""
+    fake_milvus = FakeMilvusClient()
+    milvus_client = MilvusAsyncClient([fake_milvus], timeout=1)
+    records = [
+        make_record(_msg("Shared text.", source="wiki", tenant="acme"), offset=0),
+        make_record(_msg("Shared text.", source="wiki", tenant="acme"), offset=1),
+        make_record(_msg("Shared text.", source="mail", tenant="acme"), offset=2),
+        make_record(_msg("Shared text.", source="mail", tenant="other"), offset=3),
+    ]
+
+    await process_text_embeddings_batch(
+        ollama_client=FakeOllamaClient(),  # type: ignore
+        milvus_client=milvus_client,  # type: ignore
+        records=records,
+        deduplicator=ChunkDeduplicator(milvus_client, max_size=10),  # type: ignore
+    )
+
+    assert [(row["source"], row["tenant"]) for row in fake_milvus.rows] == [
+        ("wiki", "acme"),
+        ("mail", "acme"),
+        ("mail", "other"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_revoked_partitions_are_drained_and_committed(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Batches in flight are committed before partitions move to another consumer.
+
+    :param monkeypatch: fixture to poll one message per batch.
+    """
+    monkeypatch.setattr(settings, "kafka_consumer_batch_max_size", 1)
+    records = [
+        make_record(_msg(f"msg {i}"), offset=i, partition=i % 2) for i in range(4)
+    ]
+    consumer = FakeKafkaConsumer(records)
+    milvus_client = FakeMilvusClient()
+    stopping = asyncio.Event()
+    task = asyncio.create_task(
+        run_text_embeddings_consumer(
+            consumer=consumer,  # type: ignore
+            ollama_client=SlowFirstOllamaClient(),  # type: ignore
+            milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+            stopping=stopping,
+        ),
+    )
+    # every batch is polled once the messages after the slow first one are in
+    while len(milvus_client.rows) < 3:
+        await asyncio.sleep(0.001)
+
+    revoked = [TopicPartition("rag-text-test", 1)]
+    await consumer.listener.on_partitions_revoked(revoked)
+    committed = {
+        topic_partition: offset
+        for offsets in consumer.committed
+        for topic_partition, offset in (offsets or {}).items()
+    }
+    consumer.assigned -= set(revoked)
+    stopping.set()
+    await task
+
+    assert len(milvus_client.rows) == 4
+    assert committed == {
+        TopicPartition("rag-text-test", 0): 3,
+        TopicPartition("rag-text-test", 1): 4,
+    }
+    assert consumer.paused == {TopicPartition("rag-text-test", 0)}
+
+
+class FailingOllamaClient(FakeOllamaClient):
+    """Refuses the texts holding "poison" and fails the first calls."""
+
+    def __init__(self, outage_calls: int = 0, flaky_calls: int = 0) -> None:
+        super().__init__()
+        self.outage_calls = outage_calls
+        # calls failing for flaky texts once the poison ones are refused
+        self.flaky_calls = flaky_calls
+
+    async def generate_embeddings_from_text(
+        self,
+        text: Sequence[str],
+        use_cache: bool = True,
+        priority: int = 0,
+    ) -> EmbedResponse:
+        """
+        Fails like ollama does when it is down or refuses an input.
+
+        :param text: texts to embed.
+        :param use_cache: ignored.
+        :param priority: ignored.
+        :returns: embed response.
+        :raises ConnectError: during the outage.
+        :raises ResponseError: for a poison text, or a flaky one.
+        """
+        if self.outage_calls:
+            self.outage_calls -= 1
+            raise httpx.ConnectError("connection refused")
+        if any("poison" in txt for txt in text):
+            raise ResponseError("input is not valid", 400)  # noqa: WPS432
+        if self.flaky_calls and any("flaky" in txt for txt in text):
+            self.flaky_calls -= 1
+            raise ResponseError("server busy", 503)  # noqa: WPS432
+        return await super().generate_embeddings_from_text(text)
+
+
+@pytest.mark.anyio
+async def test_poison_messages_are_dead_lettered() -> None:
+    """Bad messages go to the dead letter topic, the others are still ingested."""
+    consumer = FakeKafkaConsumer(
+        [
+            make_record(_msg("msg 0"), offset=0),
+            make_record(b"not json", offset=1),
+            make_record(_msg("poison msg"), offset=2),
+            make_record(_msg("msg 3"), offset=3),
+        ],
+    )
+    producer = FakeKafkaProducer()
+    dead_letter_queue = DeadLetterQueue(producer, "rag-text-test-dlq")  # type: ignore
+    milvus_client = FakeMilvusClient()
+    pipeline = TextEmbeddingsPipeline(
+        consumer=consumer,  # type: ignore
+        ollama_client=FailingOllamaClient(),  # type: ignore
+        milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+        batch_max_size=4,
+        batch_linger_ms=10,
+        embed_concurrency=1,
+        insert_concurrency=1,
+        queue_size=4,
+        dead_letter_queue=dead_letter_queue,
+    )
+
+    task = asyncio.create_task(pipeline.run())
+    while pipeline.committed_count < pipeline.polled_count or not consumer.committed:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert [row["text"] for row in milvus_client.rows] == ["msg 0", "msg 3"]
+    assert [value for _, value in producer.messages] == [
+        b"not json",
+        _msg("poison msg"),
+    ]
+    assert [
+        (headers["dlq.offset"], headers["dlq.stage"], headers["dlq.failure"])
+        for headers in producer.headers
+    ] == [(b"1", b"parse", b"invalid"), (b"2", b"embed", b"permanent")]
+    assert consumer.committed[-1] == {TopicPartition("rag-text-test", 0): 4}
+
+
+@pytest.mark.anyio
+async def test_consumer_is_restarted_after_an_outage(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Messages are processed again once ollama is back, none is dead lettered.
+
+    :param monkeypatch: fixture to shorten the retries and linger time.
+    """
+    monkeypatch.setattr(settings, "kafka_consumer_batch_linger_ms", 1)
+    monkeypatch.setattr(settings, "text_embeddings_retries", 1)
+    monkeypatch.setattr(settings, "text_embeddings_retry_backoff_s", 0.001)
+    monkeypatch.setattr(settings, "kafka_consumer_restart_backoff_s", 0.001)
+    consumer = FakeKafkaConsumer(
+        [make_record(_msg(f"msg {i}"), offset=i) for i in range(2)],
+    )
+    producer = FakeKafkaProducer()
+    ollama_client = FailingOllamaClient(outage_calls=4)
+    milvus_client = FakeMilvusClient()
+    stopping = asyncio.Event()
+    task = asyncio.create_task(
+        supervise_text_embeddings_consumer(
+            consumer=consumer,  # type: ignore
+            ollama_client=ollama_client,  # type: ignore
+            milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+            stopping=stopping,
+            producer=producer,  # type: ignore
+        ),
+    )
+    while not consumer.committed:
+        await asyncio.sleep(0.001)
+    stopping.set()
+    await task
+
+    assert ollama_client.outage_calls == 0
+    assert [row["text"] for row in milvus_client.rows] == ["msg 0", "msg 1"]
+    assert not producer.messages
+    assert consumer.committed == [{TopicPartition("rag-text-test", 0): 2}]
+
+
+@pytest.mark.anyio
+async def test_transient_failures_are_never_dead_lettered(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    A msg failing transiently while its batch is isolated is processed again.
+
+    :param monkeypatch: fixture to shorten the restart backoff and linger time.
+    """
+    monkeypatch.setattr(settings, "kafka_consumer_batch_linger_ms", 1)
+    monkeypatch.setattr(settings, "kafka_consumer_restart_backoff_s", 0.001)
+    consumer = FakeKafkaConsumer(
+        [
+            make_record(_msg("poison msg"), offset=0),
+            make_record(_msg("flaky msg"), offset=1),
+            make_record(_msg("msg 2"), offset=2),
+        ],
+    )
+    producer = FakeKafkaProducer()
+    ollama_client = FailingOllamaClient(flaky_calls=1)
+    milvus_client = FakeMilvusClient()
+    stopping = asyncio.Event()
+    task = asyncio.create_task(
+        supervise_text_embeddings_consumer(
+            consumer=consumer,  # type: ignore
+            ollama_client=ollama_client,  # type: ignore
+            milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+            stopping=stopping,
+            producer=producer,  # type: ignore
+        ),
+    )
+    while not consumer.committed:
+        await asyncio.sleep(0.001)
+    stopping.set()
+    await task
+
+    assert ollama_client.flaky_calls == 0
+    assert [row["text"] for row in milvus_client.rows] == ["flaky msg", "msg 2"]
+    assert [value for _, value in producer.messages] == [_msg("poison msg")]
+    assert consumer.committed == [{TopicPartition("rag-text-test", 0): 3}]
+
+
+def test_only_unavailable_milvus_errors_are_transient() -> None:
+    """Milvus rejecting a message is permanent, being overloaded is transient."""
+    too_long = MilvusException(
+        1100,
+        "length of varchar field source exceeds max length",
+    )
+    rate_limited = MilvusException(8, "rate limit exceeded")
+    retried = MilvusException(1, "[insert] Retry timeout: 3s")
+    retried.__cause__ = MilvusException(2, "service unavailable")
+
+    assert classify_failure(too_long) == FailureKind.PERMANENT
+    assert classify_failure(MilvusException(5, "internal")) == FailureKind.PERMANENT
+    assert classify_failure(rate_limited) == FailureKind.TRANSIENT
+    assert classify_failure(retried) == FailureKind.TRANSIENT
+
+
+def test_metadata_over_the_field_bytes_is_invalid() -> None:
+    """Metadata milvus would reject is refused at parse time, in utf-8 bytes."""
+    batch = TextEmbeddingsBatch(
+        seq=0,
+        records=[
+            make_record(_msg("kept", tenant="é" * 32), offset=0),
+            make_record(_msg("refused", tenant="é" * 33), offset=1),
+            make_record(_msg("refused", source="s" * 129), offset=2),
+        ],
+    )
+
+    failures = parse_text_embeddings_batch(batch)
+
+    assert batch.chunks == ["kept"]
+    assert [failure.record_index for failure in failures] == [1, 2]
+    assert {classify_failure(failure.error) for failure in failures} == {
+        FailureKind.INVALID,
+    }
+
+
+class BrokenDiskIndex:
+    """BM25 index whose segments can't be written."""
+
+    def __init__(self) -> None:
+        self.threads: List[threading.Thread] = []
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]) -> None:
+        """Fails writing the segment of the chunks."""
+        self.threads.append(threading.current_thread())
+        raise OSError("No space left on device")
+
+
+@pytest.mark.anyio
+async def test_lexical_indexing_is_off_the_loop_and_isolated() -> None:
+    """BM25 indexing runs in a thread and its errors keep the inserted batch."""
+    lexical_index = BrokenDiskIndex()
+    milvus_client = FakeMilvusClient()
+
+    insert_count = await process_text_embeddings_batch(
+        ollama_client=FakeOllamaClient(),  # type: ignore
+        milvus_client=MilvusAsyncClient([milvus_client], timeout=1),  # type: ignore
+        records=[make_record(_msg("Indexed message."), offset=0)],
+        lexical_index=lexical_index,  # type: ignore
+    )
+
+    assert insert_count == 1
+    assert len(milvus_client.rows) == 1
+    assert lexical_index.threads
+    assert threading.main_thread() not in lexical_index.threads
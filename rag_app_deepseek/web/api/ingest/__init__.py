@@ -0,0 +1,4 @@
+"""API to ingest documents in bulk."""
+from rag_app_deepseek.web.api.ingest.views import router
+
+__all__ = ["router"]
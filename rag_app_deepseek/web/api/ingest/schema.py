@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+
+class IngestResult(BaseModel):
+    """Outcome of a bulk ingestion."""
+
+    documents: int
+    # kafka messages published, one per chunk
+    chunks: int
@@ -0,0 +1,248 @@
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+from aiokafka import AIOKafkaProducer
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from loguru import logger
+
+from rag_app_deepseek.services.kafka.dependencies import get_kafka_producer
+from rag_app_deepseek.services.kafka.lag import ConsumerLagMonitor
+from rag_app_deepseek.services.milvus.schema import check_metadata_bytes
+from rag_app_deepseek.services.text_embeddings.ingest import (
+    BulkPublisher,
+    IngestDocument,
+    IngestError,
+    iter_document_messages,
+    iter_ndjson_documents,
+    iter_text_pieces,
+)
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.web.api.ingest.schema import IngestResult
+
+router = APIRouter()
+
+NDJSON_CONTENT_TYPES = frozenset(("application/x-ndjson", "application/jsonl"))
+
+
+async def iter_text_document(
+    request: Request,
+    timestamp: datetime,
+    source: str,
+    tenant: str,
+) -> AsyncIterator[IngestDocument]:
+    """
+    Reads a raw text body as documents, one per piece of the text.
+
+    The pieces share a document id, they are the same document.
+
+    :param request: current request.
+    :param timestamp: timestamp of the text.
+    :param source: source of the text.
+    :param tenant: tenant of the text.
+    :yields: documents.
+    """
+    document_id = uuid.uuid4().hex
+    async for piece in iter_text_pieces(request.stream()):
+        yield IngestDocument(
+            text=piece,
+            timestamp=timestamp,
+            source=source,
+            tenant=tenant,
+            document_id=document_id,
+        )
+
+
+async def get_excess_lag(lag_monitor: Optional[ConsumerLagMonitor]) -> int:
+    """
+    Measures the consumer lag against the ingestion limit.
+
+    :param lag_monitor: lag monitor of the text topic, None if disabled.
+    :returns: the lag when over the limit, else 0.
+    """
+    if lag_monitor is None:
+        return 0
+    lag = await lag_monitor.get_lag()
+    return lag if lag > settings.ingest_max_consumer_lag else 0
+
+
+def lagging_consumers_error(lag: int, detail: str = "") -> HTTPException:
+    """
+    Builds the response refusing ingestion while the consumers lag behind.
+
+    :param lag: consumer lag.
+    :param detail: what was ingested before, if anything.
+    :returns: Too Many Requests, with Retry-After.
+    """
+    logger.warning(f"bulk ingestion refused, consumer lag is {lag} messages")
+    return HTTPException(
+        status_code=429,  # noqa: WPS432
+        detail=f"consumer lag of {lag} messages, retry later{detail}",
+        headers={"Retry-After": str(settings.ingest_retry_after_s)},
+    )
+
+
+async def check_consumer_lag(request: Request) -> None:
+    """
+    Refuses ingestion while the consumers are too far behind.
+
+    :param request: current request.
+    :raises HTTPException: Too Many Requests, with Retry-After.
+    """
+    lag = await get_excess_lag(request.app.state.kafka_lag_monitor)
+    if lag:
+        raise lagging_consumers_error(lag)
+
+
+def get_content_type(request: Request) -> str:
+    """
+    Reads the media type of the body, without its parameters.
+
+    :param request: current request.
+    :returns: media type.
+    """
+    return request.headers.get("content-type", "").split(";")[0].strip()
+
+
+def check_text_metadata(source: str, tenant: str) -> None:
+    """
+    Refuses text/plain metadata longer than its VARCHAR field.
+
+    NDJSON documents are checked as they are parsed.
+
+    :param source: source of the document.
+    :param tenant: tenant of the document.
+    :raises HTTPException: Bad Request, when a value has too many utf-8 bytes.
+    """
+    try:
+        check_metadata_bytes("source", source)
+        check_metadata_bytes("tenant", tenant)
+    except ValueError as error:
+        raise HTTPException(
+            status_code=400,  # noqa: WPS432
+            detail=str(error),
+        )
+
+
+def read_documents(
+    request: Request,
+    source: str,
+    tenant: str,
+    timestamp: Optional[datetime],
+) -> AsyncIterator[IngestDocument]:
+    """
+    Reads the body of a bulk ingestion as documents, by content type.
+
+    :param request: current request.
+    :param source: source of a text/plain document.
+    :param tenant: tenant of a text/plain document.
+    :param timestamp: timestamp of a text/plain document.
+    :returns: documents, read as the body is received.
+    :raises HTTPException: Unsupported content type, or text/plain metadata
+        too long.
+    """
+    content_type = get_content_type(request)
+    if content_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson_documents(
+            request.stream(),
+            settings.ingest_max_document_bytes,
+        )
+    if content_type == "text/plain":
+        check_text_metadata(source, tenant)
+        return iter_text_document(
+            request,
+            timestamp or datetime.now(timezone.utc),
+            source,
+            tenant,
+        )
+    raise HTTPException(
+        status_code=415,  # noqa: WPS432
+        detail="expected application/x-ndjson or text/plain",
+    )
+
+
+async def publish_documents(
+    documents: AsyncIterator[IngestDocument],
+    publisher: BulkPublisher,
+    lag_monitor: Optional[ConsumerLagMonitor],
+) -> int:
+    """
+    Publishes the chunks of the documents as they are read.
+
+    The consumer lag is checked again before every document, so a long
+    upload stops once the consumers fall behind.
+
+    :param documents: documents to publish.
+    :param publisher: publisher of the chunks.
+    :param lag_monitor: lag monitor of the text topic, None if disabled.
+    :returns: number of documents published.
+    :raises HTTPException: Invalid document or consumers lagging behind,
+        telling what was ingested before.
+    """
+    document_count = 0
+    try:
+        async for document in documents:
+            lag = await get_excess_lag(lag_monitor)
+            if lag:
+                chunk_count = await publisher.flush()
+                raise lagging_consumers_error(
+                    lag,
+                    f", {chunk_count} chunks were ingested before",
+                )
+            for message in iter_document_messages(document):
+                await publisher.publish(message)
+            document_count += 1
+    except IngestError as error:
+        chunk_count = await publisher.flush()
+        raise HTTPException(
+            status_code=400,  # noqa: WPS432
+            detail=f"{error}, the {document_count} documents before it ({chunk_count} chunks) were ingested",  # noqa: E501
+        )
+    return document_count
+
+
+@router.post("/", dependencies=[Depends(check_consumer_lag)])
+async def ingest_documents(
+    request: Request,
+    source: str = Query("", description="source of a text/plain document"),
+    tenant: str = Query("", description="tenant of a text/plain document"),
+    timestamp: Optional[datetime] = Query(
+        None,
+        description="timestamp of a text/plain document, now if unset",
+    ),
+    producer: AIOKafkaProducer = Depends(get_kafka_producer),
+) -> IngestResult:
+    """
+    Ingests documents in bulk, reading the body as it is received.
+
+    The body is either NDJSON, one `IngestDocument` per line, or a single
+    text/plain document described by the query params. Documents are
+    chunked on the fly and the chunks published to the text topic in
+    compressed producer batches, as long as the consumers keep up.
+
+    :param request: current request.
+    :param source: source of a text/plain document.
+    :param tenant: tenant of a text/plain document.
+    :param timestamp: timestamp of a text/plain document.
+    :param producer: kafka's producer.
+    :returns: number of documents and chunks ingested.
+    :raises HTTPException: Invalid document, unsupported content type or
+        consumers lagging behind.
+    """
+    documents = read_documents(request, source, tenant, timestamp)
+    publisher = BulkPublisher(
+        producer,
+        settings.kafka_topic_text,
+        settings.ingest_max_pending_chunks,
+    )
+    document_count = await publish_documents(
+        documents,
+        publisher,
+        request.app.state.kafka_lag_monitor,
+    )
+    chunk_count = await publisher.flush()
+    if get_content_type(request) == "text/plain":
+        # a text/plain body is a single document read in pieces
+        document_count = min(document_count, 1)
+    logger.info(f"bulk ingested {document_count} documents, {chunk_count} chunks")
+    return IngestResult(documents=document_count, chunks=chunk_count)
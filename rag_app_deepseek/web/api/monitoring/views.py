@@ -1,4 +1,10 @@
-from fastapi import APIRouter
+from typing import Any, Dict
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from loguru import logger
+
+from rag_app_deepseek.services.metrics.registry import render_metrics
 
 router = APIRouter()
 
@@ -10,3 +16,62 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/cache/stats")
+def cache_stats(request: Request) -> Dict[str, Dict[str, int]]:
+    """
+    Returns the hit, miss and eviction counters of the caches.
+
+    :param request: current request.
+    :returns: counters of every enabled cache.
+    """
+    stats = {}
+    embeddings_cache = request.app.state.embeddings_cache
+    if embeddings_cache is not None:
+        stats["embeddings"] = embeddings_cache.get_stats()
+    answer_cache = request.app.state.answer_cache
+    if answer_cache is not None:
+        stats["answers"] = answer_cache.get_stats()
+    return stats
+
+
+@router.get("/ollama/stats")
+def ollama_stats(request: Request) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the counters of the ollama scheduler and embed batch sizer.
+
+    :param request: current request.
+    :returns: counters of the embed and chat lanes, embed batch sizes.
+    """
+    ollama_client = request.app.state.ollama_client
+    stats = {}
+    if ollama_client.scheduler is not None:
+        stats.update(ollama_client.scheduler.get_stats())
+    if ollama_client.batch_sizer is not None:
+        stats["embed_batching"] = ollama_client.batch_sizer.get_stats()
+    return stats
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request) -> PlainTextResponse:
+    """
+    Returns the metrics in the prometheus text format.
+
+    The metrics of the process, or of every worker process when
+    `PROMETHEUS_MULTIPROC_DIR` is set. The consumer lag is measured
+    again when stale.
+
+    :param request: current request.
+    :returns: text exposition of the metrics.
+    """
+    lag_monitor = getattr(request.app.state, "kafka_lag_monitor", None)
+    if lag_monitor is not None:
+        try:
+            await lag_monitor.get_lag()
+        except Exception as error:
+            logger.warning(f"kafka consumer lag not measured: {error!r}")
+    return PlainTextResponse(
+        render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -1,6 +1,6 @@
 from fastapi.routing import APIRouter
 
-from rag_app_deepseek.web.api import docs, echo, kafka, monitoring, search
+from rag_app_deepseek.web.api import docs, echo, ingest, kafka, monitoring, search
 
 api_router = APIRouter()
 api_router.include_router(monitoring.router)
@@ -8,3 +8,4 @@ api_router.include_router(docs.router)
 api_router.include_router(search.router, prefix="/search", tags=["search"])
 api_router.include_router(echo.router, prefix="/echo", tags=["echo"])
 api_router.include_router(kafka.router, prefix="/kafka", tags=["kafka"])
+api_router.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
@@ -1,7 +1,114 @@
-from pydantic import BaseModel
+import enum
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
 
 
 class PromptSemanticSearch(BaseModel):
     """Prompt LLM with query."""
 
     query: str
+
+
+class ReasoningMode(str, enum.Enum):  # noqa: WPS600
+    """What to do with the <think> reasoning tokens of a streamed answer."""
+
+    # stream the raw model output, reasoning tags included
+    INCLUDE = "include"
+    # stream the reasoning as separate `think` events
+    TAG = "tag"
+    # only stream the answer
+    DROP = "drop"
+
+
+class TraceMode(str, enum.Enum):  # noqa: WPS600
+    """How the timing breakdown of a search is returned."""
+
+    OFF = "off"
+    # in the Server-Timing header
+    HEADER = "header"
+    # in the Server-Timing header and a json body along with the answer
+    JSON = "json"
+
+
+class TracedChunk(BaseModel):
+    """Chunk of the context of a traced search."""
+
+    id: int
+    # cosine similarity to the query
+    distance: float
+
+
+class SearchTrace(BaseModel):
+    """Timing breakdown of a search."""
+
+    trace_id: str
+    # time spent in every stage, and in total
+    timings_ms: Dict[str, float]
+    chunks: List[TracedChunk]
+
+
+class TracedSearchAnswer(BaseModel):
+    """Answer of a search with its timing breakdown."""
+
+    answer: str
+    trace: SearchTrace
+
+
+class ChunkField(str, enum.Enum):  # noqa: WPS600
+    """Stored field of a chunk returned by the retrieval endpoint."""
+
+    TEXT = "text"
+    TIMESTAMP_UNIX = "timestamp_unix"
+    SOURCE = "source"
+    TENANT = "tenant"
+    TEXT_HASH = "text_hash"
+
+    @classmethod
+    def defaults(cls) -> List["ChunkField"]:
+        """
+        Returns the fields returned when none are requested.
+
+        :returns: the text and timestamp fields.
+        """
+        return [cls.TEXT, cls.TIMESTAMP_UNIX]
+
+
+class RetrievedChunk(BaseModel):
+    """Chunk matching a query, with the requested fields only."""
+
+    id: int
+    # distance of the index metric, a similarity for COSINE and IP
+    distance: float
+    text: Optional[str] = None
+    timestamp_unix: Optional[int] = None
+    source: Optional[str] = None
+    tenant: Optional[str] = None
+    text_hash: Optional[str] = None
+
+
+class RetrievedChunksPage(BaseModel):
+    """Page of chunks matching a query."""
+
+    chunks: List[RetrievedChunk]
+    # offset of the next page, None on the last page
+    next_offset: Optional[int] = None
+
+
+class BatchSearchRequest(BaseModel):
+    """Queries answered by a single batch search request."""
+
+    queries: List[str] = Field(..., min_length=1)
+    # stream every answer as an event once ready, instead of a single list
+    stream: bool = False
+
+
+class BatchSearchResult(BaseModel):
+    """Answer to one query of a batch search."""
+
+    # position of the query in the request
+    index: int
+    query: str
+    context_ids: List[int]
+    answer: Optional[str] = None
+    error: Optional[str] = None
@@ -1,57 +1,1069 @@
-from fastapi import APIRouter, FastAPI, HTTPException, Query, Request
-from pymilvus import MilvusClient
+import asyncio
+import time
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+)
+
+import ujson
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from loguru import logger
+from ollama import ChatResponse
 
+from rag_app_deepseek.services.cache.answers import SemanticAnswerCache
+from rag_app_deepseek.services.lexical.bm25 import BM25Index
+from rag_app_deepseek.services.metrics.instruments import (
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS,
+    observe_llm_response,
+)
+from rag_app_deepseek.services.metrics.tracing import (
+    activate_trace,
+    start_trace,
+    trace_chunks,
+    trace_span,
+)
+from rag_app_deepseek.services.milvus.filters import SearchFilters, build_filter_expr
+from rag_app_deepseek.services.milvus.index import get_search_params
+from rag_app_deepseek.services.milvus.service import MilvusAsyncClient
+from rag_app_deepseek.services.milvus.vectors import VectorCodec
+from rag_app_deepseek.services.ollama.reasoning import ReasoningSplitter
+from rag_app_deepseek.services.ollama.scheduler import Priority
 from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.services.text_embeddings.context import (
+    ContextChunk,
+    build_context,
+)
+from rag_app_deepseek.services.text_embeddings.retrieval import (
+    RetrievalParams,
+    get_default_retrieval_params,
+    rerank_candidates,
+)
 from rag_app_deepseek.services.text_embeddings.service import (
+    get_texts_by_ids,
     get_texts_matching_vector_search,
+    get_texts_matching_vectors_search,
     prompt_llm_with_context_and_query,
+    stream_llm_with_context_and_query,
+)
+from rag_app_deepseek.settings import settings
+from rag_app_deepseek.web.api.search.schema import (
+    BatchSearchRequest,
+    BatchSearchResult,
+    ChunkField,
+    ReasoningMode,
+    RetrievedChunk,
+    RetrievedChunksPage,
+    SearchTrace,
+    TracedSearchAnswer,
+    TraceMode,
 )
 
 router = APIRouter()
 
+# max offset + limit of a milvus search
+MAX_SEARCH_WINDOW = 16384
+# chunk fields fetched to rerank and pack the context
+CONTEXT_FIELDS = ("text", "document_id")
+
+
+def get_retrieval_params(
+    k: Optional[int] = Query(
+        None,
+        ge=1,
+        le=100,  # noqa: WPS432
+        description="max number of context chunks passed to the llm",
+    ),
+    candidates: Optional[int] = Query(
+        None,
+        ge=1,
+        le=1000,  # noqa: WPS432
+        description="candidates fetched from milvus and reranked",
+    ),
+    min_score: Optional[float] = Query(
+        None,
+        ge=-1,
+        le=1,
+        description="min cosine similarity of a context chunk to the query",
+    ),
+    mmr_lambda: Optional[float] = Query(
+        None,
+        ge=0,
+        le=1,
+        description="relevance (1) vs diversity (0) tradeoff of the context",
+    ),
+    token_budget: Optional[int] = Query(
+        None,
+        ge=1,
+        description="max estimated tokens of the context",
+    ),
+    hybrid: Optional[bool] = Query(
+        None,
+        description="fuse BM25 lexical search with vector search",
+    ),
+) -> RetrievalParams:
+    """
+    Builds the retrieval params from the request, defaulting to settings.
+
+    :param k: max number of context chunks.
+    :param candidates: number of candidates reranked.
+    :param min_score: min cosine similarity to the query.
+    :param mmr_lambda: relevance vs diversity tradeoff.
+    :param token_budget: max estimated tokens of the context.
+    :param hybrid: whether to fuse lexical and vector search.
+    :returns: RetrievalParams
+    """
+    defaults = get_default_retrieval_params()
+    top_k = k or defaults.top_k
+    return RetrievalParams(
+        candidates=max(candidates or defaults.candidates, top_k),
+        top_k=top_k,
+        min_score=defaults.min_score if min_score is None else min_score,
+        mmr_lambda=defaults.mmr_lambda if mmr_lambda is None else mmr_lambda,
+        token_budget=token_budget or defaults.token_budget,
+        hybrid=defaults.hybrid if hybrid is None else hybrid,
+    )
+
+
+def get_search_filters(
+    since: Optional[datetime] = Query(
+        None,
+        description="only chunks timestamped at or after, ISO 8601 or unix seconds",
+    ),
+    until: Optional[datetime] = Query(
+        None,
+        description="only chunks timestamped before, ISO 8601 or unix seconds",
+    ),
+    source: Optional[List[str]] = Query(
+        None,
+        description="only chunks from these sources",
+    ),
+    tenant: Optional[str] = Query(
+        None,
+        max_length=64,  # noqa: WPS432
+        description="only chunks of this tenant",
+    ),
+) -> SearchFilters:
+    """
+    Builds the scalar filters of the search from the request.
+
+    :param since: inclusive lower bound of the chunk timestamps.
+    :param until: exclusive upper bound of the chunk timestamps.
+    :param source: sources of the chunks.
+    :param tenant: tenant of the chunks.
+    :returns: SearchFilters
+    """
+    return SearchFilters(
+        since=int(since.timestamp()) if since else None,
+        until=int(until.timestamp()) if until else None,
+        sources=source or (),
+        tenant=tenant,
+    )
+
+
+class IndexSearchOverrides(NamedTuple):
+    """Per request overrides of the index search params."""
+
+    ef: Optional[int]
+    nprobe: Optional[int]
+
+
+def get_index_search_overrides(
+    ef: Optional[int] = Query(
+        None,
+        ge=1,
+        le=32768,  # noqa: WPS432
+        description="HNSW/DiskANN search breadth, higher is slower but more accurate",
+    ),
+    nprobe: Optional[int] = Query(
+        None,
+        ge=1,
+        le=65536,  # noqa: WPS432
+        description="IVF clusters searched, higher is slower but more accurate",
+    ),
+) -> IndexSearchOverrides:
+    """
+    Reads the index search params overridden by the request.
+
+    :param ef: search breadth of HNSW, candidate list size of DiskANN.
+    :param nprobe: number of IVF clusters searched.
+    :returns: IndexSearchOverrides
+    """
+    return IndexSearchOverrides(ef=ef, nprobe=nprobe)
+
+
+def get_vector_search_params(
+    overrides: IndexSearchOverrides = Depends(get_index_search_overrides),
+    retrieval_params: RetrievalParams = Depends(get_retrieval_params),
+) -> Dict[str, Any]:
+    """
+    Builds the milvus search params from the request, defaulting to settings.
+
+    :param overrides: index search params of the request.
+    :param retrieval_params: retrieval params of the request.
+    :returns: search params.
+    """
+    return get_search_params(
+        limit=retrieval_params.candidates,
+        ef=overrides.ef,
+        nprobe=overrides.nprobe,
+    )
+
+
+async def retrieve_context(
+    app: FastAPI,
+    query: str,
+    search_params: Optional[Dict[str, Any]] = None,
+    retrieval_params: Optional[RetrievalParams] = None,
+    search_filters: Optional[SearchFilters] = None,
+) -> Tuple[Sequence[float], List[int], List[str]]:
+    """
+    Embeds the query and retrieves the matching context from milvus.
+
+    :param app: fastapi app instance
+    :param query: incoming query.
+    :param search_params: milvus search params, defaults to the settings.
+    :param retrieval_params: retrieval params, defaults to the settings.
+    :param search_filters: scalar filters of the chunks.
+    :returns: query embedding, ids and texts of the matching context.
+    """
+    contexts = await retrieve_contexts(
+        app,
+        [query],
+        search_params,
+        retrieval_params,
+        search_filters,
+    )
+    return contexts[0]
+
+
+async def search_lexical(
+    lexical_index: BM25Index,
+    query: str,
+    limit: int,
+    filtered: bool = False,
+) -> List[int]:
+    """
+    Searches the BM25 index in a thread, its scoring is CPU bound.
+
+    BM25 ranks the chunks of every tenant, so filtered searches over-fetch
+    for enough results to pass the filters.
+
+    :param lexical_index: BM25 index of the chunks.
+    :param query: incoming query.
+    :param limit: max number of results passing the filters.
+    :param filtered: whether the results are filtered afterwards.
+    :returns: ids of the best chunks, best first.
+    """
+    if filtered:
+        limit *= settings.search_bm25_filtered_overfetch
+    results = await asyncio.to_thread(lexical_index.search, query, limit)
+    return [doc_id for doc_id, _ in results]
+
+
+async def retrieve_contexts(  # noqa: WPS210 WPS211
+    app: FastAPI,
+    queries: Sequence[str],
+    search_params: Optional[Dict[str, Any]] = None,
+    retrieval_params: Optional[RetrievalParams] = None,
+    search_filters: Optional[SearchFilters] = None,
+) -> List[Tuple[Sequence[float], List[int], List[str]]]:
+    """
+    Embeds the queries and retrieves the matching context of every one.
+
+    All queries are embedded by a single call and searched by a single
+    multi-vector milvus search, which over-fetches candidates; they are
+    then reranked locally for relevance and diversity within the context
+    token budget. Hybrid retrieval adds the BM25 matches of every query
+    to its candidates. The picked chunks are packed into context blocks,
+    merging the chunks of the same document, see `build_context`.
+
+    :param app: fastapi app instance
+    :param queries: incoming queries.
+    :param search_params: milvus search params, defaults to the settings.
+    :param retrieval_params: retrieval params, defaults to the settings.
+    :param search_filters: scalar filters of the chunks.
+    :returns: query embedding, chunk ids and blocks of the context of every query.
+    """
+    ollama_client: OllamaClient = app.state.ollama_client
+    milvus_client: MilvusAsyncClient = app.state.milvus_client
+    vector_codec: VectorCodec = app.state.vector_codec
+    lexical_index: Optional[BM25Index] = app.state.lexical_index
+    retrieval_params = retrieval_params or get_default_retrieval_params()
+    filter_expr = build_filter_expr(search_filters)
+    output_fields = [*CONTEXT_FIELDS, vector_codec.rerank_field]
+
+    limit = retrieval_params.candidates
+    lexical_ids: List[List[int]] = [[] for _ in queries]
+    if retrieval_params.hybrid and lexical_index is not None:
+        with trace_span("lexical"):
+            lexical_ids = await asyncio.gather(
+                *[
+                    search_lexical(lexical_index, query, limit, bool(filter_expr))
+                    for query in queries
+                ],
+            )
+
+    with trace_span("embed"):
+        ctx_embeddings_res = await ollama_client.generate_embeddings_from_text(
+            queries,
+        )
+    ctx_embeddings = ctx_embeddings_res.embeddings
+
+    if vector_codec.rerank:
+        limit *= settings.milvus_binary_rerank_factor
+    with trace_span("search"):
+        candidates = await get_texts_matching_vectors_search(
+            milvus_client=milvus_client,
+            embeddings_to_match=ctx_embeddings,
+            search_params=search_params,
+            vector_codec=vector_codec,
+            limit=limit,
+            output_fields=output_fields,
+            filter_expr=filter_expr,
+        )
+    if any(lexical_ids):
+        dense_ids = [{hit["id"] for hit in hits} for hits in candidates]
+        missing_ids = {
+            doc_id
+            for query_lexical_ids, query_dense_ids in zip(lexical_ids, dense_ids)
+            for doc_id in query_lexical_ids
+            if doc_id not in query_dense_ids
+        }
+        with trace_span("lexical"):
+            lexical_hits = {
+                hit["id"]: hit
+                for hit in await get_texts_by_ids(
+                    milvus_client=milvus_client,
+                    ids=sorted(missing_ids),
+                    output_fields=output_fields,
+                    filter_expr=filter_expr,
+                )
+            }
+        for position, query_dense_ids in enumerate(dense_ids):
+            # chunks filtered out or no longer stored, e.g. before a vector
+            # migration, are dropped before keeping the best over-fetched ones
+            lexical_ids[position] = [
+                doc_id
+                for doc_id in lexical_ids[position]
+                if doc_id in query_dense_ids or doc_id in lexical_hits
+            ][: retrieval_params.candidates]
+            candidates[position] = candidates[position] + [
+                lexical_hits[doc_id]
+                for doc_id in lexical_ids[position]
+                if doc_id not in query_dense_ids
+            ]
+
+    with trace_span("rerank"):
+        ctx_texts_dicts = [
+            rerank_candidates(
+                vector_codec=vector_codec,
+                embedding_to_match=ctx_embedding,
+                candidates=query_candidates,
+                params=retrieval_params,
+                lexical_ids=query_lexical_ids,
+            )
+            for ctx_embedding, query_candidates, query_lexical_ids in zip(
+                ctx_embeddings,
+                candidates,
+                lexical_ids,
+            )
+        ]
+    for query_ctx in ctx_texts_dicts:
+        trace_chunks((ctx["id"], ctx["distance"]) for ctx in query_ctx)
+    with trace_span("context"):
+        return [
+            (
+                ctx_embedding,
+                [ctx["id"] for ctx in query_ctx],
+                build_context(
+                    [
+                        ContextChunk(
+                            id=ctx["id"],
+                            text=ctx["entity"]["text"],
+                            document_id=ctx["entity"].get("document_id", ""),
+                        )
+                        for ctx in query_ctx
+                    ],
+                    retrieval_params.token_budget,
+                ),
+            )
+            for ctx_embedding, query_ctx in zip(ctx_embeddings, ctx_texts_dicts)
+        ]
+
+
+async def answer_query(
+    app: FastAPI,
+    query: str,
+    context: Tuple[Sequence[float], List[int], List[str]],
+    priority: Priority = Priority.INTERACTIVE,
+) -> Optional[str]:
+    """
+    Answers the query from its context, through the answer cache.
+
+    :param app: fastapi app instance
+    :param query: incoming query to prompt the llm.
+    :param context: query embedding, ids and texts of the context.
+    :param priority: priority of the llm call in the ollama scheduler.
+    :returns: the answer, None when the generation did not complete.
+    """
+    ctx_embedding, ctx_ids, ctx_texts = context
+    answer_cache: Optional[SemanticAnswerCache] = app.state.answer_cache
+    if answer_cache is not None:
+        cached_answer = answer_cache.lookup(ctx_embedding, ctx_ids)
+        if cached_answer is not None:
+            return cached_answer
+
+    res = await prompt_llm_with_context_and_query(
+        ollama_client=app.state.ollama_client,
+        context=ctx_texts,
+        user_query=query,
+        priority=priority,
+    )
+    logger.info(f"search answer generated: {get_prompt_stats(res)}")
+    if res.done and res.done_reason == "stop" and res.message.content is not None:
+        if answer_cache is not None:
+            answer_cache.store(ctx_embedding, ctx_ids, res.message.content)
+        return res.message.content
+    return None
+
 
-@router.get("/")
-async def send_echo_message(  # noqa: WPS210
+@router.get("/", response_model=str)
+async def send_echo_message(  # noqa: WPS211
     request: Request,
+    response: Response,
     query: str = Query(
         ...,
         max_length=250,  # noqa: WPS432
         description="user query which user wants to get answered for",
     ),
-) -> str:
+    search_params: Dict[str, Any] = Depends(get_vector_search_params),
+    retrieval_params: RetrievalParams = Depends(get_retrieval_params),
+    search_filters: SearchFilters = Depends(get_search_filters),
+    trace: TraceMode = Query(
+        TraceMode.OFF,
+        description="return the time spent in every stage of the search",
+    ),
+    trace_id: Optional[str] = Header(None, alias="X-Trace-Id"),
+) -> Union[str, JSONResponse]:
     """
     Answers to users query by retrieving context data and passing it along to llm.
 
+    Traced searches, asked for or sampled, return the time spent in every
+    stage in the Server-Timing header and log it, along with the ids and
+    distances of the context chunks. Their logs carry the trace id.
+
     :param request: fastapi app instance
+    :param response: response, the trace headers are set on it.
     :param query: incoming query to prompt the llm.
-    :returns: returns the result.
+    :param search_params: milvus search params.
+    :param retrieval_params: context retrieval params.
+    :param search_filters: scalar filters of the context chunks.
+    :param trace: how to return the timing breakdown.
+    :param trace_id: trace id of the client, a new one is made if unset.
+    :returns: returns the result, along with the trace in json mode.
     :raises HTTPException: Internal Server Error.
     """
     app: FastAPI = request.app
-    ollama_client: OllamaClient = app.state.ollama_client
-    milvus_client: MilvusClient = app.state.milvus_client
+    request_trace = start_trace(
+        requested=trace != TraceMode.OFF,
+        sample_rate=settings.search_trace_sample_rate,
+        trace_id=trace_id,
+    )
+    with activate_trace(request_trace):
+        context = await retrieve_context(
+            app,
+            query,
+            search_params,
+            retrieval_params,
+            search_filters,
+        )
+        answer = await answer_query(app, query, context)
+        if request_trace is not None:
+            logger.info(f"search trace: {request_trace.to_dict()}")
+    if answer is None:
+        raise HTTPException(
+            status_code=500,  # noqa: WPS432
+            detail="Internal Server Error",
+        )
+    if request_trace is None:
+        return answer
 
-    ctx_embeddings_res = await ollama_client.generate_embeddings_from_text([query])
-    ctx_embedding = ctx_embeddings_res.embeddings[0]
+    headers = {
+        "Server-Timing": request_trace.get_server_timing(),
+        "X-Trace-Id": request_trace.trace_id,
+    }
+    if trace == TraceMode.JSON:
+        traced = TracedSearchAnswer(
+            answer=answer,
+            trace=SearchTrace.model_validate(request_trace.to_dict()),
+        )
+        return JSONResponse(traced.model_dump(), headers=headers)
+    response.headers.update(headers)
+    return answer
 
-    ctx_texts_dicts = get_texts_matching_vector_search(
-        milvus_client=milvus_client,
-        embedding_to_match=ctx_embedding,
-    )
-    ctx_texts_filtered = list(  # noqa: F841
-        filter(
-            lambda data: data["distance"] > 0.47,  # noqa: WPS459 WPS432
-            ctx_texts_dicts,
+
+def get_prompt_stats(res: Optional[ChatResponse]) -> Dict[str, float]:
+    """
+    Reads the prompt size and prefill time of a generation.
+
+    Prompt tokens found in the ollama prompt cache are not evaluated again,
+    so they do not count in the prefill time.
+
+    :param res: final response of the generation, if any.
+    :returns: prompt tokens and prefill time in milliseconds.
+    """
+    if res is None:
+        return {"prompt_tokens": 0, "prefill_ms": 0.0}
+    return {
+        "prompt_tokens": res.prompt_eval_count or 0,
+        "prefill_ms": round((res.prompt_eval_duration or 0) / 1e6, 1),  # noqa: WPS432
+    }
+
+
+def format_sse(event: str, data: object) -> str:
+    """
+    Formats a server-sent event.
+
+    :param event: name of the event.
+    :param data: json serializable payload of the event.
+    :returns: the event in the text/event-stream format.
+    """
+    return f"event: {event}\ndata: {ujson.dumps(data)}\n\n"
+
+
+def reasoning_events(
+    parts: List[Tuple[str, str]],
+    reasoning: ReasoningMode,
+) -> List[str]:
+    """
+    Turns split llm output into server-sent events.
+
+    :param parts: (kind, text) parts of the llm output.
+    :param reasoning: what to do with the reasoning tokens.
+    :returns: server-sent events.
+    """
+    return [
+        format_sse(kind, {"text": text})
+        for kind, text in parts
+        if kind == "answer" or reasoning == ReasoningMode.TAG
+    ]
+
+
+class StreamedGeneration:
+    """What a streamed generation produced so far, collected as it is forwarded."""
+
+    def __init__(self, started_at: float) -> None:
+        self.started_at = started_at
+        self.content: List[str] = []
+        self.first_token_at: Optional[float] = None
+        self.last_chunk: Optional[ChatResponse] = None
+
+    def record(self, chunk: ChatResponse) -> str:
+        """
+        Records a chunk of the stream.
+
+        :param chunk: chunk of the llm output.
+        :returns: text of the chunk.
+        """
+        self.last_chunk = chunk
+        text = chunk.message.content or ""
+        if text and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(
+                self.first_token_at - self.started_at,
+            )
+        self.content.append(text)
+        return text
+
+    def is_complete(self) -> bool:
+        """
+        Tells if the llm finished its answer.
+
+        :returns: True if the generation stopped by itself.
+        """
+        return self.last_chunk is not None and self.last_chunk.done_reason == "stop"
+
+
+def text_events(
+    text: str,
+    splitter: ReasoningSplitter,
+    reasoning: ReasoningMode,
+) -> List[str]:
+    """
+    Turns a piece of llm output into server-sent events.
+
+    :param text: piece of the llm output.
+    :param splitter: splits the reasoning from the answer across pieces.
+    :param reasoning: what to do with the reasoning tokens.
+    :returns: server-sent events.
+    """
+    if not text:
+        return []
+    if reasoning == ReasoningMode.INCLUDE:
+        return [format_sse("answer", {"text": text})]
+    return reasoning_events(splitter.feed(text), reasoning)
+
+
+def lookup_cached_answer(
+    answer_cache: Optional[SemanticAnswerCache],
+    ctx_embedding: Sequence[float],
+    ctx_ids: List[int],
+) -> Optional[str]:
+    """
+    Finds the cached answer to a query, if the answer cache is enabled.
+
+    :param answer_cache: semantic answer cache, None if disabled.
+    :param ctx_embedding: embedding of the query.
+    :param ctx_ids: ids of the context chunks.
+    :returns: the cached llm output, if any.
+    """
+    if answer_cache is None:
+        return None
+    return answer_cache.lookup(ctx_embedding, ctx_ids)
+
+
+def replay_cached_answer(cached_answer: str, reasoning: ReasoningMode) -> List[str]:
+    """
+    Turns a cached answer into server-sent events, done event included.
+
+    :param cached_answer: cached llm output.
+    :param reasoning: what to do with the reasoning tokens.
+    :returns: server-sent events.
+    """
+    splitter = ReasoningSplitter()
+    events = text_events(cached_answer, splitter, reasoning)
+    events += reasoning_events(splitter.flush(), reasoning)
+    events.append(format_sse("done", {"cached": True}))
+    return events
+
+
+def get_stream_stats(generation: StreamedGeneration) -> Dict[str, Any]:
+    """
+    Measures a finished streamed generation.
+
+    :param generation: output of the generation.
+    :returns: timings, tokens/sec and prompt stats of the done event.
+    """
+    started_at = generation.started_at
+    last_chunk = generation.last_chunk
+    stats = {
+        "cached": False,
+        "ttft_ms": round(
+            ((generation.first_token_at or started_at) - started_at) * 1000,
+            1,
         ),
-    )
-    ctx_texts = [ctx["entity"]["text"] for ctx in ctx_texts_filtered]
+        "total_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        "tokens": last_chunk.eval_count if last_chunk else 0,
+        "tokens_per_s": 0.0,
+        **get_prompt_stats(last_chunk),
+    }
+    if last_chunk and last_chunk.eval_count and last_chunk.eval_duration:
+        stats["tokens_per_s"] = round(
+            last_chunk.eval_count / (last_chunk.eval_duration / 1e9),  # noqa: WPS432
+            1,
+        )
+    return stats
 
-    res = await prompt_llm_with_context_and_query(
-        ollama_client=ollama_client,
+
+async def stream_generation(
+    app: FastAPI,
+    query: str,
+    ctx_texts: List[str],
+    reasoning: ReasoningMode,
+    generation: StreamedGeneration,
+) -> AsyncGenerator[str, None]:
+    """
+    Streams the llm output as server-sent events, done event included.
+
+    Closing this generator closes the ollama stream and so stops the
+    generation.
+
+    :param app: fastapi app instance
+    :param query: incoming query to prompt the llm.
+    :param ctx_texts: context blocks of the prompt.
+    :param reasoning: what to do with the reasoning tokens.
+    :param generation: collects the output of the generation.
+    :yields: server-sent events.
+    """
+    stream = await stream_llm_with_context_and_query(
+        ollama_client=app.state.ollama_client,
         context=ctx_texts,
         user_query=query,
     )
-    if res.done and res.done_reason == "stop" and res.message.content is not None:
-        return res.message.content
+    splitter = ReasoningSplitter()
+    try:
+        async for chunk in stream:
+            for event in text_events(generation.record(chunk), splitter, reasoning):
+                yield event
+        for event in reasoning_events(splitter.flush(), reasoning):  # noqa: WPS440
+            yield event
+    except (asyncio.CancelledError, GeneratorExit):
+        logger.info("search stream closed early, cancelling generation")
+        raise
+    finally:
+        await stream.aclose()  # type: ignore
+
+    stats = get_stream_stats(generation)
+    observe_llm_response(generation.last_chunk)
+    logger.info(f"search stream done: {stats}")
+    yield format_sse("done", stats)
+
+
+async def stream_answer(  # noqa: WPS210 WPS211
+    app: FastAPI,
+    query: str,
+    reasoning: ReasoningMode,
+    started_at: float,
+    search_params: Optional[Dict[str, Any]] = None,
+    retrieval_params: Optional[RetrievalParams] = None,
+    search_filters: Optional[SearchFilters] = None,
+) -> AsyncIterator[str]:
+    """
+    Streams the answer to the query as server-sent events.
+
+    When the client disconnects starlette cancels this generator,
+    which closes the ollama stream and so stops the generation.
+
+    :param app: fastapi app instance
+    :param query: incoming query to prompt the llm.
+    :param reasoning: what to do with the reasoning tokens.
+    :param started_at: perf counter at the start of the request.
+    :param search_params: milvus search params.
+    :param retrieval_params: context retrieval params.
+    :param search_filters: scalar filters of the context chunks.
+    :yields: server-sent events.
+    """
+    ctx_embedding, ctx_ids, ctx_texts = await retrieve_context(
+        app,
+        query,
+        search_params,
+        retrieval_params,
+        search_filters,
+    )
+    yield format_sse("context", {"ids": ctx_ids})
+
+    answer_cache: Optional[SemanticAnswerCache] = app.state.answer_cache
+    cached_answer = lookup_cached_answer(answer_cache, ctx_embedding, ctx_ids)
+    if cached_answer is not None:
+        for event in replay_cached_answer(cached_answer, reasoning):
+            yield event
+        return
+
+    generation = StreamedGeneration(started_at)
+    events = stream_generation(app, query, ctx_texts, reasoning, generation)
+    try:
+        async for event in events:  # noqa: WPS440
+            yield event
+    finally:
+        await events.aclose()
+
+    if answer_cache is not None and generation.is_complete():
+        answer_cache.store(ctx_embedding, ctx_ids, "".join(generation.content))
 
-    raise HTTPException(status_code=500, detail="Internal Server Error")  # noqa: WPS432
+
+@router.get("/stream")
+async def stream_search_answer(  # noqa: WPS211
+    request: Request,
+    query: str = Query(
+        ...,
+        max_length=250,  # noqa: WPS432
+        description="user query which user wants to get answered for",
+    ),
+    reasoning: ReasoningMode = Query(
+        ReasoningMode.TAG,
+        description="what to do with the <think> reasoning tokens of the model",
+    ),
+    search_params: Dict[str, Any] = Depends(get_vector_search_params),
+    retrieval_params: RetrievalParams = Depends(get_retrieval_params),
+    search_filters: SearchFilters = Depends(get_search_filters),
+) -> StreamingResponse:
+    """
+    Answers to users query, streaming the llm output as server-sent events.
+
+    Events are `context` (ids of the retrieved context), `think` and
+    `answer` (text deltas) and a final `done` with time to first token,
+    tokens/sec, prompt tokens and prefill time.
+
+    :param request: fastapi app instance
+    :param query: incoming query to prompt the llm.
+    :param reasoning: what to do with the reasoning tokens.
+    :param search_params: milvus search params.
+    :param retrieval_params: context retrieval params.
+    :param search_filters: scalar filters of the context chunks.
+    :returns: text/event-stream response.
+    """
+    return StreamingResponse(
+        stream_answer(
+            request.app,
+            query,
+            reasoning,
+            time.perf_counter(),
+            search_params,
+            retrieval_params,
+            search_filters,
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def answer_batch_query(
+    app: FastAPI,
+    index: int,
+    query: str,
+    context: Tuple[Sequence[float], List[int], List[str]],
+    concurrency: asyncio.Semaphore,
+) -> BatchSearchResult:
+    """
+    Answers a query of a batch, catching the failure of its llm call.
+
+    :param app: fastapi app instance
+    :param index: position of the query in the batch.
+    :param query: incoming query.
+    :param context: query embedding, chunk ids and context blocks.
+    :param concurrency: bounds the concurrent llm calls of the batch.
+    :returns: the answer or the error of the query.
+    """
+    result = BatchSearchResult(index=index, query=query, context_ids=context[1])
+    try:
+        async with concurrency:
+            result.answer = await answer_query(
+                app,
+                query,
+                context,
+                Priority.BACKGROUND,
+            )
+    except Exception as error:
+        logger.warning(f"batch search query {index} failed: {error!r}")
+        result.error = repr(error)
+        return result
+    if result.answer is None:
+        result.error = "generation did not complete"
+    return result
+
+
+async def iter_batch_answers(  # noqa: WPS211
+    app: FastAPI,
+    queries: Sequence[str],
+    search_params: Optional[Dict[str, Any]] = None,
+    retrieval_params: Optional[RetrievalParams] = None,
+    search_filters: Optional[SearchFilters] = None,
+) -> AsyncIterator[BatchSearchResult]:
+    """
+    Answers a batch of queries, yielding the answers in completion order.
+
+    The contexts are retrieved by a single embed call and a single milvus
+    search, then the llm calls run with bounded concurrency, at background
+    priority so they do not delay interactive searches. A failed llm call
+    only fails the answer of its own query.
+
+    :param app: fastapi app instance
+    :param queries: incoming queries to prompt the llm.
+    :param search_params: milvus search params.
+    :param retrieval_params: context retrieval params.
+    :param search_filters: scalar filters of the context chunks.
+    :yields: the answer to every query.
+    """
+    contexts = await retrieve_contexts(
+        app,
+        queries,
+        search_params,
+        retrieval_params,
+        search_filters,
+    )
+    concurrency = asyncio.Semaphore(settings.search_batch_llm_concurrency)
+    tasks = [
+        asyncio.ensure_future(
+            answer_batch_query(app, index, query, contexts[index], concurrency),
+        )
+        for index, query in enumerate(queries)
+    ]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        for task in tasks:
+            task.cancel()
+        # retrieves the outcome of every task, cancelled ones included
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def stream_batch_answers(
+    results: AsyncIterator[BatchSearchResult],
+    started_at: float,
+) -> AsyncIterator[str]:
+    """
+    Streams the answers of a batch search as server-sent events.
+
+    :param results: answers in completion order.
+    :param started_at: perf counter at the start of the request.
+    :yields: server-sent events.
+    """
+    count = 0
+    async for result in results:
+        count += 1
+        yield format_sse("result", result.model_dump())
+    yield format_sse(
+        "done",
+        {
+            "queries": count,
+            "total_ms": round((time.perf_counter() - started_at) * 1000, 1),
+        },
+    )
+
+
+@router.post("/batch", response_model=None)
+async def batch_search(
+    request: Request,
+    batch: BatchSearchRequest = Body(...),
+    search_params: Dict[str, Any] = Depends(get_vector_search_params),
+    retrieval_params: RetrievalParams = Depends(get_retrieval_params),
+    search_filters: SearchFilters = Depends(get_search_filters),
+) -> Union[List[BatchSearchResult], StreamingResponse]:
+    """
+    Answers many queries in a single request.
+
+    The retrieval and filter query params apply to every query. Answers
+    are returned as a list in the order of the queries or, with `stream`,
+    as `result` events in completion order ending with a `done` event.
+
+    :param request: fastapi app instance
+    :param batch: queries of the batch.
+    :param search_params: milvus search params.
+    :param retrieval_params: context retrieval params.
+    :param search_filters: scalar filters of the context chunks.
+    :returns: answers of the queries, or a text/event-stream response.
+    :raises HTTPException: Too many or too long queries.
+    """
+    if len(batch.queries) > settings.search_batch_max_queries:
+        raise HTTPException(
+            status_code=422,  # noqa: WPS432
+            detail=f"at most {settings.search_batch_max_queries} queries per batch",
+        )
+    if any(len(query) > 250 for query in batch.queries):  # noqa: WPS432
+        raise HTTPException(
+            status_code=422,  # noqa: WPS432
+            detail="queries are at most 250 characters",
+        )
+
+    results = iter_batch_answers(
+        request.app,
+        batch.queries,
+        search_params,
+        retrieval_params,
+        search_filters,
+    )
+    if batch.stream:
+        return StreamingResponse(
+            stream_batch_answers(results, time.perf_counter()),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    answers = [result async for result in results]
+    return sorted(answers, key=lambda result: result.index)
+
+
+@router.get("/chunks", response_model_exclude_none=True)
+async def retrieve_chunks(  # noqa: WPS211
+    request: Request,
+    query: str = Query(
+        ...,
+        max_length=250,  # noqa: WPS432
+        description="user query to match the chunks against",
+    ),
+    limit: int = Query(
+        10,
+        ge=1,
+        le=1000,  # noqa: WPS432
+        description="chunks per page",
+    ),
+    offset: int = Query(0, ge=0, description="chunks skipped, for pagination"),
+    fields: Optional[List[ChunkField]] = Query(
+        None,
+        description="chunk fields returned, text and timestamp if unset",
+    ),
+    overrides: IndexSearchOverrides = Depends(get_index_search_overrides),
+    search_filters: SearchFilters = Depends(get_search_filters),
+) -> RetrievedChunksPage:
+    """
+    Returns the chunks matching the query, without prompting the llm.
+
+    Chunks are ranked by the vector search alone: no reranking, and the
+    distance is the one of the index metric, a similarity for COSINE and
+    IP. Pages past `MAX_SEARCH_WINDOW` chunks can not be fetched.
+
+    :param request: fastapi app instance
+    :param query: incoming query.
+    :param limit: chunks per page.
+    :param offset: chunks skipped.
+    :param fields: chunk fields returned.
+    :param overrides: index search params of the request.
+    :param search_filters: scalar filters of the chunks.
+    :returns: page of matching chunks.
+    :raises HTTPException: Page past the search window.
+    """
+    if offset + limit > MAX_SEARCH_WINDOW:
+        raise HTTPException(
+            status_code=422,  # noqa: WPS432
+            detail=f"offset + limit must be at most {MAX_SEARCH_WINDOW}",
+        )
+
+    app: FastAPI = request.app
+    ollama_client: OllamaClient = app.state.ollama_client
+    embeddings_res = await ollama_client.generate_embeddings_from_text([query])
+    output_fields = [field.value for field in fields or ChunkField.defaults()]
+    hits = await get_texts_matching_vector_search(
+        milvus_client=app.state.milvus_client,
+        embedding_to_match=embeddings_res.embeddings[0],
+        search_params=get_search_params(
+            limit=offset + limit,
+            ef=overrides.ef,
+            nprobe=overrides.nprobe,
+        ),
+        vector_codec=app.state.vector_codec,
+        limit=limit,
+        output_fields=output_fields,
+        filter_expr=build_filter_expr(search_filters),
+        offset=offset,
+    )
+
+    entities = [cast(Mapping[str, Any], hit["entity"]) for hit in hits]
+    next_offset = offset + limit
+    return RetrievedChunksPage(
+        chunks=[
+            RetrievedChunk(
+                id=hit["id"],
+                distance=hit["distance"],
+                **{field: entity[field] for field in output_fields},
+            )
+            for hit, entity in zip(hits, entities)
+        ],
+        next_offset=(
+            next_offset
+            if len(hits) == limit and next_offset < MAX_SEARCH_WINDOW
+            else None
+        ),
+    )
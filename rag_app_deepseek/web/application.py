@@ -8,6 +8,7 @@ from fastapi.staticfiles import StaticFiles
 from rag_app_deepseek.logging import configure_logging
 from rag_app_deepseek.web.api.router import api_router
 from rag_app_deepseek.web.lifetime import lifespan
+from rag_app_deepseek.web.middleware import MetricsMiddleware
 
 APP_ROOT = Path(__file__).parent.parent
 
@@ -32,6 +33,7 @@ def get_app() -> FastAPI:
         default_response_class=UJSONResponse,
     )
     app.openapi_version = "3.0.2"
+    app.add_middleware(MetricsMiddleware)
 
     # Main router for the API.
     app.include_router(router=api_router, prefix="/api")
@@ -3,9 +3,19 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from rag_app_deepseek.services.cache.lifetime import (
+    init_answer_cache,
+    init_embeddings_cache,
+    shutdown_embeddings_cache,
+)
 from rag_app_deepseek.services.kafka.lifetime import init_kafka, shutdown_kafka
+from rag_app_deepseek.services.lexical.lifetime import (
+    init_lexical_index,
+    shutdown_lexical_index,
+)
 from rag_app_deepseek.services.milvus.lifetime import disconnect_milvus, init_milvus
-from rag_app_deepseek.services.ollama.service import OllamaClient
+from rag_app_deepseek.services.milvus.vectors import load_vector_codec
+from rag_app_deepseek.services.ollama.lifetime import init_ollama_client
 
 
 @asynccontextmanager
@@ -18,16 +28,22 @@ async def lifespan(app: FastAPI):  # type: ignore
 
     :param app: the fastAPI application.
     """
-    app.state.ollama_client = OllamaClient()
-    await init_kafka(app)
+    app.state.embeddings_cache = init_embeddings_cache()
+    app.state.ollama_client = init_ollama_client(app.state.embeddings_cache)
+    app.state.answer_cache = init_answer_cache()
+    app.state.vector_codec = load_vector_codec()
+    app.state.lexical_index = init_lexical_index()
     milvus_client = init_milvus()
-    milvus_client.load_collection("text_embeddings_schema")
+    await milvus_client.load_collection("text_embeddings_schema")
     app.state.milvus_client = milvus_client
+    await init_kafka(app)
     yield
 
     await shutdown_kafka(app)
     await asyncio.sleep(
         3,
     )  # sleep for 3 seconds so that milvus writes can be completed before disconnecting
-    milvus_client.release_collection("text_embeddings_schema")
+    await milvus_client.release_collection("text_embeddings_schema")
     disconnect_milvus(milvus_client)
+    shutdown_lexical_index(app.state.lexical_index)
+    shutdown_embeddings_cache(app.state.embeddings_cache)
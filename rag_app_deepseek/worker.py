@@ -0,0 +1,177 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+from typing import List
+
+from aiokafka import AIOKafkaProducer
+from loguru import logger
+from prometheus_client import start_http_server
+
+from rag_app_deepseek.services.cache.lifetime import (
+    init_embeddings_cache,
+    shutdown_embeddings_cache,
+)
+from rag_app_deepseek.services.kafka.lifetime import (
+    create_text_embeddings_consumer,
+    get_kafka_common_config,
+)
+from rag_app_deepseek.services.lexical.lifetime import (
+    init_lexical_index,
+    shutdown_lexical_index,
+)
+from rag_app_deepseek.services.metrics.registry import (
+    MULTIPROC_DIR_ENV,
+    get_metrics_registry,
+)
+from rag_app_deepseek.services.milvus.lifetime import disconnect_milvus, init_milvus
+from rag_app_deepseek.services.milvus.vectors import load_vector_codec
+from rag_app_deepseek.services.ollama.lifetime import init_ollama_client
+from rag_app_deepseek.services.text_embeddings.consumer import (
+    supervise_text_embeddings_consumer,
+)
+from rag_app_deepseek.settings import settings
+
+
+async def run_consumers(count: int) -> None:  # pragma: no cover
+    """
+    Runs text embeddings consumers of the consumer group until SIGINT/SIGTERM.
+
+    The consumers share the ollama and milvus clients of the process and
+    split the partitions of the topic with every other consumer of the
+    group. A failed consumer is restarted. On a signal they stop fetching,
+    commit the batches in flight and leave the group.
+
+    :param count: number of consumers.
+    :raises Exception: the first error of a consumer.
+    """
+    embeddings_cache = init_embeddings_cache()
+    ollama_client = init_ollama_client(embeddings_cache)
+    vector_codec = load_vector_codec()
+    lexical_index = init_lexical_index()
+    milvus_client = init_milvus()
+    # chunk deduplication queries the collection
+    await milvus_client.load_collection("text_embeddings_schema")
+    kafka_common_config = get_kafka_common_config()
+    # publishes the dead letters
+    producer = AIOKafkaProducer(**kafka_common_config)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    consumers = [
+        create_text_embeddings_consumer(kafka_common_config) for _ in range(count)
+    ]
+    tasks: List["asyncio.Task[None]"] = []
+    try:
+        await producer.start()
+        for consumer in consumers:
+            await consumer.start()
+            tasks.append(
+                asyncio.create_task(
+                    supervise_text_embeddings_consumer(
+                        consumer=consumer,
+                        ollama_client=ollama_client,
+                        milvus_client=milvus_client,
+                        vector_codec=vector_codec,
+                        lexical_index=lexical_index,
+                        stopping=stopping,
+                        producer=producer,
+                    ),
+                ),
+            )
+        logger.info(f"{count} kafka consumers started")
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            task.result()
+    finally:
+        stopping.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for consumer in consumers:  # noqa: WPS440
+            await consumer.stop()
+        await producer.stop()
+        disconnect_milvus(milvus_client)
+        shutdown_lexical_index(lexical_index)
+        shutdown_embeddings_cache(embeddings_cache)
+        logger.info("kafka consumers stopped")
+
+
+def run_process(count: int) -> None:  # pragma: no cover
+    """
+    Runs the consumers of a process.
+
+    :param count: number of consumers.
+    """
+    asyncio.run(run_consumers(count))
+
+
+def start_metrics_server() -> None:  # pragma: no cover
+    """Serves the prometheus metrics on `kafka_consumer_metrics_port`, if set."""
+    if settings.kafka_consumer_metrics_port:
+        start_http_server(
+            settings.kafka_consumer_metrics_port,
+            registry=get_metrics_registry(),
+        )
+        logger.info(f"metrics served on port {settings.kafka_consumer_metrics_port}")
+
+
+def run_processes() -> None:  # pragma: no cover
+    """
+    Runs the consumers in `kafka_consumer_processes` processes until they exit.
+
+    SIGTERM is forwarded to them.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_process,
+            args=(settings.kafka_consumer_tasks,),
+            name=f"kafka-consumer-{index}",
+        )
+        for index in range(settings.kafka_consumer_processes)
+    ]
+    for process in processes:
+        process.start()
+    # the children stop gracefully on the SIGINT of the terminal themselves
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    def terminate(signum: int, frame: object) -> None:  # noqa: WPS430
+        for child in processes:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    for process in processes:  # noqa: WPS440
+        process.join()
+    sys.exit(max(process.exitcode or 0 for process in processes))
+
+
+def main() -> None:  # pragma: no cover
+    """
+    Entrypoint of the standalone kafka consumers.
+
+    Starts `kafka_consumer_processes` processes running
+    `kafka_consumer_tasks` consumers each. Disable the consumer of the
+    web processes with `kafka_consumer_in_web` when running this.
+
+    The metrics of the consumers are served on their own port. Several
+    processes write them to `PROMETHEUS_MULTIPROC_DIR`, a temporary
+    directory if unset, for the server to export them together.
+    """
+    if settings.kafka_consumer_processes == 1:
+        start_metrics_server()
+        run_process(settings.kafka_consumer_tasks)
+        return
+
+    with tempfile.TemporaryDirectory(prefix="rag-consumer-metrics-") as metrics_dir:
+        # read by prometheus_client once imported by the spawned processes
+        os.environ.setdefault(MULTIPROC_DIR_ENV, metrics_dir)
+        start_metrics_server()
+        run_processes()
+
+
+if __name__ == "__main__":
+    main()